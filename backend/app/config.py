@@ -12,6 +12,9 @@ class Settings(BaseSettings):
 
     # Anthropic
     anthropic_api_key: str
+    anthropic_replay_mode: Optional[str] = None  # "record", "replay" or "auto" (see app/services/replay.py)
+    anthropic_replay_dir: str = ".replay"
+    anthropic_replay_latency: str = "recorded"  # "recorded" or a fixed number of seconds
 
     # Stripe (Optional for MVP)
     stripe_secret_key: Optional[str] = None
@@ -19,6 +22,10 @@ class Settings(BaseSettings):
     stripe_price_id_starter: str = "price_starter"
     stripe_price_id_standard: str = "price_standard"
     stripe_price_id_pro: str = "price_pro"
+    stripe_webhook_tolerance: int = 300  # Seconds a signed webhook stays valid
+    stripe_batch_size: int = 20  # Inbox events fulfilled per claim
+    stripe_poll_interval: float = 30.0  # Seconds between inbox polls (new events wake it at once)
+    stripe_max_attempts: int = 5  # Claims before a failing event is marked failed
 
     # Clerk (Auth) - Optional for MVP, uses dev mode
     clerk_secret_key: Optional[str] = None
@@ -33,6 +40,109 @@ class Settings(BaseSettings):
     backend_url: str = "http://localhost:8000"
     environment: str = "development"
 
+    # Model routing: cheapest adequate tier per request (see app/services/model_router.py)
+    model_tiers: dict[str, str] = {
+        "fast": "claude-3-5-haiku-20241022",
+        "standard": "claude-sonnet-4-20250514",
+        "premium": "claude-opus-4-20250514",
+    }
+    routing_fast_max_images: int = 2  # Requests this small go to the fast tier...
+    routing_fast_max_context_chars: int = 200  # ...if their user context is this short
+    routing_fast_with_conversation: bool = False  # Conversation analysis stays on standard
+    routing_pressure_queue_depth: int = 4  # Queued standard calls before mid-sized requests go fast
+    routing_pressure_latency_ms: float = 0.0  # Standard latency that also counts as load (0 = off)
+    routing_pressure_max_images: int = 5
+
+    # Two-stage analysis: output budget of the quick triage pass
+    triage_max_tokens: int = 700
+
+    # POST /api/analyze/compare: profiles analyzed together
+    compare_max_profiles: int = 5
+
+    # Pricing: JSON price table (see app/services/pricing.py); built-in table when unset
+    pricing_table_path: Optional[str] = None
+
+    # Image store: normalized screenshots, content-addressed (see app/services/image_store.py)
+    image_store_backend: str = "local"  # "local" or "s3"
+    image_store_path: str = ".images"  # local backend directory
+    image_store_bucket: Optional[str] = None  # s3 backend; credentials from AWS_* variables
+    image_store_prefix: str = "images/"
+    image_store_endpoint_url: Optional[str] = None  # MinIO or another S3-compatible server
+    image_store_region: Optional[str] = None
+    image_max_edge: int = 1568  # Longer uploads are downscaled to this many pixels
+    image_max_bytes: int = 5 * 1024 * 1024
+
+    # Pre-flight: screenshots left out before they are billed (see app/services/preflight.py)
+    image_preflight_checks: list[str] = ["blank", "dark", "duplicate"]  # Add "photo" to drop camera photos; empty to send everything
+
+    # Image packing: screenshots tiled into fewer composite images per call (see app/services/image_packing.py)
+    image_packing: bool = False
+    image_packing_min_scale: float = 0.7  # Smallest size a screenshot is read at, relative to sending it alone
+    image_packing_max_tiles: int = 4  # Screenshots per composite
+
+    # Analysis text at rest: zstd with a trained dictionary (see app/services/analysis_codec.py)
+    analysis_compression: bool = True
+    analysis_dictionary: Optional[str] = "rose-glass-v1"  # app/dictionaries/<name>.zdict; plain zstd when unset
+    analysis_compression_level: int = 9
+
+    # Database resilience: per-query timeout, circuit breaker and a local
+    # journal for charges and saves made while it is down (see app/db/journal.py)
+    db_timeout: float = 5.0  # Seconds before a query counts as failed
+    db_breaker_failures: int = 5  # Consecutive failures that open the circuit
+    db_breaker_reset: float = 10.0  # Seconds the circuit stays open before a probe
+    db_journal_path: Optional[str] = ".journal/db-writes.sqlite3"  # Off when unset
+
+    # Authenticated users: clerk_id -> users.id and balance, cached per worker
+    user_cache_ttl: float = 30.0  # Seconds before a user's balance snapshot is refreshed
+    user_cache_size: int = 10_000
+
+    # Admin (usage dashboards); admin endpoints are disabled when unset
+    admin_api_key: Optional[str] = None
+
+    # Logging: queued, written by a background thread (see app/core/logs.py)
+    log_level: str = "INFO"
+    log_format: str = "text"  # "text" or "json" (one object per line, with each record's fields)
+    log_queue_size: int = 10_000  # Records waiting to be written; more are dropped, not waited for
+    log_sample_rates: dict[str, float] = {  # Logger -> fraction of its INFO/DEBUG records kept
+        "app.services.auth": 0.1,
+    }
+
+    # Server
+    shutdown_drain_timeout: float = 60.0  # Seconds to wait for in-flight analyses on SIGTERM
+    disconnect_poll_interval: float = 0.5  # Seconds between client-disconnect checks during an analysis
+
+    # Rate limiting / admission control for expensive endpoints
+    rate_limit_backend: str = "memory"  # "memory" (per worker) or "database" (shared)
+    rate_limit_user_per_minute: float = 6.0
+    rate_limit_user_burst: int = 3
+    rate_limit_global_per_minute: float = 600.0
+    rate_limit_global_burst: int = 60
+    concurrency_per_user: int = 2
+    concurrency_per_model: dict[str, int] = {"claude-opus-4-20250514": 8}
+    concurrency_default_per_model: int = 32
+    concurrency_global: int = 48
+    admission_max_queue: int = 100  # Waiters per model/global slot before rejecting
+    admission_max_wait: float = 10.0  # Seconds a request may queue for a slot
+    admission_lease_ttl: float = 300.0  # Shared slots expire if a worker dies holding them
+
+    # Org-wide Anthropic tokens per minute, per model (see app/services/token_budget.py).
+    # Shared across workers with RATE_LIMIT_BACKEND=database; off when unset
+    token_budget_input_tpm: Optional[int] = None
+    token_budget_output_tpm: Optional[int] = None
+    token_budget_max_wait: float = 10.0  # Seconds a call may wait for budget before it is shed
+
+    # Fair scheduling of upstream Claude calls (per worker)
+    scheduler_slots: int = 16  # Concurrent Claude calls before lanes queue
+    scheduler_lane_weights: dict[str, float] = {
+        "fast:small": 8.0,
+        "fast:large": 4.0,
+        "standard:small": 8.0,
+        "standard:large": 4.0,
+        "premium:small": 2.0,
+        "premium:large": 1.0,
+    }
+    scheduler_large_request_images: int = 4  # Requests with more images use the ":large" lane
+
     # CORS
     cors_origins: list[str] = ["http://localhost:3000"]
 
@@ -8,10 +8,28 @@ from .reflection_gate import (
     CombinedContext,
     ReflectionRequired
 )
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+from .lifecycle import ClientDisconnected, InFlightTracker, ShuttingDown, cancel_on_disconnect
+from .logs import JsonFormatter, SamplingFilter, configure_logging, stop_logging
+from .metrics import MetricsRegistry, metrics
+from .singleflight import SingleFlight
 
 __all__ = [
     'ReflectionGate',
     'UserReflection',
     'CombinedContext',
-    'ReflectionRequired'
+    'ReflectionRequired',
+    'InFlightTracker',
+    'ShuttingDown',
+    'ClientDisconnected',
+    'cancel_on_disconnect',
+    'MetricsRegistry',
+    'metrics',
+    'SingleFlight',
+    'CircuitBreaker',
+    'CircuitOpen',
+    'configure_logging',
+    'stop_logging',
+    'JsonFormatter',
+    'SamplingFilter'
 ]
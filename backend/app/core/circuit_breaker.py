@@ -0,0 +1,138 @@
+"""
+Circuit Breaker - Fast failure for a dependency that is down
+
+Without one, every request keeps paying the full timeout of a dependency
+that is not answering, several times over. The breaker counts consecutive
+failures; at `failure_threshold` it opens and calls fail immediately with
+CircuitOpen. After `reset_timeout` it is half-open: a single call goes
+through as a probe while the rest keep failing fast. A successful probe
+closes the breaker, a failed one opens it for another `reset_timeout`.
+
+What counts as a failure is the caller's decision (`is_failure`): an error
+the dependency answered with (a constraint violation, a 404) shows it is
+up and does not trip the breaker.
+"""
+
+from typing import Awaitable, Callable, Optional, TypeVar
+import asyncio
+import logging
+import time
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Gauge values for `circuit_state`
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """The breaker is open; the call was not attempted"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit {name} is open, retry after {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Guard calls to one dependency.
+
+    Usage:
+        result = await breaker.call(lambda: client.fetch(...))
+
+    `timeout` bounds each call; a call that exceeds it raises
+    asyncio.TimeoutError and counts as a failure.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        timeout: Optional[float] = None,
+        is_failure: Callable[[BaseException], bool] = lambda e: True
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        probe = self._admit()
+        try:
+            if self.timeout:
+                result = await asyncio.wait_for(fn(), self.timeout)
+            else:
+                result = await fn()
+        except asyncio.TimeoutError:
+            metrics.inc("circuit_timeouts", circuit=self.name)
+            self._failure(probe)
+            raise
+        except asyncio.CancelledError:
+            # Says nothing about the dependency; let the next call probe
+            if probe:
+                self._probing = False
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._failure(probe)
+            else:
+                self._success(probe)
+            raise
+        self._success(probe)
+        return result
+
+    def _admit(self) -> bool:
+        """Let a call through or raise CircuitOpen; True when it is the half-open probe"""
+        if self.state == CLOSED:
+            return False
+
+        retry_after = self._opened_at + self.reset_timeout - time.monotonic()
+        if self.state == OPEN and retry_after <= 0:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+
+        metrics.inc("circuit_rejected", circuit=self.name)
+        raise CircuitOpen(self.name, max(retry_after, 0.0))
+
+    def _success(self, probe: bool) -> None:
+        self._failures = 0
+        if probe:
+            self._probing = False
+        if self.state != CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+            self._set_state(CLOSED)
+
+    def _failure(self, probe: bool) -> None:
+        self._failures += 1
+        if probe:
+            self._probing = False
+        if probe or (self.state == CLOSED and self._failures >= self.failure_threshold):
+            if self.state == CLOSED:
+                logger.warning(f"Circuit {self.name} opened after {self._failures} consecutive failures")
+                metrics.inc("circuit_opened", circuit=self.name)
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set("circuit_state", _STATE_VALUES[state], circuit=self.name)
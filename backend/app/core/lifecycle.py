@@ -0,0 +1,146 @@
+"""
+Worker Lifecycle - In-flight tracking, graceful drain, client disconnects
+
+Each server worker owns one InFlightTracker. Analyses register with it while
+they run, and the lifespan shutdown hook waits on it so a SIGTERM (deploy,
+autoscale-in, worker recycling) never drops a request that has already been
+charged.
+
+`cancel_on_disconnect` is the other direction: a request whose client has
+gone away (tab closed, navigation) is cancelled instead of holding a
+scheduler slot and an upstream call for a response nobody will read.
+"""
+
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Set
+import asyncio
+import logging
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+
+class ShuttingDown(Exception):
+    """Raised when new work arrives after the worker has started draining."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready; the work was cancelled."""
+
+
+class InFlightTracker:
+    """
+    Track in-flight analyses and the settlement work that follows them.
+
+    Usage:
+        async with tracker.track():
+            result = await claude.analyze_profile(...)
+            await tracker.run_to_completion(settle(result))
+
+    `run_to_completion` shields its coroutine from request cancellation, so
+    once the upstream call has succeeded the credit deduction and analysis
+    save always finish - even if the client disconnects or the server's
+    graceful-shutdown timeout cancels the request task.
+    """
+
+    def __init__(self):
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.draining = False
+
+    @property
+    def active(self) -> int:
+        """Number of analyses currently in flight"""
+        return self._active
+
+    @asynccontextmanager
+    async def track(self):
+        """Register one in-flight analysis for the duration of the block"""
+        if self.draining:
+            raise ShuttingDown("Worker is shutting down")
+
+        self._active += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0 and not self._tasks:
+                self._idle.set()
+
+    async def run_to_completion(self, coro: Awaitable[Any]) -> Any:
+        """Run `coro` as a task that survives cancellation of the caller"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        self._idle.clear()
+        task.add_done_callback(self._task_done)
+        return await asyncio.shield(task)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._active == 0 and not self._tasks:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Stop admitting new work and wait for in-flight work to finish.
+
+        Returns:
+            True if everything finished within `timeout`, False otherwise
+        """
+        self.draining = True
+
+        if self._idle.is_set():
+            return True
+
+        logger.info(
+            "Draining %d in-flight analyses and %d settlement tasks",
+            self._active, len(self._tasks)
+        )
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.error(
+                "Drain timed out with %d analyses and %d settlement tasks pending",
+                self._active, len(self._tasks)
+            )
+            return False
+
+
+async def cancel_on_disconnect(request: "Request", work: Awaitable[Any], poll_interval: float = 0.5) -> Any:
+    """
+    Await `work`, cancelling it if the client disconnects first.
+
+    The connection is polled every `poll_interval` seconds. Cancellation
+    reaches whatever `work` is waiting on - admission, a scheduler queue, the
+    upstream HTTP call - but not coroutines run with
+    `InFlightTracker.run_to_completion`, so a charge that has started always
+    finishes.
+
+    Raises:
+        ClientDisconnected: The client went away and `work` was cancelled
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    raise ClientDisconnected()
@@ -0,0 +1,172 @@
+"""
+Logging - Queue-backed, structured, sampled
+
+`logging.basicConfig` writes every record to stderr on the thread that
+logged it, i.e. the event loop, so a slow or blocked log sink stalls every
+request in the worker. `configure_logging` instead gives the root logger a
+QueueHandler: the event loop only appends the record to a bounded queue,
+and a QueueListener thread formats and writes it. When the queue is full
+the record is dropped and counted (`log_records_dropped`) rather than
+blocking the loop.
+
+Messages are formatted on the writer thread too. Hot-path call sites pass
+a dict of fields instead of an f-string:
+
+    logger.info("Analysis complete for user %(user)s", {"user": user.clerk_id})
+
+which costs a dict on the event loop, renders the text only when written,
+and gives LOG_FORMAT=json its fields (`{"msg": ..., "user": ...}`). Fields
+must not be mutated after the call.
+
+High-volume INFO lines can be sampled per logger (`LOG_SAMPLE_RATES`):
+a logger and its children keep that fraction of their records below
+WARNING; warnings and errors are always kept.
+"""
+
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
+import atexit
+import json
+import logging
+import queue
+import random
+
+from app.core.metrics import metrics
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and its fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if isinstance(record.args, dict):
+            entry.update(record.args)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the sub-WARNING records of configured loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        """Rate of the closest configured ancestor of logger `name` (1.0 if none)"""
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        metrics.inc("log_records_sampled_out", logger=record.name)
+        return False
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener and never blocks"""
+
+    def __init__(self, records: queue.Queue, max_size: int):
+        super().__init__(records)
+        # The queue itself is unbounded so the listener's stop sentinel
+        # always fits; records beyond `max_size` are dropped here instead
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() renders the message here, on the event loop.
+        # Only tracebacks are rendered now, so frames are not kept alive
+        # while the record waits in the queue.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            metrics.inc("log_records_dropped")
+            return
+        self.queue.put_nowait(record)
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10_000,
+    stream: Optional[TextIO] = None
+) -> QueueListener:
+    """
+    Route the root logger through a bounded queue to a writer thread.
+
+    `fmt` is "text" (the classic format) or "json". Replaces any earlier
+    configuration, flushing its queue first; records still queued at exit
+    are written by an atexit hook (or call `stop_logging`).
+    """
+    global _listener
+
+    if fmt not in ("text", "json"):
+        raise ValueError(f"Unknown log format {fmt!r} (expected 'text' or 'json')")
+    stop_logging()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = _NonBlockingQueueHandler(queue.Queue(), max_size=queue_size)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(handler.queue, output)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Write out what is queued and stop the writer thread"""
+    global _listener
+
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,116 @@
+"""
+In-Process Metrics
+
+A deliberately small metrics registry: counters, gauges and summaries keyed
+by name plus labels, snapshotted as JSON by `GET /metrics`. Values are per
+worker process; aggregate across workers in whatever scrapes the endpoint.
+"""
+
+from collections import defaultdict, deque
+from typing import Deque, Dict, Tuple
+import threading
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Recent observations kept per summary for quantile estimates
+RESERVOIR_SIZE = 1024
+
+
+def _key(name: str, labels: dict) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(key: LabelKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class _Summary:
+    """Count/sum/max plus a bounded reservoir of recent values"""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def quantile(q: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": quantile(0.50),
+            "p95": quantile(0.95),
+            "p99": quantile(0.99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and summaries for one worker.
+
+    Usage:
+        metrics.inc("admission_rejected", scope="user", reason="rate")
+        metrics.add("admission_queue_depth", 1, scope="global")
+        metrics.observe("admission_wait_ms", 12.5, scope="global")
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = defaultdict(float)
+        self._gauges: Dict[LabelKey, float] = defaultdict(float)
+        self._summaries: Dict[LabelKey, _Summary] = defaultdict(_Summary)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Increase a monotonic counter"""
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge to an absolute value"""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def add(self, name: str, delta: float, **labels) -> None:
+        """Move a gauge up or down"""
+        with self._lock:
+            self._gauges[_key(name, labels)] += delta
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record one observation in a summary"""
+        with self._lock:
+            self._summaries[_key(name, labels)].observe(value)
+
+    def gauge(self, name: str, **labels) -> float:
+        """Current value of a gauge (0 if never set)"""
+        with self._lock:
+            return self._gauges.get(_key(name, labels), 0.0)
+
+    def snapshot(self) -> dict:
+        """JSON-serializable view of every metric"""
+        with self._lock:
+            return {
+                "counters": {_format(k): v for k, v in self._counters.items()},
+                "gauges": {_format(k): v for k, v in self._gauges.items()},
+                "summaries": {_format(k): s.snapshot() for k, s in self._summaries.items()},
+            }
+
+
+metrics = MetricsRegistry()
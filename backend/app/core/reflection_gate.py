@@ -12,6 +12,8 @@ from typing import Any, Optional, List, Dict
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+from app.prompts.templates import REFLECTION_PROMPT, perception_text
+
 
 class UserReflection(BaseModel):
     """User's authentic perspective after seeing system analysis"""
@@ -196,35 +198,15 @@ class ReflectionGate:
             raise ReflectionRequired()
 
         context = self.get_combined_context()
-
-        prompt = f"""
-## System Perception (Hand 1)
-
-{context.system_perception}
-
-## User Perspective (Hand 2)
-
-**What they observed:** {context.user_perspective.observation}
-
-**What resonates for them:** {context.user_perspective.resonance}
-
-**What they want to share:** {context.user_perspective.intention}
-
-{f"**Additional context:** {context.user_perspective.context}" if context.user_perspective.context else ""}
-
-## Co-Creation Task
-
-Based on BOTH the system's perception AND the user's authentic input, help articulate a message that:
-
-1. **Calibrates to the other person's communication style** (from the analysis)
-2. **Expresses what's genuinely true for the user** (from their reflection)
-3. **Creates space for real connection** (not just engagement)
-
-The message should feel like the user - you're helping them articulate, not generating something artificial.
-
-Format as a quoted message they can send directly.
-"""
-        return prompt
+        reflection = context.user_perspective
+
+        return REFLECTION_PROMPT.render(
+            perception=perception_text(context.system_perception),
+            observation=reflection.observation,
+            resonance=reflection.resonance,
+            intention=reflection.intention,
+            context=reflection.context
+        )
 
     def __repr__(self) -> str:
         status = "PASSED" if self.gate_passed else "WAITING"
@@ -0,0 +1,66 @@
+"""
+Single-Flight - Coalescing of identical concurrent work
+
+A double-click or a client retry sends the same analysis twice while the
+first is still running. Keyed on what makes two requests the same, the
+second caller joins the first one's flight instead of starting its own:
+one upstream call, one charge, one saved analysis, and both callers get
+the same result (or the same exception).
+
+The shared work runs as its own task so one caller going away does not
+fail the others; it is cancelled only when every caller has gone. Flights
+are per worker process and end when the work finishes; a request that
+arrives after that runs again.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one execution of `fn` between concurrent callers with the same key.
+
+    Usage:
+        result, shared = await flights.do(key, lambda: run(...))
+
+    `shared` is True for callers that joined an existing flight.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    @property
+    def active(self) -> int:
+        """Number of distinct flights in progress"""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,105 @@
+"""
+Write Journal - Durable local queue of database writes made during an outage
+
+When the database is unavailable, the charge and save that follow a
+completed analysis are appended here instead of being lost, and replayed
+in order once the database answers again. The journal is a SQLite file
+(WAL, synchronous=FULL) so entries survive a worker crash or restart; all
+workers on a host can share one file.
+
+Replay relies on the journaled writes being idempotent: ledger entries
+are keyed by (kind, reference_id) and analyses by their pre-assigned id,
+so a write that did land before its timeout, or one replayed by two
+workers at once, is applied once. An entry the database rejects for any
+other reason than being unavailable is marked failed and kept for
+inspection rather than retried forever.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import asyncio
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    args TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    failed INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class WriteJournal:
+    """Append-only queue of pending writes in a SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Pending entries as of the last append or read; None until known
+        self.pending: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _run(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _count(self) -> int:
+        self.pending = self._run("SELECT count(*) FROM writes WHERE failed = 0")[0][0]
+        return self.pending
+
+    async def append(self, op: str, args: dict) -> None:
+        """Durably record one write; returns once it is on disk"""
+        def append():
+            self._run(
+                "INSERT INTO writes (op, args, created_at) VALUES (?, ?, ?)",
+                (op, json.dumps(args), datetime.utcnow().isoformat())
+            )
+            return self._count()
+
+        await asyncio.to_thread(append)
+
+    async def count(self) -> int:
+        """Entries waiting for replay"""
+        return await asyncio.to_thread(self._count)
+
+    async def next_batch(self, limit: int = 100) -> list[tuple[int, str, dict]]:
+        """Oldest pending entries as (id, op, args)"""
+        rows = await asyncio.to_thread(
+            self._run, "SELECT id, op, args FROM writes WHERE failed = 0 ORDER BY id LIMIT ?", (limit,)
+        )
+        return [(entry_id, op, json.loads(args)) for entry_id, op, args in rows]
+
+    async def remove(self, entry_id: int) -> None:
+        """Forget an entry that has been applied"""
+        await asyncio.to_thread(self._run, "DELETE FROM writes WHERE id = ?", (entry_id,))
+
+    async def mark_failed(self, entry_id: int, error: str) -> None:
+        """Stop replaying an entry the database rejected; kept for inspection"""
+        await asyncio.to_thread(
+            self._run,
+            "UPDATE writes SET failed = 1, attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (error, entry_id)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -2,109 +2,361 @@
 Supabase Database Client
 """
 
-from supabase import create_client, Client
 from datetime import datetime
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+import asyncio
 import logging
 
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.core.metrics import metrics
+from app.db.journal import WriteJournal
+from app.services.analysis_codec import AnalysisCodec, from_bytea, to_bytea
+from app.services.pricing import from_micros, to_micros
+
+if TYPE_CHECKING:
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
+# Analysis history is listed without bodies; the text is read per analysis
+ANALYSIS_SUMMARY_COLUMNS = (
+    'id,user_id,input_tokens,output_tokens,cost_usd,charge_usd,model_used,price_version,'
+    'stage,parent_id,cache_read_tokens,cache_write_tokens,image_hashes,conversation_image_hashes,created_at'
+)
+
+# Writes that may be journaled while the database is down; all idempotent
+JOURNALED_WRITES = frozenset({'deduct_credits', 'save_analysis'})
+
+
+class DatabaseUnavailable(Exception):
+    """The database could not be reached, did not answer in time, or the circuit is open"""
+
+
+class InsufficientCredits(Exception):
+    """A debit the balance does not cover: the users.credits >= 0 check rejected it"""
+
+# Postgres check_violation
+CHECK_VIOLATION = '23514'
+
+
+def is_outage(error: BaseException) -> bool:
+    """
+    Whether `error` means the database is unavailable, as opposed to an
+    answer from a healthy one (constraint violation, bad request).
+    """
+    try:
+        from postgrest.exceptions import APIError
+    except ImportError:
+        return True
+
+    if not isinstance(error, APIError):
+        # Transport errors: connection refused, reset, read timeout
+        return True
+    code = error.code
+    if isinstance(code, int):
+        # Non-JSON response: the gateway in front of PostgREST
+        return code >= 500
+    # PostgREST connection errors, Postgres connection exceptions and
+    # shutdown / statement timeout
+    return str(code or '').startswith(('PGRST00', '08', '57'))
+
 
 class SupabaseClient:
-    """Supabase database operations"""
-
-    def __init__(self, url: str, service_key: str):
-        self.client: Client = create_client(url, service_key)
-
-    async def get_or_create_user(self, clerk_id: str, email: str) -> dict:
-        """Get existing user or create new one"""
-        try:
-            # Try to find existing user
-            result = self.client.table('users') \
-                .select('*') \
-                .eq('clerk_id', clerk_id) \
-                .execute()
-
-            if result.data:
-                return result.data[0]
-
-            # Create new user
-            result = self.client.table('users') \
-                .insert({
-                    'clerk_id': clerk_id,
-                    'email': email,
-                    'credits': 0,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'updated_at': datetime.utcnow().isoformat()
-                }) \
-                .execute()
-
-            logger.info(f"Created new user: {clerk_id}")
-            return result.data[0]
+    """
+    Supabase database operations
+
+    Money crosses this boundary as integer micro-dollars; DECIMAL columns
+    are written as exact decimal strings and read back with `to_micros`.
 
+    With a codec, analysis text is stored zstd-compressed in `analysis_zstd`
+    and decompressed when a single analysis is read; rows written without
+    one keep it in `analysis_text`. Either way callers see `analysis_text`.
+
+    Every query goes through a circuit breaker: each is bounded by `timeout`,
+    and after `failure_threshold` consecutive outages queries fail at once
+    with DatabaseUnavailable until a probe succeeds. Writes that fail that
+    way can be handed to `defer`, which journals them locally; the journal
+    is replayed as soon as a query succeeds again.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        service_key: Optional[str],
+        codec: Optional[AnalysisCodec] = None,
+        timeout: Optional[float] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        journal: Optional[WriteJournal] = None
+    ):
+        self.url = url
+        self.service_key = service_key
+        self.codec = codec
+        # Compressed rows stay readable with compression turned off
+        self._reader = codec
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(
+            "database",
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+            timeout=timeout,
+            is_failure=is_outage
+        )
+        self.journal = journal
+        self._replay: Optional[asyncio.Task] = None
+        self._client: Optional["Client"] = None
+
+    @property
+    def client(self) -> "Client":
+        """
+        Underlying supabase client, created on first use.
+
+        Deferring `create_client` keeps the supabase/postgrest/realtime import
+        tree off the startup path, and lets the app boot without database
+        config: a missing URL surfaces as an error from the first query,
+        which the routers already treat as "database unavailable".
+        """
+        if self._client is None:
+            from supabase import ClientOptions, create_client
+
+            options = None
+            if self.timeout:
+                # Abandoned queries must not hold executor threads past the breaker's timeout
+                options = ClientOptions(postgrest_client_timeout=self.timeout)
+            self._client = create_client(self.url, self.service_key, options)
+        return self._client
+
+    @property
+    def degraded(self) -> bool:
+        """True while the circuit is not closed"""
+        return not self.breaker.closed
+
+    async def _execute(self, query):
+        """
+        Run a PostgREST query off the event loop, through the circuit breaker.
+
+        The supabase client is synchronous; executing it inline would stall
+        every other request served by this worker for a full round trip.
+        """
+        try:
+            result = await self.breaker.call(lambda: asyncio.to_thread(query.execute))
+        except CircuitOpen as e:
+            raise DatabaseUnavailable(str(e)) from e
+        except asyncio.TimeoutError as e:
+            raise DatabaseUnavailable(f"Database did not answer within {self.timeout}s") from e
         except Exception as e:
-            logger.error(f"Error getting/creating user: {e}")
+            if is_outage(e):
+                raise DatabaseUnavailable(f"Database unreachable: {e}") from e
             raise
 
-    async def get_user_credits(self, user_id: str) -> float:
-        """Get user's current credit balance"""
+        if self.journal is not None and self.journal.pending != 0 and self._replay is None:
+            self._replay = asyncio.ensure_future(self.replay_journal())
+        return result
+
+    async def defer(self, op: str, **kwargs) -> bool:
+        """
+        Journal a write that failed with DatabaseUnavailable, to be replayed
+        when the database is back. `op` is one of JOURNALED_WRITES, `kwargs`
+        its arguments; a user not yet resolved to a users row is given by
+        `clerk_id` instead of `user_id` and resolved at replay. False when
+        there is no journal or it cannot be written.
+        """
+        if self.journal is None:
+            return False
+        if op not in JOURNALED_WRITES:
+            raise ValueError(f"{op} cannot be journaled")
+
         try:
-            result = self.client.table('users') \
-                .select('credits') \
-                .eq('id', user_id) \
-                .execute()
+            await self.journal.append(op, kwargs)
+        except Exception as e:
+            logger.error(f"Error journaling {op}: {e}")
+            return False
 
-            if not result.data:
-                return 0.0
+        metrics.inc("db_journal_appended", op=op)
+        metrics.set("db_journal_pending", self.journal.pending)
+        logger.warning(f"Database unavailable, journaled {op} for replay")
+        return True
 
-            return float(result.data[0]['credits'])
+    async def replay_journal(self) -> int:
+        """Apply journaled writes in order until done or the database fails again"""
+        applied = 0
+        try:
+            while batch := await self.journal.next_batch():
+                for entry_id, op, args in batch:
+                    try:
+                        if op not in JOURNALED_WRITES:
+                            raise ValueError(f"{op} cannot be journaled")
+                        await getattr(self, op)(**await self._resolve_owner(args))
+                    except DatabaseUnavailable as e:
+                        logger.warning(f"Journal replay paused, {applied} applied: {e}")
+                        return applied
+                    except Exception as e:
+                        if not _already_applied(op, e):
+                            logger.error(f"Journaled {op} (entry {entry_id}) rejected, kept as failed: {e}")
+                            metrics.inc("db_journal_failed", op=op)
+                            await self.journal.mark_failed(entry_id, str(e))
+                            continue
+
+                    await self.journal.remove(entry_id)
+                    applied += 1
+                    metrics.inc("db_journal_replayed", op=op)
+
+            if applied:
+                logger.info(f"Journal replay complete, {applied} writes applied")
+        except Exception as e:
+            logger.error(f"Journal replay failed: {e}")
+        finally:
+            self._replay = None
+            try:
+                metrics.set("db_journal_pending", await self.journal.count())
+            except Exception:
+                pass
+        return applied
+
+    async def _resolve_owner(self, args: dict) -> dict:
+        """Journaled arguments with a `clerk_id` replaced by that user's users.id"""
+        if 'clerk_id' not in args:
+            return args
+        args = dict(args)
+        args['user_id'] = (await self.upsert_user(args.pop('clerk_id')))['id']
+        return args
+
+    def close(self) -> None:
+        if self._replay is not None:
+            self._replay.cancel()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _analysis_body(self, analysis_text: str) -> dict:
+        """Columns holding an analysis' text, compressed when configured"""
+        if self.codec is None:
+            return {'analysis_text': analysis_text}
+        return {'analysis_text': None, 'analysis_zstd': to_bytea(self.codec.compress(analysis_text))}
+
+    def _read_analysis(self, row: dict) -> dict:
+        """Row with `analysis_zstd` decompressed into `analysis_text`"""
+        packed = row.pop('analysis_zstd', None)
+        if packed is not None:
+            if self._reader is None:
+                self._reader = AnalysisCodec()
+            row['analysis_text'] = self._reader.decompress(from_bytea(packed))
+        return row
+
+    async def upsert_user(self, clerk_id: str, email: Optional[str] = None) -> dict:
+        """
+        Get or create the user for a Clerk id in one round trip.
+
+        Returns {'id': users.id, 'credits': balance in micro-dollars}. The
+        stored email is updated when `email` is given and differs.
+        """
+        try:
+            result = await self._execute(
+                self.client.rpc('upsert_user', {
+                    'p_clerk_id': clerk_id,
+                    'p_email': email
+                })
+            )
+            return {'id': result.data['user_id'], 'credits': to_micros(result.data['balance'])}
 
         except Exception as e:
-            logger.error(f"Error getting credits: {e}")
+            logger.error(f"Error upserting user: {e}")
             raise
 
-    async def deduct_credits(self, user_id: str, amount: float) -> float:
-        """Deduct credits from user balance, return new balance"""
+    async def get_user_credits(self, user_id: str) -> int:
+        """Get user's current credit balance in micro-dollars"""
         try:
-            # Get current balance
-            current = await self.get_user_credits(user_id)
-            new_balance = current - amount
+            result = await self._execute(
+                self.client.table('users')
+                    .select('credits')
+                    .eq('id', user_id)
+            )
 
-            # Update balance
-            result = self.client.table('users') \
-                .update({
-                    'credits': new_balance,
-                    'updated_at': datetime.utcnow().isoformat()
-                }) \
-                .eq('id', user_id) \
-                .execute()
+            if not result.data:
+                return 0
 
-            logger.info(f"Deducted ${amount:.4f} from user {user_id}, new balance: ${new_balance:.4f}")
-            return new_balance
+            return to_micros(result.data[0]['credits'])
 
         except Exception as e:
-            logger.error(f"Error deducting credits: {e}")
+            logger.error(f"Error getting credits: {e}")
             raise
 
-    async def add_credits(self, user_id: str, amount: float) -> float:
-        """Add credits to user balance, return new balance"""
+    async def post_ledger_entry(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str,
+        reference_id: Optional[str] = None
+    ) -> int:
+        """
+        Append a credit (positive) or debit (negative) to the credit ledger,
+        return the new balance in micro-dollars.
+
+        `post_ledger_entry` updates users.credits and inserts the ledger row
+        in one transaction, so concurrent charges cannot lose updates. A
+        repeated (kind, reference_id) is a no-op returning the current balance.
+        """
         try:
-            current = await self.get_user_credits(user_id)
-            new_balance = current + amount
+            result = await self._execute(
+                self.client.rpc('post_ledger_entry', {
+                    'p_user_id': user_id,
+                    'p_amount': str(from_micros(amount_micros)),
+                    'p_kind': kind,
+                    'p_reference_id': reference_id
+                })
+            )
+            return to_micros(result.data)
 
-            result = self.client.table('users') \
-                .update({
-                    'credits': new_balance,
-                    'updated_at': datetime.utcnow().isoformat()
-                }) \
-                .eq('id', user_id) \
-                .execute()
+        except Exception as e:
+            if amount_micros < 0 and getattr(e, 'code', None) == CHECK_VIOLATION:
+                raise InsufficientCredits(
+                    f"Balance of user {user_id} does not cover ${from_micros(-amount_micros)}"
+                ) from e
+            logger.error(f"Error posting {kind} ledger entry: {e}")
+            raise
 
-            logger.info(f"Added ${amount:.2f} to user {user_id}, new balance: ${new_balance:.2f}")
-            return new_balance
+    async def deduct_credits(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str = 'analysis',
+        reference_id: Optional[str] = None
+    ) -> int:
+        """Deduct credits from user balance, return new balance"""
+        new_balance = await self.post_ledger_entry(user_id, -amount_micros, kind, reference_id)
+        logger.info("Deducted $%(amount)s from user %(user_id)s, new balance: $%(balance)s", {
+            "amount": from_micros(amount_micros), "user_id": user_id, "balance": from_micros(new_balance)
+        })
+        return new_balance
+
+    async def add_credits(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str = 'purchase',
+        reference_id: Optional[str] = None
+    ) -> int:
+        """Add credits to user balance, return new balance"""
+        new_balance = await self.post_ledger_entry(user_id, amount_micros, kind, reference_id)
+        logger.info("Added $%(amount)s to user %(user_id)s, new balance: $%(balance)s", {
+            "amount": from_micros(amount_micros), "user_id": user_id, "balance": from_micros(new_balance)
+        })
+        return new_balance
+
+    async def get_credit_ledger(self, user_id: str, limit: int = 50) -> list:
+        """Get user's most recent ledger entries"""
+        try:
+            result = await self._execute(
+                self.client.table('credit_ledger')
+                    .select('*')
+                    .eq('user_id', user_id)
+                    .order('created_at', desc=True)
+                    .limit(limit)
+            )
+
+            return result.data
 
         except Exception as e:
-            logger.error(f"Error adding credits: {e}")
+            logger.error(f"Error getting credit ledger: {e}")
             raise
 
     async def save_analysis(
@@ -113,41 +365,116 @@ class SupabaseClient:
         analysis_text: str,
         input_tokens: int,
         output_tokens: int,
-        cost_usd: float,
-        charge_usd: float,
-        model_used: str
+        cost_micros: int,
+        charge_micros: int,
+        model_used: str,
+        price_version: Optional[str] = None,
+        analysis_id: Optional[str] = None,
+        stage: str = 'full',
+        parent_id: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        image_hashes: Optional[list[str]] = None,
+        conversation_image_hashes: Optional[list[str]] = None,
+        created_at: Optional[str] = None,
+        comparison_id: Optional[str] = None
     ) -> dict:
         """Save analysis to database"""
         try:
-            result = self.client.table('analyses') \
-                .insert({
-                    'user_id': user_id,
-                    'analysis_text': analysis_text,
-                    'input_tokens': input_tokens,
-                    'output_tokens': output_tokens,
-                    'cost_usd': cost_usd,
-                    'charge_usd': charge_usd,
-                    'model_used': model_used,
-                    'created_at': datetime.utcnow().isoformat()
-                }) \
-                .execute()
-
-            logger.info(f"Saved analysis for user {user_id}")
-            return result.data[0]
+            record = {
+                'user_id': user_id,
+                **self._analysis_body(analysis_text),
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'cost_usd': str(from_micros(cost_micros)),
+                'charge_usd': str(from_micros(charge_micros)),
+                'model_used': model_used,
+                'price_version': price_version,
+                'stage': stage,
+                'parent_id': parent_id,
+                'cache_read_tokens': cache_read_tokens,
+                'cache_write_tokens': cache_write_tokens,
+                'image_hashes': image_hashes or [],
+                'conversation_image_hashes': conversation_image_hashes or [],
+                'created_at': created_at or datetime.utcnow().isoformat()
+            }
+            if comparison_id:
+                record['comparison_id'] = comparison_id
+            if analysis_id:
+                record['id'] = analysis_id
+
+            result = await self._execute(
+                self.client.table('analyses').insert(record)
+            )
+
+            logger.info("Saved analysis for user %(user_id)s", {"user_id": user_id})
+            # The row echoes the compressed text back; the original is at hand
+            row = result.data[0]
+            row.pop('analysis_zstd', None)
+            row['analysis_text'] = analysis_text
+            return row
 
         except Exception as e:
             logger.error(f"Error saving analysis: {e}")
             raise
 
+    async def get_analysis_by_id(self, analysis_id: str) -> Optional[dict]:
+        """Get a single analysis, or None"""
+        try:
+            result = await self._execute(
+                self.client.table('analyses')
+                    .select('*')
+                    .eq('id', analysis_id)
+            )
+
+            return self._read_analysis(result.data[0]) if result.data else None
+
+        except Exception as e:
+            logger.error(f"Error getting analysis {analysis_id}: {e}")
+            raise
+
+    async def add_user_images(self, user_id: str, image_hashes: list[str]) -> None:
+        """Record that a user has uploaded these images (idempotent)"""
+        try:
+            await self._execute(
+                self.client.table('user_images')
+                    .upsert(
+                        [{'user_id': user_id, 'image_hash': h} for h in image_hashes],
+                        on_conflict='user_id,image_hash',
+                        ignore_duplicates=True
+                    )
+            )
+
+        except Exception as e:
+            logger.error(f"Error recording images for user {user_id}: {e}")
+            raise
+
+    async def get_user_images(self, user_id: str, image_hashes: list[str]) -> set[str]:
+        """Which of `image_hashes` this user has uploaded"""
+        try:
+            result = await self._execute(
+                self.client.table('user_images')
+                    .select('image_hash')
+                    .eq('user_id', user_id)
+                    .in_('image_hash', image_hashes)
+            )
+
+            return {row['image_hash'] for row in result.data}
+
+        except Exception as e:
+            logger.error(f"Error getting images for user {user_id}: {e}")
+            raise
+
     async def get_user_analyses(self, user_id: str, limit: int = 20) -> list:
-        """Get user's analysis history"""
+        """Get user's analysis history, without analysis text"""
         try:
-            result = self.client.table('analyses') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .order('created_at', desc=True) \
-                .limit(limit) \
-                .execute()
+            result = await self._execute(
+                self.client.table('analyses')
+                    .select(ANALYSIS_SUMMARY_COLUMNS)
+                    .eq('user_id', user_id)
+                    .order('created_at', desc=True)
+                    .limit(limit)
+            )
 
             return result.data
 
@@ -159,21 +486,22 @@ class SupabaseClient:
         self,
         user_id: str,
         stripe_session_id: str,
-        amount_usd: float,
-        credits_added: float
+        amount_micros: int,
+        credits_added_micros: int
     ) -> dict:
         """Create payment transaction record"""
         try:
-            result = self.client.table('transactions') \
-                .insert({
-                    'user_id': user_id,
-                    'stripe_session_id': stripe_session_id,
-                    'amount_usd': amount_usd,
-                    'credits_added': credits_added,
-                    'status': 'pending',
-                    'created_at': datetime.utcnow().isoformat()
-                }) \
-                .execute()
+            result = await self._execute(
+                self.client.table('transactions')
+                    .insert({
+                        'user_id': user_id,
+                        'stripe_session_id': stripe_session_id,
+                        'amount_usd': str(from_micros(amount_micros)),
+                        'credits_added': str(from_micros(credits_added_micros)),
+                        'status': 'pending',
+                        'created_at': datetime.utcnow().isoformat()
+                    })
+            )
 
             return result.data[0]
 
@@ -188,16 +516,162 @@ class SupabaseClient:
     ) -> dict:
         """Mark transaction as completed"""
         try:
-            result = self.client.table('transactions') \
-                .update({
-                    'status': 'completed',
-                    'stripe_payment_intent': stripe_payment_intent
-                }) \
-                .eq('stripe_session_id', stripe_session_id) \
-                .execute()
+            result = await self._execute(
+                self.client.table('transactions')
+                    .update({
+                        'status': 'completed',
+                        'stripe_payment_intent': stripe_payment_intent
+                    })
+                    .eq('stripe_session_id', stripe_session_id)
+            )
 
             return result.data[0]
 
         except Exception as e:
             logger.error(f"Error completing transaction: {e}")
             raise
+
+    async def record_stripe_event(self, event: dict) -> bool:
+        """Store a verified webhook event in the inbox; False if it was already there"""
+        try:
+            result = await self._execute(
+                self.client.table('stripe_events')
+                    .upsert(
+                        {'id': event['id'], 'type': event['type'], 'payload': event},
+                        on_conflict='id',
+                        ignore_duplicates=True
+                    )
+            )
+
+            return bool(result.data)
+
+        except Exception as e:
+            logger.error(f"Error recording Stripe event {event['id']}: {e}")
+            raise
+
+    async def claim_stripe_events(self, limit: int, lease_seconds: int) -> list:
+        """Lease up to `limit` pending inbox events, oldest first"""
+        result = await self._execute(
+            self.client.rpc('claim_stripe_events', {
+                'p_limit': limit,
+                'p_lease_seconds': lease_seconds
+            })
+        )
+        return result.data
+
+    async def fulfill_stripe_checkout(
+        self,
+        event_id: str,
+        user_id: str,
+        session_id: str,
+        payment_intent: Optional[str],
+        amount_micros: int,
+        credits_micros: int
+    ) -> int:
+        """
+        Credit a paid checkout and mark its event processed, in one
+        transaction; returns the new balance. Idempotent per session.
+        """
+        result = await self._execute(
+            self.client.rpc('fulfill_stripe_checkout', {
+                'p_event_id': event_id,
+                'p_user_id': user_id,
+                'p_session_id': session_id,
+                'p_payment_intent': payment_intent,
+                'p_amount': str(from_micros(amount_micros)),
+                'p_credits': str(from_micros(credits_micros))
+            })
+        )
+        return to_micros(result.data)
+
+    async def finish_stripe_events(
+        self,
+        event_ids: list[str],
+        status: str,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Set the status of inbox events. Events left pending keep their
+        lease, which spaces out their retries.
+        """
+        update = {'status': status, 'last_error': error}
+        if status != 'pending':
+            update.update(claimed_until=None, processed_at=datetime.utcnow().isoformat())
+        await self._execute(
+            self.client.table('stripe_events')
+                .update(update)
+                .in_('id', event_ids)
+        )
+
+    async def get_usage_by_day(self, since: str) -> list:
+        """Per-day, per-model usage totals from the rollup table"""
+        try:
+            result = await self._execute(
+                self.client.table('usage_daily_model')
+                    .select('*')
+                    .gte('day', since)
+                    .order('day', desc=True)
+            )
+
+            return result.data
+
+        except Exception as e:
+            logger.error(f"Error getting usage rollup: {e}")
+            raise
+
+    async def get_user_usage_by_day(self, user_id: str, since: str) -> list:
+        """One user's per-day, per-model usage totals from the rollup table"""
+        try:
+            result = await self._execute(
+                self.client.table('usage_daily')
+                    .select('*')
+                    .eq('user_id', user_id)
+                    .gte('day', since)
+                    .order('day', desc=True)
+            )
+
+            return result.data
+
+        except Exception as e:
+            logger.error(f"Error getting user usage rollup: {e}")
+            raise
+
+    async def rate_limit_take(
+        self,
+        key: str,
+        capacity: float,
+        refill_per_sec: float,
+        cost: float
+    ) -> float:
+        """Take tokens from a shared bucket; returns seconds to wait (0 = granted)"""
+        result = await self._execute(
+            self.client.rpc('rate_limit_take', {
+                'p_key': key,
+                'p_capacity': capacity,
+                'p_refill_per_sec': refill_per_sec,
+                'p_cost': cost
+            })
+        )
+        return float(result.data)
+
+    async def acquire_lease(self, key: str, limit: int, ttl_seconds: float) -> Optional[str]:
+        """Take one of `limit` shared concurrency slots; returns lease id or None"""
+        result = await self._execute(
+            self.client.rpc('concurrency_acquire', {
+                'p_key': key,
+                'p_limit': limit,
+                'p_ttl_seconds': ttl_seconds
+            })
+        )
+        return result.data
+
+    async def release_lease(self, lease_id: str) -> None:
+        """Release a concurrency slot"""
+        await self._execute(
+            self.client.rpc('concurrency_release', {'p_lease_id': lease_id})
+        )
+
+
+def _already_applied(op: str, error: Exception) -> bool:
+    """A replayed save whose row exists: the original write landed after all"""
+    return op == 'save_analysis' and getattr(error, 'code', None) == '23505'
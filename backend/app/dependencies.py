@@ -0,0 +1,188 @@
+"""
+Request Dependencies
+
+Per-worker service instances live on `app.state`. They are built lazily by
+these providers on the first request that needs them, so importing the app
+and starting a worker stays cheap (no SDK imports, no network setup) and a
+cold start on serverless-style hosts only pays for what the first request
+actually touches.
+
+The providers are `async def` on purpose: FastAPI runs sync dependencies in
+a threadpool, which would both cost a thread hop per request and race the
+lazy initialization.
+"""
+
+from fastapi import Depends, Request
+
+from app.config import get_settings
+from app.core.lifecycle import InFlightTracker
+from app.core.singleflight import SingleFlight
+from app.db.journal import WriteJournal
+from app.db.supabase import SupabaseClient
+from app.services.analysis_codec import AnalysisCodec
+from app.services.claude_service import ClaudeService
+from app.services.image_store import ImageStore, LocalImageBackend, S3ImageBackend
+from app.services.model_router import ModelRouter, RoutingPolicy
+from app.services.scheduler import FairScheduler
+from app.services.stripe_webhooks import StripeEventProcessor
+from app.services.token_budget import TokenBudgetLimits, TokenGovernor
+from app.services.rate_limiter import (
+    AdmissionController,
+    AdmissionLimits,
+    DatabaseBackend,
+    InMemoryBackend
+)
+
+
+async def get_db(request: Request) -> SupabaseClient:
+    """Database client for this worker"""
+    return db_for(request.app.state)
+
+
+def db_for(state) -> SupabaseClient:
+    """`get_db` outside a request, e.g. from the app lifespan"""
+    if getattr(state, "db", None) is None:
+        settings = get_settings()
+        codec = None
+        if settings.analysis_compression:
+            codec = AnalysisCodec(settings.analysis_dictionary, level=settings.analysis_compression_level)
+        journal = None
+        if settings.db_journal_path and settings.supabase_url:
+            journal = WriteJournal(settings.db_journal_path)
+        state.db = SupabaseClient(
+            url=settings.supabase_url,
+            service_key=settings.supabase_service_key,
+            codec=codec,
+            timeout=settings.db_timeout,
+            failure_threshold=settings.db_breaker_failures,
+            reset_timeout=settings.db_breaker_reset,
+            journal=journal
+        )
+    return state.db
+
+
+async def get_claude(request: Request, db: SupabaseClient = Depends(get_db)) -> ClaudeService:
+    """Claude service for this worker"""
+    state = request.app.state
+    if getattr(state, "claude", None) is None:
+        settings = get_settings()
+        transport = None
+        if settings.anthropic_replay_mode:
+            # Deferred: development-only, and pulls in httpx before the SDK does
+            from app.services.replay import ReplayTransport
+            transport = ReplayTransport(
+                settings.anthropic_replay_mode,
+                settings.anthropic_replay_dir,
+                latency=settings.anthropic_replay_latency
+            )
+        governor = None
+        if settings.token_budget_input_tpm or settings.token_budget_output_tpm:
+            if settings.rate_limit_backend == "database":
+                budget_backend = DatabaseBackend(db)
+            else:
+                budget_backend = InMemoryBackend()
+            governor = TokenGovernor(budget_backend, TokenBudgetLimits(
+                input_tpm=settings.token_budget_input_tpm,
+                output_tpm=settings.token_budget_output_tpm,
+                max_wait=settings.token_budget_max_wait
+            ))
+        state.claude = ClaudeService(
+            api_key=settings.anthropic_api_key,
+            scheduler=FairScheduler(
+                slots=settings.scheduler_slots,
+                weights=settings.scheduler_lane_weights
+            ),
+            large_request_images=settings.scheduler_large_request_images,
+            router=ModelRouter(RoutingPolicy(
+                models=settings.model_tiers,
+                fast_max_images=settings.routing_fast_max_images,
+                fast_max_context_chars=settings.routing_fast_max_context_chars,
+                fast_with_conversation=settings.routing_fast_with_conversation,
+                pressure_queue_depth=settings.routing_pressure_queue_depth,
+                pressure_latency_ms=settings.routing_pressure_latency_ms,
+                pressure_max_images=settings.routing_pressure_max_images
+            )),
+            triage_max_tokens=settings.triage_max_tokens,
+            transport=transport,
+            governor=governor
+        )
+    return state.claude
+
+
+async def get_image_store(request: Request) -> ImageStore:
+    """Image store for this worker"""
+    state = request.app.state
+    if getattr(state, "image_store", None) is None:
+        settings = get_settings()
+        if settings.image_store_backend == "s3":
+            backend = S3ImageBackend(
+                bucket=settings.image_store_bucket,
+                prefix=settings.image_store_prefix,
+                endpoint_url=settings.image_store_endpoint_url,
+                region=settings.image_store_region
+            )
+        else:
+            backend = LocalImageBackend(settings.image_store_path)
+        state.image_store = ImageStore(
+            backend,
+            max_edge=settings.image_max_edge,
+            max_bytes=settings.image_max_bytes
+        )
+    return state.image_store
+
+
+async def get_coalescer(request: Request) -> SingleFlight:
+    """Coalescing of identical in-flight analyses for this worker"""
+    return request.app.state.coalescer
+
+
+async def get_inflight(request: Request) -> InFlightTracker:
+    """In-flight analysis tracker for this worker"""
+    return request.app.state.inflight
+
+
+async def get_admission(
+    request: Request,
+    db: SupabaseClient = Depends(get_db)
+) -> AdmissionController:
+    """Rate limiter / admission controller for this worker"""
+    state = request.app.state
+    if getattr(state, "admission", None) is None:
+        settings = get_settings()
+        if settings.rate_limit_backend == "database":
+            backend = DatabaseBackend(db)
+        else:
+            backend = InMemoryBackend()
+
+        state.admission = AdmissionController(backend, AdmissionLimits(
+            user_per_minute=settings.rate_limit_user_per_minute,
+            user_burst=settings.rate_limit_user_burst,
+            global_per_minute=settings.rate_limit_global_per_minute,
+            global_burst=settings.rate_limit_global_burst,
+            per_user=settings.concurrency_per_user,
+            per_model=settings.concurrency_per_model,
+            default_per_model=settings.concurrency_default_per_model,
+            global_concurrency=settings.concurrency_global,
+            max_queue=settings.admission_max_queue,
+            max_wait=settings.admission_max_wait,
+            lease_ttl=settings.admission_lease_ttl
+        ))
+    return state.admission
+
+
+async def get_stripe_processor(request: Request) -> StripeEventProcessor:
+    """Background processor of the Stripe inbox for this worker"""
+    return stripe_processor_for(request.app.state)
+
+
+def stripe_processor_for(state) -> StripeEventProcessor:
+    """`get_stripe_processor` outside a request; started by the app lifespan"""
+    if getattr(state, "stripe_processor", None) is None:
+        settings = get_settings()
+        state.stripe_processor = StripeEventProcessor(
+            db_for(state),
+            batch_size=settings.stripe_batch_size,
+            poll_interval=settings.stripe_poll_interval,
+            max_attempts=settings.stripe_max_attempts
+        )
+    return state.stripe_processor
@@ -4,24 +4,81 @@ Rose Glass Dating Profile Analyzer - FastAPI Backend
 Main application entry point.
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
+import os
 
 from app.config import get_settings
-from app.routers import analyze
+from app.core.lifecycle import InFlightTracker
+from app.core.logs import configure_logging
+from app.core.metrics import metrics
+from app.core.singleflight import SingleFlight
+from app.dependencies import stripe_processor_for
+from app.services.auth import require_admin
+from app.services.pricing import get_price_table
+from app.routers import admin, analyze, images, webhooks
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Initialize settings
+settings = get_settings()
+
+# Configure logging: records are queued here and written by a background thread
+configure_logging(
+    level=settings.log_level,
+    fmt=settings.log_format,
+    sample_rates=settings.log_sample_rates,
+    queue_size=settings.log_queue_size
 )
 
 logger = logging.getLogger(__name__)
 
-# Initialize settings
-settings = get_settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup and shutdown.
+
+    Runs once in every server worker process. Service clients are not
+    built here: `app.dependencies` creates them on first use, after the fork,
+    so no connection pool is shared between processes and startup does no
+    SDK imports or network setup. The Stripe inbox processor is the one
+    exception, started here when Stripe is configured so events are not left
+    waiting for the next webhook; its first database query happens in the
+    background. On shutdown (SIGTERM) the server has already stopped
+    accepting connections; we then wait for in-flight analyses and their
+    credit settlement to finish before closing clients.
+    """
+    app.state.claude = None
+    app.state.db = None
+    app.state.admission = None
+    app.state.image_store = None
+    app.state.stripe_processor = None
+    app.state.inflight = InFlightTracker()
+    app.state.coalescer = SingleFlight()
+
+    # Parse the price table now so a bad PRICING_TABLE_PATH fails the boot
+    get_price_table()
+
+    # Fulfil top-ups left in the inbox without waiting for the next webhook
+    if settings.stripe_webhook_secret:
+        stripe_processor_for(app.state).start()
+
+    logger.info(f"Worker {os.getpid()} started")
+
+    yield
+
+    drained = await app.state.inflight.drain(timeout=settings.shutdown_drain_timeout)
+    if app.state.stripe_processor is not None:
+        await app.state.stripe_processor.close()
+    if app.state.claude is not None:
+        await app.state.claude.close()
+    if app.state.db is not None:
+        app.state.db.close()
+
+    logger.info(f"Worker {os.getpid()} stopped (drained={drained})")
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -29,7 +86,8 @@ app = FastAPI(
     description="Dating profile analysis through the Rose Glass translation framework",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -43,6 +101,9 @@ app.add_middleware(
 
 # Include routers
 app.include_router(analyze.router)
+app.include_router(images.router)
+app.include_router(admin.router)
+app.include_router(webhooks.router)
 
 
 @app.get("/")
@@ -65,11 +126,31 @@ async def health_check():
         "services": {
             "api": "ok",
             "claude": "configured" if settings.anthropic_api_key else "not_configured",
-            "database": "configured" if settings.supabase_url else "not_configured",
+            "database": _database_status(),
         }
     }
 
 
+def _database_status() -> str:
+    if not settings.supabase_url:
+        return "not_configured"
+    db = getattr(app.state, "db", None)
+    # Degraded: circuit open, failing fast and journaling writes
+    return "degraded" if db is not None and db.degraded else "configured"
+
+
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def get_metrics():
+    """
+    Per-worker counters, gauges and latency summaries.
+
+    Admin only, like /api/admin: labels include user and model names.
+    """
+    active = app.state.inflight.active if hasattr(app.state, "inflight") else 0
+    metrics.set("inflight_analyses", active)
+    return metrics.snapshot()
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
@@ -3,7 +3,7 @@ Pydantic Models for Analysis
 """
 
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -23,9 +23,24 @@ class UsageMetrics(BaseModel):
     """Usage and cost metrics"""
     input_tokens: int
     output_tokens: int
+    cache_read_tokens: int = Field(0, description="Input tokens served from the prompt cache")
+    cache_write_tokens: int = Field(0, description="Input tokens written to the prompt cache")
     cost_usd: float
     charge_usd: float
+    cost_micros: int = Field(0, description="Upstream cost in micro-dollars")
+    charge_micros: int = Field(0, description="Amount charged in micro-dollars")
+    price_version: Optional[str] = Field(None, description="Price table the charge was computed with")
+    prompt_version: Optional[str] = Field(None, description="Prompt templates the request was built from")
     model_used: str
+    model_tier: Optional[str] = Field(None, description="Routing tier: fast, standard or premium")
+    queue_wait_ms: float = Field(0.0, description="Time spent waiting for an upstream slot")
+
+
+class SkippedImageInfo(BaseModel):
+    """A screenshot the pre-flight checks left out of an analysis"""
+    id: str
+    kind: str = Field(..., description="profile or conversation")
+    reason: str = Field(..., description="blank, dark, duplicate or photo")
 
 
 class AnalysisResponse(BaseModel):
@@ -35,16 +50,28 @@ class AnalysisResponse(BaseModel):
     usage: UsageMetrics
     remaining_credits: float
     analysis_id: Optional[str] = None
+    stage: str = Field("full", description="full, triage (deep pass available) or deep")
+    parent_id: Optional[str] = Field(None, description="Triage analysis a deep pass continues")
+    image_ids: list[str] = Field(default_factory=list, description="Stored profile images, reusable by id")
+    conversation_image_ids: list[str] = Field(default_factory=list, description="Stored conversation images")
+    skipped_images: list[SkippedImageInfo] = Field(
+        default_factory=list, description="Screenshots left out by the pre-flight checks; not sent or billed"
+    )
 
 
 class AnalysisHistoryItem(BaseModel):
     """Single analysis history entry"""
     id: str
-    analysis_text: str
+    analysis_text: Optional[str] = Field(None, description="Only included when a single analysis is read")
     created_at: datetime
     model_used: str
     cost_usd: float
     charge_usd: float
+    price_version: Optional[str] = None
+    stage: str = "full"
+    parent_id: Optional[str] = None
+    image_ids: list[str] = []
+    conversation_image_ids: list[str] = []
 
 
 class UserCredits(BaseModel):
@@ -54,6 +81,36 @@ class UserCredits(BaseModel):
     last_updated: datetime
 
 
+class UsageRollupRow(BaseModel):
+    """Usage totals for one day and model"""
+    day: date
+    model: str
+    analyses: int
+    users: Optional[int] = None
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    charge_usd: float
+
+
+class UsageTotals(BaseModel):
+    """Usage totals over a reporting window"""
+    analyses: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    charge_usd: float = 0.0
+
+
+class UsageDashboardResponse(BaseModel):
+    """Spend dashboard served from the daily rollups"""
+    success: bool
+    since: date
+    totals: UsageTotals
+    by_model: dict[str, UsageTotals]
+    by_day: list[UsageRollupRow]
+
+
 class ReflectionPrompts(BaseModel):
     """Reflection prompts for user after analysis"""
     observation_prompt: str = Field(..., description="Prompt asking what user notices")
@@ -86,3 +143,27 @@ class CoCreateResponse(BaseModel):
     suggested_message: str = Field(..., description="Co-created message integrating user input")
     usage: UsageMetrics
     remaining_credits: float
+
+
+class ImageCheckRequest(BaseModel):
+    """Content hashes a client is about to send"""
+    hashes: list[str] = Field(..., max_length=20, description="SHA-256 of each prepared image, lowercase hex")
+
+
+class ImageCheckResponse(BaseModel):
+    """Which images the server already holds for this user"""
+    stored: list[str] = Field(..., description="Reference these by id; no upload needed")
+    missing: list[str] = Field(..., description="Upload these first")
+
+
+class StoredImageInfo(BaseModel):
+    """An image in the image store"""
+    id: str
+    media_type: str
+    size: int
+
+
+class ImageUploadResponse(BaseModel):
+    """Stored uploads, in request order"""
+    success: bool
+    images: list[StoredImageInfo]
@@ -0,0 +1,276 @@
+"""
+Prompt Templates - Precompiled request prompts
+
+Every per-request prompt (the analysis, triage and deep requests, the
+co-creation prompt) is a PromptTemplate: static text with a few variable
+parts. Templates are compiled once at import - adjacent static text is
+merged and conditional sections are resolved to plain strings - so
+rendering only formats the variable parts and joins.
+
+`blocks()` returns content blocks directly. The leading static run is its
+own block and can carry `cache_control`, so a long fixed preamble (the
+co-creation addendum) is served from the prompt cache across requests.
+
+Each template has a `version`, a hash of its static structure, and
+PROMPT_VERSION covers the system prompt and every template. Anything
+that caches model output by request should include it in its key, so a
+prompt edit invalidates the cache.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Union
+import hashlib
+
+from app.prompts.system_prompt import BIDIRECTIONAL_TRANSLATION_ADDENDUM, ROSE_GLASS_DATING_SYSTEM_PROMPT
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+@dataclass(frozen=True)
+class Slot:
+    """A variable: `value` formatted into `fmt`, or nothing when it is empty"""
+    name: str
+    fmt: str = "{}"
+    optional: bool = False
+
+
+@dataclass(frozen=True)
+class When:
+    """Static text included only when the flag `name` is true"""
+    name: str
+    text: str
+    otherwise: str = ""
+
+
+Part = Union[str, Slot, When]
+
+
+class PromptTemplate:
+    """Static segments and variable slots, compiled once"""
+
+    def __init__(self, name: str, *parts: Part):
+        self.name = name
+        self.parts = self._compile(parts)
+        self.version = hashlib.sha256(repr((name, self.parts)).encode()).hexdigest()[:12]
+
+        # Longest static prefix, for cache-marked blocks
+        self._prefix = self.parts[0] if self.parts and isinstance(self.parts[0], str) else ""
+        self._rest = self.parts[1:] if self._prefix else self.parts
+
+    @staticmethod
+    def _compile(parts: tuple[Part, ...]) -> tuple[Part, ...]:
+        compiled: list[Part] = []
+        for part in parts:
+            if isinstance(part, str) and compiled and isinstance(compiled[-1], str):
+                compiled[-1] += part
+            elif part != "":
+                compiled.append(part)
+        return tuple(compiled)
+
+    @staticmethod
+    def _render_parts(parts: tuple[Part, ...], values: dict) -> str:
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+            elif isinstance(part, When):
+                out.append(part.text if values[part.name] else part.otherwise)
+            else:
+                value = values[part.name]
+                if value or not part.optional:
+                    out.append(part.fmt.format(value))
+        return "".join(out)
+
+    def render(self, **values) -> str:
+        return self._render_parts(self.parts, values)
+
+    def blocks(self, cache_prefix: bool = False, **values) -> list[dict]:
+        """
+        Text content blocks: the static prefix, then everything else.
+
+        With `cache_prefix`, the prefix block carries a prompt-cache
+        breakpoint. Anthropic only caches prefixes of 1024+ tokens (2048 on
+        Haiku); shorter ones are sent uncached at no extra cost.
+        """
+        blocks = []
+        if self._prefix:
+            block = {"type": "text", "text": self._prefix}
+            if cache_prefix:
+                block["cache_control"] = CACHE_CONTROL
+            blocks.append(block)
+        rest = self._render_parts(self._rest, values)
+        if rest:
+            blocks.append({"type": "text", "text": rest})
+        return blocks
+
+
+_REMEMBER_TRANSLATION = "- Translation, not judgment\n"
+_REMEMBER_OPENER = """- Match their energy level in the opener
+- Be specific, reference actual profile elements
+- Never comment on physical appearance"""
+
+ANALYSIS_REQUEST = PromptTemplate(
+    "analysis_request",
+    "Analyze this dating profile through the Rose Glass framework.\n\n",
+    Slot("user_context", "**User Context:** {}\n\n", optional=True),
+    """Provide:
+
+1. **Dimension Analysis Table** — Ψ, ρ, q, f with readings (0.0-1.0) and translations
+
+2. **Key Translation** — What are they actually filtering for? (2-3 sentences)
+
+3. **The Tell** — The ONE element that reveals the most about them
+
+4. **Suggested Opener** — Calibrated to their specific communication style, formatted as a quoted message
+""",
+    When("has_conversation", """
+5. **Conversation Analysis** — Investment level, trajectory, red/green flags
+
+6. **Next Move** — Clear recommendation on what to do/send next
+"""),
+    "\n\nRemember:\n",
+    _REMEMBER_TRANSLATION,
+    "- Multiple valid interpretations exist\n",
+    _REMEMBER_OPENER,
+)
+
+TRIAGE_REQUEST = PromptTemplate(
+    "triage_request",
+    "Analyze this dating profile through the Rose Glass framework. Quick read only.\n\n",
+    Slot("user_context", "**User Context:** {}\n\n", optional=True),
+    """Provide ONLY:
+
+1. **Dimension Analysis Table** — Ψ, ρ, q, f with readings (0.0-1.0) and one-line translations
+
+2. **The Tell** — The ONE element that reveals the most about them
+
+3. **Suggested Opener** — Calibrated to their specific communication style, formatted as a quoted message
+
+No preamble and no other sections; a deeper translation can be requested separately.
+
+Remember:
+""",
+    _REMEMBER_TRANSLATION,
+    _REMEMBER_OPENER,
+)
+
+DEEP_REQUEST = PromptTemplate(
+    "deep_request",
+    """Go deeper, building on your readings above without repeating the table, the tell or the opener.
+
+Provide:
+
+1. **Key Translation** — What are they actually filtering for? What does the pattern across Ψ, ρ, q, f say about what they want?
+""",
+    When(
+        "has_conversation",
+        """
+2. **Conversation Analysis** — Investment level, trajectory, red/green flags
+
+3. **Next Move** — Clear recommendation on what to do/send next
+""",
+        otherwise="""
+2. **Next Move** — How to follow up once they reply, calibrated to their style
+"""
+    ),
+    "\nRemember:\n",
+    _REMEMBER_TRANSLATION,
+    "- Multiple valid interpretations exist",
+)
+
+# POST /api/analyze/compare: leads each profile's message, ahead of the
+# images, so one cached prefix (system prompt + this) serves every profile
+COMPARISON_CONTEXT = PromptTemplate(
+    "comparison_context",
+    "I'm comparing several matches. Each profile comes in its own request; read each one on its own terms.\n\n",
+    Slot("user_context", "**User Context:** {}\n", optional=True),
+)
+
+_CO_CREATION_TASK = """## Your Task
+
+Based on the Rose Glass analysis AND the user's authentic input, help articulate a message that:
+
+1. **Calibrates to their communication style** (from the analysis)
+2. **Expresses what's genuinely true for the user** (from their input)
+3. **Creates space for connection** (not just engagement)
+
+The message should feel like the user - it's helping them articulate, not generating something artificial.
+
+Format as a quoted message they can send directly.
+"""
+
+# POST /api/co-create: the addendum is a fixed prefix, cache-markable
+CO_CREATION_PROMPT = PromptTemplate(
+    "co_creation",
+    f"\n{BIDIRECTIONAL_TRANSLATION_ADDENDUM}\n\n## Original Analysis (Phase 1)\n\n",
+    Slot("analysis"),
+    "\n\n## User Input (Phase 2)\n\n**What they noticed:** ",
+    Slot("observation"),
+    "\n\n**What resonates for them:** ",
+    Slot("resonance"),
+    "\n\n**What they want to share:** ",
+    Slot("intention"),
+    "\n\n",
+    Slot("conversation_context", "**Conversation context:** {}", optional=True),
+    "\n\n",
+    _CO_CREATION_TASK,
+)
+
+# ReflectionGate.get_co_creation_prompt
+REFLECTION_PROMPT = PromptTemplate(
+    "reflection",
+    "\n## System Perception (Hand 1)\n\n",
+    Slot("perception"),
+    "\n\n## User Perspective (Hand 2)\n\n**What they observed:** ",
+    Slot("observation"),
+    "\n\n**What resonates for them:** ",
+    Slot("resonance"),
+    "\n\n**What they want to share:** ",
+    Slot("intention"),
+    "\n\n",
+    Slot("context", "**Additional context:** {}", optional=True),
+    """
+
+## Co-Creation Task
+
+Based on BOTH the system's perception AND the user's authentic input, help articulate a message that:
+
+1. **Calibrates to the other person's communication style** (from the analysis)
+2. **Expresses what's genuinely true for the user** (from their reflection)
+3. **Creates space for real connection** (not just engagement)
+
+The message should feel like the user - you're helping them articulate, not generating something artificial.
+
+Format as a quoted message they can send directly.
+""",
+)
+
+# Separates profile from conversation screenshots in a message
+CONVERSATION_SEPARATOR_BLOCK = {"type": "text", "text": "\n---\n**CONVERSATION SCREENSHOTS FOLLOW:**\n"}
+
+TEMPLATES = (
+    ANALYSIS_REQUEST, TRIAGE_REQUEST, DEEP_REQUEST, COMPARISON_CONTEXT, CO_CREATION_PROMPT, REFLECTION_PROMPT
+)
+
+PROMPT_VERSION = hashlib.sha256(
+    "\n".join([
+        hashlib.sha256(ROSE_GLASS_DATING_SYSTEM_PROMPT.encode()).hexdigest(),
+        CONVERSATION_SEPARATOR_BLOCK["text"],
+        *(template.version for template in TEMPLATES),
+    ]).encode()
+).hexdigest()[:12]
+
+
+def perception_text(analysis: Any) -> str:
+    """
+    The analysis text of an analysis passed around as a string, a stored
+    row (`analysis_text`) or a result/response (`analysis`). Anything else
+    falls back to str().
+    """
+    if isinstance(analysis, str):
+        return analysis
+    for key in ("analysis_text", "analysis"):
+        value = analysis.get(key) if isinstance(analysis, dict) else getattr(analysis, key, None)
+        if isinstance(value, str):
+            return value
+    return str(analysis)
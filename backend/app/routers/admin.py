@@ -0,0 +1,106 @@
+"""
+Admin Router - Spend Dashboards
+
+GET /api/admin/usage - Per-day, per-model usage and spend
+GET /api/admin/usage/users/{user_id} - One user's usage and spend
+GET /api/admin/ledger/{user_id} - One user's credit ledger
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+import logging
+
+from app.services.auth import require_admin
+from app.db.supabase import SupabaseClient
+from app.dependencies import get_db
+from app.models.analysis import UsageDashboardResponse, UsageRollupRow, UsageTotals
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _since(days: int) -> date:
+    return datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+
+def _dashboard(since: date, rows: list[dict]) -> UsageDashboardResponse:
+    """
+    Fold rollup rows into totals.
+
+    Rows are already aggregated per day and model, so this touches at most
+    days x models rows no matter how many analyses were run.
+    """
+    totals = UsageTotals()
+    by_model: dict[str, UsageTotals] = {}
+    by_day = []
+
+    for row in rows:
+        item = UsageRollupRow(**row)
+        by_day.append(item)
+        for bucket in (totals, by_model.setdefault(item.model, UsageTotals())):
+            bucket.analyses += item.analyses
+            bucket.input_tokens += item.input_tokens
+            bucket.output_tokens += item.output_tokens
+            bucket.cost_usd += item.cost_usd
+            bucket.charge_usd += item.charge_usd
+
+    return UsageDashboardResponse(
+        success=True,
+        since=since,
+        totals=totals,
+        by_model=by_model,
+        by_day=by_day
+    )
+
+
+@router.get("/usage", response_model=UsageDashboardResponse)
+async def get_usage(
+    days: int = Query(30, ge=1, le=366),
+    db: SupabaseClient = Depends(get_db)
+):
+    """Usage and spend across all users, per day and model"""
+    since = _since(days)
+    try:
+        rows = await db.get_usage_by_day(since.isoformat())
+    except Exception as e:
+        logger.error(f"Error getting usage dashboard: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get usage")
+
+    return _dashboard(since, rows)
+
+
+@router.get("/usage/users/{user_id}", response_model=UsageDashboardResponse)
+async def get_user_usage(
+    user_id: str,
+    days: int = Query(30, ge=1, le=366),
+    db: SupabaseClient = Depends(get_db)
+):
+    """One user's usage and spend, per day and model"""
+    since = _since(days)
+    try:
+        rows = await db.get_user_usage_by_day(user_id, since.isoformat())
+    except Exception as e:
+        logger.error(f"Error getting usage for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get usage")
+
+    return _dashboard(since, rows)
+
+
+@router.get("/ledger/{user_id}")
+async def get_user_ledger(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    db: SupabaseClient = Depends(get_db)
+):
+    """One user's most recent credits and charges"""
+    try:
+        entries = await db.get_credit_ledger(user_id, limit)
+    except Exception as e:
+        logger.error(f"Error getting ledger for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get ledger")
+
+    return {
+        "success": True,
+        "user_id": user_id,
+        "entries": entries
+    }
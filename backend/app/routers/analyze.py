@@ -2,36 +2,66 @@
 Analysis Router - Main API Endpoint
 
 POST /api/analyze - Analyze dating profile through Rose Glass
+POST /api/analyze/compare - Analyze several profiles at once, streamed
+POST /api/analyze/{analysis_id}/deep - Deep pass following a triage analysis
 GET /api/analyze/history - Get analysis history
+GET /api/analyze/{analysis_id} - Get one analysis with its text
 """
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from contextlib import AsyncExitStack, aclosing
+from datetime import datetime
+from typing import AsyncIterator, Optional, Union
+import asyncio
 import base64
+import json
 import logging
+import math
+import uuid
 
 from app.services.claude_service import ClaudeService
-from app.services.auth import get_current_user, User
-from app.db.supabase import SupabaseClient
+from app.services.image_packing import pack_images
+from app.services.image_store import ImageStore, StoredImage
+from app.services.preflight import screen_images
+from app.services.model_router import Route
+from app.services.auth import charge_refused, current_balance, get_current_user, get_user_cache, User
+from app.db.supabase import DatabaseUnavailable, InsufficientCredits, SupabaseClient
 from app.config import get_settings
-from app.models.analysis import AnalysisResponse, AnalysisHistoryItem
+from app.core.lifecycle import ClientDisconnected, InFlightTracker, ShuttingDown, cancel_on_disconnect
+from app.core.metrics import metrics
+from app.core.singleflight import SingleFlight
+from app.services.rate_limiter import AdmissionController, RateLimitExceeded
+from app.services.token_budget import TokenBudgetExceeded
+from app.services.pricing import MINIMUM_BALANCE_MICROS, from_micros
+from app.dependencies import get_admission, get_claude, get_coalescer, get_db, get_image_store, get_inflight
+from app.routers.images import load_images
+from app.models.analysis import AnalysisResponse, AnalysisHistoryItem, SkippedImageInfo
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/analyze", tags=["analysis"])
 
-# Initialize services
-settings = get_settings()
-claude = ClaudeService(api_key=settings.anthropic_api_key)
-db = SupabaseClient(url=settings.supabase_url, service_key=settings.supabase_service_key)
+# An uploaded screenshot, or the id of one already in the image store
+ImageSource = Union[UploadFile, str]
 
 
 @router.post("/", response_model=AnalysisResponse)
 async def analyze_profile(
-    profile_images: list[UploadFile] = File(..., description="1-10 profile screenshots"),
+    request: Request,
+    profile_images: Optional[list[UploadFile]] = File(None, description="1-10 profile screenshots"),
     conversation_images: Optional[list[UploadFile]] = File(None, description="Optional conversation screenshots"),
+    profile_image_ids: Optional[list[str]] = Form(None, description="Stored profile screenshots, by image id"),
+    conversation_image_ids: Optional[list[str]] = Form(None, description="Stored conversation screenshots, by image id"),
     user_context: Optional[str] = Form(None, description="Optional context about yourself"),
     use_premium: bool = Form(False, description="Use premium model (Claude Opus)"),
-    user: User = Depends(get_current_user)
+    mode: str = Form("full", description="full, or triage for a quick first pass"),
+    user: User = Depends(get_current_user),
+    claude: ClaudeService = Depends(get_claude),
+    db: SupabaseClient = Depends(get_db),
+    images: ImageStore = Depends(get_image_store),
+    inflight: InFlightTracker = Depends(get_inflight),
+    coalescer: SingleFlight = Depends(get_coalescer),
+    admission: AdmissionController = Depends(get_admission)
 ):
     """
     Analyze dating profile through Rose Glass framework.
@@ -42,10 +72,202 @@ async def analyze_profile(
     3. Optionally provide context about yourself
     4. Get Rose Glass analysis with suggested opener
 
+    **Modes:** `full` returns every section. `triage` returns only the
+    dimension readings, the tell and an opener, quickly and with far fewer
+    output tokens; request the rest with POST /api/analyze/{analysis_id}/deep.
+
+    **Stored images:** every screenshot is kept in the image store and the
+    response lists their ids (`image_ids`, `conversation_image_ids`). Send
+    those ids as `profile_image_ids` / `conversation_image_ids` instead of
+    uploading the same screenshots again; referenced images come before
+    uploaded ones.
+
+    **Pre-flight:** blank, mostly black, duplicated and non-screenshot
+    images are left out before the call and listed in `skipped_images`;
+    they are not billed. With no usable profile screenshot: 422.
+
+    **Limits:** per-user and global rate and concurrency limits apply; excess
+    requests get 429 with a Retry-After header.
+
     **Cost:** $0.02-0.10 per analysis depending on image count and model
     """
 
-    # Validate image count
+    profile = [*(profile_image_ids or []), *(profile_images or [])]
+    conversation = [*(conversation_image_ids or []), *(conversation_images or [])] or None
+    _validate_image_counts(profile, conversation)
+
+    if mode not in ("full", "triage"):
+        raise HTTPException(status_code=400, detail="mode must be 'full' or 'triage'")
+
+    logger.info("Analysis request from user %(user)s: %(profile_images)d profile images, "
+                "%(conversation_images)d conversation images, premium=%(premium)s, mode=%(mode)s", {
+                    "user": user.clerk_id,
+                    "profile_images": len(profile),
+                    "conversation_images": len(conversation) if conversation else 0,
+                    "premium": use_premium,
+                    "mode": mode,
+                })
+
+    route = claude.route(
+        profile_images=len(profile),
+        conversation_images=len(conversation or []),
+        user_context=user_context,
+        use_premium=use_premium
+    )
+
+    return await _unless_disconnected(request, user, mode, _admit_and_run(
+        profile, conversation, user_context, use_premium,
+        user, claude, db, images, inflight, coalescer, admission, route, stage=mode
+    ))
+
+
+@router.post("/compare")
+async def compare_profiles(
+    profile_images: Optional[list[UploadFile]] = File(None, description="Screenshots of every profile, in order"),
+    images_per_profile: Optional[list[int]] = Form(None, description="How many of profile_images belong to each profile"),
+    profile_image_ids: Optional[list[str]] = Form(None, description="Stored screenshots: one comma-separated list of image ids per profile"),
+    user_context: Optional[str] = Form(None, description="Optional context about yourself, shared by every profile"),
+    use_premium: bool = Form(False, description="Use premium model (Claude Opus)"),
+    user: User = Depends(get_current_user),
+    claude: ClaudeService = Depends(get_claude),
+    db: SupabaseClient = Depends(get_db),
+    images: ImageStore = Depends(get_image_store),
+    inflight: InFlightTracker = Depends(get_inflight),
+    admission: AdmissionController = Depends(get_admission)
+):
+    """
+    Analyze several matches at once (2 to COMPARE_MAX_PROFILES, default 5).
+
+    Send each profile's screenshots either as uploads (`profile_images`,
+    split by `images_per_profile`) or as stored image ids
+    (`profile_image_ids`, one comma-separated list per profile). The
+    profiles are analyzed concurrently on one model with a shared
+    prompt-cache prefix (system prompt + `user_context`), so only the first
+    pays for it in full.
+
+    **Response:** newline-delimited JSON. A `comparison` line first, then a
+    `result` line per profile as soon as it completes (any order; `index`
+    is the profile's position), or an `error` line with a `status` for a
+    profile that failed, and a closing `summary` line with the total charge
+    and remaining credits. Failed profiles are not charged.
+
+    **Cost:** the sum of the profiles' analyses, charged once for the whole
+    comparison. The balance must cover the minimum for every profile up
+    front; a profile whose result the balance no longer covers is returned
+    as an error (402) and not charged.
+
+    **Pre-flight:** screenshots left out are listed in the `comparison`
+    line with their profile's `index`; a profile with none left: 422.
+
+    **Limits:** admitted as one request against the per-user limits.
+    """
+    profiles = _comparison_profiles(profile_images, images_per_profile, profile_image_ids)
+
+    logger.info("Comparison request from user %(user)s: %(profiles)d profiles, premium=%(premium)s", {
+        "user": user.clerk_id,
+        "profiles": len(profiles),
+        "premium": use_premium,
+    })
+
+    # One model for all: results stay comparable and share a cached prefix
+    route = claude.route(
+        profile_images=max(len(p) for p in profiles),
+        user_context=user_context,
+        use_premium=use_premium
+    )
+
+    stream = _run_comparison(
+        profiles, user_context, use_premium, user, claude, db, images, inflight, admission, route
+    )
+    # Admission, the credit check and image loading happen before the first
+    # line, so their failures are still plain HTTP errors
+    first = await anext(stream)
+    return StreamingResponse(_prepend(first, stream), media_type="application/x-ndjson")
+
+
+@router.post("/{analysis_id}/deep", response_model=AnalysisResponse)
+async def deep_analysis(
+    request: Request,
+    analysis_id: str,
+    profile_images: Optional[list[UploadFile]] = File(None, description="The same profile screenshots as the triage"),
+    conversation_images: Optional[list[UploadFile]] = File(None, description="The same conversation screenshots"),
+    profile_image_ids: Optional[list[str]] = Form(None, description="The same screenshots, by image id"),
+    conversation_image_ids: Optional[list[str]] = Form(None, description="The same conversation screenshots, by image id"),
+    user_context: Optional[str] = Form(None, description="The same context as the triage"),
+    user: User = Depends(get_current_user),
+    claude: ClaudeService = Depends(get_claude),
+    db: SupabaseClient = Depends(get_db),
+    images: ImageStore = Depends(get_image_store),
+    inflight: InFlightTracker = Depends(get_inflight),
+    coalescer: SingleFlight = Depends(get_coalescer),
+    admission: AdmissionController = Depends(get_admission)
+):
+    """
+    Long-form translation, conversation analysis and next move for a
+    triage analysis.
+
+    The deep pass runs on the same model with the same system prompt and
+    images as the triage, which Anthropic then serves from its prompt cache
+    (5 minutes, refreshed on use), so the images are billed at the
+    cache-read rate. Send no images to reuse the triage's stored
+    screenshots, or send the same ones again. Charged as its own analysis,
+    every time: only an identical request still in flight is shared, a
+    repeat after it finished is a new, billed deep pass.
+    """
+    try:
+        parent = await db.get_analysis_by_id(analysis_id)
+    except Exception as e:
+        logger.error("Error loading triage analysis %(analysis_id)s: %(error)s",
+                     {"analysis_id": analysis_id, "error": str(e)})
+        raise HTTPException(status_code=503, detail="Analysis store unavailable, please retry")
+
+    if not parent or parent["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    if parent.get("stage") != "triage":
+        raise HTTPException(status_code=409, detail="Deep pass is only available for triage analyses")
+
+    profile = [*(profile_image_ids or []), *(profile_images or [])]
+    conversation = [*(conversation_image_ids or []), *(conversation_images or [])] or None
+    if not profile:
+        profile = list(parent.get("image_hashes") or [])
+        conversation = list(parent.get("conversation_image_hashes") or []) or None
+    _validate_image_counts(profile, conversation)
+
+    logger.info("Deep analysis request from user %(user)s for %(analysis_id)s",
+                {"user": user.clerk_id, "analysis_id": analysis_id})
+
+    # Same model as the triage: the prompt cache is per model
+    route = claude.route_for_model(parent["model_used"], reason="deep")
+
+    return await _unless_disconnected(request, user, "deep", _admit_and_run(
+        profile, conversation, user_context, False,
+        user, claude, db, images, inflight, coalescer, admission, route, stage="deep", parent=parent
+    ))
+
+
+async def _unless_disconnected(request: Request, user: User, stage: str, work) -> AnalysisResponse:
+    """
+    Run an analysis, cancelling it if the client goes away first.
+
+    Cancellation stops admission waits, scheduler queueing and the upstream
+    call, and nothing is charged or saved. Once Claude has answered, the
+    charge and save finish regardless (see InFlightTracker.run_to_completion).
+    """
+    try:
+        return await cancel_on_disconnect(request, work, get_settings().disconnect_poll_interval)
+    except ClientDisconnected:
+        metrics.inc("analysis_cancelled", stage=stage)
+        logger.info("Client disconnected, cancelled %(stage)s analysis for user %(user)s",
+                    {"stage": stage, "user": user.clerk_id})
+        # Nobody is listening; 499 is what the access log will show
+        raise HTTPException(status_code=499, detail="Client closed request")
+
+
+def _validate_image_counts(
+    profile_images: list[ImageSource],
+    conversation_images: Optional[list[ImageSource]]
+) -> None:
     if not profile_images or len(profile_images) == 0:
         raise HTTPException(status_code=400, detail="At least 1 profile image required")
 
@@ -55,150 +277,677 @@ async def analyze_profile(
     if conversation_images and len(conversation_images) > 10:
         raise HTTPException(status_code=400, detail="Maximum 10 conversation images allowed")
 
-    logger.info(f"Analysis request from user {user.clerk_id}: "
-               f"{len(profile_images)} profile images, "
-               f"{len(conversation_images) if conversation_images else 0} conversation images, "
-               f"premium={use_premium}")
 
-    # Check user credits (estimate minimum $0.05)
+def _comparison_profiles(
+    uploads: Optional[list[UploadFile]],
+    images_per_profile: Optional[list[int]],
+    image_ids: Optional[list[str]]
+) -> list[list[ImageSource]]:
+    """Screenshots of each profile of a comparison request"""
+    if uploads and image_ids:
+        raise HTTPException(status_code=400, detail="Send either profile_images or profile_image_ids, not both")
+
+    profiles: list[list[ImageSource]] = []
+    if image_ids:
+        profiles = [[i.strip() for i in ids.split(",") if i.strip()] for ids in image_ids]
+    elif uploads:
+        counts = images_per_profile or []
+        if sum(counts) != len(uploads) or any(count < 1 for count in counts):
+            raise HTTPException(
+                status_code=400,
+                detail="images_per_profile must give the number of uploaded screenshots of each profile"
+            )
+        start = 0
+        for count in counts:
+            profiles.append(list(uploads[start:start + count]))
+            start += count
+
+    max_profiles = get_settings().compare_max_profiles
+    if not 2 <= len(profiles) <= max_profiles:
+        raise HTTPException(status_code=400, detail=f"A comparison needs 2-{max_profiles} profiles")
+    for profile in profiles:
+        _validate_image_counts(profile, None)
+    return profiles
+
+
+async def _run_comparison(
+    profiles: list[list[ImageSource]],
+    user_context: Optional[str],
+    use_premium: bool,
+    user: User,
+    claude: ClaudeService,
+    db: SupabaseClient,
+    images: ImageStore,
+    inflight: InFlightTracker,
+    admission: AdmissionController,
+    route: Route
+) -> AsyncIterator[str]:
+    """
+    NDJSON lines of a comparison.
+
+    Everything before the first line may raise HTTPException. Profiles that
+    complete are settled together at the end, or, if the client goes away
+    first, as soon as the stream is closed; the rest are cancelled.
+    """
+    comparison_id = str(uuid.uuid4())
+
+    async with AsyncExitStack() as stack:
+        try:
+            await stack.enter_async_context(admission.admit(user_id=user.id, model=route.model))
+        except RateLimitExceeded as e:
+            logger.info("Rejected comparison for user %(user)s: %(error)s", {"user": user.clerk_id, "error": str(e)})
+            raise HTTPException(
+                status_code=429,
+                detail="Too many analyses in progress. Please retry shortly.",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+
+        minimum = MINIMUM_BALANCE_MICROS * len(profiles)
+        try:
+            credits = await current_balance(db, user, minimum)
+        except Exception as e:
+            logger.error("Error checking credits: %(error)s", {"error": str(e)})
+            # For MVP, allow analysis without credit check
+            credits = 100_000_000  # Fake $100 for testing
+
+        if credits < minimum:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Insufficient credits. Comparing {len(profiles)} profiles needs at least "
+                       f"${from_micros(minimum)}.",
+                headers={"X-Required-Credits": str(from_micros(minimum))}
+            )
+
+        loaded = await asyncio.gather(*(load_images(profile, images, db, user) for profile in profiles))
+        screened = await asyncio.gather(*(
+            _preflight(user, profile, [], subject=f"profile {index + 1}") for index, profile in enumerate(loaded)
+        ))
+        loaded = [profile for profile, _, _ in screened]
+        image_hashes = [[img.id for img in profile] for profile in loaded]
+        encoded = await asyncio.gather(*(_encode_images(profile) for profile in loaded))
+
+        try:
+            await stack.enter_async_context(inflight.track())
+        except ShuttingDown:
+            raise HTTPException(status_code=503, detail="Server is restarting, please retry", headers={"Retry-After": "5"})
+
+        yield _ndjson({
+            "type": "comparison",
+            "comparison_id": comparison_id,
+            "profiles": len(profiles),
+            "model_used": route.model,
+            "model_tier": route.tier,
+            "skipped_images": [
+                {"index": index, **info.model_dump()}
+                for index, (_, _, skipped) in enumerate(screened) for info in skipped
+            ],
+        })
+
+        completed: list[tuple[str, dict, list[str]]] = []  # (analysis id, result, image ids)
+        charged = 0
+        failed = 0
+        settled = False
+        try:
+            async with aclosing(claude.compare_profiles(encoded, user_context, use_premium, route)) as outcomes:
+                async for index, outcome in outcomes:
+                    if isinstance(outcome, Exception):
+                        failed += 1
+                        metrics.inc("comparison_results", outcome="failed")
+                        yield _ndjson({"type": "error", "index": index, **_comparison_error(outcome)})
+                        continue
+
+                    charge = outcome["usage"]["charge_micros"]
+                    credits = await _confirm_balance(db, user, credits, charged + charge)
+                    if credits < charged + charge:
+                        failed += 1
+                        metrics.inc("comparison_results", outcome="unpaid")
+                        yield _ndjson({
+                            "type": "error", "index": index, "status": 402,
+                            "detail": f"Insufficient credits. This analysis costs ${from_micros(charge)}, "
+                                      f"${from_micros(credits - charged)} is left",
+                        })
+                        continue
+
+                    analysis_id = str(uuid.uuid4())
+                    completed.append((analysis_id, outcome, image_hashes[index]))
+                    charged += charge
+                    metrics.inc("comparison_results", outcome="ok")
+                    yield _ndjson({
+                        "type": "result",
+                        "index": index,
+                        "analysis_id": analysis_id,
+                        "analysis": outcome["analysis"],
+                        "usage": outcome["usage"],
+                        "image_ids": image_hashes[index],
+                    })
+
+            settled = True
+            try:
+                new_balance = await inflight.run_to_completion(
+                    _settle_comparison(db, user, credits, comparison_id, completed)
+                )
+            except HTTPException as e:
+                # Not charged, so not saved either
+                yield _ndjson({"type": "error", "comparison_id": comparison_id, "status": e.status_code, "detail": e.detail})
+                return
+        finally:
+            if not settled:
+                # Client gone mid-stream: the unfinished profiles were
+                # cancelled, the finished ones are still charged and saved
+                metrics.inc("analysis_cancelled", stage="compare")
+                logger.info("Comparison for user %(user)s interrupted after %(analyses)d analyses",
+                            {"user": user.clerk_id, "analyses": len(completed)})
+                try:
+                    await inflight.run_to_completion(_settle_comparison(db, user, credits, comparison_id, completed))
+                except HTTPException as e:
+                    logger.warning("Interrupted comparison %(comparison_id)s not settled: %(error)s",
+                                   {"comparison_id": comparison_id, "error": e.detail})
+
+        logger.info("Comparison complete for user %(user)s: %(analyses)d analyses, %(failed)d failed. "
+                    "Charged $%(charge)s, new balance $%(balance)s", {
+                        "user": user.clerk_id,
+                        "analyses": len(completed),
+                        "failed": failed,
+                        "charge": from_micros(charged),
+                        "balance": from_micros(new_balance),
+                    })
+        yield _ndjson({
+            "type": "summary",
+            "comparison_id": comparison_id,
+            "analyses": len(completed),
+            "failed": failed,
+            "charge_usd": float(from_micros(charged)),
+            "remaining_credits": float(from_micros(new_balance)),
+        })
+
+
+async def _prepend(first: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    async with aclosing(rest):
+        yield first
+        async for line in rest:
+            yield line
+
+
+def _ndjson(line: dict) -> str:
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def _comparison_error(error: Exception) -> dict:
+    """Status and detail of a profile that failed, as the single-analysis endpoint would answer"""
+    if isinstance(error, TokenBudgetExceeded):
+        return {
+            "status": 429,
+            "detail": "The analysis service is at capacity. Please retry shortly.",
+            "retry_after": max(1, math.ceil(error.retry_after)),
+        }
+    logger.error("Analysis failed: %(error)s", {"error": str(error)})
+    return {"status": 500, "detail": f"Analysis failed: {str(error)}"}
+
+
+async def _admit_and_run(
+    profile_images: list[ImageSource],
+    conversation_images: Optional[list[ImageSource]],
+    user_context: Optional[str],
+    use_premium: bool,
+    user: User,
+    claude: ClaudeService,
+    db: SupabaseClient,
+    images: ImageStore,
+    inflight: InFlightTracker,
+    coalescer: SingleFlight,
+    admission: AdmissionController,
+    route: Route,
+    stage: str = "full",
+    parent: Optional[dict] = None
+) -> AnalysisResponse:
+    """
+    Credit check and images, then the analysis under admission control;
+    over-limit requests get 429.
+
+    Identical requests already running for this user (double-clicks,
+    retries) join that analysis before admission: they share its call,
+    charge and result instead of queueing for a slot of their own.
+    """
+
+    # Check user credits (micro-dollars), from the authentication snapshot
+    # when it is enough
     try:
-        credits = await db.get_user_credits(user.id)
-        logger.info(f"User {user.clerk_id} has ${credits:.4f} credits")
+        credits = await current_balance(db, user, MINIMUM_BALANCE_MICROS)
+        logger.info("User %(user)s has $%(credits)s credits",
+                    {"user": user.clerk_id, "credits": from_micros(credits)})
     except Exception as e:
-        logger.error(f"Error checking credits: {e}")
-        # For MVP, allow analysis without credit check
-        credits = 100.0  # Fake credits for testing
+        logger.error("Error checking credits: %(error)s", {"error": str(e)})
+        # For MVP, allow analysis without credit check (immediately, while
+        # the database circuit is open)
+        credits = 100_000_000  # Fake $100 for testing
 
-    if credits < 0.02:
+    if credits < MINIMUM_BALANCE_MICROS:
         raise HTTPException(
             status_code=402,
             detail="Insufficient credits. Please add funds to continue.",
-            headers={"X-Required-Credits": "0.02"}
+            headers={"X-Required-Credits": str(from_micros(MINIMUM_BALANCE_MICROS))}
         )
 
-    # Process images to base64
-    profile_b64 = []
-    for img in profile_images:
+    # Store uploads, fetch referenced images. The triage's own images need
+    # no ownership lookup for its deep pass
+    known = frozenset()
+    if parent:
+        known = frozenset((parent.get("image_hashes") or []) + (parent.get("conversation_image_hashes") or []))
+
+    profile = await load_images(profile_images, images, db, user, known)
+    conversation = await load_images(conversation_images, images, db, user, known) if conversation_images else []
+    profile, conversation, skipped = await _preflight(user, profile, conversation)
+
+    image_hashes = [img.id for img in profile]
+    conversation_image_hashes = [img.id for img in conversation]
+
+    # What the user asked for, not how it is served: the route depends on
+    # queue depth, which a retry a moment later may see differently
+    key = (
+        user.id, stage, use_premium, user_context or "", parent["id"] if parent else None,
+        tuple(image_hashes), tuple(conversation_image_hashes)
+    )
+
+    async def admitted() -> tuple[dict, int, Optional[str]]:
         try:
-            content = await img.read()
-            profile_b64.append(base64.b64encode(content).decode())
+            async with admission.admit(user_id=user.id, model=route.model):
+                return await _run_analysis(
+                    profile, conversation, user_context, use_premium,
+                    user, claude, db, inflight, route, credits, stage, parent
+                )
+        except RateLimitExceeded as e:
+            logger.info("Rejected analysis for user %(user)s: %(error)s", {"user": user.clerk_id, "error": str(e)})
+            raise HTTPException(
+                status_code=429,
+                detail="Too many analyses in progress. Please retry shortly.",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+
+    try:
+        (result, new_balance, analysis_id), shared = await coalescer.do(key, admitted)
+    except ShuttingDown:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is restarting, please retry",
+            headers={"Retry-After": "5"}
+        )
+
+    if shared:
+        metrics.inc("analysis_coalesced", stage=stage)
+        logger.info("Analysis for user %(user)s shared an identical request already in flight",
+                    {"user": user.clerk_id})
+    else:
+        logger.info("Analysis complete for user %(user)s. Charged $%(charge)s, new balance $%(balance)s", {
+            "user": user.clerk_id,
+            "charge": from_micros(result['usage']['charge_micros']),
+            "balance": from_micros(new_balance),
+        })
+
+    return _analysis_response(
+        result, new_balance, analysis_id, stage, parent, image_hashes, conversation_image_hashes, skipped
+    )
+
+
+async def _run_analysis(
+    profile: list[StoredImage],
+    conversation: list[StoredImage],
+    user_context: Optional[str],
+    use_premium: bool,
+    user: User,
+    claude: ClaudeService,
+    db: SupabaseClient,
+    inflight: InFlightTracker,
+    route: Route,
+    credits: int,
+    stage: str = "full",
+    parent: Optional[dict] = None
+) -> tuple[dict, int, Optional[str]]:
+    """Claude call and settlement for an admitted request"""
+    profile_b64 = await _encode_images(profile)
+    conversation_b64 = await _encode_images(conversation) or None
+
+    async with inflight.track():
+        # Run analysis
+        try:
+            result = await claude.analyze_profile(
+                images=profile_b64,
+                user_context=user_context,
+                conversation_images=conversation_b64,
+                use_premium=use_premium,
+                route=route,
+                stage=stage,
+                triage_text=parent["analysis_text"] if parent else None
+            )
+        except TokenBudgetExceeded as e:
+            logger.warning("Analysis for user %(user)s shed: %(error)s", {"user": user.clerk_id, "error": str(e)})
+            raise HTTPException(
+                status_code=429,
+                detail="The analysis service is at capacity. Please retry shortly.",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
         except Exception as e:
-            logger.error(f"Error reading profile image: {e}")
-            raise HTTPException(status_code=400, detail=f"Invalid image file: {img.filename}")
+            logger.error("Analysis failed: %(error)s", {"error": str(e)})
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-    conversation_b64 = None
-    if conversation_images:
-        conversation_b64 = []
-        for img in conversation_images:
-            try:
-                content = await img.read()
-                conversation_b64.append(base64.b64encode(content).decode())
-            except Exception as e:
-                logger.error(f"Error reading conversation image: {e}")
-                raise HTTPException(status_code=400, detail=f"Invalid image file: {img.filename}")
+        # Get charge amount
+        charge = result["usage"]["charge_micros"]
 
-    # Run analysis
-    try:
-        result = await claude.analyze_profile(
-            images=profile_b64,
-            user_context=user_context,
-            conversation_images=conversation_b64,
-            use_premium=use_premium
+        # Check if user has enough credits
+        credits = await _confirm_balance(db, user, credits, charge)
+        if credits < charge:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Insufficient credits. Analysis costs ${from_micros(charge)}, "
+                       f"you have ${from_micros(credits)}",
+                headers={"X-Required-Credits": str(from_micros(charge))}
+            )
+
+        # Charge and save even if this request is cancelled from here on
+        new_balance, analysis_id = await inflight.run_to_completion(
+            _settle_analysis(
+                db, user, credits, result, parent["id"] if parent else None,
+                image_hashes=[img.id for img in profile],
+                conversation_image_hashes=[img.id for img in conversation]
+            )
         )
-    except Exception as e:
-        logger.error(f"Analysis failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        return result, new_balance, analysis_id
+
+
+async def _preflight(
+    user: User,
+    profile: list[StoredImage],
+    conversation: list[StoredImage],
+    subject: str = "the profile"
+) -> tuple[list[StoredImage], list[StoredImage], list[SkippedImageInfo]]:
+    """
+    Leave out screenshots not worth a vision call (IMAGE_PREFLIGHT_CHECKS).
+    Nothing is charged for them; with no profile screenshot left the
+    request is refused with 422.
+    """
+    checks = get_settings().image_preflight_checks
+    if not checks:
+        return profile, conversation, []
+
+    def screen():
+        profile_screening = screen_images(profile, checks)
+        return profile_screening, screen_images(conversation, checks, seen=profile_screening.fingerprints)
 
-    # Get charge amount
-    charge = result["usage"]["charge_usd"]
+    profile_screening, conversation_screening = await asyncio.to_thread(screen)
+    skipped = [
+        SkippedImageInfo(id=image.id, kind=kind, reason=image.reason)
+        for kind, screening in (("profile", profile_screening), ("conversation", conversation_screening))
+        for image in screening.skipped
+    ]
+    if skipped:
+        logger.info("Pre-flight left out %(skipped)d of %(images)d screenshots for user %(user)s: %(reasons)s", {
+            "skipped": len(skipped),
+            "images": len(profile) + len(conversation),
+            "user": user.clerk_id,
+            "reasons": ", ".join(info.reason for info in skipped),
+        })
 
-    # Check if user has enough credits
-    if credits < charge:
+    if not profile_screening.kept:
+        metrics.inc("preflight_rejected")
+        reasons = ", ".join(f"{info.reason} ({info.id[:12]})" for info in skipped if info.kind == "profile")
         raise HTTPException(
-            status_code=402,
-            detail=f"Insufficient credits. Analysis costs ${charge:.4f}, you have ${credits:.4f}",
-            headers={"X-Required-Credits": str(charge)}
+            status_code=422,
+            detail=f"No usable screenshots of {subject}: {reasons}. Nothing was charged."
         )
+    return profile_screening.kept, conversation_screening.kept, skipped
 
-    # Deduct credits
-    try:
-        new_balance = await db.deduct_credits(user.id, charge)
-    except Exception as e:
-        logger.error(f"Error deducting credits: {e}")
-        # For MVP, continue without deducting
-        new_balance = credits - charge
 
-    # Save analysis to database
-    try:
-        analysis_record = await db.save_analysis(
-            user_id=user.id,
-            analysis_text=result["analysis"],
-            input_tokens=result["usage"]["input_tokens"],
-            output_tokens=result["usage"]["output_tokens"],
-            cost_usd=result["usage"]["cost_usd"],
-            charge_usd=charge,
-            model_used=result["model_used"]
+async def _encode_images(images: list[StoredImage]) -> list[str]:
+    """Base64 for Claude, tiled into fewer images when IMAGE_PACKING is on"""
+    data = [img.data for img in images]
+    settings = get_settings()
+    if settings.image_packing and len(data) > 1:
+        packed = await asyncio.to_thread(
+            pack_images, data, settings.image_packing_min_scale, settings.image_packing_max_tiles
         )
-        analysis_id = analysis_record["id"]
-    except Exception as e:
-        logger.error(f"Error saving analysis: {e}")
-        analysis_id = None
+        data = packed.images
+    return [base64.b64encode(d).decode() for d in data]
 
-    logger.info(f"Analysis complete for user {user.clerk_id}. "
-               f"Charged ${charge:.4f}, new balance ${new_balance:.4f}")
 
+def _analysis_response(
+    result: dict,
+    new_balance: int,
+    analysis_id: Optional[str],
+    stage: str,
+    parent: Optional[dict],
+    image_hashes: list[str],
+    conversation_image_hashes: list[str],
+    skipped: list[SkippedImageInfo]
+) -> AnalysisResponse:
     return AnalysisResponse(
         success=True,
         analysis=result["analysis"],
         usage=result["usage"],
-        remaining_credits=new_balance,
-        analysis_id=analysis_id
+        remaining_credits=float(from_micros(new_balance)),
+        analysis_id=analysis_id,
+        stage=stage,
+        parent_id=parent["id"] if parent else None,
+        image_ids=image_hashes,
+        conversation_image_ids=conversation_image_hashes,
+        skipped_images=skipped
+    )
+
+
+async def _confirm_balance(db: SupabaseClient, user: User, credits: int, charge: int) -> int:
+    """A balance too low for `charge` is read again before the user is refused"""
+    if credits >= charge:
+        return credits
+    try:
+        return await current_balance(db, user, charge)
+    except Exception as e:
+        logger.error("Error checking credits: %(error)s", {"error": str(e)})
+        return credits
+
+
+async def _settle_analysis(
+    db: SupabaseClient,
+    user: User,
+    credits: int,
+    result: dict,
+    parent_id: Optional[str] = None,
+    image_hashes: Optional[list[str]] = None,
+    conversation_image_hashes: Optional[list[str]] = None
+) -> tuple[int, Optional[str]]:
+    """Deduct credits and persist a completed analysis"""
+    usage = result["usage"]
+    charge = usage["charge_micros"]
+
+    # Id assigned up front so the ledger debit references the analysis
+    # even if the two writes land independently
+    analysis_id = str(uuid.uuid4())
+
+    new_balance = await _deduct(db, user, credits, charge, "analysis", analysis_id)
+
+    # Save analysis to database, or journal it under its id
+    analysis_id = await _save_analysis(db, user, _analysis_record(
+        user, result, analysis_id, parent_id, image_hashes, conversation_image_hashes
+    ))
+    return new_balance, analysis_id
+
+
+async def _settle_comparison(
+    db: SupabaseClient,
+    user: User,
+    credits: int,
+    comparison_id: str,
+    completed: list[tuple[str, dict, list[str]]]
+) -> int:
+    """One ledger debit for every analysis of a comparison, then the analyses themselves"""
+    if not completed:
+        return credits
+
+    charge = sum(result["usage"]["charge_micros"] for _, result, _ in completed)
+    new_balance = await _deduct(db, user, credits, charge, "comparison", comparison_id)
+
+    await asyncio.gather(*(
+        _save_analysis(db, user, _analysis_record(user, result, analysis_id, image_hashes=hashes, comparison_id=comparison_id))
+        for analysis_id, result, hashes in completed
+    ))
+    return new_balance
+
+
+async def _deduct(db: SupabaseClient, user: User, credits: int, charge: int, kind: str, reference_id: str) -> int:
+    """
+    Post a charge to the ledger and return the new balance. While the
+    database is down the charge is journaled and applied when it is back.
+
+    A balance that does not cover the charge (the snapshot the credit check
+    trusted was stale) is 402; any other failure to charge is 500. Either
+    way nothing is saved and the analysis is not returned.
+
+    A user authenticated while the database was down has no users.id to
+    charge yet; the charge is journaled by Clerk id and resolved at replay.
+    """
+    if not user.resolved:
+        await db.defer("deduct_credits", clerk_id=user.clerk_id, amount_micros=charge, kind=kind, reference_id=reference_id)
+        return credits - charge
+
+    try:
+        new_balance = await db.deduct_credits(user.id, charge, kind=kind, reference_id=reference_id)
+        get_user_cache().update_balance(user.clerk_id, new_balance)
+    except DatabaseUnavailable as e:
+        logger.error("Error deducting credits: %(error)s", {"error": str(e)})
+        await db.defer("deduct_credits", user_id=user.id, amount_micros=charge, kind=kind, reference_id=reference_id)
+        new_balance = credits - charge
+    except InsufficientCredits as e:
+        raise await charge_refused(db, user, charge, kind, e)
+    except Exception as e:
+        logger.error("Error deducting credits: %(error)s", {"error": str(e)})
+        raise HTTPException(status_code=500, detail="Could not charge for this analysis; nothing was charged. Please retry.")
+    return new_balance
+
+
+def _analysis_record(
+    user: User,
+    result: dict,
+    analysis_id: str,
+    parent_id: Optional[str] = None,
+    image_hashes: Optional[list[str]] = None,
+    conversation_image_hashes: Optional[list[str]] = None,
+    comparison_id: Optional[str] = None
+) -> dict:
+    """`save_analysis` arguments for a completed analysis"""
+    usage = result["usage"]
+    return dict(
+        user_id=user.id,
+        analysis_text=result["analysis"],
+        input_tokens=usage["input_tokens"],
+        output_tokens=usage["output_tokens"],
+        cost_micros=usage["cost_micros"],
+        charge_micros=usage["charge_micros"],
+        model_used=result["model_used"],
+        price_version=usage["price_version"],
+        analysis_id=analysis_id,
+        stage=result["stage"],
+        parent_id=parent_id,
+        cache_read_tokens=usage["cache_read_tokens"],
+        cache_write_tokens=usage["cache_write_tokens"],
+        image_hashes=image_hashes,
+        conversation_image_hashes=conversation_image_hashes,
+        created_at=datetime.utcnow().isoformat(),
+        comparison_id=comparison_id
     )
 
 
+async def _save_analysis(db: SupabaseClient, user: User, record: dict) -> Optional[str]:
+    """
+    Save an analysis record, journaling it while the database is down (by
+    Clerk id for an unresolved user, see `_deduct`); its id, or None if lost
+    """
+    if not user.resolved:
+        record = {k: v for k, v in record.items() if k != "user_id"}
+        if await db.defer("save_analysis", clerk_id=user.clerk_id, **record):
+            return record["analysis_id"]
+        return None
+
+    try:
+        analysis_record = await db.save_analysis(**record)
+        return analysis_record["id"]
+    except DatabaseUnavailable as e:
+        logger.error("Error saving analysis: %(error)s", {"error": str(e)})
+        if await db.defer("save_analysis", **record):
+            return record["analysis_id"]
+    except Exception as e:
+        logger.error("Error saving analysis: %(error)s", {"error": str(e)})
+    return None
+
+
 @router.get("/history")
 async def get_analysis_history(
     limit: int = 20,
-    user: User = Depends(get_current_user)
+    user: User = Depends(get_current_user),
+    db: SupabaseClient = Depends(get_db)
 ):
-    """Get user's analysis history"""
+    """Get user's analysis history; the text is fetched per analysis"""
     try:
         analyses = await db.get_user_analyses(user.id, limit)
 
         return {
             "success": True,
-            "analyses": [
-                AnalysisHistoryItem(
-                    id=a["id"],
-                    analysis_text=a["analysis_text"],
-                    created_at=a["created_at"],
-                    model_used=a["model_used"],
-                    cost_usd=a["cost_usd"],
-                    charge_usd=a["charge_usd"]
-                )
-                for a in analyses
-            ]
+            "analyses": [_history_item(a) for a in analyses]
         }
     except Exception as e:
-        logger.error(f"Error getting history: {e}")
+        logger.error("Error getting history: %(error)s", {"error": str(e)})
         raise HTTPException(status_code=500, detail="Failed to get history")
 
 
 @router.get("/credits")
-async def get_credits(user: User = Depends(get_current_user)):
+async def get_credits(
+    user: User = Depends(get_current_user),
+    db: SupabaseClient = Depends(get_db)
+):
     """Get user's current credit balance"""
     try:
         credits = await db.get_user_credits(user.id)
         return {
             "success": True,
             "user_id": user.id,
-            "credits": credits
+            "credits": float(from_micros(credits))
         }
     except Exception as e:
-        logger.error(f"Error getting credits: {e}")
+        logger.error("Error getting credits: %(error)s", {"error": str(e)})
         # For MVP, return fake credits
         return {
             "success": True,
             "user_id": user.id,
             "credits": 100.0
         }
+
+
+@router.get("/{analysis_id}")
+async def get_analysis(
+    analysis_id: str,
+    user: User = Depends(get_current_user),
+    db: SupabaseClient = Depends(get_db)
+):
+    """Get one analysis, including its (decompressed) text"""
+    try:
+        analysis = await db.get_analysis_by_id(analysis_id)
+    except Exception as e:
+        logger.error("Error getting analysis %(analysis_id)s: %(error)s", {"analysis_id": analysis_id, "error": str(e)})
+        raise HTTPException(status_code=503, detail="Analysis store unavailable, please retry")
+
+    if not analysis or analysis["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    return {"success": True, "analysis": _history_item(analysis)}
+
+
+def _history_item(a: dict) -> AnalysisHistoryItem:
+    return AnalysisHistoryItem(
+        id=a["id"],
+        analysis_text=a.get("analysis_text"),
+        created_at=a["created_at"],
+        model_used=a["model_used"],
+        cost_usd=a["cost_usd"],
+        charge_usd=a["charge_usd"],
+        price_version=a.get("price_version"),
+        stage=a.get("stage", "full"),
+        parent_id=a.get("parent_id"),
+        image_ids=a.get("image_hashes") or [],
+        conversation_image_ids=a.get("conversation_image_hashes") or []
+    )
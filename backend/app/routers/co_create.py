@@ -9,25 +9,23 @@ import logging
 import uuid
 
 from app.services.claude_service import ClaudeService
-from app.services.auth import get_current_user, User
-from app.db.supabase import SupabaseClient
-from app.config import get_settings
+from app.services.auth import charge_refused, current_balance, get_current_user, get_user_cache, User
+from app.db.supabase import DatabaseUnavailable, InsufficientCredits, SupabaseClient
+from app.dependencies import get_claude, get_db
 from app.models.analysis import CoCreateRequest, CoCreateResponse
-from app.prompts.system_prompt import BIDIRECTIONAL_TRANSLATION_ADDENDUM
+from app.services.pricing import MINIMUM_BALANCE_MICROS, from_micros
+from app.prompts.templates import CO_CREATION_PROMPT
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/co-create", tags=["co-create"])
 
-# Initialize services
-settings = get_settings()
-claude = ClaudeService(api_key=settings.anthropic_api_key)
-db = SupabaseClient(url=settings.supabase_url, service_key=settings.supabase_service_key)
-
 
 @router.post("/", response_model=CoCreateResponse)
 async def co_create_response(
     request: CoCreateRequest = Body(...),
-    user: User = Depends(get_current_user)
+    user: User = Depends(get_current_user),
+    claude: ClaudeService = Depends(get_claude),
+    db: SupabaseClient = Depends(get_db)
 ):
     """
     Co-create response integrating user's authentic perspective.
@@ -42,7 +40,8 @@ async def co_create_response(
     **This is NOT generating optimal responses - it's helping the user show up authentically**
     """
 
-    logger.info(f"Co-create request from user {user.clerk_id} for analysis {request.analysis_id}")
+    logger.info("Co-create request from user %(user)s for analysis %(analysis_id)s",
+                {"user": user.clerk_id, "analysis_id": request.analysis_id})
 
     # Retrieve original analysis from database
     try:
@@ -56,48 +55,27 @@ async def co_create_response(
 
     # Check user credits
     try:
-        credits = await db.get_user_credits(user.id)
+        credits = await current_balance(db, user, MINIMUM_BALANCE_MICROS)
     except Exception as e:
         logger.error(f"Error checking credits: {e}")
-        credits = 100.0  # Fake credits for MVP testing
+        credits = 100_000_000  # Fake $100 for MVP testing
 
-    if credits < 0.02:
+    if credits < MINIMUM_BALANCE_MICROS:
         raise HTTPException(
             status_code=402,
             detail="Insufficient credits for co-creation",
-            headers={"X-Required-Credits": "0.02"}
+            headers={"X-Required-Credits": str(from_micros(MINIMUM_BALANCE_MICROS))}
         )
 
-    # Build co-creation prompt
-    co_creation_prompt = f"""
-{BIDIRECTIONAL_TRANSLATION_ADDENDUM}
-
-## Original Analysis (Phase 1)
-
-{analysis.get("analysis_text", "Rose Glass analysis")}
-
-## User Input (Phase 2)
-
-**What they noticed:** {request.user_observation}
-
-**What resonates for them:** {request.user_resonance}
-
-**What they want to share:** {request.user_intention}
-
-{f"**Conversation context:** {request.conversation_context}" if request.conversation_context else ""}
-
-## Your Task
-
-Based on the Rose Glass analysis AND the user's authentic input, help articulate a message that:
-
-1. **Calibrates to their communication style** (from the analysis)
-2. **Expresses what's genuinely true for the user** (from their input)
-3. **Creates space for connection** (not just engagement)
-
-The message should feel like the user - it's helping them articulate, not generating something artificial.
-
-Format as a quoted message they can send directly.
-"""
+    # Build co-creation prompt; the addendum prefix is cache-marked
+    co_creation_prompt = CO_CREATION_PROMPT.blocks(
+        cache_prefix=True,
+        analysis=analysis.get("analysis_text", "Rose Glass analysis"),
+        observation=request.user_observation,
+        resonance=request.user_resonance,
+        intention=request.user_intention,
+        conversation_context=request.conversation_context
+    )
 
     # Call Claude to co-create response
     try:
@@ -107,29 +85,45 @@ Format as a quoted message they can send directly.
         raise HTTPException(status_code=500, detail=f"Co-creation failed: {str(e)}")
 
     # Get charge amount
-    charge = result["usage"]["charge_usd"]
+    charge = result["usage"]["charge_micros"]
 
-    # Check credits again
+    # Check credits again; a snapshot too low for the charge is read again
+    if credits < charge:
+        try:
+            credits = await current_balance(db, user, charge)
+        except Exception as e:
+            logger.error(f"Error checking credits: {e}")
     if credits < charge:
         raise HTTPException(
             status_code=402,
-            detail=f"Insufficient credits. Co-creation costs ${charge:.4f}, you have ${credits:.4f}",
-            headers={"X-Required-Credits": str(charge)}
+            detail=f"Insufficient credits. Co-creation costs ${from_micros(charge)}, "
+                   f"you have ${from_micros(credits)}",
+            headers={"X-Required-Credits": str(from_micros(charge))}
         )
 
-    # Deduct credits
+    # Deduct credits; the reference makes a journaled charge safe to replay
+    reference_id = str(uuid.uuid4())
     try:
-        new_balance = await db.deduct_credits(user.id, charge)
-    except Exception as e:
+        new_balance = await db.deduct_credits(user.id, charge, kind="co_create", reference_id=reference_id)
+        get_user_cache().update_balance(user.clerk_id, new_balance)
+    except DatabaseUnavailable as e:
         logger.error(f"Error deducting credits: {e}")
+        await db.defer(
+            "deduct_credits", user_id=user.id, amount_micros=charge, kind="co_create", reference_id=reference_id
+        )
         new_balance = credits - charge
+    except InsufficientCredits as e:
+        raise await charge_refused(db, user, charge, "co_create", e)
+    except Exception as e:
+        logger.error(f"Error deducting credits: {e}")
+        raise HTTPException(status_code=500, detail="Could not charge for this message; nothing was charged. Please retry.")
 
-    logger.info(f"Co-creation complete for user {user.clerk_id}. "
-               f"Charged ${charge:.4f}, new balance ${new_balance:.4f}")
+    logger.info("Co-creation complete for user %(user)s. Charged $%(charge)s, new balance $%(balance)s",
+                {"user": user.clerk_id, "charge": from_micros(charge), "balance": from_micros(new_balance)})
 
     return CoCreateResponse(
         success=True,
         suggested_message=result["message"],
         usage=result["usage"],
-        remaining_credits=new_balance
+        remaining_credits=float(from_micros(new_balance))
     )
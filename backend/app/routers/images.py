@@ -0,0 +1,137 @@
+"""
+Images Router - Hash-first uploads
+
+POST /api/images/check - Which of these image hashes are already stored
+POST /api/images - Store screenshots, return their ids
+
+Clients hash each prepared screenshot, ask which ones the server already
+holds, upload only the rest, and then reference every image by id in
+POST /api/analyze. Repeat analyses of the same screenshots upload nothing.
+"""
+
+from fastapi import APIRouter, Body, Depends, File, HTTPException, UploadFile
+import asyncio
+import logging
+
+from app.core.metrics import metrics
+from app.services.auth import get_current_user, User
+from app.services.image_store import ImageError, ImageNotFound, ImageStore, StoredImage, is_image_id
+from app.db.supabase import SupabaseClient
+from app.dependencies import get_db, get_image_store
+from app.models.analysis import ImageCheckRequest, ImageCheckResponse, ImageUploadResponse, StoredImageInfo
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/images", tags=["images"])
+
+MAX_UPLOADS = 20
+
+
+@router.post("/check", response_model=ImageCheckResponse)
+async def check_images(
+    request: ImageCheckRequest = Body(...),
+    user: User = Depends(get_current_user),
+    db: SupabaseClient = Depends(get_db),
+    images: ImageStore = Depends(get_image_store)
+):
+    """
+    Split image hashes into those already stored for this user and those
+    to upload.
+
+    Only images this user has uploaded count as stored, so the answer never
+    reveals whether someone else uploaded an image.
+    """
+    hashes = list(dict.fromkeys(h.lower() for h in request.hashes))
+    valid = [h for h in hashes if is_image_id(h)]
+
+    try:
+        owned = await db.get_user_images(user.id, valid) if valid else set()
+        absent = set(await images.missing([h for h in valid if h in owned]))
+    except Exception as e:
+        logger.error(f"Error checking images for user {user.clerk_id}: {e}")
+        raise HTTPException(status_code=503, detail="Image store unavailable, please retry")
+
+    stored = [h for h in hashes if h in owned and h not in absent]
+    missing = [h for h in hashes if h not in owned or h in absent]
+
+    metrics.inc("image_check", len(stored), result="stored")
+    metrics.inc("image_check", len(missing), result="missing")
+    return ImageCheckResponse(stored=stored, missing=missing)
+
+
+@router.post("/", response_model=ImageUploadResponse)
+async def upload_images(
+    images: list[UploadFile] = File(..., description="Screenshots to store"),
+    user: User = Depends(get_current_user),
+    db: SupabaseClient = Depends(get_db),
+    store: ImageStore = Depends(get_image_store)
+):
+    """
+    Normalize and store screenshots for later reference by id.
+
+    The returned id is the SHA-256 of the stored bytes; for an image already
+    downscaled to the server's bounds it equals the hash of the upload.
+    """
+    if len(images) > MAX_UPLOADS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_UPLOADS} images per upload")
+
+    stored = await load_images(images, store, db, user)
+    return ImageUploadResponse(
+        success=True,
+        images=[StoredImageInfo(id=img.id, media_type=img.media_type, size=len(img.data)) for img in stored]
+    )
+
+
+async def load_images(
+    sources: list,
+    store: ImageStore,
+    db: SupabaseClient,
+    user: User,
+    known: frozenset[str] = frozenset()
+) -> list[StoredImage]:
+    """
+    Stored images for `sources` (uploads or image ids), in order: uploads
+    are normalized and written to the store, ids are read back from it.
+
+    Users may only reference images they have uploaded themselves; ids in
+    `known` have already been checked.
+    """
+    referenced = [s for s in sources if isinstance(s, str) and s not in known]
+    if referenced:
+        try:
+            owned = await db.get_user_images(user.id, referenced)
+        except Exception as e:
+            logger.error(f"Error checking stored images: {e}")
+            raise HTTPException(status_code=503, detail="Image store unavailable, please retry")
+        for image_id in referenced:
+            if image_id not in owned:
+                raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+
+    async def load(source) -> StoredImage:
+        if isinstance(source, str):
+            try:
+                return await store.get(source)
+            except ImageNotFound:
+                raise HTTPException(status_code=404, detail=f"Image not found: {source}")
+        try:
+            return await store.put(await source.read())
+        except ImageError as e:
+            logger.error(f"Error reading image {source.filename}: {e}")
+            raise HTTPException(status_code=400, detail=f"Invalid image file: {source.filename}")
+
+    try:
+        loaded = await asyncio.gather(*(load(source) for source in sources))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Image store error: {e}")
+        raise HTTPException(status_code=503, detail="Image store unavailable, please retry")
+
+    uploaded = [img.id for img, source in zip(loaded, sources) if not isinstance(source, str)]
+    if uploaded:
+        try:
+            await db.add_user_images(user.id, uploaded)
+        except Exception as e:
+            # The analysis still runs; these images just cannot be reused by id
+            logger.error(f"Error recording uploaded images: {e}")
+
+    return list(loaded)
@@ -0,0 +1,57 @@
+"""
+Webhooks Router - Payment provider callbacks
+
+POST /api/webhooks/stripe - Stripe events (credit top-ups)
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from typing import Optional
+import logging
+
+from app.config import get_settings
+from app.core.metrics import metrics
+from app.db.supabase import SupabaseClient
+from app.dependencies import get_db, get_stripe_processor
+from app.services.stripe_webhooks import StripeEventProcessor, WebhookSignatureError, verify_event
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+
+@router.post("/stripe")
+async def stripe_webhook(
+    request: Request,
+    stripe_signature: Optional[str] = Header(None),
+    db: SupabaseClient = Depends(get_db),
+    processor: StripeEventProcessor = Depends(get_stripe_processor)
+):
+    """
+    Receive a Stripe event.
+
+    The event is verified against STRIPE_WEBHOOK_SECRET, stored in the
+    inbox and acknowledged; credits are granted in the background. A
+    redelivered event is acknowledged without being stored again. When the
+    inbox cannot be written the endpoint answers 503 and Stripe retries.
+    """
+    secret = get_settings().stripe_webhook_secret
+    if not secret:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    payload = await request.body()
+    try:
+        event = verify_event(payload, stripe_signature, secret, get_settings().stripe_webhook_tolerance)
+    except WebhookSignatureError as e:
+        logger.warning(f"Rejected Stripe webhook: {e}")
+        metrics.inc("stripe_webhooks_rejected")
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    try:
+        new = await db.record_stripe_event(event)
+    except Exception as e:
+        logger.error(f"Error storing Stripe event {event['id']}: {e}")
+        raise HTTPException(status_code=503, detail="Event store unavailable, please retry")
+
+    metrics.inc("stripe_webhooks_received", type=event["type"], duplicate=not new)
+    if new:
+        processor.wake()
+    return {"received": True}
@@ -0,0 +1,120 @@
+"""
+Analysis Codec - zstd compression of stored analysis text
+
+Analyses are a few kilobytes of markdown that repeat the same section
+headings, dimension table and Rose Glass vocabulary, which is exactly what
+a trained zstd dictionary is for: the shared phrasing lives in the
+dictionary and each row stores only what is specific to it.
+
+Dictionaries are `*.zdict` files in `app/dictionaries/`, trained with
+`python -m benchmarks.analysis_compression --train`. New rows are
+compressed with the configured dictionary; every zstd frame records the id
+of the dictionary it was made with, so reads pick the right one and
+rows written under an older dictionary keep decompressing for as long as
+its file is kept. Never delete a dictionary that stored rows use.
+
+zstandard is imported on first use. Compressor objects are not safe for
+concurrent use across threads; the database client calls the codec from
+the event loop only.
+"""
+
+from pathlib import Path
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_DIR = Path(__file__).resolve().parent.parent / "dictionaries"
+DEFAULT_LEVEL = 9
+DEFAULT_DICTIONARY_SIZE = 16 * 1024
+
+
+class AnalysisCodecError(Exception):
+    """Stored analysis cannot be decompressed"""
+
+
+class AnalysisCodec:
+    """Compresses analysis text with a trained dictionary"""
+
+    def __init__(
+        self,
+        dictionary: Optional[str] = None,
+        directory: Path = DICTIONARY_DIR,
+        level: int = DEFAULT_LEVEL
+    ):
+        """
+        Args:
+            dictionary: Name of the dictionary new rows are compressed with
+                (`<directory>/<name>.zdict`); plain zstd when None
+            directory: Where dictionaries are loaded from; all of them are
+                available for reads
+            level: zstd compression level
+        """
+        self.dictionary = dictionary
+        self.directory = Path(directory)
+        self.level = level
+        self._compressor = None
+        self._decompressors: Optional[dict] = None
+        self.dict_id = 0
+
+    def _load(self) -> None:
+        import zstandard
+
+        dictionaries = {}
+        for path in sorted(self.directory.glob("*.zdict")):
+            zdict = zstandard.ZstdCompressionDict(path.read_bytes())
+            dictionaries[zdict.dict_id()] = (path.stem, zdict)
+
+        write_dict = None
+        if self.dictionary:
+            matches = [zdict for name, zdict in dictionaries.values() if name == self.dictionary]
+            if not matches:
+                raise FileNotFoundError(f"No dictionary {self.dictionary}.zdict in {self.directory}")
+            write_dict = matches[0]
+            self.dict_id = write_dict.dict_id()
+
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=write_dict)
+        self._decompressors = {
+            dict_id: zstandard.ZstdDecompressor(dict_data=zdict)
+            for dict_id, (_, zdict) in dictionaries.items()
+        }
+        self._decompressors[0] = zstandard.ZstdDecompressor()
+        logger.info(f"Analysis codec: {len(dictionaries)} dictionaries, writing with "
+                    f"{self.dictionary or 'none'} (id {self.dict_id})")
+
+    def compress(self, text: str) -> bytes:
+        if self._compressor is None:
+            self._load()
+        return self._compressor.compress(text.encode())
+
+    def decompress(self, data: bytes) -> str:
+        import zstandard
+
+        if self._decompressors is None:
+            self._load()
+        try:
+            dict_id = zstandard.get_frame_parameters(data).dict_id
+            decompressor = self._decompressors.get(dict_id)
+            if decompressor is None:
+                raise AnalysisCodecError(f"Analysis was compressed with unknown dictionary {dict_id}")
+            return decompressor.decompress(data).decode()
+        except zstandard.ZstdError as e:
+            raise AnalysisCodecError(f"Corrupt compressed analysis: {e}") from e
+
+
+def train_dictionary(samples: list[str], size: int = DEFAULT_DICTIONARY_SIZE) -> bytes:
+    """Train a zstd dictionary on sample analyses; returns the .zdict bytes"""
+    import zstandard
+
+    return zstandard.train_dictionary(size, [s.encode() for s in samples]).as_bytes()
+
+
+def to_bytea(data: bytes) -> str:
+    """PostgREST representation of a BYTEA value"""
+    return "\\x" + data.hex()
+
+
+def from_bytea(value: str) -> bytes:
+    if not value.startswith("\\x"):
+        raise AnalysisCodecError("Expected a hex-encoded BYTEA value")
+    return bytes.fromhex(value[2:])
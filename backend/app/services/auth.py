@@ -2,27 +2,162 @@
 Authentication Service - Clerk JWT Validation
 """
 
-from fastapi import Header, HTTPException
-from typing import Optional
-import jwt
+from collections import OrderedDict
+from fastapi import Depends, Header, HTTPException
+from functools import lru_cache
+from typing import NamedTuple, Optional
+import hmac
 import logging
+import time
+
+from app.config import get_settings
+from app.core.metrics import metrics
+from app.db.supabase import SupabaseClient
+from app.dependencies import get_db
+from app.services.pricing import from_micros
 
 logger = logging.getLogger(__name__)
 
 
 class User:
     """Authenticated user"""
-    def __init__(self, id: str, clerk_id: str, email: str):
+    def __init__(self, id: str, clerk_id: str, email: str, credits: Optional[int] = None, resolved: bool = True):
         self.id = id
         self.clerk_id = clerk_id
         self.email = email
+        # Balance in micro-dollars as of authentication (possibly cached);
+        # None when the database could not be asked
+        self.credits = credits
+        # False when `id` is a placeholder: the users row could not be
+        # looked up, so writes for this user go to the journal by clerk_id
+        self.resolved = resolved
+
+
+class CachedUser(NamedTuple):
+    id: str
+    credits: int
+    expires: float
+
+
+class UserCache:
+    """
+    Per-worker map of clerk_id -> (users.id, balance snapshot).
+
+    Entries are fresh for `ttl` seconds; the least recently used are
+    evicted beyond `max_size`. Balances are snapshots: a charge made by
+    this worker updates its entry, anything else (another worker, a
+    purchase) shows up when the entry expires.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, CachedUser]" = OrderedDict()
+
+    def get(self, clerk_id: str, allow_stale: bool = False) -> Optional[CachedUser]:
+        entry = self._entries.get(clerk_id)
+        if entry is None or (entry.expires < time.monotonic() and not allow_stale):
+            return None
+        self._entries.move_to_end(clerk_id)
+        return entry
+
+    def put(self, clerk_id: str, user_id: str, credits: int) -> None:
+        self._entries[clerk_id] = CachedUser(user_id, credits, time.monotonic() + self.ttl)
+        self._entries.move_to_end(clerk_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, clerk_id: str) -> None:
+        """Forget an entry, e.g. when its balance turned out to be wrong"""
+        self._entries.pop(clerk_id, None)
+
+    def update_balance(self, clerk_id: str, credits: int) -> None:
+        """Record a balance this worker has just seen, e.g. after a charge"""
+        entry = self._entries.get(clerk_id)
+        if entry is not None:
+            self._entries[clerk_id] = entry._replace(credits=credits)
+
+
+@lru_cache()
+def get_user_cache() -> UserCache:
+    """User cache for this worker"""
+    settings = get_settings()
+    return UserCache(ttl=settings.user_cache_ttl, max_size=settings.user_cache_size)
+
+
+async def resolve_user(db: SupabaseClient, clerk_id: str, email: Optional[str], fallback_id: str) -> User:
+    """
+    Map a Clerk user to its users row, creating it on first sight.
+
+    One `upsert_user` round trip on a cache miss, none on a hit. When the
+    database cannot answer, a stale cache entry is used; without one the
+    user keeps `fallback_id` (MVP behaviour without a database) and is
+    marked unresolved, so nothing is written under that placeholder id.
+    """
+    cache = get_user_cache()
+    display_email = email or "unknown@roseglass.dating"
+
+    entry = cache.get(clerk_id)
+    if entry is not None:
+        metrics.inc("user_cache", result="hit")
+        return User(id=entry.id, clerk_id=clerk_id, email=display_email, credits=entry.credits)
+
+    try:
+        row = await db.upsert_user(clerk_id, email)
+    except Exception as e:
+        entry = cache.get(clerk_id, allow_stale=True)
+        if entry is not None:
+            metrics.inc("user_cache", result="stale")
+            return User(id=entry.id, clerk_id=clerk_id, email=display_email, credits=entry.credits)
+        metrics.inc("user_cache", result="unresolved")
+        logger.warning("Could not resolve user %(user)s, continuing without a users row: %(error)s",
+                       {"user": clerk_id, "error": str(e)})
+        return User(id=fallback_id, clerk_id=clerk_id, email=display_email, resolved=False)
+
+    metrics.inc("user_cache", result="miss")
+    cache.put(clerk_id, row["id"], row["credits"])
+    return User(id=row["id"], clerk_id=clerk_id, email=display_email, credits=row["credits"])
+
+
+async def current_balance(db: SupabaseClient, user: User, needed: int) -> int:
+    """
+    Balance for a credit check of `needed` micro-dollars.
+
+    The snapshot from authentication is trusted when it covers `needed`; a
+    lower one may predate a purchase, so it is read again before anyone is
+    refused.
+    """
+    if user.credits is not None and user.credits >= needed:
+        return user.credits
+    user.credits = await db.get_user_credits(user.id)
+    return user.credits
+
+
+async def charge_refused(db: SupabaseClient, user: User, charge: int, kind: str, error: Exception) -> HTTPException:
+    """
+    402 for a charge the ledger rejected as more than the balance. The
+    cached balance that let the request through is dropped, and the
+    current one is read for the message.
+    """
+    metrics.inc("charge_refused", kind=kind)
+    logger.warning("Charge for user %(user)s refused: %(error)s", {"user": user.clerk_id, "error": str(error)})
+    get_user_cache().invalidate(user.clerk_id)
+    user.credits = None
+    detail = f"Insufficient credits. This costs ${from_micros(charge)}"
+    try:
+        detail += f", you have ${from_micros(await current_balance(db, user, charge))}"
+    except Exception as e:
+        logger.error("Error checking credits: %(error)s", {"error": str(e)})
+    return HTTPException(status_code=402, detail=detail, headers={"X-Required-Credits": str(from_micros(charge))})
 
 
 async def get_current_user(
-    authorization: Optional[str] = Header(None)
+    authorization: Optional[str] = Header(None),
+    db: SupabaseClient = Depends(get_db)
 ) -> User:
     """
-    Extract and validate user from Clerk JWT token.
+    Extract and validate user from Clerk JWT token, resolved to its users
+    row (see `resolve_user`).
 
     For development/testing, accepts:
     - Authorization: Bearer <clerk_jwt>
@@ -35,11 +170,7 @@ async def get_current_user(
     # Development mode - allow test user
     if authorization == "dev_test_user":
         logger.info("Using development test user")
-        return User(
-            id="test-user-id",
-            clerk_id="dev_test_clerk_id",
-            email="test@roseglass.dating"
-        )
+        return await resolve_user(db, "dev_test_clerk_id", "test@roseglass.dating", fallback_id="test-user-id")
 
     # Extract token
     try:
@@ -49,6 +180,9 @@ async def get_current_user(
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
 
+    # Deferred: pyjwt pulls in cryptography, only needed for real tokens
+    import jwt
+
     # Validate JWT (simplified for MVP - add proper Clerk validation in production)
     try:
         # In production, verify against Clerk's JWKS
@@ -61,18 +195,29 @@ async def get_current_user(
         if not clerk_id:
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        logger.info(f"Authenticated user: {clerk_id}")
-
-        # In production, get user from database
-        # For MVP, return user from token
-        return User(
-            id=clerk_id,  # Use clerk_id as id for now
-            clerk_id=clerk_id,
-            email=email or "unknown@roseglass.dating"
-        )
+        logger.info("Authenticated user: %(user)s", {"user": clerk_id})
 
     except jwt.DecodeError:
         raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
-        logger.error(f"Authentication error: {e}")
+        logger.error("Authentication error: %(error)s", {"error": str(e)})
         raise HTTPException(status_code=401, detail="Authentication failed")
+
+    return await resolve_user(db, clerk_id, email, fallback_id=clerk_id)
+
+
+async def require_admin(
+    x_admin_key: Optional[str] = Header(None)
+) -> None:
+    """
+    Guard for admin endpoints: requires `X-Admin-Key` to match ADMIN_API_KEY.
+
+    Admin endpoints answer 404 when no key is configured, so they do not
+    exist at all in deployments that have not opted in.
+    """
+    admin_key = get_settings().admin_api_key
+    if not admin_key:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, admin_key):
+        raise HTTPException(status_code=403, detail="Admin access required")
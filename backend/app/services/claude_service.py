@@ -4,50 +4,41 @@ Claude Service - The Rose Glass Analysis Engine
 This is where dating profiles are translated through the Rose Glass lens.
 """
 
-import anthropic
-from decimal import Decimal
-from typing import Optional
+from contextlib import nullcontext
+from typing import AsyncIterator, Optional, Union
+import asyncio
 import logging
+import time
 
+from app.core.metrics import metrics
 from app.prompts.system_prompt import ROSE_GLASS_DATING_SYSTEM_PROMPT
+from app.prompts.templates import (
+    ANALYSIS_REQUEST, COMPARISON_CONTEXT, CONVERSATION_SEPARATOR_BLOCK, DEEP_REQUEST, PROMPT_VERSION, TRIAGE_REQUEST
+)
+from app.services.model_router import ModelRouter, RequestFeatures, Route
+from app.services.pricing import PriceTable, from_micros, get_price_table
+from app.services.scheduler import FairScheduler
+from app.services.token_budget import TokenBudgetExceeded, TokenGovernor, estimate_input_tokens
 
 
 logger = logging.getLogger(__name__)
 
+STAGES = ("full", "triage", "deep")
 
-class CostTracker:
-    """
-    Track API costs and apply markup.
+# Output budget of a full or deep analysis
+ANALYSIS_MAX_TOKENS = 2500
 
-    Pricing per 1M tokens (as of January 2025):
-    - Sonnet 4: Input $3, Output $15
-    - Opus 4: Input $15, Output $75
-    """
+# Prompt-cache breakpoint (5 minute TTL, refreshed on every hit)
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHE_TTL = 300.0
 
-    PRICING = {
-        "claude-sonnet-4-20250514": {
-            "input": Decimal("0.003"),   # per 1K tokens
-            "output": Decimal("0.015"),
-        },
-        "claude-opus-4-20250514": {
-            "input": Decimal("0.015"),
-            "output": Decimal("0.075"),
-        }
-    }
-
-    def calculate_cost(
-        self,
-        model: str,
-        input_tokens: int,
-        output_tokens: int
-    ) -> Decimal:
-        """Calculate raw API cost in USD"""
-        prices = self.PRICING.get(model, self.PRICING["claude-sonnet-4-20250514"])
 
-        input_cost = (Decimal(input_tokens) / 1000) * prices["input"]
-        output_cost = (Decimal(output_tokens) / 1000) * prices["output"]
-
-        return input_cost + output_cost
+def _retry_after(response) -> float:
+    """Seconds from a 429's Retry-After header, or a short default"""
+    try:
+        return max(1.0, float(response.headers.get("retry-after", "")))
+    except (TypeError, ValueError):
+        return 5.0
 
 
 class ClaudeService:
@@ -58,84 +49,216 @@ class ClaudeService:
     and translate patterns through the Rose Glass framework.
     """
 
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.cost_tracker = CostTracker()
+    def __init__(
+        self,
+        api_key: str,
+        scheduler: Optional[FairScheduler] = None,
+        large_request_images: int = 4,
+        price_table: Optional[PriceTable] = None,
+        router: Optional[ModelRouter] = None,
+        triage_max_tokens: int = 700,
+        transport=None,
+        governor: Optional[TokenGovernor] = None
+    ):
+        # The anthropic SDK is the single heaviest import in the app; load it
+        # when the first service is built rather than when the module is
+        import anthropic
+
+        # `transport` (an httpx transport) swaps the network layer, e.g. for
+        # recorded responses in development and benchmarks
+        http_client = anthropic.DefaultAsyncHttpxClient(transport=transport) if transport else None
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, http_client=http_client)
+        self.pricing = price_table or get_price_table()
+        self.scheduler = scheduler or FairScheduler()
+        self.large_request_images = large_request_images
+        self.triage_max_tokens = triage_max_tokens
+        # Org-wide tokens-per-minute budget; unlimited when None
+        self.governor = governor
+
+        # Identical for every request, so it is always a prompt-cache prefix
+        self.system = [{
+            "type": "text",
+            "text": ROSE_GLASS_DATING_SYSTEM_PROMPT,
+            "cache_control": CACHE_CONTROL
+        }]
+        # Per model: until when this worker last saw the system prompt cached
+        self._cache_warm_until: dict[str, float] = {}
+
+        # Haiku for small requests, Sonnet by default, Opus on demand
+        self.router = router or ModelRouter()
+        self.default_model = self.router.model_for("standard")
+        self.premium_model = self.router.model_for("premium")
+
+        # Fail at startup, not after a paid API call, if a model has no price
+        for model in self.router.policy.models.values():
+            self.pricing.rates(model)
+
+    def route(
+        self,
+        profile_images: int,
+        conversation_images: int = 0,
+        user_context: Optional[str] = None,
+        use_premium: bool = False
+    ) -> Route:
+        """Pick the tier/model for a request from its shape and current load"""
+        features = RequestFeatures(
+            profile_images=profile_images,
+            conversation_images=conversation_images,
+            context_chars=len(user_context or ""),
+            use_premium=use_premium
+        )
+        return self.router.route(features, self.scheduler.queue_depths())
+
+    def route_for_model(self, model: str, reason: str) -> Route:
+        """Route that pins a known model, e.g. a deep pass following its triage"""
+        return self.router.route_model(model, reason)
 
-        # Use Sonnet for cost efficiency, Opus for complex analysis
-        self.default_model = "claude-sonnet-4-20250514"
-        self.premium_model = "claude-opus-4-20250514"
+    def lane_for(self, tier: str, image_count: int) -> str:
+        """Scheduler lane: model tier x request size"""
+        size = "large" if image_count > self.large_request_images else "small"
+        return f"{tier}:{size}"
 
     async def analyze_profile(
         self,
         images: list[str],
         user_context: Optional[str] = None,
         conversation_images: Optional[list[str]] = None,
-        use_premium: bool = False
+        use_premium: bool = False,
+        route: Optional[Route] = None,
+        stage: str = "full",
+        triage_text: Optional[str] = None,
+        shared_context: bool = False
     ) -> dict:
         """
         Analyze dating profile images through Rose Glass.
 
+        Stages:
+            full: every section in one call
+            triage: dimension readings, the tell and an opener only, with a
+                small output budget; the image prefix is marked for caching
+            deep: key translation, conversation analysis and next move,
+                continuing from `triage_text`. Sends the same system prompt
+                and images as the triage call, so while the cache is warm
+                (5 minutes) that prefix is billed at the cache-read rate
+
         Args:
             images: Base64 encoded profile screenshots
             user_context: Optional context about the user doing the analysis
             conversation_images: Optional conversation screenshots
             use_premium: Use Opus for more complex analysis
+            route: Routing decision made earlier (e.g. before admission);
+                routed here from the request itself when omitted
+            stage: "full", "triage" or "deep"
+            triage_text: Triage output a deep pass builds on
+            shared_context: Full stage only: send `user_context` in a
+                cache-marked block ahead of the images, so calls for
+                different profiles share that prefix (see compare_profiles)
 
         Returns:
             Analysis results with usage metrics
         """
-        model = self.premium_model if use_premium else self.default_model
+        import anthropic
 
-        logger.info(f"Analyzing profile with {model}, {len(images)} profile images, "
-                   f"{len(conversation_images) if conversation_images else 0} conversation images")
+        if stage not in STAGES:
+            raise ValueError(f"Unknown analysis stage: {stage}")
+        if stage == "deep" and not triage_text:
+            raise ValueError("A deep pass needs the triage analysis it continues")
 
-        # Build message content
-        content = self._build_message_content(
-            images,
-            user_context,
-            conversation_images
-        )
+        if route is None:
+            route = self.route(len(images), len(conversation_images or []), user_context, use_premium)
+        model = route.model
+
+        logger.info("Analyzing profile (%(stage)s) with %(model)s, %(profile_images)d profile images, "
+                    "%(conversation_images)d conversation images", {
+                        "stage": stage,
+                        "model": model,
+                        "profile_images": len(images),
+                        "conversation_images": len(conversation_images) if conversation_images else 0,
+                    })
 
+        messages = self._build_messages(stage, images, user_context, conversation_images, triage_text, shared_context)
+        max_tokens = self.triage_max_tokens if stage == "triage" else ANALYSIS_MAX_TOKENS
+
+        image_count = len(images) + len(conversation_images or [])
+
+        budget = nullcontext()
+        if self.governor:
+            input_estimate = estimate_input_tokens(messages, cached_prefix=stage == "deep")
+            budget = self.governor.reserve(model, input_estimate, max_tokens)
+
+        phase = "queued"
         try:
-            # Call Claude API
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=2500,
-                temperature=1.0,  # Allow creative interpretation
-                system=ROSE_GLASS_DATING_SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": content}]
-            )
+            # Call Claude API once the token budget has room and the fair
+            # scheduler grants an upstream slot
+            async with budget as reservation:
+                async with self.scheduler.slot(self.lane_for(route.tier, image_count)) as ticket:
+                    phase = "upstream"
+                    started = time.monotonic()
+                    response = await self.client.messages.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=1.0,  # Allow creative interpretation
+                        system=self.system,
+                        messages=messages
+                    )
+                    latency_ms = (time.monotonic() - started) * 1000
+                if reservation:
+                    reservation.used(
+                        response.usage.input_tokens + (getattr(response.usage, "cache_creation_input_tokens", None) or 0),
+                        response.usage.output_tokens
+                    )
 
             # Extract analysis text
             analysis_text = response.content[0].text
 
-            # Calculate costs
+            # Calculate cost and charge (markup comes from the price table)
             usage = response.usage
-            cost = self.cost_tracker.calculate_cost(
+            charge = self.pricing.price(
                 model=model,
                 input_tokens=usage.input_tokens,
-                output_tokens=usage.output_tokens
+                output_tokens=usage.output_tokens,
+                cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+                cache_read_tokens=getattr(usage, "cache_read_input_tokens", None) or 0
             )
 
-            # Apply 100% markup
-            charge = cost * 2
+            self.router.record(route, latency_ms, charge.cost_micros)
+            if getattr(usage, "cache_read_input_tokens", None) or getattr(usage, "cache_creation_input_tokens", None):
+                self._cache_warm_until[model] = time.monotonic() + CACHE_TTL
 
-            logger.info(f"Analysis complete. Input: {usage.input_tokens}, "
-                       f"Output: {usage.output_tokens}, Cost: ${float(cost):.4f}, "
-                       f"Charge: ${float(charge):.4f}")
+            logger.info("Analysis complete (%(tier)s/%(reason)s). Input: %(input_tokens)d, "
+                        "Output: %(output_tokens)d, Cost: $%(cost)s, Charge: $%(charge)s", {
+                            "tier": route.tier,
+                            "reason": route.reason,
+                            "input_tokens": usage.input_tokens,
+                            "output_tokens": usage.output_tokens,
+                            "cost": from_micros(charge.cost_micros),
+                            "charge": from_micros(charge.charge_micros),
+                        })
 
             return {
                 "analysis": analysis_text,
                 "model_used": model,
-                "usage": {
-                    "input_tokens": usage.input_tokens,
-                    "output_tokens": usage.output_tokens,
-                    "cost_usd": float(cost),
-                    "charge_usd": float(charge)
-                }
+                "stage": stage,
+                "usage": self._usage_dict(usage, charge, ticket.wait_ms, route)
             }
 
+        except asyncio.CancelledError:
+            # Caller went away: leaving the slot frees it, and cancelling the
+            # request closes its upstream connection
+            metrics.inc("claude_cancelled", tier=route.tier, phase=phase)
+            logger.info(f"Analysis ({stage}) cancelled while {phase}")
+            raise
+        except TokenBudgetExceeded:
+            metrics.inc("claude_shed", tier=route.tier)
+            raise
+        except anthropic.RateLimitError as e:
+            # Org limit hit despite the budget (other keys' traffic, limits
+            # set too high): back off and let the caller retry later
+            retry_after = _retry_after(e.response)
+            metrics.inc("upstream_rate_limited", model=model)
+            if self.governor:
+                self.governor.pause(model, retry_after)
+            raise TokenBudgetExceeded(model, "upstream", retry_after) from e
         except anthropic.APIError as e:
             logger.error(f"Claude API error: {e}")
             raise
@@ -143,95 +266,157 @@ class ClaudeService:
             logger.error(f"Unexpected error during analysis: {e}")
             raise
 
-    def _build_message_content(
+    async def compare_profiles(
         self,
+        profiles: list[list[str]],
+        user_context: Optional[str] = None,
+        use_premium: bool = False,
+        route: Optional[Route] = None
+    ) -> AsyncIterator[tuple[int, Union[dict, Exception]]]:
+        """
+        Full analyses of several profiles at once, for comparing matches.
+
+        Every profile goes to the same model with the same cache-marked
+        prefix (system prompt + `user_context`), so all but the first read
+        it from the prompt cache. A cache entry is only readable once the
+        response that writes it has started, so when this worker has not
+        seen the model's cache in the last 5 minutes the first profile runs
+        alone before the rest fan out.
+
+        Args:
+            profiles: Base64 encoded screenshots, one list per profile
+            user_context: Optional context about the user, shared by all
+            use_premium: Use Opus for every profile
+            route: Routing decision made earlier; routed for the largest
+                profile when omitted
+
+        Yields:
+            (index in `profiles`, analysis result or the exception it
+            failed with), in order of completion. Closing the iterator
+            cancels the analyses still running.
+        """
+        if route is None:
+            route = self.route(max(len(images) for images in profiles), 0, user_context, use_premium)
+
+        async def analyze(index: int) -> tuple[int, Union[dict, Exception]]:
+            try:
+                return index, await self.analyze_profile(
+                    images=profiles[index],
+                    user_context=user_context,
+                    use_premium=use_premium,
+                    route=route,
+                    shared_context=True
+                )
+            except Exception as e:
+                return index, e
+
+        pending: set[asyncio.Task] = set()
+        try:
+            first = 0
+            if len(profiles) > 1 and self._cache_warm_until.get(route.model, 0.0) <= time.monotonic():
+                metrics.inc("comparison_primed", tier=route.tier)
+                yield await analyze(0)
+                first = 1
+
+            pending = {asyncio.ensure_future(analyze(i)) for i in range(first, len(profiles))}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _usage_dict(usage, charge, queue_wait_ms: float, route: Route) -> dict:
+        """Usage block of a result; money in micro-dollars, USD floats for display"""
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "cost_micros": charge.cost_micros,
+            "charge_micros": charge.charge_micros,
+            "cost_usd": float(from_micros(charge.cost_micros)),
+            "charge_usd": float(from_micros(charge.charge_micros)),
+            "price_version": charge.price_version,
+            "prompt_version": PROMPT_VERSION,
+            "model_used": charge.model,
+            "model_tier": route.tier,
+            "queue_wait_ms": round(queue_wait_ms, 1)
+        }
+
+    async def close(self) -> None:
+        """Release the underlying HTTP connection pool."""
+        await self.client.close()
+
+    def _build_messages(
+        self,
+        stage: str,
         images: list[str],
         user_context: Optional[str],
-        conversation_images: Optional[list[str]]
+        conversation_images: Optional[list[str]],
+        triage_text: Optional[str],
+        shared_context: bool = False
     ) -> list[dict]:
-        """Build the message content with images and text."""
-        content = []
-
-        # Add profile images
-        for i, img_b64 in enumerate(images):
-            content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": self._detect_media_type(img_b64),
-                    "data": img_b64
-                }
-            })
-
-        # Add conversation images if provided
-        if conversation_images:
+        """
+        Messages for one stage; triage and deep share a cacheable image
+        prefix, the profiles of a comparison a cacheable context prefix
+        """
+        content = self._build_image_blocks(images, conversation_images)
+        has_conversation = bool(conversation_images)
+
+        if stage == "full":
+            if shared_context:
+                content.insert(0, {
+                    "type": "text",
+                    "text": COMPARISON_CONTEXT.render(user_context=user_context),
+                    "cache_control": CACHE_CONTROL
+                })
+                user_context = None
             content.append({
                 "type": "text",
-                "text": "\n---\n**CONVERSATION SCREENSHOTS FOLLOW:**\n"
+                "text": ANALYSIS_REQUEST.render(user_context=user_context, has_conversation=has_conversation)
             })
-            for img_b64 in conversation_images:
-                content.append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": self._detect_media_type(img_b64),
-                        "data": img_b64
-                    }
-                })
-
-        # Build the analysis request
-        analysis_request = self._build_analysis_request(
-            user_context,
-            has_conversation=bool(conversation_images)
-        )
+            return [{"role": "user", "content": content}]
 
+        content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
         content.append({
             "type": "text",
-            "text": analysis_request
+            "text": TRIAGE_REQUEST.render(user_context=user_context)
         })
+        messages = [{"role": "user", "content": content}]
 
-        return content
+        if stage == "deep":
+            messages += [
+                {"role": "assistant", "content": triage_text},
+                {"role": "user", "content": DEEP_REQUEST.render(has_conversation=has_conversation)},
+            ]
+        return messages
 
-    def _build_analysis_request(
+    def _build_image_blocks(
         self,
-        user_context: Optional[str],
-        has_conversation: bool
-    ) -> str:
-        """Build the analysis request prompt."""
-
-        request = "Analyze this dating profile through the Rose Glass framework.\n\n"
-
-        if user_context:
-            request += f"**User Context:** {user_context}\n\n"
-
-        request += """Provide:
-
-1. **Dimension Analysis Table** — Ψ, ρ, q, f with readings (0.0-1.0) and translations
-
-2. **Key Translation** — What are they actually filtering for? (2-3 sentences)
-
-3. **The Tell** — The ONE element that reveals the most about them
-
-4. **Suggested Opener** — Calibrated to their specific communication style, formatted as a quoted message
-"""
-
-        if has_conversation:
-            request += """
-5. **Conversation Analysis** — Investment level, trajectory, red/green flags
-
-6. **Next Move** — Clear recommendation on what to do/send next
-"""
+        images: list[str],
+        conversation_images: Optional[list[str]]
+    ) -> list[dict]:
+        """Profile images, then conversation images behind a separator"""
+        content = [self._image_block(img_b64) for img_b64 in images]
 
-        request += """
+        if conversation_images:
+            content.append(CONVERSATION_SEPARATOR_BLOCK)
+            content.extend(self._image_block(img_b64) for img_b64 in conversation_images)
 
-Remember:
-- Translation, not judgment
-- Multiple valid interpretations exist
-- Match their energy level in the opener
-- Be specific, reference actual profile elements
-- Never comment on physical appearance"""
+        return content
 
-        return request
+    def _image_block(self, img_b64: str) -> dict:
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": self._detect_media_type(img_b64),
+                "data": img_b64
+            }
+        }
 
     def _detect_media_type(self, base64_data: str) -> str:
         """Detect image media type from base64 content."""
@@ -0,0 +1,168 @@
+"""
+Image Packing - Fewer, fuller images per request
+
+Claude bills an image by its area, about width x height / 750 tokens,
+after scaling it down to fit MAX_EDGE and MAX_PIXELS, so no single image
+costs much more than ~1,500 tokens. Phone screenshots are tall and narrow
+and often framed by wide uniform margins, so a profile sent as five
+screenshots pays for five nearly full-size images.
+
+`pack_images` trims uniform margins off each screenshot, then tiles
+consecutive ones side by side into composites that fit those limits: a
+composite of two or three screenshots costs about what one did. The trade
+is resolution, as the model sees each tile smaller than it would see the
+screenshot alone. `min_scale` bounds it: a screenshot only joins a
+composite while the model would still see it at `min_scale` or more of
+its stand-alone linear size.
+
+Order is preserved (tiles read left to right, composites in sequence) and
+packing is deterministic, so the same screenshots always give the same
+composites and a deep pass still reads its triage's images from the
+prompt cache. CPU-bound: call off the event loop.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+import io
+import math
+
+from app.core.metrics import metrics
+from app.services.image_store import DEFAULT_MAX_EDGE, JPEG_QUALITY
+
+# Claude's image limits: longer edge, and area (~1.15 megapixels)
+MAX_EDGE = DEFAULT_MAX_EDGE
+MAX_PIXELS = 1_150_000
+PIXELS_PER_TOKEN = 750
+
+# Pixels between tiles, and kept around trimmed content
+GAP = 16
+PADDING = 8
+# Dark, so tile edges stay clear against light app backgrounds
+DIVIDER = (64, 64, 64)
+# Per-channel difference from the corner colour that counts as content
+MARGIN_TOLERANCE = 12
+
+
+def fit_scale(width: int, height: int) -> float:
+    """Factor Claude scales a width x height image by before reading it"""
+    return min(1.0, MAX_EDGE / max(width, height), math.sqrt(MAX_PIXELS / (width * height)))
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Approximate input tokens of a width x height image"""
+    scale = fit_scale(width, height)
+    return math.ceil(int(width * scale) * int(height * scale) / PIXELS_PER_TOKEN)
+
+
+@dataclass
+class _Tile:
+    image: "object"  # PIL.Image.Image, trimmed
+    data: bytes  # Original bytes, reused when the tile is sent alone and untrimmed
+    trimmed: bool
+    alone_scale: float  # Scale the untrimmed screenshot would be read at on its own
+
+
+@dataclass(frozen=True)
+class PackResult:
+    """Packed images and what packing did"""
+    images: list[bytes]
+    tiles: list[int]  # Screenshots in each image
+    tokens_before: int
+    tokens_after: int
+    min_scale: float  # Smallest tile scale relative to its stand-alone view
+
+
+def pack_images(images: list[bytes], min_scale: float = 0.7, max_tiles: int = 4) -> PackResult:
+    """
+    Pack screenshots into as few images as `min_scale` and `max_tiles`
+    allow. A screenshot left on its own is sent as it was unless it had
+    margins to trim.
+    """
+    # Deferred: Pillow is only needed once images arrive
+    from PIL import Image
+
+    tiles = [_tile(Image, data) for data in images]
+    tokens_before = sum(image_tokens(*Image.open(io.BytesIO(data)).size) for data in images)
+
+    groups: list[list[_Tile]] = []
+    for tile in tiles:
+        if groups and len(groups[-1]) < max_tiles and _tile_scale(groups[-1] + [tile]) >= min_scale:
+            groups[-1].append(tile)
+        else:
+            groups.append([tile])
+
+    packed = [_render(Image, group) for group in groups]
+    sizes = [Image.open(io.BytesIO(data)).size for data in packed]
+    result = PackResult(
+        images=packed,
+        tiles=[len(group) for group in groups],
+        tokens_before=tokens_before,
+        tokens_after=sum(image_tokens(*size) for size in sizes),
+        min_scale=min((_tile_scale(group) for group in groups), default=1.0)
+    )
+    metrics.inc("image_packing_images", len(images), stage="in")
+    metrics.inc("image_packing_images", len(packed), stage="out")
+    metrics.inc("image_packing_tokens_saved", max(0, result.tokens_before - result.tokens_after))
+    return result
+
+
+def _tile(Image, data: bytes) -> _Tile:
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    alone_scale = fit_scale(*image.size)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    box = _content_box(image)
+    trimmed = box is not None and box != (0, 0, *image.size)
+    if trimmed:
+        image = image.crop(box)
+    return _Tile(image=image, data=data, trimmed=trimmed, alone_scale=alone_scale)
+
+
+def _content_box(image) -> Optional[tuple[int, int, int, int]]:
+    """Bounding box of everything that differs from the corner colour, padded"""
+    from PIL import Image, ImageChops
+
+    background = Image.new("RGB", image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L")
+    box = diff.point(lambda v: 255 if v > MARGIN_TOLERANCE else 0).getbbox()
+    if box is None:
+        # Blank screenshot: nothing to trim to
+        return None
+    left, top, right, bottom = box
+    width, height = image.size
+    return max(0, left - PADDING), max(0, top - PADDING), min(width, right + PADDING), min(height, bottom + PADDING)
+
+
+def _canvas_size(group: list[_Tile]) -> tuple[int, int]:
+    width = sum(tile.image.size[0] for tile in group) + GAP * (len(group) - 1)
+    height = max(tile.image.size[1] for tile in group)
+    return width, height
+
+
+def _tile_scale(group: list[_Tile]) -> float:
+    """Smallest scale a tile of `group` is read at, relative to reading it alone"""
+    scale = fit_scale(*_canvas_size(group))
+    return min(scale / tile.alone_scale for tile in group)
+
+
+def _render(Image, group: list[_Tile]) -> bytes:
+    if len(group) == 1 and not group[0].trimmed:
+        return group[0].data
+
+    width, height = _canvas_size(group)
+    canvas = Image.new("RGB", (width, height), DIVIDER)
+    x = 0
+    for tile in group:
+        canvas.paste(tile.image, (x, 0))
+        x += tile.image.size[0] + GAP
+
+    # Scale to what Claude would read anyway, so it is not resized again
+    scale = fit_scale(width, height)
+    if scale < 1.0:
+        canvas = canvas.resize((int(width * scale), int(height * scale)), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    canvas.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
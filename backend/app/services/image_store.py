@@ -0,0 +1,277 @@
+"""
+Image Store - Content-addressed storage for profile screenshots
+
+Uploads are normalized once and written under the SHA-256 of the
+normalized bytes, so an image is stored once however often it is sent, and
+later requests (a deep pass, a premium re-run, a new conversation
+screenshot on the same profile) can reference it by id instead of
+uploading it again.
+
+Normalization is idempotent: a JPEG/PNG/WebP/GIF that is already within
+`max_edge` and `max_bytes` and needs no EXIF rotation is stored byte for
+byte; anything else is rotated, downscaled and re-encoded as JPEG, which
+is itself in bounds. A client that downscales to the same bounds before
+uploading therefore computes the same id the server stores it under.
+`max_edge` defaults to the long edge Claude resizes images to anyway, so
+normalizing does not change what the model sees or the tokens billed.
+
+Two backends:
+- LocalImageBackend: files under a directory (development, single host)
+- S3ImageBackend: any S3-compatible bucket; set an endpoint URL for MinIO
+  or another local stand-in. boto3 is imported on first use.
+"""
+
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Protocol
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Claude downscales anything with a longer edge than this before reading it
+DEFAULT_MAX_EDGE = 1568
+# Anthropic's per-image upload limit
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+JPEG_QUALITY = 85
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+_IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+_EXIF_ORIENTATION = 0x0112
+
+
+class ImageError(Exception):
+    """Upload is not a usable image"""
+
+
+class ImageNotFound(Exception):
+    """No stored image with this id"""
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    """A normalized image and its content address"""
+    id: str
+    data: bytes
+    media_type: str
+
+
+def is_image_id(value: str) -> bool:
+    return bool(_IMAGE_ID.match(value))
+
+
+def media_type_of(data: bytes) -> str:
+    """Media type from magic bytes"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"GIF8"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def normalize_image(
+    data: bytes,
+    max_edge: int = DEFAULT_MAX_EDGE,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> bytes:
+    """
+    Bytes to store for an upload (CPU-bound; call off the event loop).
+
+    Returns `data` unchanged when it is already in bounds, so
+    normalize_image(normalize_image(x)) == normalize_image(x).
+    """
+    # Deferred: Pillow is only needed once images arrive
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f"Unreadable image: {e}")
+
+    rotated = image.getexif().get(_EXIF_ORIENTATION, 1) != 1
+    if (image.format in _MEDIA_TYPES and not rotated
+            and max(image.size) <= max_edge and len(data) <= max_bytes):
+        return data
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+class ImageBackend(Protocol):
+    """Blob storage keyed by image id"""
+
+    async def exists(self, image_id: str) -> bool:
+        ...
+
+    async def read(self, image_id: str) -> Optional[bytes]:
+        """Stored bytes, or None"""
+        ...
+
+    async def write(self, image_id: str, data: bytes, media_type: str) -> None:
+        ...
+
+
+class LocalImageBackend:
+    """Images as files: <root>/<id[:2]>/<id>"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, image_id: str) -> Path:
+        return self.root / image_id[:2] / image_id
+
+    async def exists(self, image_id: str) -> bool:
+        return await asyncio.to_thread(self._path(image_id).exists)
+
+    async def read(self, image_id: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self._path(image_id).read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def write(self, image_id: str, data: bytes, media_type: str) -> None:
+        await asyncio.to_thread(self._write, self._path(image_id), data)
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        # Content-addressed: whoever stored it first stored the same bytes
+        if path.exists():
+            return
+        # Write-then-rename: a concurrent reader sees all of the image or
+        # none. The temporary name is unique, so concurrent writers of the
+        # same image (a duplicate upload, a double submit) never move each
+        # other's file away
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+            raise
+
+
+class S3ImageBackend:
+    """Images as objects in an S3-compatible bucket: <prefix><id>"""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "images/",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._client = None
+
+    @property
+    def client(self):
+        """boto3 S3 client, created on first use (credentials from the AWS_* environment)"""
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    async def exists(self, image_id: str) -> bool:
+        return await asyncio.to_thread(self._head, image_id)
+
+    async def read(self, image_id: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, image_id)
+
+    async def write(self, image_id: str, data: bytes, media_type: str) -> None:
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=self.prefix + image_id,
+            Body=data,
+            ContentType=media_type
+        )
+
+    def _head(self, image_id: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + image_id)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _get(self, image_id: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + image_id)
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+
+class ImageStore:
+    """Normalizes, addresses and stores images on a backend"""
+
+    def __init__(
+        self,
+        backend: ImageBackend,
+        max_edge: int = DEFAULT_MAX_EDGE,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.backend = backend
+        self.max_edge = max_edge
+        self.max_bytes = max_bytes
+
+    async def put(self, data: bytes) -> StoredImage:
+        """Normalize and store an upload; a no-op write if it is already stored"""
+        normalized = await asyncio.to_thread(normalize_image, data, self.max_edge, self.max_bytes)
+        image = StoredImage(
+            id=hashlib.sha256(normalized).hexdigest(),
+            data=normalized,
+            media_type=media_type_of(normalized)
+        )
+
+        if await self.backend.exists(image.id):
+            metrics.inc("image_store_writes", result="exists")
+        else:
+            await self.backend.write(image.id, image.data, image.media_type)
+            metrics.inc("image_store_writes", result="stored")
+        metrics.inc("image_store_bytes_saved", max(0, len(data) - len(normalized)))
+        return image
+
+    async def get(self, image_id: str) -> StoredImage:
+        if not is_image_id(image_id):
+            raise ImageNotFound(image_id)
+        data = await self.backend.read(image_id)
+        if data is None:
+            raise ImageNotFound(image_id)
+        metrics.inc("image_store_reads")
+        return StoredImage(id=image_id, data=data, media_type=media_type_of(data))
+
+    async def missing(self, image_ids: list[str]) -> list[str]:
+        """Ids from `image_ids` that are not stored"""
+        valid = [i for i in image_ids if is_image_id(i)]
+        found = dict(zip(valid, await asyncio.gather(*(self.backend.exists(i) for i in valid))))
+        return [i for i in image_ids if not found.get(i)]
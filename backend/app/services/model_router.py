@@ -0,0 +1,137 @@
+"""
+Model Router - Cheapest adequate model per request
+
+Every analysis is routed to one of three tiers:
+
+- fast: small requests (few images, no conversation, little context)
+- standard: everything else
+- premium: only when the client asks for it
+
+Under load, the router also sends mid-sized requests to the fast tier once
+the standard lanes of the fair scheduler are queueing or standard latency
+drifts above a threshold, trading some depth for responsiveness. Premium
+requests are never downgraded.
+
+Thresholds live in config (RoutingPolicy is built from Settings in
+app/dependencies.py). Each routing decision and the latency/cost of each
+completed call are recorded in the metrics registry, labelled by tier.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import logging
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("fast", "standard", "premium")
+
+# Weight of the newest observation in the per-tier latency average
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass(frozen=True)
+class RequestFeatures:
+    """What the router knows about a request before any upload is read"""
+    profile_images: int
+    conversation_images: int = 0
+    context_chars: int = 0
+    use_premium: bool = False
+
+    @property
+    def image_count(self) -> int:
+        return self.profile_images + self.conversation_images
+
+
+@dataclass(frozen=True)
+class Route:
+    """Routing decision"""
+    tier: str
+    model: str
+    reason: str
+
+
+@dataclass
+class RoutingPolicy:
+    """Tier models and the thresholds that pick between them"""
+    models: Dict[str, str] = field(default_factory=lambda: {
+        "fast": "claude-3-5-haiku-20241022",
+        "standard": "claude-sonnet-4-20250514",
+        "premium": "claude-opus-4-20250514",
+    })
+    fast_max_images: int = 2
+    fast_max_context_chars: int = 200
+    fast_with_conversation: bool = False
+    pressure_queue_depth: int = 4  # Queued standard calls that count as "under load"
+    pressure_latency_ms: float = 0.0  # Standard latency that counts as "under load" (0 = off)
+    pressure_max_images: int = 5  # Largest request moved to fast under load
+
+
+class ModelRouter:
+    """Picks a tier per request; tracks per-tier latency"""
+
+    def __init__(self, policy: Optional[RoutingPolicy] = None):
+        self.policy = policy or RoutingPolicy()
+        missing = [tier for tier in TIERS if tier not in self.policy.models]
+        if missing:
+            raise ValueError(f"Routing policy has no model for tiers: {', '.join(missing)}")
+        self._latency_ms: Dict[str, float] = {}
+
+    def model_for(self, tier: str) -> str:
+        return self.policy.models[tier]
+
+    def route(self, features: RequestFeatures, queue_depths: Optional[Dict[str, int]] = None) -> Route:
+        """Choose a tier for `features` given the scheduler's current queue depths"""
+        route = self._choose(features, queue_depths or {})
+        metrics.inc("route_requests", tier=route.tier, reason=route.reason)
+        return route
+
+    def route_model(self, model: str, reason: str) -> Route:
+        """Route pinned to `model`, labelled with the tier that serves it"""
+        tier = next((t for t in TIERS if self.policy.models[t] == model), "standard")
+        route = Route(tier, model, reason)
+        metrics.inc("route_requests", tier=route.tier, reason=route.reason)
+        return route
+
+    def record(self, route: Route, latency_ms: float, cost_micros: int) -> None:
+        """Feed back the upstream latency and cost of a completed call"""
+        previous = self._latency_ms.get(route.tier)
+        self._latency_ms[route.tier] = latency_ms if previous is None else (
+            previous + LATENCY_SMOOTHING * (latency_ms - previous)
+        )
+        metrics.observe("route_latency_ms", latency_ms, tier=route.tier)
+        metrics.observe("route_cost_micros", cost_micros, tier=route.tier)
+        metrics.inc("route_cost_micros_total", cost_micros, tier=route.tier)
+
+    def latency_ms(self, tier: str) -> Optional[float]:
+        """Smoothed upstream latency of a tier, if it has served anything"""
+        return self._latency_ms.get(tier)
+
+    def _choose(self, features: RequestFeatures, queue_depths: Dict[str, int]) -> Route:
+        policy = self.policy
+
+        if features.use_premium:
+            return Route("premium", policy.models["premium"], "requested")
+
+        if features.conversation_images and not policy.fast_with_conversation:
+            return Route("standard", policy.models["standard"], "conversation")
+
+        if (features.image_count <= policy.fast_max_images
+                and features.context_chars <= policy.fast_max_context_chars):
+            return Route("fast", policy.models["fast"], "small")
+
+        if features.image_count <= policy.pressure_max_images and self._under_pressure(queue_depths):
+            return Route("fast", policy.models["fast"], "load")
+
+        return Route("standard", policy.models["standard"], "default")
+
+    def _under_pressure(self, queue_depths: Dict[str, int]) -> bool:
+        policy = self.policy
+
+        queued = sum(depth for lane, depth in queue_depths.items() if lane.startswith("standard:"))
+        if policy.pressure_queue_depth and queued >= policy.pressure_queue_depth:
+            return True
+
+        latency = self._latency_ms.get("standard")
+        return bool(policy.pressure_latency_ms and latency and latency >= policy.pressure_latency_ms)
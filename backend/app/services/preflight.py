@@ -0,0 +1,200 @@
+"""
+Pre-flight - Screenshots not worth a vision call
+
+Blank captures, pocket shots, the same screenshot sent twice and camera
+photos picked by mistake are billed like any other image, and add
+nothing to an analysis. `screen_images` looks at each stored image at
+reduced resolution (a few milliseconds each) and leaves out:
+
+    blank      one flat colour, or almost no tonal information
+    dark       mostly black, e.g. a capture of a locked screen
+    duplicate  the same screenshot as an earlier one in the request, or
+               the same picture re-saved or re-encoded (a close difference
+               hash, confirmed pixel by pixel). Resized copies are usually
+               kept: at screening size they differ from the original as much
+               as two screens that differ by a word
+    photo      a camera aspect ratio (4:3, 3:2) with none of the flat UI
+               backgrounds a screenshot has. Opt-in: tablet screens are
+               4:3 too, and an iPad screenshot of a photo-heavy profile
+               looks the same, so it is not among DEFAULT_CHECKS
+
+Each check errs towards keeping the image: a skipped screenshot costs the
+user an analysis, a wasted image only costs tokens. CPU-bound: call off
+the event loop.
+"""
+
+from dataclasses import dataclass, field
+from typing import Collection, Optional
+import io
+import math
+
+from app.core.metrics import metrics
+from app.services.image_store import StoredImage
+
+CHECKS = ("blank", "dark", "duplicate", "photo")
+DEFAULT_CHECKS = ("blank", "dark", "duplicate")
+
+# Longer edge images are screened at
+SCREEN_EDGE = 400
+
+# blank: luminance spread below this, or histogram entropy (bits) below MIN_ENTROPY
+BLANK_STDDEV = 4.0
+MIN_ENTROPY = 0.5
+# dark: mean luminance below DARK_MEAN with almost nothing brighter than DARK_LIGHT
+DARK_MEAN = 24
+DARK_LIGHT = 48
+DARK_LIGHT_FRACTION = 0.005
+
+# duplicate: differing bits of the 256-bit difference hash that make two
+# images candidates, and the fraction of their pixels that may then differ
+# by more than DUPLICATE_PIXEL_DELTA (same-layout screens with different
+# text hash alike but fail this)
+HASH_SIZE = 16
+DUPLICATE_DISTANCE = 12
+DUPLICATE_PIXEL_DELTA = 40
+DUPLICATE_PIXEL_FRACTION = 0.001
+
+# photo: long/short edge within PHOTO_RATIO_TOLERANCE of a camera ratio, and
+# fewer than PHOTO_FLAT_FRACTION of pixels equal to their right neighbour
+CAMERA_RATIOS = (4 / 3, 3 / 2)
+PHOTO_RATIO_TOLERANCE = 0.02
+PHOTO_FLAT_FRACTION = 0.25
+
+
+@dataclass(frozen=True)
+class SkippedImage:
+    """An image left out, and why"""
+    id: str
+    reason: str
+    index: int  # Position in the screened list
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """What duplicates are recognised by"""
+    dhash: int
+    gray: "object"  # PIL.Image.Image, luminance at screening size
+
+
+@dataclass
+class Screening:
+    """What `screen_images` kept and skipped"""
+    kept: list[StoredImage]
+    skipped: list[SkippedImage]
+    fingerprints: list[Fingerprint] = field(default_factory=list)  # Of `kept`, for screening later images
+
+
+def screen_images(
+    images: list[StoredImage],
+    checks: Collection[str] = DEFAULT_CHECKS,
+    seen: Optional[list[Fingerprint]] = None
+) -> Screening:
+    """
+    Keep the images worth sending, in order.
+
+    `seen` holds the fingerprints of images screened earlier in the same
+    request (`Screening.fingerprints`), so e.g. a conversation screenshot
+    that repeats a profile screenshot counts as a duplicate.
+    """
+    seen_ids: set[str] = set()
+    fingerprints = list(seen or [])
+    screening = Screening(kept=[], skipped=[])
+
+    for index, image in enumerate(images):
+        if "duplicate" in checks and image.id in seen_ids:
+            reason = "duplicate"
+        else:
+            reason, fingerprint = _screen(image, checks, fingerprints)
+            if reason is None:
+                fingerprints.append(fingerprint)
+                screening.fingerprints.append(fingerprint)
+
+        if reason:
+            metrics.inc("preflight_skipped", reason=reason)
+            screening.skipped.append(SkippedImage(id=image.id, reason=reason, index=index))
+        else:
+            seen_ids.add(image.id)
+            screening.kept.append(image)
+    return screening
+
+
+def _screen(
+    image: StoredImage,
+    checks: Collection[str],
+    seen: list[Fingerprint]
+) -> tuple[Optional[str], Optional[Fingerprint]]:
+    """(reason to skip or None, fingerprint)"""
+    from PIL import Image, ImageChops
+
+    picture = Image.open(io.BytesIO(image.data))
+    width, height = picture.size
+    target = (width * SCREEN_EDGE // max(width, height), height * SCREEN_EDGE // max(width, height))
+    # JPEGs decode straight to a fraction of their size; other formats are
+    # box-reduced by the same factor, so a JPEG and its PNG re-save screen
+    # to the same pixels
+    picture.draft("L", target)
+    gray = picture.convert("L")
+    if picture.format != "JPEG":
+        factor = 1
+        while factor < 8 and width // (factor * 2) >= target[0] and height // (factor * 2) >= target[1]:
+            factor *= 2
+        if factor > 1:
+            gray = gray.reduce(factor)
+    if max(gray.size) > SCREEN_EDGE:
+        gray.thumbnail((SCREEN_EDGE, SCREEN_EDGE), Image.Resampling.BOX)
+
+    histogram = gray.histogram()
+    pixels = gray.size[0] * gray.size[1]
+    mean = sum(value * count for value, count in enumerate(histogram)) / pixels
+    stddev = math.sqrt(max(0.0, sum((value - mean) ** 2 * count for value, count in enumerate(histogram)) / pixels))
+    entropy = -sum(count / pixels * math.log2(count / pixels) for count in histogram if count)
+
+    if ("blank" in checks or "dark" in checks) and (stddev < BLANK_STDDEV or entropy < MIN_ENTROPY):
+        if mean < DARK_MEAN and "dark" in checks:
+            return "dark", None
+        if "blank" in checks:
+            return "blank", None
+    if "dark" in checks and mean < DARK_MEAN and sum(histogram[DARK_LIGHT:]) / pixels < DARK_LIGHT_FRACTION:
+        return "dark", None
+
+    fingerprint = Fingerprint(dhash=_difference_hash(gray), gray=gray)
+    if "duplicate" in checks and any(_same_picture(fingerprint, other) for other in seen):
+        return "duplicate", fingerprint
+
+    if "photo" in checks:
+        ratio = max(width, height) / min(width, height)
+        if any(abs(ratio - camera) <= camera * PHOTO_RATIO_TOLERANCE for camera in CAMERA_RATIOS):
+            w, h = gray.size
+            steps = ImageChops.difference(gray.crop((1, 0, w, h)), gray.crop((0, 0, w - 1, h)))
+            if steps.histogram()[0] / ((w - 1) * h) < PHOTO_FLAT_FRACTION:
+                return "photo", fingerprint
+
+    return None, fingerprint
+
+
+def _same_picture(a: Fingerprint, b: Fingerprint) -> bool:
+    if bin(a.dhash ^ b.dhash).count("1") > DUPLICATE_DISTANCE:
+        return False
+    (aw, ah), (bw, bh) = a.gray.size, b.gray.size
+    if abs(aw / ah - bw / bh) > 0.02 * aw / ah:
+        return False
+
+    from PIL import Image, ImageChops
+
+    other = b.gray if b.gray.size == a.gray.size else b.gray.resize(a.gray.size, Image.Resampling.BOX)
+    histogram = ImageChops.difference(a.gray, other).histogram()
+    return sum(histogram[DUPLICATE_PIXEL_DELTA:]) / (aw * ah) <= DUPLICATE_PIXEL_FRACTION
+
+
+def _difference_hash(gray) -> int:
+    """Bit per adjacent pair of a (HASH_SIZE+1) x HASH_SIZE thumbnail: is the left one brighter"""
+    from PIL import Image
+
+    small = gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    values = small.tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = values[row * (HASH_SIZE + 1) + col]
+            bits = (bits << 1) | (left > values[row * (HASH_SIZE + 1) + col + 1])
+    return bits
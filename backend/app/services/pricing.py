@@ -0,0 +1,210 @@
+"""
+Pricing Engine - Versioned price table and charge calculation
+
+Money is integer micro-dollars (1 USD = 1_000_000) everywhere in the
+backend. USD decimals only appear at the edges: `to_micros` when reading
+balances from the database, `from_micros` when writing DECIMAL columns or
+building API responses.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+import json
+import logging
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MICROS_PER_USD = 1_000_000
+
+# Smallest balance that can start a paid request ($0.02)
+MINIMUM_BALANCE_MICROS = 20_000
+
+# Rates are stored as micro-dollars per million tokens, so tokens x rate is an
+# exact integer in units of 1e-12 USD; we round once, when converting a whole
+# request to micro-dollars
+_RATE_SCALE = 1_000_000
+_BASIS_POINTS = 10_000
+
+# Prices in USD per million tokens, as published by Anthropic
+DEFAULT_PRICE_TABLE = {
+    "version": "2025-05-14",
+    "markup": {
+        "multiplier": "2.0",
+        "minimum_charge_usd": "0",
+    },
+    "models": {
+        "claude-sonnet-4-20250514": {
+            "input": "3.00", "output": "15.00", "cache_write": "3.75", "cache_read": "0.30",
+        },
+        "claude-opus-4-20250514": {
+            "input": "15.00", "output": "75.00", "cache_write": "18.75", "cache_read": "1.50",
+        },
+        "claude-3-5-haiku-20241022": {
+            "input": "0.80", "output": "4.00", "cache_write": "1.00", "cache_read": "0.08",
+        },
+    },
+}
+
+
+class PricingError(Exception):
+    """Malformed price table or a model with no price"""
+
+
+def to_micros(value: Union[str, float, int, Decimal]) -> int:
+    """USD amount (as stored in DECIMAL columns) to integer micro-dollars"""
+    try:
+        amount = Decimal(str(value)) * MICROS_PER_USD
+    except InvalidOperation:
+        raise PricingError(f"Not a USD amount: {value!r}")
+    return int(amount.to_integral_value(ROUND_HALF_UP))
+
+
+def from_micros(micros: int) -> Decimal:
+    """Integer micro-dollars to an exact USD Decimal (6 places)"""
+    return Decimal(micros).scaleb(-6)
+
+
+def _ceil_div(numerator: int, denominator: int) -> int:
+    return -(-numerator // denominator)
+
+
+@dataclass(frozen=True)
+class ModelRates:
+    """Per-token rates for one model, in micro-dollars per million tokens"""
+    input: int
+    output: int
+    cache_write: int
+    cache_read: int
+
+    def scaled(self, factor: Decimal) -> "ModelRates":
+        return ModelRates(*(
+            int((Decimal(rate) * factor).to_integral_value(ROUND_HALF_UP))
+            for rate in (self.input, self.output, self.cache_write, self.cache_read)
+        ))
+
+
+@dataclass(frozen=True)
+class Charge:
+    """Priced usage of one request"""
+    model: str
+    price_version: str
+    cost_micros: int    # What Anthropic bills us
+    charge_micros: int  # What we bill the user
+
+
+class PriceTable:
+    """
+    Immutable, versioned price table.
+
+    Built once from config; every rate is converted to an integer when the
+    table is loaded, so pricing a request is a handful of integer
+    multiplications. Unknown models raise instead of being priced as some
+    other model.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        models: dict[str, ModelRates],
+        batch_models: dict[str, ModelRates],
+        markup_bps: int,
+        minimum_charge_micros: int = 0
+    ):
+        self.version = version
+        self.models = models
+        self.batch_models = batch_models
+        self.markup_bps = markup_bps
+        self.minimum_charge_micros = minimum_charge_micros
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PriceTable":
+        """
+        Parse a price table.
+
+        Model rates are USD per million tokens; `batch` rates default to
+        `batch_discount` (0.5) of the interactive rates.
+        """
+        try:
+            version = str(data["version"])
+            markup = data.get("markup", {})
+            multiplier = Decimal(str(markup.get("multiplier", "1")))
+            minimum = to_micros(markup.get("minimum_charge_usd", "0"))
+
+            models, batch_models = {}, {}
+            for model, prices in data["models"].items():
+                rates = ModelRates(
+                    input=to_micros(prices["input"]),
+                    output=to_micros(prices["output"]),
+                    cache_write=to_micros(prices.get("cache_write", prices["input"])),
+                    cache_read=to_micros(prices.get("cache_read", prices["input"])),
+                )
+                models[model] = rates
+                batch_models[model] = rates.scaled(Decimal(str(prices.get("batch_discount", "0.5"))))
+        except (KeyError, TypeError, AttributeError, InvalidOperation) as e:
+            raise PricingError(f"Invalid price table: {e!r}")
+
+        if multiplier < 1:
+            raise PricingError(f"Markup multiplier {multiplier} would sell below cost")
+
+        markup_bps = int((multiplier * _BASIS_POINTS).to_integral_value(ROUND_HALF_UP))
+        return cls(version, models, batch_models, markup_bps, minimum)
+
+    def rates(self, model: str, batch: bool = False) -> ModelRates:
+        table = self.batch_models if batch else self.models
+        try:
+            return table[model]
+        except KeyError:
+            raise PricingError(f"No price for model {model} in price table {self.version}")
+
+    def price(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        batch: bool = False
+    ) -> Charge:
+        """Cost and marked-up charge for one request, rounded up to the micro-dollar"""
+        rates = self.rates(model, batch)
+        exact = (
+            input_tokens * rates.input
+            + output_tokens * rates.output
+            + cache_write_tokens * rates.cache_write
+            + cache_read_tokens * rates.cache_read
+        )
+
+        cost = _ceil_div(exact, _RATE_SCALE)
+        charge = _ceil_div(exact * self.markup_bps, _RATE_SCALE * _BASIS_POINTS)
+
+        return Charge(
+            model=model,
+            price_version=self.version,
+            cost_micros=cost,
+            charge_micros=max(charge, self.minimum_charge_micros)
+        )
+
+
+def load_price_table(path: Optional[str] = None) -> PriceTable:
+    """Price table from a JSON file, or the built-in table"""
+    if path is None:
+        return PriceTable.from_dict(DEFAULT_PRICE_TABLE)
+
+    try:
+        data = json.loads(Path(path).read_text())
+    except (OSError, ValueError) as e:
+        raise PricingError(f"Cannot read price table {path}: {e}")
+    return PriceTable.from_dict(data)
+
+
+@lru_cache()
+def get_price_table() -> PriceTable:
+    """Get cached price table (loaded once per worker)"""
+    table = load_price_table(get_settings().pricing_table_path)
+    logger.info(f"Loaded price table {table.version} ({len(table.models)} models)")
+    return table
@@ -0,0 +1,256 @@
+"""
+Rate Limiting and Admission Control
+
+Protects the expensive endpoints (multi-image vision calls plus DB round
+trips) from being monopolized by one user or overwhelming the worker:
+
+1. Token buckets cap request *rate* per user and globally.
+2. Concurrency slots cap requests *in flight* per user, per model and
+   globally. Per-user slots reject immediately; model and global slots let
+   requests wait in a bounded queue for up to `max_wait` seconds.
+
+Anything that cannot be admitted raises RateLimitExceeded carrying a
+Retry-After hint, which the routers turn into HTTP 429.
+
+Two shared-state backends:
+- InMemoryBackend: per worker process, zero latency. Limits are effectively
+  multiplied by the worker count.
+- DatabaseBackend: Postgres functions from migration 004, shared by every
+  worker. Falls back to the in-memory backend if the database is
+  unreachable, so an outage degrades limiting rather than the API.
+"""
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional, Protocol
+import asyncio
+import logging
+import time
+import uuid
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, scope: str, reason: str, retry_after: float):
+        self.scope = scope
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{reason} limit exceeded for {scope}, retry after {retry_after:.1f}s")
+
+
+class RateLimitBackend(Protocol):
+    """Shared state for token buckets and concurrency slots"""
+
+    async def take_tokens(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1.0) -> float:
+        """Take `cost` tokens; return 0 if granted, else seconds until they would be"""
+        ...
+
+    async def try_acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        """Take one of `limit` slots; return a lease id, or None if all are taken"""
+        ...
+
+    async def release(self, key: str, lease_id: str) -> None:
+        """Return a slot taken by `try_acquire`"""
+        ...
+
+
+class InMemoryBackend:
+    """Token buckets and slots held in this worker's memory"""
+
+    def __init__(self):
+        self._buckets: Dict[str, tuple[float, float]] = {}  # key -> (tokens, updated_at)
+        self._leases: Dict[str, set[str]] = {}
+
+    async def take_tokens(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            return 0.0
+
+        self._buckets[key] = (tokens, now)
+        return (cost - tokens) / refill_per_sec
+
+    async def try_acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        # ttl only matters for shared backends, where a crashed worker
+        # cannot release its leases; in-process leases die with the process
+        leases = self._leases.setdefault(key, set())
+        if len(leases) >= limit:
+            return None
+        lease_id = uuid.uuid4().hex
+        leases.add(lease_id)
+        return lease_id
+
+    async def release(self, key: str, lease_id: str) -> None:
+        self._leases.get(key, set()).discard(lease_id)
+
+
+class DatabaseBackend:
+    """Token buckets and slots shared across workers through Postgres"""
+
+    def __init__(self, db, fallback: Optional[InMemoryBackend] = None):
+        self.db = db
+        self.fallback = fallback or InMemoryBackend()
+        # Leases handed out by the fallback must be released there too
+        self._fallback_leases: set[str] = set()
+
+    async def take_tokens(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1.0) -> float:
+        try:
+            return await self.db.rate_limit_take(key, capacity, refill_per_sec, cost)
+        except Exception as e:
+            logger.warning(f"Rate limit backend unavailable, using in-memory buckets: {e}")
+            metrics.inc("rate_limit_backend_errors", op="take_tokens")
+            return await self.fallback.take_tokens(key, capacity, refill_per_sec, cost)
+
+    async def try_acquire(self, key: str, limit: int, ttl: float) -> Optional[str]:
+        try:
+            return await self.db.acquire_lease(key, limit, ttl)
+        except Exception as e:
+            logger.warning(f"Rate limit backend unavailable, using in-memory slots: {e}")
+            metrics.inc("rate_limit_backend_errors", op="try_acquire")
+            lease_id = await self.fallback.try_acquire(key, limit, ttl)
+            if lease_id:
+                self._fallback_leases.add(lease_id)
+            return lease_id
+
+    async def release(self, key: str, lease_id: str) -> None:
+        if lease_id in self._fallback_leases:
+            self._fallback_leases.discard(lease_id)
+            await self.fallback.release(key, lease_id)
+            return
+        try:
+            await self.db.release_lease(lease_id)
+        except Exception as e:
+            # The lease expires on its own after its ttl
+            logger.warning(f"Failed to release lease {lease_id}: {e}")
+            metrics.inc("rate_limit_backend_errors", op="release")
+
+
+@dataclass
+class AdmissionLimits:
+    """Configured limits; see `Settings.rate_limit_*` and `concurrency_*`"""
+    user_per_minute: float
+    user_burst: int
+    global_per_minute: float
+    global_burst: int
+    per_user: int
+    per_model: Dict[str, int]
+    default_per_model: int
+    global_concurrency: int
+    max_queue: int
+    max_wait: float
+    lease_ttl: float
+
+
+class AdmissionController:
+    """
+    Admit or reject expensive requests.
+
+    Usage:
+        async with admission.admit(user_id=user.id, model=model):
+            result = await claude.analyze_profile(...)
+    """
+
+    # How often a queued request re-checks a slot freed by another worker
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, backend: RateLimitBackend, limits: AdmissionLimits):
+        self.backend = backend
+        self.limits = limits
+        self._released = asyncio.Event()
+        self._queued: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, model: str):
+        """Hold rate tokens and concurrency slots for the duration of the block"""
+        await self._check_rates(user_id)
+
+        held: list[tuple[str, str, str]] = []  # (key, lease_id, scope)
+        started = time.monotonic()
+        try:
+            slots = [
+                # Cheapest rejection first: one user hogging their own slots
+                (f"user:{user_id}", "user", self.limits.per_user, False),
+                (f"model:{model}", f"model:{model}",
+                 self.limits.per_model.get(model, self.limits.default_per_model), True),
+                ("global", "global", self.limits.global_concurrency, True),
+            ]
+            for key, scope, limit, wait in slots:
+                lease_id = await self._acquire(key, scope, limit, wait)
+                held.append((key, lease_id, scope))
+
+            metrics.observe("admission_wait_ms", (time.monotonic() - started) * 1000)
+            for _, _, scope in held:
+                metrics.add("admission_active", 1, scope=scope)
+            try:
+                yield
+            finally:
+                for _, _, scope in held:
+                    metrics.add("admission_active", -1, scope=scope)
+        finally:
+            for key, lease_id, _ in held:
+                await self.backend.release(key, lease_id)
+            if held:
+                # Wake local waiters; they re-check their slot immediately
+                self._released.set()
+                self._released = asyncio.Event()
+
+    async def _check_rates(self, user_id: str) -> None:
+        checks = [
+            (f"rate:user:{user_id}", "user", self.limits.user_burst, self.limits.user_per_minute),
+            ("rate:global", "global", self.limits.global_burst, self.limits.global_per_minute),
+        ]
+        for key, scope, burst, per_minute in checks:
+            retry_after = await self.backend.take_tokens(key, burst, per_minute / 60.0)
+            if retry_after > 0:
+                metrics.inc("admission_rejected", scope=scope, reason="rate")
+                raise RateLimitExceeded(scope, "rate", retry_after)
+
+    async def _acquire(self, key: str, scope: str, limit: int, wait: bool) -> str:
+        lease_id = await self.backend.try_acquire(key, limit, self.limits.lease_ttl)
+        if lease_id:
+            return lease_id
+
+        if not wait:
+            metrics.inc("admission_rejected", scope=scope, reason="concurrency")
+            raise RateLimitExceeded(scope, "concurrency", self.limits.max_wait)
+
+        if self._queued.get(key, 0) >= self.limits.max_queue:
+            metrics.inc("admission_rejected", scope=scope, reason="queue_full")
+            raise RateLimitExceeded(scope, "queue", self.limits.max_wait)
+
+        self._queued[key] = self._queued.get(key, 0) + 1
+        metrics.add("admission_queue_depth", 1, scope=scope)
+        deadline = time.monotonic() + self.limits.max_wait
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.inc("admission_rejected", scope=scope, reason="timeout")
+                    raise RateLimitExceeded(scope, "concurrency", self.limits.max_wait)
+
+                # Woken immediately by local releases; polls for remote ones
+                try:
+                    await asyncio.wait_for(
+                        self._released.wait(), timeout=min(remaining, self.POLL_INTERVAL)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+                lease_id = await self.backend.try_acquire(key, limit, self.limits.lease_ttl)
+                if lease_id:
+                    return lease_id
+        finally:
+            self._queued[key] -= 1
+            metrics.add("admission_queue_depth", -1, scope=scope)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Requests currently waiting, by slot key"""
+        return {key: depth for key, depth in self._queued.items() if depth}
@@ -0,0 +1,217 @@
+"""
+Record/Replay Transport - Offline Anthropic responses for dev and benchmarks
+
+An httpx transport for the Anthropic client. Each Messages API request is
+reduced to a fingerprint - the request body with every image replaced by
+the SHA-256 of its bytes, hashed canonically - and responses are kept in a
+content-addressed store on disk:
+
+    <dir>/<fp[:2]>/<fp>.json   {"fingerprint", "request", "response", "latency_ms", ...}
+
+Modes (ANTHROPIC_REPLAY_MODE):
+- record: call the real API, store every successful response
+- replay: serve stored responses only; a miss answers 404 (not retried)
+- auto: replay when stored, otherwise record
+
+In replay, responses are delayed by the recorded latency, a fixed number
+of seconds, or not at all (ANTHROPIC_REPLAY_LATENCY = "recorded" | "<seconds>").
+The same request always gets the same analysis, which makes end-to-end
+runs deterministic, free and offline.
+"""
+
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay", "auto")
+
+# Describe the body as it came off the wire; `aread` has already decoded it
+_WIRE_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint_request(path: str, body: dict) -> tuple[str, dict]:
+    """
+    Fingerprint of a Messages API request, plus a readable summary.
+
+    Image data is replaced by its hash before hashing, so the fingerprint
+    is cheap to store and identical for identical uploads; everything else
+    in the body (model, prompts, max_tokens, cache_control, ...) counts.
+    """
+    image_hashes = []
+
+    def strip_images(value):
+        if isinstance(value, dict):
+            source = value.get("source")
+            if value.get("type") == "image" and isinstance(source, dict) and "data" in source:
+                digest = _sha256(source["data"].encode())
+                image_hashes.append(digest)
+                return {**value, "source": {**source, "data": digest}}
+            return {k: strip_images(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [strip_images(v) for v in value]
+        return value
+
+    canonical = strip_images(body)
+    encoded = json.dumps({"path": path, "body": canonical}, sort_keys=True, separators=(",", ":"))
+    summary = {
+        "path": path,
+        "model": body.get("model"),
+        "max_tokens": body.get("max_tokens"),
+        "prompt_hash": _sha256(json.dumps(
+            {"system": body.get("system"), "messages": canonical.get("messages")},
+            sort_keys=True
+        ).encode()),
+        "image_hashes": image_hashes,
+    }
+    return _sha256(encoded.encode()), summary
+
+
+class ReplayStore:
+    """Content-addressed JSON files, one per fingerprint"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def path(self, fingerprint: str) -> Path:
+        return self.directory / fingerprint[:2] / f"{fingerprint}.json"
+
+    def load(self, fingerprint: str) -> Optional[dict]:
+        try:
+            return json.loads(self.path(fingerprint).read_text())
+        except FileNotFoundError:
+            return None
+
+    def save(self, fingerprint: str, entry: dict) -> None:
+        # Write-then-rename so concurrent workers never read a partial
+        # file; the temporary name is unique, so concurrent recordings of
+        # the same request do not move each other's file away
+        path = self.path(fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(entry, indent=1))
+            os.replace(tmp, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+            raise
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Records or replays Anthropic Messages API calls.
+
+    Usage:
+        transport = ReplayTransport("replay", ".replay")
+        client = anthropic.AsyncAnthropic(
+            http_client=anthropic.DefaultAsyncHttpxClient(transport=transport)
+        )
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        directory: str,
+        latency: str = "recorded",
+        upstream: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Replay mode must be one of {', '.join(MODES)}, not {mode!r}")
+        self.mode = mode
+        self.store = ReplayStore(directory)
+        self.latency = latency
+        self.upstream = upstream or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or not request.url.path.endswith("/messages"):
+            return await self.upstream.handle_async_request(request)
+
+        body = json.loads(await request.aread())
+        fingerprint, summary = fingerprint_request(request.url.path, body)
+
+        if self.mode != "record":
+            entry = await asyncio.to_thread(self.store.load, fingerprint)
+            if entry is not None:
+                metrics.inc("replay_requests", result="hit")
+                await self._simulate_latency(entry)
+                return self._response(entry["response"], request)
+            if self.mode == "replay":
+                metrics.inc("replay_requests", result="miss")
+                message = (
+                    f"No recorded response for {summary['model']} request {fingerprint[:12]} "
+                    f"({len(summary['image_hashes'])} images) in {self.store.directory}"
+                )
+                logger.warning(message)
+                # An API-shaped 404 surfaces as anthropic.NotFoundError, which
+                # the SDK does not retry (a transport error would be)
+                return self._response({
+                    "status": 404,
+                    "content_type": "application/json",
+                    "body": {"type": "error", "error": {"type": "not_found_error", "message": message}},
+                }, request)
+
+        started = time.monotonic()
+        response = await self.upstream.handle_async_request(request)
+        content = await response.aread()
+        latency_ms = (time.monotonic() - started) * 1000
+
+        if response.is_success:
+            entry = {
+                "fingerprint": fingerprint,
+                "request": summary,
+                "response": {
+                    "status": response.status_code,
+                    "content_type": response.headers.get("content-type", "application/json"),
+                    "body": json.loads(content),
+                },
+                "latency_ms": round(latency_ms, 1),
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            await asyncio.to_thread(self.store.save, fingerprint, entry)
+            metrics.inc("replay_requests", result="recorded")
+
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _WIRE_HEADERS]
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request
+        )
+
+    async def aclose(self) -> None:
+        await self.upstream.aclose()
+
+    async def _simulate_latency(self, entry: dict) -> None:
+        if self.latency == "recorded":
+            delay = entry.get("latency_ms", 0.0) / 1000
+        else:
+            delay = float(self.latency)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _response(stored: dict, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            status_code=stored["status"],
+            headers={"content-type": stored["content_type"]},
+            content=json.dumps(stored["body"]).encode(),
+            request=request
+        )
@@ -0,0 +1,191 @@
+"""
+Stripe Webhooks - Verified inbox and batched credit top-ups
+
+The webhook endpoint only verifies the signature, writes the raw event to
+the `stripe_events` inbox (migration 011) keyed by event id, and answers
+200; Stripe's redeliveries of an event it already has are no-ops. Credits
+are granted afterwards by StripeEventProcessor, a background task per
+worker that claims pending events in batches (leased, SKIP LOCKED, so
+workers never process the same event at once) and fulfils each checkout
+with `fulfill_stripe_checkout`: ledger entry, transaction row and event
+status in one database transaction. The ledger entry is keyed by the
+checkout session, so a session is credited once however many events,
+retries or workers touch it.
+
+Checkout sessions identify the user with `client_reference_id` (users.id)
+or `metadata.user_id`, and may set `metadata.credits` (USD); otherwise the
+amount paid is credited (1 credit = $1).
+"""
+
+from typing import Optional
+import asyncio
+import json
+import logging
+
+from app.core.metrics import metrics
+from app.db.supabase import DatabaseUnavailable
+from app.services.pricing import from_micros, to_micros
+
+logger = logging.getLogger(__name__)
+
+FULFILLING_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+# Stripe amounts are in cents
+MICROS_PER_CENT = 10_000
+
+
+class WebhookSignatureError(Exception):
+    """The payload is not a Stripe event signed with our webhook secret"""
+
+
+class CheckoutError(Exception):
+    """A checkout event that cannot be fulfilled as sent"""
+
+
+def verify_event(payload: bytes, signature: Optional[str], secret: str, tolerance: int = 300) -> dict:
+    """Check the Stripe-Signature header of a webhook and parse its event"""
+    # Deferred: the stripe SDK is only needed when a webhook arrives
+    import stripe
+
+    try:
+        stripe.WebhookSignature.verify_header(payload.decode(), signature, secret, tolerance)
+        event = json.loads(payload)
+    except (stripe.SignatureVerificationError, UnicodeDecodeError, ValueError) as e:
+        raise WebhookSignatureError(str(e)) from e
+
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise WebhookSignatureError("Not a Stripe event")
+    return event
+
+
+def checkout_credit(event: dict) -> Optional[dict]:
+    """
+    Arguments for `fulfill_stripe_checkout` from a checkout event, or None
+    when the event grants nothing (not a checkout, or not paid yet).
+    """
+    if event["type"] not in FULFILLING_EVENTS:
+        return None
+
+    session = event["data"]["object"]
+    if session.get("payment_status") != "paid":
+        # Delayed payment methods: credited on async_payment_succeeded
+        return None
+
+    metadata = session.get("metadata") or {}
+    user_id = session.get("client_reference_id") or metadata.get("user_id")
+    if not user_id:
+        raise CheckoutError(f"Checkout session {session.get('id')} has no user")
+    if (session.get("currency") or "usd").lower() != "usd":
+        raise CheckoutError(f"Checkout session {session.get('id')} is not in USD")
+
+    amount_micros = int(session["amount_total"]) * MICROS_PER_CENT
+    credits_micros = to_micros(metadata["credits"]) if metadata.get("credits") else amount_micros
+    return {
+        "event_id": event["id"],
+        "user_id": user_id,
+        "session_id": session["id"],
+        "payment_intent": session.get("payment_intent"),
+        "amount_micros": amount_micros,
+        "credits_micros": credits_micros,
+    }
+
+
+class StripeEventProcessor:
+    """
+    Background fulfilment of the Stripe inbox for this worker.
+
+    Started with the worker when Stripe is configured, so events left by
+    other workers or a previous process are fulfilled without waiting for
+    the next webhook. Woken by the webhook endpoint after each new event,
+    and polls every `poll_interval` seconds. An event that keeps failing is marked failed after
+    `max_attempts` claims; one that failed because the database was
+    unavailable stays pending.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 20,
+        poll_interval: float = 30.0,
+        max_attempts: int = 5,
+        lease_seconds: int = 60
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background task, which processes the inbox at once"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def wake(self) -> None:
+        """Process the inbox now; starts the background task if needed"""
+        self.start()
+        self._wake.set()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                while await self.process_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Stripe inbox processing failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_batch(self) -> int:
+        """Claim and handle one batch of pending events; returns how many were claimed"""
+        events = await self.db.claim_stripe_events(self.batch_size, self.lease_seconds)
+        ignored = []
+
+        for row in events:
+            event = row["payload"]
+            try:
+                credit = checkout_credit(event)
+                if credit is None:
+                    ignored.append(row["id"])
+                    continue
+                balance = await self.db.fulfill_stripe_checkout(**credit)
+            except Exception as e:
+                await self._failed(row, e)
+                continue
+
+            metrics.inc("stripe_events_processed", type=row["type"])
+            logger.info(f"Credited ${from_micros(credit['credits_micros'])} to user {credit['user_id']} "
+                        f"for checkout {credit['session_id']}, new balance ${from_micros(balance)}")
+
+        if ignored:
+            await self.db.finish_stripe_events(ignored, "ignored")
+            metrics.inc("stripe_events_ignored", len(ignored))
+        return len(events)
+
+    async def _failed(self, row: dict, error: Exception) -> None:
+        """Keep a failed event pending for another attempt, or give up on it"""
+        final = isinstance(error, CheckoutError) or (
+            row["attempts"] >= self.max_attempts and not isinstance(error, DatabaseUnavailable)
+        )
+        logger.error(f"Stripe event {row['id']} ({row['type']}) failed"
+                     f"{' permanently' if final else ''}: {error}")
+        metrics.inc("stripe_events_failed", type=row["type"], final=final)
+        try:
+            await self.db.finish_stripe_events([row["id"]], "failed" if final else "pending", str(error))
+        except Exception as e:
+            # Still claimed; retried when the lease expires
+            logger.error(f"Error recording failure of Stripe event {row['id']}: {e}")
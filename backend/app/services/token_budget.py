@@ -0,0 +1,208 @@
+"""
+Token Budget - Org-wide tokens-per-minute governor for Anthropic calls
+
+Every worker shares one API key, and Anthropic enforces input and output
+tokens per minute (ITPM / OTPM) per model across the whole organization.
+A burst of 10-image analyses spread over several workers can blow through
+that even when each worker is well within its own concurrency limits, and
+the resulting 429s cascade through the SDK's retries.
+
+The governor keeps two token buckets per model, sized to one minute of the
+configured budget and refilled continuously, and takes an estimate of each
+call's tokens before it is sent. A call that does not fit waits for the
+buckets to refill, up to `max_wait`; one that would have to wait longer is
+shed with TokenBudgetExceeded before it reaches the API. Estimates are
+upper bounds (images at the maximum ~1600 tokens, output at max_tokens);
+the unused part is returned once the real usage is known. Prompt-cache
+reads do not count toward ITPM and are not estimated.
+
+Buckets live in a RateLimitBackend: in-memory per worker, or the shared
+Postgres buckets of migration 004 (`rate_limit_take`) for one budget
+across all workers. An upstream 429 pauses the model locally for its
+Retry-After.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+import asyncio
+import logging
+import time
+
+from app.core.metrics import metrics
+from app.services.rate_limiter import RateLimitBackend
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for one image at Claude's maximum resolution (~1.15 megapixels / 750)
+PER_IMAGE_TOKENS = 1600
+# Conservative for English markdown
+CHARS_PER_TOKEN = 3.5
+# Utilization window
+WINDOW_SECONDS = 60.0
+
+
+class TokenBudgetExceeded(Exception):
+    """A call cannot be sent within the token budget in time"""
+
+    def __init__(self, model: str, reason: str, retry_after: float):
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Token budget for {model} exhausted ({reason}), retry after {retry_after:.1f}s")
+
+
+@dataclass
+class TokenBudgetLimits:
+    """Per-model tokens per minute; see `Settings.token_budget_*`"""
+    input_tpm: Optional[int] = None
+    output_tpm: Optional[int] = None
+    max_wait: float = 10.0
+
+
+def estimate_input_tokens(messages: list[dict], cached_prefix: bool = False) -> int:
+    """
+    Upper-bound estimate of the uncached input tokens of `messages`.
+
+    With `cached_prefix`, everything up to the last cache breakpoint is
+    assumed to be read from the prompt cache (a deep pass right after its
+    triage). The system prompt is always cached and is not counted.
+    """
+    tokens = 0.0
+    for message in messages:
+        content = message["content"]
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        for block in blocks:
+            if block["type"] == "image":
+                tokens += PER_IMAGE_TOKENS
+            else:
+                tokens += len(block.get("text", "")) / CHARS_PER_TOKEN
+            if cached_prefix and "cache_control" in block:
+                tokens = 0.0
+    return int(tokens) + 1
+
+
+class Reservation:
+    """Tokens taken for one call; report actual usage with `used`"""
+
+    def __init__(self, model: str, input_tokens: int, output_tokens: int):
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.actual: Optional[tuple[int, int]] = None
+
+    def used(self, input_tokens: int, output_tokens: int) -> None:
+        self.actual = (input_tokens, output_tokens)
+
+
+class TokenGovernor:
+    """
+    Hold calls until the per-model token budget has room for them.
+
+    Usage:
+        async with governor.reserve(model, input_estimate, max_tokens) as reservation:
+            response = await client.messages.create(...)
+            reservation.used(response.usage.input_tokens, response.usage.output_tokens)
+
+    A reservation whose call fails keeps its tokens: the budget stays
+    pessimistic after errors rather than inviting a retry storm.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: TokenBudgetLimits):
+        self.backend = backend
+        self.limits = limits
+        self._paused_until: Dict[str, float] = {}
+        self._window: Dict[tuple[str, str], Deque[tuple[float, int]]] = {}
+        self._waiting = 0
+
+    def _buckets(self, model: str, input_tokens: int, output_tokens: int) -> list[tuple[str, str, int, int]]:
+        """(kind, key, tpm, cost) for each configured limit; costs capped at one minute's budget"""
+        buckets = []
+        for kind, tpm, cost in (("input", self.limits.input_tpm, input_tokens),
+                                ("output", self.limits.output_tpm, output_tokens)):
+            if tpm:
+                buckets.append((kind, f"tpm:{kind}:{model}", tpm, min(cost, tpm)))
+        return buckets
+
+    @asynccontextmanager
+    async def reserve(self, model: str, input_tokens: int, output_tokens: int):
+        reservation = await self._acquire(model, input_tokens, output_tokens)
+        try:
+            yield reservation
+        finally:
+            if reservation.actual is not None:
+                await self._settle(reservation)
+
+    async def _acquire(self, model: str, input_tokens: int, output_tokens: int) -> Reservation:
+        started = time.monotonic()
+        deadline = started + self.limits.max_wait
+        waiting = False
+        try:
+            while True:
+                now = time.monotonic()
+                retry_after = self._paused_until.get(model, 0.0) - now
+                if retry_after <= 0:
+                    retry_after = await self._take(model, input_tokens, output_tokens)
+                    if retry_after <= 0:
+                        break
+
+                if now + retry_after > deadline:
+                    metrics.inc("token_budget_shed", model=model)
+                    raise TokenBudgetExceeded(model, "budget", retry_after)
+
+                if not waiting:
+                    waiting = True
+                    self._waiting += 1
+                    metrics.set("token_budget_waiting", self._waiting)
+                await asyncio.sleep(retry_after)
+        finally:
+            if waiting:
+                self._waiting -= 1
+                metrics.set("token_budget_waiting", self._waiting)
+
+        metrics.observe("token_budget_wait_ms", (time.monotonic() - started) * 1000, model=model)
+        self._record(model, "input", input_tokens)
+        self._record(model, "output", output_tokens)
+        return Reservation(model, input_tokens, output_tokens)
+
+    async def _take(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        """Take from every bucket or none; 0 when granted, else seconds to wait"""
+        taken = []
+        for kind, key, tpm, cost in self._buckets(model, input_tokens, output_tokens):
+            retry_after = await self.backend.take_tokens(key, tpm, tpm / 60.0, cost)
+            if retry_after > 0:
+                for key, tpm, cost in taken:
+                    await self.backend.take_tokens(key, tpm, tpm / 60.0, -cost)
+                return retry_after
+            taken.append((key, tpm, cost))
+        return 0.0
+
+    async def _settle(self, reservation: Reservation) -> None:
+        """Return the part of the estimate the call did not use"""
+        actual_input, actual_output = reservation.actual
+        unused = {"input": max(0, reservation.input_tokens - actual_input),
+                  "output": max(0, reservation.output_tokens - actual_output)}
+        for kind, key, tpm, cost in self._buckets(reservation.model, unused["input"], unused["output"]):
+            if cost:
+                await self.backend.take_tokens(key, tpm, tpm / 60.0, -cost)
+            self._record(reservation.model, kind, -cost)
+        metrics.inc("token_budget_tokens", actual_input, kind="input", model=reservation.model)
+        metrics.inc("token_budget_tokens", actual_output, kind="output", model=reservation.model)
+
+    def pause(self, model: str, retry_after: float) -> None:
+        """Stop sending to `model` for `retry_after` seconds (after an upstream 429)"""
+        self._paused_until[model] = max(self._paused_until.get(model, 0.0), time.monotonic() + retry_after)
+        logger.warning(f"Upstream rate limit for {model}; pausing {retry_after:.1f}s")
+
+    def _record(self, model: str, kind: str, tokens: int) -> None:
+        """Tokens this worker reserved in the last minute, as a share of the budget"""
+        tpm = self.limits.input_tpm if kind == "input" else self.limits.output_tpm
+        if not tpm:
+            return
+        now = time.monotonic()
+        window = self._window.setdefault((model, kind), deque())
+        window.append((now, tokens))
+        while window and window[0][0] < now - WINDOW_SECONDS:
+            window.popleft()
+        metrics.set("token_budget_utilization", sum(t for _, t in window) / tpm, kind=kind, model=model)
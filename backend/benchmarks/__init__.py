@@ -0,0 +1 @@
+"""Backend benchmarks - run from the backend directory with `python -m benchmarks.<name>`"""
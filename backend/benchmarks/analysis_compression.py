@@ -0,0 +1,134 @@
+"""
+Analysis Compression Benchmark
+
+Reports storage and transfer savings of compressed analysis text on a
+sample corpus (benchmarks/analysis_corpus.py), and trains the dictionary
+the codec ships with.
+
+    python -m benchmarks.analysis_compression
+    python -m benchmarks.analysis_compression --corpus analyses.jsonl
+    python -m benchmarks.analysis_compression --corpus analyses.jsonl --train app/dictionaries/rose-glass-v2.zdict
+
+The corpus is split 80/20; dictionaries are trained on the first part and
+every figure is measured on the held-out part. Without --dictionary, one is
+trained in memory for the report.
+
+Storage is bytes at rest (TEXT vs BYTEA, before Postgres' own TOAST
+compression). Transfer is the JSON PostgREST returns: a row of history
+with and without the body column, and a detail read as TEXT vs hex BYTEA.
+"""
+
+from pathlib import Path
+from statistics import median
+import argparse
+import json
+import random
+import tempfile
+import time
+import uuid
+
+from app.services.analysis_codec import AnalysisCodec, to_bytea, train_dictionary
+from benchmarks.analysis_corpus import load_corpus
+
+HISTORY_PAGE = 20
+
+
+def history_row(text_columns: dict) -> dict:
+    """An analyses row as PostgREST returns it, with the given body columns"""
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        **text_columns,
+        "input_tokens": 3121,
+        "output_tokens": 742,
+        "cost_usd": "0.020493",
+        "charge_usd": "0.030740",
+        "model_used": "claude-sonnet-4-20250514",
+        "price_version": "2025-05-14",
+        "stage": "full",
+        "parent_id": None,
+        "cache_read_tokens": 0,
+        "cache_write_tokens": 0,
+        "image_hashes": ["0" * 64] * 3,
+        "conversation_image_hashes": [],
+        "created_at": "2025-06-01T12:00:00.000000",
+    }
+
+
+def json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode())
+
+
+def per_row_us(fn, items: list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analysis text compression savings")
+    parser.add_argument("--corpus", help="JSONL export with an analysis_text field; synthetic when omitted")
+    parser.add_argument("--size", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--dictionary", help="Existing .zdict to evaluate")
+    parser.add_argument("--dict-size", type=int, default=16 * 1024)
+    parser.add_argument("--level", type=int, default=9)
+    parser.add_argument("--train", metavar="PATH", help="Write a dictionary trained on the corpus here")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.size, args.seed)
+    random.Random(args.seed).shuffle(corpus)
+    split = int(len(corpus) * 0.8)
+    train, test = corpus[:split], corpus[split:]
+
+    if args.dictionary:
+        dictionary = Path(args.dictionary).read_bytes()
+    else:
+        dictionary = train_dictionary(train, args.dict_size)
+    if args.train:
+        Path(args.train).write_bytes(dictionary)
+        print(f"Wrote {len(dictionary)} byte dictionary to {args.train}\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        (Path(directory) / "eval.zdict").write_bytes(dictionary)
+        plain = AnalysisCodec(None, directory, args.level)
+        trained = AnalysisCodec("eval", directory, args.level)
+
+        raw = [len(text.encode()) for text in test]
+        packed_plain = [plain.compress(text) for text in test]
+        packed = [trained.compress(text) for text in test]
+        assert all(trained.decompress(blob) == text for blob, text in zip(packed, test))
+
+        total_raw = sum(raw)
+        total_plain = sum(len(blob) for blob in packed_plain)
+        total_dict = sum(len(blob) for blob in packed)
+
+        print(f"Corpus: {len(corpus)} analyses ({'synthetic' if not args.corpus else args.corpus}), "
+              f"{len(test)} held out, median {median(raw):.0f} bytes\n")
+        print("Storage (held-out rows)")
+        print(f"  {'TEXT':<22} {total_raw:>10} bytes")
+        print(f"  {'zstd':<22} {total_plain:>10} bytes  {total_raw / total_plain:5.2f}x")
+        print(f"  {'zstd + dictionary':<22} {total_dict:>10} bytes  {total_raw / total_dict:5.2f}x  "
+              f"(+{len(dictionary)} byte dictionary, once)")
+
+        page = list(zip(test, packed))[:HISTORY_PAGE]
+        full_page = json_size([history_row({"analysis_text": text}) for text, _ in page])
+        lean_page = json_size([history_row({}) for _ in page])
+        text_detail = median(json_size(history_row({"analysis_text": text})) for text in test)
+        zstd_detail = median(
+            json_size(history_row({"analysis_text": None, "analysis_zstd": to_bytea(blob)})) for blob in packed
+        )
+
+        print(f"\nTransfer (PostgREST JSON)")
+        print(f"  history page of {len(page):<8} {full_page:>10} bytes with bodies -> {lean_page} without "
+              f"({1 - lean_page / full_page:.0%} less)")
+        print(f"  detail read (median)     {text_detail:>10.0f} bytes as TEXT -> {zstd_detail:.0f} as hex BYTEA")
+
+        print(f"\nCPU per row")
+        print(f"  compress     {per_row_us(trained.compress, test):8.1f} us")
+        print(f"  decompress   {per_row_us(trained.decompress, packed):8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
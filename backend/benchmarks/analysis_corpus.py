@@ -0,0 +1,152 @@
+"""
+Analysis Corpus
+
+Rose Glass analyses for compression benchmarks and dictionary training.
+Real outputs can be loaded from a JSONL export (one object per line with
+an `analysis_text` field, e.g. `select analysis_text from analyses`
+exported from Supabase, decompressed). Without one, a synthetic corpus is
+generated: analyses in the shape the analysis/triage/deep prompts ask for,
+assembled from the system prompt's vocabulary with varied readings,
+observations and openers.
+"""
+
+from pathlib import Path
+from typing import Optional
+import json
+import random
+
+DIMENSIONS = [
+    ("Ψ", "Psi", [
+        "Consistent voice across prompts and photos",
+        "Outdoor photos and adventure prompts resonate harmonically",
+        "Professional photos clash with the 'not serious lol' prompt",
+        "Still assembling identity after a recent move",
+        "Scattered presentation, mixed signals between photos and prompts",
+        "Strong self-concept, every element points the same way",
+    ]),
+    ("ρ", "Rho", [
+        "Growth language ('I used to... now I...') shows reflection",
+        "Earned perspective, lightly worn",
+        "Descriptive rather than reflective, early in the journey",
+        "Healthcare work at a young age plus recovery rituals = knows her limits",
+        "Minimal depth markers, purely presentational",
+        "Has done the work, depth is available if invited",
+    ]),
+    ("q", "q", [
+        "Calm, low-activation energy with lots of softeners",
+        "'Match my energy' plus 'lol' softeners = hedged investment",
+        "Exclamation points and fire emojis = high activation",
+        "Moderate warmth, open but not urgent",
+        "Boundaries stated with heat, intensity seeker",
+        "Very low energy, minimal investment in the profile",
+    ]),
+    ("f", "f", [
+        "Strong friend-group orientation, group photos throughout",
+        "Faith community and family markers, knows their tribe",
+        "Independent identity, mostly solo photos",
+        "House parties and weekend socializing = social creature",
+        "Sports fandom as a tribal marker, filters for in-group",
+        "Flexible belonging, welcomes outsiders",
+    ]),
+]
+
+FILTERS = [
+    "someone who can keep up without performing",
+    "reciprocity: matched effort, not a charm offensive",
+    "stability and follow-through over excitement",
+    "a partner for adventures who also values quiet recovery time",
+    "playfulness first; depth is earned later",
+    "people who share their community and values",
+    "emotional availability, signalled through the growth language",
+]
+
+TELLS = [
+    "The lead photo is the goofy one, not the most attractive one.",
+    "The hiking photo caption undercuts its own seriousness.",
+    "The food prompt is low effort while every other prompt is careful.",
+    "'Match my energy' is a reciprocity filter, not an invitation.",
+    "No photos with friends despite a prompt about their friend group.",
+    "The only group photo is cropped to a single face.",
+    "The career is never mentioned, which is a deliberate omission.",
+]
+
+SUBJECTS = [
+    "the summit photo", "the dog in photo three", "the sourdough prompt", "the ski trip",
+    "the concert wristbands", "the 'unpopular opinion' answer", "the travel map", "the pottery class",
+    "the climbing gym photo", "the karaoke prompt", "the garden", "the road trip playlist",
+]
+
+OPENERS = [
+    "Okay, I need the full story behind {subject}.",
+    "Settle a debate for me: is {subject} as good as it looks?",
+    "I have questions about {subject} and I think you owe me answers.",
+    "{subject} is doing a lot of work on this profile. What's the story?",
+    "Be honest, how long did {subject} take?",
+]
+
+CONVERSATION = [
+    "**Conversation Analysis:** Investment is {level}. Response times are {timing} and "
+    "messages {length}. They have asked {questions} question(s), which reads as {reading}.\n\n"
+    "- Green flag: builds on your topics\n- {flag}\n",
+]
+LEVELS = ["high", "moderate", "cooling", "uneven"]
+TIMINGS = ["hours, which is normal", "within minutes", "stretching to days", "inconsistent"]
+LENGTHS = ["match yours", "are getting shorter", "exceed yours", "are brief but warm"]
+READINGS = ["extraction", "dialogue", "genuine interest"]
+FLAGS = [
+    "Red flag: questions about you have stopped",
+    "Green flag: they reference something from days ago",
+    "Red flag: emoji-only replies to direct questions",
+    "Green flag: they suggested a specific plan",
+]
+NEXT_MOVES = [
+    "Propose a specific, low-stakes plan that ties into {subject}.",
+    "Match their length and ask one question that invites a story.",
+    "Pull back slightly; let them carry the next exchange.",
+    "Name the thread you both enjoyed and suggest continuing it in person.",
+]
+
+
+def synthetic_analysis(rng: random.Random) -> str:
+    """One analysis; stage and sections vary like real traffic"""
+    stage = rng.choice(["full", "full", "triage", "deep"])
+    subject = rng.choice(SUBJECTS)
+    parts = []
+
+    if stage != "deep":
+        rows = "\n".join(
+            f"| {symbol} | {rng.uniform(0.15, 0.95):.2f} | {rng.choice(notes)} |"
+            for symbol, _, notes in DIMENSIONS
+        )
+        parts.append(
+            "**Rose Glass Analysis:**\n\n| Dimension | Reading | Translation |\n"
+            f"|-----------|---------|-------------|\n{rows}\n"
+        )
+    if stage != "triage":
+        parts.append(
+            f"**Key Translation:** Filtering for {rng.choice(FILTERS)}. "
+            f"The pattern across Ψ, ρ, q, f says they want {rng.choice(FILTERS)}.\n"
+        )
+    if stage != "deep":
+        parts.append(f"**The Tell:** {rng.choice(TELLS)}\n")
+        opener = rng.choice(OPENERS).format(subject=subject)
+        parts.append(f"**Suggested Opener:**\n> \"{opener[0].upper() + opener[1:]}\"\n")
+    if stage != "triage" and rng.random() < 0.5:
+        parts.append(rng.choice(CONVERSATION).format(
+            level=rng.choice(LEVELS), timing=rng.choice(TIMINGS), length=rng.choice(LENGTHS),
+            questions=rng.randint(0, 3), reading=rng.choice(READINGS), flag=rng.choice(FLAGS)
+        ))
+    if stage != "triage":
+        parts.append(f"**Next Move:** {rng.choice(NEXT_MOVES).format(subject=subject)}\n")
+
+    return "\n".join(parts)
+
+
+def load_corpus(path: Optional[str] = None, size: int = 2000, seed: int = 0) -> list[str]:
+    """Analyses from a JSONL export, or a synthetic corpus of `size`"""
+    if path:
+        lines = Path(path).read_text().splitlines()
+        return [json.loads(line)["analysis_text"] for line in lines if line.strip()]
+
+    rng = random.Random(seed)
+    return [synthetic_analysis(rng) for _ in range(size)]
@@ -0,0 +1,44 @@
+"""
+ASGI entrypoint for benchmarks
+
+The real application with the database dependency swapped for the
+in-memory stand-in. Point ANTHROPIC_BASE_URL at the fake API and run:
+
+    BENCH_DB_LATENCY=0.005 uvicorn benchmarks.bench_app:app
+"""
+
+import os
+import tempfile
+
+from app.config import get_settings
+from app.dependencies import get_db, get_image_store
+from app.main import app
+from app.services.analysis_codec import AnalysisCodec
+from app.services.image_store import ImageStore, LocalImageBackend
+from benchmarks.fakes import InMemoryDatabase
+
+settings = get_settings()
+database = InMemoryDatabase(
+    latency=float(os.getenv("BENCH_DB_LATENCY", "0.005")),
+    starting_credits=float(os.getenv("BENCH_STARTING_CREDITS", "1000000")),
+    codec=AnalysisCodec(
+        settings.analysis_dictionary, level=settings.analysis_compression_level
+    ) if settings.analysis_compression else None
+)
+
+# Stored images go to a scratch directory unless BENCH_IMAGE_DIR is set
+image_store = ImageStore(LocalImageBackend(
+    os.getenv("BENCH_IMAGE_DIR") or tempfile.mkdtemp(prefix="bench-images-")
+))
+
+
+async def _get_database() -> InMemoryDatabase:
+    return database
+
+
+async def _get_image_store() -> ImageStore:
+    return image_store
+
+
+app.dependency_overrides[get_db] = _get_database
+app.dependency_overrides[get_image_store] = _get_image_store
@@ -0,0 +1,152 @@
+"""
+Shared benchmark helpers: synthetic uploads, readiness checks, load driving
+and result statistics.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import asyncio
+import io
+import random
+import time
+
+import httpx
+
+
+def make_screenshot(seed: int, size: tuple[int, int] = (1170, 2532), fmt: str = "JPEG") -> bytes:
+    """Synthetic phone screenshot: noisy gradient, JPEG or PNG encoded"""
+    from PIL import Image
+
+    noise = Image.effect_noise(size, 40 + seed % 20).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    buf = io.BytesIO()
+    image = Image.blend(noise, gradient, 0.5)
+    if fmt == "JPEG":
+        image.save(buf, format="JPEG", quality=85)
+    else:
+        image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def bench_token(user: str) -> str:
+    """
+    Bearer token for a distinct benchmark user.
+
+    The MVP auth path decodes JWTs without verifying the signature, so any
+    signing key works; distinct users keep per-user limits from dominating.
+    """
+    import jwt
+
+    claims = {"sub": user, "email": f"{user}@bench.local"}
+    return jwt.encode(claims, "rose-glass-benchmark-signing-key", algorithm="HS256")
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    """Poll `url` until it answers 200"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready")
+
+
+async def wait_port(port: int, timeout: float = 10.0) -> None:
+    """Wait until something listens on 127.0.0.1:`port`"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size of a process in MiB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+@dataclass
+class LoadResult:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "throughput_rps": len(ordered) / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+        }
+
+
+async def drive(
+    url: str,
+    build_request: Callable[[int, random.Random], dict],
+    concurrency: int,
+    duration: float,
+    warmup: float = 0.0,
+    seed: int = 0
+) -> LoadResult:
+    """
+    Closed-loop load: `concurrency` clients posting back to back.
+
+    `build_request(client_index, rng)` returns httpx.post kwargs (files,
+    data, headers). Only 200 responses count towards latency; anything else
+    is tallied in `statuses`/`errors`. Requests finishing during `warmup`
+    are discarded.
+    """
+    result = LoadResult()
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def client_loop(index: int, client: httpx.AsyncClient):
+        rng = random.Random(seed * 10_000 + index)
+        while time.monotonic() < deadline:
+            begin = time.perf_counter()
+            try:
+                response = await client.post(url, **build_request(index, rng))
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            if time.monotonic() < measure_from:
+                continue
+            result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                result.latencies.append(time.perf_counter() - begin)
+            else:
+                result.errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300.0, limits=limits) as client:
+        await asyncio.gather(*(client_loop(i, client) for i in range(concurrency)))
+    result.elapsed = time.monotonic() - measure_from
+    return result
@@ -0,0 +1,213 @@
+"""
+Fake Anthropic Messages API for benchmarks
+
+Serves POST /v1/messages with a canned Rose Glass analysis, so the backend
+can be load tested without paying for real calls. Latency and token usage
+follow configurable distributions:
+
+- input tokens are derived from the request (image blocks x per-image
+  tokens + text length / 4), like real vision pricing
+- output tokens are sampled, capped by the request's max_tokens
+- prompt caching: everything up to the last `cache_control` block is a
+  cacheable prefix; the first request with a given prefix (per model) is
+  billed as cache_creation_input_tokens, repeats within 5 minutes as
+  cache_read_input_tokens
+- latency = time-to-first-token sample + output tokens / tokens-per-second
+
+Distributions are written as "fixed:0.5", "uniform:0.2,1.5",
+"normal:700,150" or "lognormal:0.8,0.4" (median, sigma).
+
+The Anthropic SDK honours ANTHROPIC_BASE_URL, so pointing a server at this
+requires no code changes:
+
+    python -m benchmarks.fake_anthropic --port 9100 --ttft lognormal:0.8,0.4 --tps 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:9100 uvicorn app.main:app
+"""
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from typing import Callable
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+
+CACHE_TTL = 300.0
+
+CANNED_ANALYSIS = """**Rose Glass Analysis:**
+
+| Dimension | Reading | Translation |
+|-----------|---------|-------------|
+| Ψ | 0.72 | Consistent voice across prompts |
+| ρ | 0.58 | Earned perspective, lightly worn |
+| q | 0.41 | Calm, low-activation energy |
+| f | 0.66 | Strong friend-group orientation |
+
+**Key Translation:** Filtering for someone who can keep up without performing.
+
+**The Tell:** The hiking photo caption undercuts its own seriousness.
+
+**Suggested Opener:**
+> "Okay, I need the full story behind the summit photo."
+"""
+
+
+def parse_distribution(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Turn "kind:a,b" into a zero-argument sampler (never negative)"""
+    kind, _, params = spec.partition(":")
+    args = [float(p) for p in params.split(",") if p]
+
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+def _blocks(body: dict) -> list[dict]:
+    """System and message content as one flat list of blocks, in prompt order"""
+    system = body.get("system", "")
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            blocks.append({"type": "text", "text": content})
+        else:
+            blocks.extend(content)
+    return blocks
+
+
+def _tokens(blocks: list[dict], per_image_tokens: int) -> int:
+    images = sum(1 for block in blocks if block.get("type") == "image")
+    text_chars = sum(len(block.get("text", "")) for block in blocks if block.get("type") == "text")
+    return images * per_image_tokens + text_chars // 4
+
+
+def count_input_tokens(body: dict, per_image_tokens: int) -> int:
+    """Approximate input tokens the way the real API bills them"""
+    return _tokens(_blocks(body), per_image_tokens)
+
+
+def cached_prefix(body: dict) -> list[dict]:
+    """Blocks up to and including the last cache_control breakpoint"""
+    blocks = _blocks(body)
+    marks = [i for i, block in enumerate(blocks) if block.get("cache_control")]
+    return blocks[:marks[-1] + 1] if marks else []
+
+
+def create_app(
+    ttft: str = "fixed:0.5",
+    tokens_per_second: float = 0.0,
+    output_tokens: str = "fixed:650",
+    per_image_tokens: int = 1600,
+    error_rate: float = 0.0,
+    seed: int = 0
+) -> Starlette:
+    """
+    Build the fake API app.
+
+    Args:
+        ttft: Time-to-first-token distribution (seconds)
+        tokens_per_second: Generation speed; 0 means output adds no latency
+        output_tokens: Output token count distribution
+        per_image_tokens: Input tokens billed per image block
+        error_rate: Fraction of requests answered with 529 overloaded
+        seed: RNG seed for reproducible runs
+    """
+    rng = random.Random(seed)
+    sample_ttft = parse_distribution(ttft, rng)
+    sample_output = parse_distribution(output_tokens, rng)
+    prompt_cache: dict[str, float] = {}
+
+    async def messages(request: Request) -> JSONResponse:
+        body = await request.json()
+
+        if error_rate and rng.random() < error_rate:
+            await asyncio.sleep(sample_ttft())
+            return JSONResponse(
+                {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                status_code=529
+            )
+
+        out_tokens = max(1, min(int(sample_output()), body.get("max_tokens", 4096)))
+        latency = sample_ttft()
+        if tokens_per_second:
+            latency += out_tokens / tokens_per_second
+        await asyncio.sleep(latency)
+
+        input_tokens = count_input_tokens(body, per_image_tokens)
+        cache_read = cache_write = 0
+        prefix = cached_prefix(body)
+        if prefix:
+            key = hashlib.sha256(
+                json.dumps([body.get("model"), prefix], sort_keys=True).encode()
+            ).hexdigest()
+            prefix_tokens = _tokens(prefix, per_image_tokens)
+            now = time.monotonic()
+            if prompt_cache.get(key, 0.0) > now:
+                cache_read = prefix_tokens
+            else:
+                cache_write = prefix_tokens
+            prompt_cache[key] = now + CACHE_TTL
+            input_tokens -= prefix_tokens
+
+        return JSONResponse({
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "claude-sonnet-4-20250514"),
+            "content": [{"type": "text", "text": CANNED_ANALYSIS}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": out_tokens,
+                "cache_creation_input_tokens": cache_write,
+                "cache_read_input_tokens": cache_read
+            }
+        })
+
+    return Starlette(routes=[Route("/v1/messages", messages, methods=["POST"])])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fake API knobs, shared with the benchmark CLIs"""
+    parser.add_argument("--ttft", default="fixed:0.5", help="Time-to-first-token distribution (s)")
+    parser.add_argument("--tps", type=float, default=0.0, help="Output tokens per second (0 = instant)")
+    parser.add_argument("--output-tokens", default="fixed:650", help="Output token distribution")
+    parser.add_argument("--per-image-tokens", type=int, default=1600)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction answered with 529")
+
+
+def app_from_arguments(args: argparse.Namespace, seed: int = 0) -> Starlette:
+    return create_app(
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        output_tokens=args.output_tokens,
+        per_image_tokens=args.per_image_tokens,
+        error_rate=args.error_rate,
+        seed=seed
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(app_from_arguments(args, args.seed), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,343 @@
+"""
+In-memory stand-in for SupabaseClient
+
+Implements the same async methods as `app.db.supabase.SupabaseClient` on
+plain dicts, with an optional per-call delay to model database round-trip
+time. Used by the benchmark app so load tests exercise the full request path
+without a Supabase project.
+"""
+
+from datetime import datetime
+from typing import Optional
+import asyncio
+import time
+import uuid
+
+from app.db.supabase import InsufficientCredits
+from app.services.analysis_codec import AnalysisCodec
+from app.services.pricing import from_micros, to_micros
+
+
+class InMemoryDatabase:
+    """Drop-in replacement for SupabaseClient backed by dicts"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        starting_credits: float = 1000.0,
+        codec: Optional[AnalysisCodec] = None
+    ):
+        self.latency = latency
+        self.codec = codec
+        self.starting_credits = to_micros(starting_credits)
+        self.users: dict[str, dict] = {}
+        self.clerk_ids: dict[str, str] = {}
+        self.analyses: dict[str, dict] = {}
+        self.transactions: dict[str, dict] = {}
+        self.ledger: list[dict] = []
+        self.user_images: set[tuple[str, str]] = set()
+        self.usage_daily: dict[tuple[str, str, str], dict] = {}
+        self.usage_daily_model: dict[tuple[str, str], dict] = {}
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._leases: dict[str, dict[str, float]] = {}
+        self.stripe_events: dict[str, dict] = {}
+
+    async def _round_trip(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def degraded(self) -> bool:
+        return False
+
+    async def defer(self, op: str, **kwargs) -> bool:
+        """Never unavailable, so nothing to journal"""
+        return False
+
+    def _user(self, user_id: str) -> dict:
+        if user_id not in self.users:
+            now = datetime.utcnow().isoformat()
+            self.users[user_id] = {
+                "id": user_id,
+                "clerk_id": user_id,
+                "email": f"{user_id}@bench.local",
+                "credits": self.starting_credits,
+                "created_at": now,
+                "updated_at": now,
+            }
+        return self.users[user_id]
+
+    async def upsert_user(self, clerk_id: str, email: Optional[str] = None) -> dict:
+        await self._round_trip()
+        if clerk_id not in self.clerk_ids:
+            self.clerk_ids[clerk_id] = str(uuid.uuid4())
+        user = self._user(self.clerk_ids[clerk_id])
+        user["clerk_id"] = clerk_id
+        if email is not None:
+            user["email"] = email
+        return {"id": user["id"], "credits": user["credits"]}
+
+    async def get_user_credits(self, user_id: str) -> int:
+        await self._round_trip()
+        return self._user(user_id)["credits"]
+
+    async def post_ledger_entry(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str,
+        reference_id: Optional[str] = None
+    ) -> int:
+        await self._round_trip()
+        user = self._user(user_id)
+        if reference_id is not None and any(
+            e["kind"] == kind and e["reference_id"] == reference_id for e in self.ledger
+        ):
+            return user["credits"]
+        if user["credits"] + amount_micros < 0:
+            # users.credits >= 0
+            raise InsufficientCredits(f"Balance of user {user_id} does not cover ${from_micros(-amount_micros)}")
+        user["credits"] += amount_micros
+        self.ledger.append({
+            "id": len(self.ledger) + 1,
+            "user_id": user_id,
+            "amount_usd": float(from_micros(amount_micros)),
+            "balance_after": float(from_micros(user["credits"])),
+            "kind": kind,
+            "reference_id": reference_id,
+            "created_at": datetime.utcnow().isoformat(),
+        })
+        return user["credits"]
+
+    async def deduct_credits(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str = "analysis",
+        reference_id: Optional[str] = None
+    ) -> int:
+        return await self.post_ledger_entry(user_id, -amount_micros, kind, reference_id)
+
+    async def add_credits(
+        self,
+        user_id: str,
+        amount_micros: int,
+        kind: str = "purchase",
+        reference_id: Optional[str] = None
+    ) -> int:
+        return await self.post_ledger_entry(user_id, amount_micros, kind, reference_id)
+
+    async def get_credit_ledger(self, user_id: str, limit: int = 50) -> list:
+        await self._round_trip()
+        rows = [e for e in self.ledger if e["user_id"] == user_id]
+        return rows[::-1][:limit]
+
+    async def save_analysis(
+        self,
+        user_id: str,
+        analysis_text: str,
+        input_tokens: int,
+        output_tokens: int,
+        cost_micros: int,
+        charge_micros: int,
+        model_used: str,
+        price_version: Optional[str] = None,
+        analysis_id: Optional[str] = None,
+        stage: str = "full",
+        parent_id: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        image_hashes: Optional[list[str]] = None,
+        conversation_image_hashes: Optional[list[str]] = None,
+        created_at: Optional[str] = None,
+        comparison_id: Optional[str] = None
+    ) -> dict:
+        await self._round_trip()
+        record = {
+            "id": analysis_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "analysis_text": analysis_text if self.codec is None else None,
+            "analysis_zstd": self.codec.compress(analysis_text) if self.codec else None,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": float(from_micros(cost_micros)),
+            "charge_usd": float(from_micros(charge_micros)),
+            "model_used": model_used,
+            "price_version": price_version,
+            "stage": stage,
+            "parent_id": parent_id,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
+            "image_hashes": image_hashes or [],
+            "conversation_image_hashes": conversation_image_hashes or [],
+            "created_at": created_at or datetime.utcnow().isoformat(),
+            "comparison_id": comparison_id,
+        }
+        self.analyses[record["id"]] = record
+        self._rollup(record)
+        return {**{k: v for k, v in record.items() if k != "analysis_zstd"}, "analysis_text": analysis_text}
+
+    def _read_analysis(self, record: dict) -> dict:
+        row = {k: v for k, v in record.items() if k != "analysis_zstd"}
+        if record["analysis_zstd"] is not None:
+            row["analysis_text"] = self.codec.decompress(record["analysis_zstd"])
+        return row
+
+    def _rollup(self, record: dict) -> None:
+        """Same increments as the rollup_analysis_usage trigger"""
+        day = record["created_at"][:10]
+        model = record["model_used"] or "unknown"
+        empty = {"analyses": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "charge_usd": 0.0}
+
+        per_user = self.usage_daily.setdefault(
+            (day, record["user_id"], model),
+            {"day": day, "user_id": record["user_id"], "model": model, **empty}
+        )
+        per_model = self.usage_daily_model.setdefault(
+            (day, model), {"day": day, "model": model, "users": 0, **empty}
+        )
+        if per_user["analyses"] == 0:
+            per_model["users"] += 1
+        for row in (per_user, per_model):
+            row["analyses"] += 1
+            for key in ("input_tokens", "output_tokens", "cost_usd", "charge_usd"):
+                row[key] += record[key]
+
+    async def get_analysis_by_id(self, analysis_id: str) -> Optional[dict]:
+        await self._round_trip()
+        record = self.analyses.get(analysis_id)
+        return self._read_analysis(record) if record else None
+
+    async def add_user_images(self, user_id: str, image_hashes: list[str]) -> None:
+        await self._round_trip()
+        self.user_images.update((user_id, h) for h in image_hashes)
+
+    async def get_user_images(self, user_id: str, image_hashes: list[str]) -> set[str]:
+        await self._round_trip()
+        return {h for h in image_hashes if (user_id, h) in self.user_images}
+
+    async def get_user_analyses(self, user_id: str, limit: int = 20) -> list:
+        await self._round_trip()
+        rows = [
+            {k: v for k, v in a.items() if k not in ("analysis_text", "analysis_zstd")}
+            for a in self.analyses.values() if a["user_id"] == user_id
+        ]
+        return sorted(rows, key=lambda a: a["created_at"], reverse=True)[:limit]
+
+    async def create_transaction(
+        self,
+        user_id: str,
+        stripe_session_id: str,
+        amount_micros: int,
+        credits_added_micros: int
+    ) -> dict:
+        await self._round_trip()
+        record = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "stripe_session_id": stripe_session_id,
+            "amount_usd": float(from_micros(amount_micros)),
+            "credits_added": float(from_micros(credits_added_micros)),
+            "status": "pending",
+        }
+        self.transactions[stripe_session_id] = record
+        return record
+
+    async def complete_transaction(self, stripe_session_id: str, stripe_payment_intent: str) -> dict:
+        await self._round_trip()
+        record = self.transactions[stripe_session_id]
+        record.update(status="completed", stripe_payment_intent=stripe_payment_intent)
+        return record
+
+    async def record_stripe_event(self, event: dict) -> bool:
+        await self._round_trip()
+        if event["id"] in self.stripe_events:
+            return False
+        self.stripe_events[event["id"]] = {
+            "id": event["id"],
+            "type": event["type"],
+            "payload": event,
+            "status": "pending",
+            "attempts": 0,
+            "claimed_until": 0.0,
+            "last_error": None,
+        }
+        return True
+
+    async def claim_stripe_events(self, limit: int, lease_seconds: int) -> list:
+        await self._round_trip()
+        now = time.monotonic()
+        claimed = [
+            e for e in self.stripe_events.values()
+            if e["status"] == "pending" and e["claimed_until"] < now
+        ][:limit]
+        for event in claimed:
+            event["claimed_until"] = now + lease_seconds
+            event["attempts"] += 1
+        return [dict(e) for e in claimed]
+
+    async def fulfill_stripe_checkout(
+        self,
+        event_id: str,
+        user_id: str,
+        session_id: str,
+        payment_intent: Optional[str],
+        amount_micros: int,
+        credits_micros: int
+    ) -> int:
+        balance = await self.post_ledger_entry(user_id, credits_micros, "purchase", session_id)
+        transaction = self.transactions.setdefault(session_id, {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "stripe_session_id": session_id,
+            "amount_usd": float(from_micros(amount_micros)),
+            "credits_added": float(from_micros(credits_micros)),
+        })
+        transaction.update(status="completed", stripe_payment_intent=payment_intent)
+        self.stripe_events[event_id].update(status="processed", claimed_until=0.0, last_error=None)
+        return balance
+
+    async def finish_stripe_events(self, event_ids: list[str], status: str, error: Optional[str] = None) -> None:
+        await self._round_trip()
+        for event_id in event_ids:
+            event = self.stripe_events[event_id]
+            event.update(status=status, last_error=error)
+            if status != "pending":
+                event["claimed_until"] = 0.0
+
+    async def get_usage_by_day(self, since: str) -> list:
+        await self._round_trip()
+        rows = [r for r in self.usage_daily_model.values() if r["day"] >= since]
+        return sorted(rows, key=lambda r: r["day"], reverse=True)
+
+    async def get_user_usage_by_day(self, user_id: str, since: str) -> list:
+        await self._round_trip()
+        rows = [r for r in self.usage_daily.values() if r["user_id"] == user_id and r["day"] >= since]
+        return sorted(rows, key=lambda r: r["day"], reverse=True)
+
+    async def rate_limit_take(self, key: str, capacity: float, refill_per_sec: float, cost: float) -> float:
+        await self._round_trip()
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (cost - tokens) / refill_per_sec
+
+    async def acquire_lease(self, key: str, limit: int, ttl_seconds: float) -> Optional[str]:
+        await self._round_trip()
+        now = time.monotonic()
+        leases = {k: exp for k, exp in self._leases.get(key, {}).items() if exp > now}
+        self._leases[key] = leases
+        if len(leases) >= limit:
+            return None
+        lease_id = str(uuid.uuid4())
+        leases[lease_id] = now + ttl_seconds
+        return lease_id
+
+    async def release_lease(self, lease_id: str) -> None:
+        await self._round_trip()
+        for leases in self._leases.values():
+            leases.pop(lease_id, None)
@@ -0,0 +1,242 @@
+"""
+Image Packing A/B
+
+Compares sending a profile's screenshots one image block each (A) with
+sending them packed into composites by app/services/image_packing.py (B).
+
+Offline, the default, it reports for each profile how many images each
+variant sends, their estimated input tokens (pixel area / 750 after
+Claude's own downscaling), how small packing shows a screenshot relative
+to sending it alone, and how long packing takes:
+
+    python -m benchmarks.image_packing
+    python -m benchmarks.image_packing --profiles shots/alex shots/sam --save /tmp/packed
+    python -m benchmarks.image_packing --min-scale 0.6 --max-tiles 3
+
+Each --profiles directory holds one profile's screenshots, sent in file
+name order; without any, synthetic phone screenshots (margins, text,
+photo blocks) are used. --save writes the composites for a look at their
+legibility.
+
+With ANTHROPIC_API_KEY set, --count-tokens asks the API what each variant
+of the full analysis request actually costs, and --live N runs the full
+analysis N times per variant (alternating, so both see the same cache
+state and load) and compares input tokens, latency and the Ψ, ρ, q, f
+readings: their spread within a variant shows how stable the readings
+are, and the gap between the variants' means what packing changes.
+
+    python -m benchmarks.image_packing --profiles shots/alex --count-tokens
+    python -m benchmarks.image_packing --profiles shots/alex --live 5 --premium
+"""
+
+from pathlib import Path
+from statistics import mean, median, pstdev
+from typing import Optional
+import argparse
+import asyncio
+import base64
+import io
+import os
+import re
+import time
+
+from app.services.image_packing import image_tokens, pack_images
+from app.services.image_store import normalize_image
+
+DIMENSIONS = ("Ψ", "ρ", "q", "f")
+# "| **Ψ** | 0.72 | ..." rows of the dimension table
+READING = re.compile(r"^\|\s*\**\s*(Ψ|ρ|q|f)\s*\**\s*\|\s*\**\s*([01](?:\.\d+)?)", re.MULTILINE)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+
+def synthetic_screenshot(seed: int, size: tuple[int, int] = (1170, 2532)) -> bytes:
+    """Phone capture: wide plain margins around a column of text and photos"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    image = Image.new("RGB", size, (246, 246, 248))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=34)
+    left, right = 150 + seed % 40, width - 150 - seed % 40
+
+    y = 220
+    for block in range(4 + seed % 3):
+        if (block + seed) % 2 == 0:
+            shade = 60 + (seed * 37 + block * 53) % 160
+            draw.rounded_rectangle((left, y, right, y + 620), radius=28, fill=(shade, 120, 255 - shade))
+            y += 660
+        else:
+            draw.rounded_rectangle((left, y, right, y + 330), radius=28, fill=(255, 255, 255))
+            for line in range(5):
+                draw.text((left + 40, y + 30 + line * 56),
+                          f"Prompt {seed}.{block}: slow mornings, climbing, line {line}",
+                          font=font, fill=(30, 30, 30))
+            y += 370
+        if y > height - 400:
+            break
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def load_profiles(directories: list[str], synthetic: int, images: int) -> list[tuple[str, list[bytes]]]:
+    """(name, stored screenshots) per profile, normalized like uploads"""
+    if not directories:
+        return [
+            (f"synthetic-{p}", [normalize_image(synthetic_screenshot(p * 10 + i)) for i in range(images)])
+            for p in range(synthetic)
+        ]
+    profiles = []
+    for directory in directories:
+        files = sorted(f for f in Path(directory).iterdir() if f.suffix.lower() in IMAGE_SUFFIXES)
+        profiles.append((Path(directory).name, [normalize_image(f.read_bytes()) for f in files]))
+    return profiles
+
+
+def sizes(images: list[bytes]) -> list[tuple[int, int]]:
+    from PIL import Image
+
+    return [Image.open(io.BytesIO(data)).size for data in images]
+
+
+def readings(analysis: str) -> dict[str, float]:
+    """Dimension readings from an analysis's table (first row of each)"""
+    found: dict[str, float] = {}
+    for symbol, value in READING.findall(analysis):
+        found.setdefault(symbol, float(value))
+    return found
+
+
+def offline(profiles: list[tuple[str, list[bytes]]], args: argparse.Namespace) -> None:
+    print(f"min_scale {args.min_scale}, max_tiles {args.max_tiles}\n")
+    print(f"{'profile':<16} {'A images':>9} {'A tokens':>9} {'B images':>9} {'B tokens':>9} "
+          f"{'saved':>7} {'tiles':>10} {'scale':>6} {'pack ms':>8}")
+
+    total_a = total_b = 0
+    for name, images in profiles:
+        tokens_a = sum(image_tokens(*size) for size in sizes(images))
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            packed = pack_images(images, args.min_scale, args.max_tiles)
+            timings.append((time.perf_counter() - started) * 1000)
+        tokens_b = sum(image_tokens(*size) for size in sizes(packed.images))
+        total_a += tokens_a
+        total_b += tokens_b
+
+        tiles = "+".join(str(n) for n in packed.tiles)
+        print(f"{name[:16]:<16} {len(images):>9} {tokens_a:>9} {len(packed.images):>9} {tokens_b:>9} "
+              f"{1 - tokens_b / tokens_a:>7.0%} {tiles:>10} {packed.min_scale:>6.2f} {median(timings):>8.1f}")
+
+        if args.save:
+            directory = Path(args.save) / name
+            directory.mkdir(parents=True, exist_ok=True)
+            for i, data in enumerate(packed.images):
+                (directory / f"packed-{i}.jpg").write_bytes(data)
+
+    print(f"\nEstimated image tokens: {total_a} individually, {total_b} packed ({1 - total_b / total_a:.0%} fewer)")
+    if args.save:
+        print(f"Composites written to {args.save}/<profile>/")
+
+
+def variants(images: list[bytes], args: argparse.Namespace) -> dict[str, list[str]]:
+    packed = pack_images(images, args.min_scale, args.max_tiles).images
+    return {
+        "A": [base64.b64encode(data).decode() for data in images],
+        "B": [base64.b64encode(data).decode() for data in packed],
+    }
+
+
+async def count_tokens(profiles: list[tuple[str, list[bytes]]], args: argparse.Namespace, claude) -> None:
+    route = claude.route(1, 0, args.user_context, args.premium)
+    print(f"\nInput tokens of the full analysis request ({route.model}):")
+    print(f"{'profile':<16} {'A':>8} {'B':>8} {'saved':>7}")
+    for name, images in profiles:
+        counted = {}
+        for variant, encoded in variants(images, args).items():
+            messages = claude._build_messages("full", encoded, args.user_context, None, None, False)
+            response = await claude.client.messages.count_tokens(
+                model=route.model, system=claude.system, messages=messages
+            )
+            counted[variant] = response.input_tokens
+        print(f"{name[:16]:<16} {counted['A']:>8} {counted['B']:>8} {1 - counted['B'] / counted['A']:>7.0%}")
+
+
+async def live(profiles: list[tuple[str, list[bytes]]], args: argparse.Namespace, claude) -> None:
+    print(f"\nFull analyses, {args.live} per variant:")
+    print(f"{'profile':<16} {'var':>4} {'tokens':>8} {'p50 ms':>8} " + " ".join(
+        f"{d + ' mean':>7} {d + ' sd':>6}" for d in DIMENSIONS))
+
+    for name, images in profiles:
+        encoded = variants(images, args)
+        route = claude.route(len(images), 0, args.user_context, args.premium)
+        runs: dict[str, list[dict]] = {"A": [], "B": []}
+        for n in range(args.live):
+            for variant in ("A", "B") if n % 2 == 0 else ("B", "A"):
+                started = time.perf_counter()
+                result = await claude.analyze_profile(
+                    images=encoded[variant], user_context=args.user_context, use_premium=args.premium, route=route
+                )
+                usage = result["usage"]
+                runs[variant].append({
+                    "tokens": usage["input_tokens"] + usage["cache_read_tokens"] + usage["cache_write_tokens"],
+                    "latency_ms": (time.perf_counter() - started) * 1000,
+                    "readings": readings(result["analysis"]),
+                })
+
+        means: dict[str, dict[str, Optional[float]]] = {}
+        for variant, results in runs.items():
+            columns = []
+            means[variant] = {}
+            for dimension in DIMENSIONS:
+                values = [r["readings"][dimension] for r in results if dimension in r["readings"]]
+                means[variant][dimension] = mean(values) if values else None
+                columns.append(f"{mean(values):>7.2f} {pstdev(values):>6.2f}" if values else f"{'-':>7} {'-':>6}")
+            print(f"{name[:16]:<16} {variant:>4} {mean(r['tokens'] for r in results):>8.0f} "
+                  f"{median(r['latency_ms'] for r in results):>8.0f} " + " ".join(columns))
+
+        gaps = [
+            f"{d} {abs(means['A'][d] - means['B'][d]):.2f}"
+            for d in DIMENSIONS if means["A"][d] is not None and means["B"][d] is not None
+        ]
+        print(f"{'':<16} {'|A-B|':>4} {', '.join(gaps) or 'no readings parsed'}")
+
+
+async def run_api(profiles: list[tuple[str, list[bytes]]], args: argparse.Namespace) -> None:
+    from app.services.claude_service import ClaudeService
+
+    claude = ClaudeService(api_key=os.environ["ANTHROPIC_API_KEY"])
+    if args.count_tokens:
+        await count_tokens(profiles, args, claude)
+    if args.live:
+        await live(profiles, args, claude)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Screenshots sent individually vs packed into composites")
+    parser.add_argument("--profiles", nargs="*", default=[], help="Directories of one profile's screenshots each")
+    parser.add_argument("--synthetic", type=int, default=4, help="Synthetic profiles when --profiles is not given")
+    parser.add_argument("--images", type=int, default=6, help="Screenshots per synthetic profile")
+    parser.add_argument("--min-scale", type=float, default=0.7)
+    parser.add_argument("--max-tiles", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs of the packer per profile")
+    parser.add_argument("--save", help="Directory to write the composites to")
+    parser.add_argument("--count-tokens", action="store_true", help="Count request tokens with the API")
+    parser.add_argument("--live", type=int, default=0, help="Full analyses per variant and profile")
+    parser.add_argument("--premium", action="store_true")
+    parser.add_argument("--user-context")
+    args = parser.parse_args()
+    if (args.count_tokens or args.live) and not os.getenv("ANTHROPIC_API_KEY"):
+        parser.error("--count-tokens and --live need ANTHROPIC_API_KEY")
+
+    profiles = load_profiles(args.profiles, args.synthetic, args.images)
+    offline(profiles, args)
+    if args.count_tokens or args.live:
+        asyncio.run(run_api(profiles, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Backend Load Test
+
+Runs the real FastAPI app (benchmarks.bench_app: in-memory database) in a
+fresh server process per run, against the fake Anthropic API, and drives
+realistic multi-image uploads at increasing concurrency. Reports
+throughput, p50/p95/p99 latency and the server's peak RSS per scenario.
+
+    python -m benchmarks.load_test                              # default suite
+    python -m benchmarks.load_test --scenario standard --concurrency 1 16 64
+    python -m benchmarks.load_test --save                       # store results
+    python -m benchmarks.load_test --compare benchmarks/results/<file>.json
+
+Results are written to benchmarks/results/ as JSON; --compare re-runs the
+same scenarios and exits non-zero when throughput, tail latency or memory
+regress by more than --tolerance.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+
+from benchmarks.common import bench_token, drive, make_screenshot, peak_rss_mb, wait_port, wait_ready
+from benchmarks import fake_anthropic
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class Scenario:
+    """Shape of the requests one scenario sends"""
+    profile_images: int
+    conversation_images: int = 0
+    premium_fraction: float = 0.0
+    user_context: Optional[str] = None
+    image_format: str = "JPEG"
+    mode: str = "full"
+
+
+SCENARIOS = {
+    "standard": Scenario(profile_images=3),
+    "triage": Scenario(profile_images=3, mode="triage"),
+    "conversation": Scenario(profile_images=3, conversation_images=4),
+    "mixed-premium": Scenario(
+        profile_images=4, premium_fraction=0.25,
+        user_context="Looking for something long-term, value humor and curiosity"
+    ),
+    "max-upload": Scenario(profile_images=10, image_format="PNG"),
+}
+
+DEFAULT_CONCURRENCY = [1, 8, 32, 64]
+
+# Admission limits are lifted so runs measure capacity, not the limiter;
+# pass --with-limits to keep the configured values
+UNLIMITED_ENV = {
+    "RATE_LIMIT_USER_PER_MINUTE": "1e9",
+    "RATE_LIMIT_USER_BURST": "1000000",
+    "RATE_LIMIT_GLOBAL_PER_MINUTE": "1e9",
+    "RATE_LIMIT_GLOBAL_BURST": "1000000",
+    "CONCURRENCY_PER_USER": "1000",
+    "CONCURRENCY_PER_MODEL": "{}",
+    "CONCURRENCY_DEFAULT_PER_MODEL": "100000",
+    "CONCURRENCY_GLOBAL": "100000",
+}
+
+# Lower is better for these; higher is better for throughput
+REGRESSION_KEYS = {"throughput_rps": +1, "p95_ms": -1, "p99_ms": -1, "peak_rss_mb": -1}
+
+
+def build_requester(scenario: Scenario, pool_size: int = 12):
+    """Return build_request(client_index, rng) for `drive`"""
+    size = (1170, 2532)
+    pool = [make_screenshot(i, size, scenario.image_format) for i in range(pool_size)]
+    mime = "image/jpeg" if scenario.image_format == "JPEG" else "image/png"
+    ext = "jpg" if scenario.image_format == "JPEG" else "png"
+    tokens: dict[int, str] = {}
+
+    def build_request(index: int, rng: random.Random) -> dict:
+        if index not in tokens:
+            tokens[index] = bench_token(f"bench-user-{index}")
+
+        # Distinct screenshots: pre-flight would leave out repeats
+        picks = rng.sample(pool, scenario.profile_images + scenario.conversation_images)
+        files = [
+            ("profile_images", (f"profile{i}.{ext}", picks[i], mime))
+            for i in range(scenario.profile_images)
+        ]
+        files += [
+            ("conversation_images", (f"chat{i}.{ext}", picks[scenario.profile_images + i], mime))
+            for i in range(scenario.conversation_images)
+        ]
+        data = {
+            "use_premium": str(rng.random() < scenario.premium_fraction).lower(),
+            "mode": scenario.mode,
+        }
+        if scenario.user_context:
+            data["user_context"] = scenario.user_context
+
+        return {"files": files, "data": data, "headers": {"Authorization": f"Bearer {tokens[index]}"}}
+
+    return build_request
+
+
+async def run_one(name: str, scenario: Scenario, concurrency: int, args, env: dict) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_app:app",
+         "--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    try:
+        await wait_ready(f"http://127.0.0.1:{args.port}/health")
+        result = await drive(
+            f"http://127.0.0.1:{args.port}/api/analyze/",
+            build_requester(scenario),
+            concurrency=concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            seed=args.seed
+        )
+        rss = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=120)
+
+    return {"scenario": name, "concurrency": concurrency, **result.summary(), "peak_rss_mb": rss}
+
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_row(run: dict, baseline: Optional[dict] = None) -> list[str]:
+    """Print one result line; return names of metrics that regressed"""
+    rss = f"{run['peak_rss_mb']:.0f}" if run["peak_rss_mb"] else "-"
+    line = (f"{run['scenario']:<14} {run['concurrency']:>5} {run['throughput_rps']:>8.1f} "
+            f"{run['p50_ms']:>8.0f} {run['p95_ms']:>8.0f} {run['p99_ms']:>8.0f} {rss:>7} "
+            f"{run['requests']:>6} {run['errors']:>5}")
+
+    regressed = []
+    if baseline:
+        deltas = []
+        for key, direction in REGRESSION_KEYS.items():
+            old, new = baseline.get(key), run.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            deltas.append(f"{key.split('_')[0]} {change:+.0%}")
+            if change * direction < -baseline["_tolerance"]:
+                regressed.append(key)
+        line += "   " + ", ".join(deltas) + ("  REGRESSION" if regressed else "")
+    print(line)
+    return regressed
+
+
+async def main(args) -> int:
+    import uvicorn
+
+    baseline_runs = {}
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        for run in baseline["runs"]:
+            baseline_runs[(run["scenario"], run["concurrency"])] = {**run, "_tolerance": args.tolerance}
+        plan = sorted(baseline_runs)
+    else:
+        plan = [(name, c) for name in args.scenario for c in args.concurrency]
+
+    fake = uvicorn.Server(uvicorn.Config(
+        fake_anthropic.app_from_arguments(args, args.seed),
+        host="127.0.0.1", port=args.fake_port, log_level="warning"
+    ))
+    fake_task = asyncio.create_task(fake.serve())
+    await wait_port(args.fake_port)
+
+    env = {
+        **os.environ,
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{args.fake_port}",
+        "BENCH_DB_LATENCY": str(args.db_latency),
+        **({} if args.with_limits else UNLIMITED_ENV),
+    }
+
+    print(f"{'scenario':<14} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'rss MB':>7} {'ok':>6} {'err':>5}")
+    runs, regressions = [], []
+    try:
+        for name, concurrency in plan:
+            run = await run_one(name, SCENARIOS[name], concurrency, args, env)
+            runs.append(run)
+            regressions += [(name, concurrency, key) for key in
+                            print_row(run, baseline_runs.get((name, concurrency)))]
+    finally:
+        fake.should_exit = True
+        await fake_task
+
+    if args.save or args.compare:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = RESULTS_DIR / f"{stamp}_{git_sha()}.json"
+        path.write_text(json.dumps({
+            "meta": {
+                "timestamp": stamp,
+                "git_sha": git_sha(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "duration": args.duration,
+                "db_latency": args.db_latency,
+                "fake_anthropic": {
+                    "ttft": args.ttft, "tps": args.tps, "output_tokens": args.output_tokens,
+                    "per_image_tokens": args.per_image_tokens, "error_rate": args.error_rate,
+                },
+                "scenarios": {name: asdict(SCENARIOS[name]) for name in {r["scenario"] for r in runs}},
+            },
+            "runs": runs,
+        }, indent=2))
+        print(f"\nResults saved to {path}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for name, concurrency, key in regressions:
+            print(f"  {name} @ {concurrency}: {key}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the analyze endpoint")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Discarded seconds per run")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Simulated DB round trip (s)")
+    parser.add_argument("--with-limits", action="store_true", help="Keep configured admission limits")
+    parser.add_argument("--save", action="store_true", help="Write results to benchmarks/results/")
+    parser.add_argument("--compare", help="Baseline results file to re-run and compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression fraction")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8810)
+    parser.add_argument("--fake-port", type=int, default=9110)
+    parser.add_argument("--verbose", action="store_true", help="Show server stderr")
+    fake_anthropic.add_arguments(parser)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,208 @@
+"""
+Logging Overhead Benchmark
+
+Replays the INFO lines one analysis request logs (authentication, request,
+credits, Claude call and result, charge, save, completion) from many
+concurrent simulated requests on one event loop, under each logging setup:
+
+    sync         basicConfig-style StreamHandler, f-strings (the old setup)
+    queue        configure_logging, text, fields formatted on the writer thread
+    queue-json   the same with LOG_FORMAT=json
+    sampled      queue-json with the default LOG_SAMPLE_RATES
+
+and reports how long each request's logging calls held the event loop
+(nothing else runs on it meanwhile), how long the writer thread took to
+drain afterwards, and how many records were written or dropped. Between
+its log lines each request waits --io-ms, standing in for Claude and the
+database. Records go to a temporary file; --sink-delay-ms makes every
+write that slow, like a blocked stdout pipe or a log shipper applying
+backpressure.
+
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --requests 5000 --concurrency 100 --sink-delay-ms 0.2
+"""
+
+from statistics import quantiles
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app.config import Settings
+from app.core.logs import TEXT_FORMAT, configure_logging, stop_logging
+from app.core.metrics import metrics
+
+MODES = ("sync", "queue", "queue-json", "sampled")
+
+USER = "user_2aXbQ8rT0kLmN3pZ"
+USER_ID = "0d9f3a52-8c1e-4b7a-9f6d-2e5c7a1b4d30"
+
+
+class SlowStream:
+    """File wrapper whose writes take at least `delay` seconds"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def log_before_eager(n: int) -> None:
+    """The lines logged before the Claude call, as f-strings"""
+    logging.getLogger("app.services.auth").info(f"Authenticated user: {USER}")
+    logging.getLogger("app.routers.analyze").info(
+        f"Analysis request from user {USER}: 4 profile images, 0 conversation images, premium=False, mode=full")
+    logging.getLogger("app.routers.analyze").info(f"User {USER} has ${n / 100} credits")
+    logging.getLogger("app.services.claude_service").info(
+        "Analyzing profile (full) with claude-sonnet-4-20250514, 4 profile images, 0 conversation images")
+
+
+def log_after_eager(n: int) -> None:
+    """The lines logged after it"""
+    logging.getLogger("app.services.claude_service").info(
+        f"Analysis complete (standard/default). Input: {6200 + n % 100}, Output: {700 + n % 50}, "
+        f"Cost: $0.029100, Charge: $0.043650")
+    logging.getLogger("app.db.supabase").info(
+        f"Deducted $0.043650 from user {USER_ID}, new balance: ${n / 100}")
+    logging.getLogger("app.db.supabase").info(f"Saved analysis for user {USER_ID}")
+    logging.getLogger("app.routers.analyze").info(
+        f"Analysis complete for user {USER}. Charged $0.043650, new balance ${n / 100}")
+
+
+def log_before_lazy(n: int) -> None:
+    """The same lines with fields, as the app now logs them"""
+    logging.getLogger("app.services.auth").info("Authenticated user: %(user)s", {"user": USER})
+    logging.getLogger("app.routers.analyze").info(
+        "Analysis request from user %(user)s: %(profile_images)d profile images, "
+        "%(conversation_images)d conversation images, premium=%(premium)s, mode=%(mode)s",
+        {"user": USER, "profile_images": 4, "conversation_images": 0, "premium": False, "mode": "full"})
+    logging.getLogger("app.routers.analyze").info(
+        "User %(user)s has $%(credits)s credits", {"user": USER, "credits": n / 100})
+    logging.getLogger("app.services.claude_service").info(
+        "Analyzing profile (%(stage)s) with %(model)s, %(profile_images)d profile images, "
+        "%(conversation_images)d conversation images",
+        {"stage": "full", "model": "claude-sonnet-4-20250514", "profile_images": 4, "conversation_images": 0})
+
+
+def log_after_lazy(n: int) -> None:
+    """The lines logged after it"""
+    logging.getLogger("app.services.claude_service").info(
+        "Analysis complete (%(tier)s/%(reason)s). Input: %(input_tokens)d, "
+        "Output: %(output_tokens)d, Cost: $%(cost)s, Charge: $%(charge)s",
+        {"tier": "standard", "reason": "default", "input_tokens": 6200 + n % 100,
+         "output_tokens": 700 + n % 50, "cost": "0.029100", "charge": "0.043650"})
+    logging.getLogger("app.db.supabase").info(
+        "Deducted $%(amount)s from user %(user_id)s, new balance: $%(balance)s",
+        {"amount": "0.043650", "user_id": USER_ID, "balance": n / 100})
+    logging.getLogger("app.db.supabase").info("Saved analysis for user %(user_id)s", {"user_id": USER_ID})
+    logging.getLogger("app.routers.analyze").info(
+        "Analysis complete for user %(user)s. Charged $%(charge)s, new balance $%(balance)s",
+        {"user": USER, "charge": "0.043650", "balance": n / 100})
+
+
+LINES_PER_REQUEST = 8
+
+
+def setup(mode: str, stream, queue_size: int) -> None:
+    if mode == "sync":
+        stop_logging()
+        root = logging.getLogger()
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        configure_logging(
+            fmt="text" if mode == "queue" else "json",
+            sample_rates=Settings.model_fields["log_sample_rates"].default if mode == "sampled" else None,
+            queue_size=queue_size,
+            stream=stream
+        )
+
+
+async def simulate(args: argparse.Namespace, log_before, log_after) -> list[float]:
+    """Run the simulated requests; returns the microseconds each spent in logging calls"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    blocked = []
+
+    async def request(n: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            log_before(n)
+            logging_time = time.perf_counter() - started
+            await asyncio.sleep(args.io_ms / 1000)
+            started = time.perf_counter()
+            log_after(n)
+            logging_time += time.perf_counter() - started
+            blocked.append(logging_time * 1e6)
+
+    await asyncio.gather(*(request(n) for n in range(args.requests)))
+    return blocked
+
+
+def run(mode: str, args: argparse.Namespace, directory: str) -> dict:
+    path = os.path.join(directory, f"{mode}.log")
+    with open(path, "w") as sink:
+        setup(mode, SlowStream(sink, args.sink_delay_ms / 1000), args.queue_size)
+        dropped_before = metrics.snapshot()["counters"].get("log_records_dropped", 0)
+        if mode == "sync":
+            log_before, log_after = log_before_eager, log_after_eager
+        else:
+            log_before, log_after = log_before_lazy, log_after_lazy
+
+        started = time.perf_counter()
+        blocked = asyncio.run(simulate(args, log_before, log_after))
+        elapsed = time.perf_counter() - started
+
+        stop_logging()
+        drained = time.perf_counter() - started - elapsed
+        logging.getLogger().handlers.clear()
+
+    with open(path) as f:
+        written = sum(1 for _ in f)
+    return {
+        "mean_us": sum(blocked) / len(blocked),
+        "p99_us": quantiles(blocked, n=100)[98],
+        "max_us": max(blocked),
+        "elapsed_ms": elapsed * 1000,
+        "drain_ms": drained * 1000,
+        "written": written,
+        "dropped": metrics.snapshot()["counters"].get("log_records_dropped", 0) - dropped_before,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-request logging cost under each logging setup")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Simulated requests in flight")
+    parser.add_argument("--io-ms", type=float, default=20.0, help="Wait between a request's log lines")
+    parser.add_argument("--queue-size", type=int, default=Settings.model_fields["log_queue_size"].default)
+    parser.add_argument("--sink-delay-ms", type=float, default=0.0, help="Extra time each write takes")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests x {LINES_PER_REQUEST} lines, concurrency {args.concurrency}, "
+          f"{args.io_ms} ms I/O each, sink delay {args.sink_delay_ms} ms/write\n")
+    print(f"{'mode':<12} {'logging us/req':>15} {'p99 us':>9} {'max us':>9} {'elapsed ms':>11} "
+          f"{'drain ms':>9} {'written':>8} {'dropped':>8}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes:
+            r = run(mode, args, directory)
+            print(f"{mode:<12} {r['mean_us']:>15.1f} {r['p99_us']:>9.1f} {r['max_us']:>9.0f} "
+                  f"{r['elapsed_ms']:>11.0f} {r['drain_ms']:>9.0f} {r['written']:>8} {r['dropped']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
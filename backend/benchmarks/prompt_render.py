@@ -0,0 +1,71 @@
+"""
+Prompt Render Benchmark
+
+Times rendering of each prompt template with representative values and
+reports the size of what is sent: rendered bytes, and for templates with a
+static prefix, how many of those bytes sit in the cache-markable prefix.
+
+    python -m benchmarks.prompt_render
+    python -m benchmarks.prompt_render --number 100000
+"""
+
+from statistics import median
+import argparse
+import json
+import timeit
+
+from app.prompts.system_prompt import ROSE_GLASS_DATING_SYSTEM_PROMPT
+from app.prompts.templates import (
+    ANALYSIS_REQUEST, CO_CREATION_PROMPT, COMPARISON_CONTEXT, DEEP_REQUEST, PROMPT_VERSION, REFLECTION_PROMPT,
+    TRIAGE_REQUEST
+)
+
+USER_CONTEXT = "34, into climbing and slow mornings, looking for something long-term"
+ANALYSIS_TEXT = "| Dimension | Reading | Translation |\n" * 40
+REFLECTION = {
+    "observation": "She's a newcomer complaining about crowds",
+    "resonance": "I don't mind lift lines - it's all mountain time",
+    "intention": "Want to tease playfully and share my philosophy",
+}
+
+CASES = [
+    ("analysis", ANALYSIS_REQUEST, {"user_context": USER_CONTEXT, "has_conversation": True}),
+    ("analysis (bare)", ANALYSIS_REQUEST, {"user_context": None, "has_conversation": False}),
+    ("triage", TRIAGE_REQUEST, {"user_context": USER_CONTEXT}),
+    ("deep", DEEP_REQUEST, {"has_conversation": True}),
+    ("comparison", COMPARISON_CONTEXT, {"user_context": USER_CONTEXT}),
+    ("co-creation", CO_CREATION_PROMPT, {
+        "analysis": ANALYSIS_TEXT, "conversation_context": "We matched yesterday", **REFLECTION
+    }),
+    ("reflection", REFLECTION_PROMPT, {"perception": ANALYSIS_TEXT, "context": None, **REFLECTION}),
+]
+
+
+def time_us(fn, number: int, repeat: int) -> float:
+    """Median microseconds per call"""
+    return median(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prompt template render time and size")
+    parser.add_argument("--number", type=int, default=20000, help="Calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Prompt version {PROMPT_VERSION}; system prompt {len(ROSE_GLASS_DATING_SYSTEM_PROMPT.encode())} bytes\n")
+    print(f"{'template':<18} {'render us':>10} {'blocks us':>10} {'bytes':>8} {'prefix':>8} {'json':>8}")
+
+    for label, template, values in CASES:
+        render_us = time_us(lambda: template.render(**values), args.number, args.repeat)
+        blocks_us = time_us(lambda: template.blocks(cache_prefix=True, **values), args.number, args.repeat)
+
+        blocks = template.blocks(cache_prefix=True, **values)
+        size = len(template.render(**values).encode())
+        prefix = len(blocks[0]["text"].encode()) if "cache_control" in blocks[0] else 0
+        wire = len(json.dumps(blocks, ensure_ascii=False).encode())
+
+        print(f"{label:<18} {render_us:>10.2f} {blocks_us:>10.2f} {size:>8} {prefix:>8} {wire:>8}")
+
+
+if __name__ == "__main__":
+    main()
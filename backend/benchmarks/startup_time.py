@@ -0,0 +1,89 @@
+"""
+Startup Time Benchmark
+
+Measures cold import cost of the application with `python -X importtime`
+in fresh interpreters, aggregates it by top-level package, and checks that
+the heavy SDKs stay off the startup path.
+
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --runs 10 --top 15 --module app.main
+
+Exits non-zero if any module listed in --forbid is imported at startup, so
+it can gate CI.
+"""
+
+from collections import defaultdict
+from statistics import median
+import argparse
+import os
+import subprocess
+import sys
+
+# Dependency trees that must only load when a request first needs them
+LAZY_PACKAGES = ["anthropic", "supabase", "postgrest", "realtime", "jwt", "stripe", "boto3", "PIL", "zstandard"]
+
+
+def import_profile(module: str) -> dict[str, tuple[int, int]]:
+    """Return {module: (self_us, cumulative_us)} for one cold import"""
+    env = {
+        **os.environ,
+        "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", "startup-bench"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True
+    )
+
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time of the backend")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Packages to list by self time")
+    parser.add_argument("--forbid", nargs="*", default=LAZY_PACKAGES)
+    args = parser.parse_args()
+
+    totals = []
+    by_package: dict[str, list[int]] = defaultdict(list)
+    imported: set[str] = set()
+
+    for _ in range(args.runs):
+        profile = import_profile(args.module)
+        totals.append(profile[args.module][1])
+        imported.update(profile)
+
+        package_self = defaultdict(int)
+        for name, (self_us, _) in profile.items():
+            package_self[name.split(".")[0]] += self_us
+        for package, us in package_self.items():
+            by_package[package].append(us)
+
+    print(f"import {args.module}: median {median(totals) / 1000:.1f} ms "
+          f"(min {min(totals) / 1000:.1f}, max {max(totals) / 1000:.1f}, {args.runs} runs)")
+    print(f"modules imported: {len(imported)}")
+    print()
+    print(f"{'package':<24} {'self ms':>9}")
+    ranked = sorted(by_package.items(), key=lambda kv: median(kv[1]), reverse=True)
+    for package, samples in ranked[:args.top]:
+        print(f"{package:<24} {median(samples) / 1000:>9.1f}")
+
+    eager = sorted(p for p in args.forbid if p in imported)
+    if eager:
+        print(f"\nFAIL: imported at startup: {', '.join(eager)}")
+        return 1
+
+    print(f"\nOK: none of {', '.join(args.forbid)} imported at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
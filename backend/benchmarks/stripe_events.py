@@ -0,0 +1,119 @@
+"""
+Fake Stripe Events
+
+Builds checkout events, signs them the way Stripe does with a local
+webhook secret, and posts them to a running server, so the webhook path
+can be exercised without a Stripe account or the Stripe CLI:
+
+    STRIPE_WEBHOOK_SECRET=whsec_test uvicorn benchmarks.bench_app:app
+    python -m benchmarks.stripe_events --user <users.id> --amount 10
+    python -m benchmarks.stripe_events --user <users.id> --count 50 --deliveries 3
+    python -m benchmarks.stripe_events --user <users.id> --bad-signature
+
+Each event is delivered `--deliveries` times, like Stripe's retries; the
+inbox stores it once and the session is credited once. The secret is
+STRIPE_WEBHOOK_SECRET unless --secret is given.
+"""
+
+from typing import Optional
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+import httpx
+
+
+def sign(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Stripe-Signature header for `payload`"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    digest = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def checkout_event(
+    user_id: str,
+    amount_cents: int,
+    credits: Optional[str] = None,
+    payment_status: str = "paid",
+    event_type: str = "checkout.session.completed"
+) -> dict:
+    """A checkout.session.* event as Stripe sends it (fields the backend reads)"""
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    return {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "livemode": False,
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "client_reference_id": user_id,
+                "amount_total": amount_cents,
+                "currency": "usd",
+                "payment_status": payment_status,
+                "payment_intent": f"pi_test_{uuid.uuid4().hex}",
+                "metadata": {"credits": credits} if credits else {},
+            }
+        },
+    }
+
+
+async def deliver(client: httpx.AsyncClient, url: str, event: dict, secret: str) -> int:
+    payload = json.dumps(event).encode()
+    response = await client.post(url, content=payload, headers={
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign(payload, secret),
+    })
+    return response.status_code
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = args.url.rstrip("/") + "/api/webhooks/stripe"
+    secret = "whsec_wrong" if args.bad_signature else args.secret
+    events = [
+        checkout_event(args.user, int(round(args.amount * 100)), args.credits)
+        for _ in range(args.count)
+    ]
+
+    statuses: dict[int, int] = {}
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        for _ in range(args.deliveries):
+            results = await asyncio.gather(*(deliver(client, url, event, secret) for event in events))
+            for status in results:
+                statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    deliveries = args.count * args.deliveries
+    print(f"{deliveries} deliveries of {args.count} events in {elapsed * 1000:.0f} ms "
+          f"({elapsed / deliveries * 1000:.1f} ms each): {statuses}")
+    if not args.bad_signature:
+        print(f"Expect ${args.count * float(args.credits or args.amount):.2f} credited to {args.user} once processed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send locally signed fake Stripe checkout events")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--secret", default=os.getenv("STRIPE_WEBHOOK_SECRET"))
+    parser.add_argument("--user", required=True, help="users.id to credit (client_reference_id)")
+    parser.add_argument("--amount", type=float, default=10.0, help="USD paid per checkout")
+    parser.add_argument("--credits", help="metadata.credits; the amount paid when omitted")
+    parser.add_argument("--count", type=int, default=1, help="Distinct checkout events")
+    parser.add_argument("--deliveries", type=int, default=1, help="Times each event is delivered")
+    parser.add_argument("--bad-signature", action="store_true", help="Sign with the wrong secret (expect 400)")
+    args = parser.parse_args()
+    if not args.secret and not args.bad_signature:
+        parser.error("--secret or STRIPE_WEBHOOK_SECRET is required")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Worker Scaling Benchmark
+
+Starts the production server profile (gunicorn + uvicorn workers) at
+increasing worker counts against the fake Anthropic API and measures
+POST /api/analyze/ throughput and latency at a fixed client concurrency.
+
+    python -m benchmarks.worker_scaling --workers 1 2 4 8 --concurrency 64
+
+Run from the backend directory. Workers serve benchmarks.bench_app, i.e.
+the real app with the in-memory database stand-in.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+
+from benchmarks import fake_anthropic
+from benchmarks.common import bench_token, drive, make_screenshot, wait_port, wait_ready
+from benchmarks.load_test import UNLIMITED_ENV
+
+
+async def run(args) -> None:
+    import uvicorn
+
+    fake = uvicorn.Server(uvicorn.Config(
+        fake_anthropic.app_from_arguments(args), host="127.0.0.1", port=args.fake_port, log_level="warning"
+    ))
+    fake_task = asyncio.create_task(fake.serve())
+    await wait_port(args.fake_port)
+
+    images = [make_screenshot(i) for i in range(args.images)]
+    files = [("profile_images", (f"p{i}.jpg", img, "image/jpeg")) for i, img in enumerate(images)]
+    tokens = [bench_token(f"bench-user-{i}") for i in range(args.concurrency)]
+
+    def build_request(index: int, rng: random.Random) -> dict:
+        return {"files": files, "headers": {"Authorization": f"Bearer {tokens[index]}"}}
+
+    env = {
+        **os.environ,
+        **UNLIMITED_ENV,
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{args.fake_port}",
+        "PORT": str(args.port),
+        "LOG_LEVEL": "warning",
+    }
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'ok':>6} {'err':>5}")
+    baseline = None
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "benchmarks.bench_app:app", "-c", "gunicorn.conf.py",
+             "--workers", str(workers)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            await wait_ready(f"{base_url}/health")
+            stats = (await drive(
+                f"{base_url}/api/analyze/", build_request, args.concurrency, args.duration
+            )).summary()
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=120)
+
+        baseline = baseline or stats["throughput_rps"]
+        print(f"{workers:>7} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.0f} "
+              f"{stats['p95_ms']:>8.0f} {stats['requests']:>6} {stats['errors']:>5}"
+              f"   x{stats['throughput_rps'] / baseline:.2f}")
+
+    fake.should_exit = True
+    await fake_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput scaling from 1 to N workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per worker count")
+    parser.add_argument("--images", type=int, default=3, help="Profile images per request")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    fake_anthropic.add_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration - production server profile
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Runs N uvicorn worker processes behind one gunicorn master. Each worker runs
+the FastAPI lifespan independently, so Claude/Supabase clients are created
+once per worker after the fork. All knobs can be overridden from the
+environment (Railway/Render set PORT; WEB_CONCURRENCY is the de facto
+standard for worker count).
+"""
+
+import multiprocessing
+import os
+
+# Binding
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Workers - analyses are I/O bound (waiting on Claude), but image decoding,
+# base64 and JSON work is CPU bound, so scale with cores
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Graceful shutdown - on SIGTERM the master stops accepting connections and
+# gives each worker `graceful_timeout` seconds to finish. This must exceed the
+# longest analysis plus credit settlement (see SHUTDOWN_DRAIN_TIMEOUT).
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "90"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle workers periodically to bound memory growth from image buffers;
+# jitter prevents all workers restarting at once
+max_requests = int(os.getenv("MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "200"))
+
+# Each worker must build its own clients in the lifespan hook
+preload_app = False
+
+# Logging
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -0,0 +1,85 @@
+"""
+Shared fixtures: the real app wired to the benchmark stand-ins
+
+`api` is the app served in-process (httpx ASGITransport) with the
+in-memory database, a scratch image store and a ClaudeService whose HTTP
+layer is the fake Anthropic API, so requests run end to end with no
+network, credentials or ports. `fake_api.requests` holds every Messages
+API body the app sent.
+"""
+
+import json
+
+import httpx
+import pytest
+
+from app.dependencies import get_claude, get_db, get_image_store
+from app.main import app
+from app.services.auth import get_user_cache
+from app.services.claude_service import ClaudeService
+from app.services.image_store import ImageStore, LocalImageBackend
+from benchmarks import fake_anthropic
+from benchmarks.common import bench_token
+from benchmarks.fakes import InMemoryDatabase
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """ASGI transport to the fake Anthropic API that keeps each request body"""
+
+    def __init__(self, fake_app):
+        self.inner = httpx.ASGITransport(app=fake_app)
+        self.requests: list[dict] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(await request.aread()))
+        return await self.inner.handle_async_request(request)
+
+
+def auth(user: str) -> dict:
+    """Headers of a request by benchmark user `user`"""
+    return {"Authorization": f"Bearer {bench_token(user)}"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_cache():
+    get_user_cache.cache_clear()
+    yield
+    get_user_cache.cache_clear()
+
+
+@pytest.fixture
+def fake_api() -> RecordingTransport:
+    return RecordingTransport(fake_anthropic.create_app(ttft="fixed:0", output_tokens="fixed:300"))
+
+
+@pytest.fixture
+def database() -> InMemoryDatabase:
+    return InMemoryDatabase(starting_credits=10.0)
+
+
+@pytest.fixture
+def claude(fake_api) -> ClaudeService:
+    return ClaudeService(api_key="test", transport=fake_api)
+
+
+@pytest.fixture
+async def api(database, claude, tmp_path):
+    image_store = ImageStore(LocalImageBackend(str(tmp_path / "images")))
+
+    async def _database():
+        return database
+
+    async def _claude():
+        return claude
+
+    async def _image_store():
+        return image_store
+
+    app.dependency_overrides.update({get_db: _database, get_claude: _claude, get_image_store: _image_store})
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+                yield client
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,125 @@
+"""
+Analysis codec: zstd round-trips, with and without a dictionary, and across dictionary changes
+"""
+
+import random
+
+import pytest
+
+from app.services.analysis_codec import (
+    AnalysisCodec,
+    AnalysisCodecError,
+    from_bytea,
+    to_bytea,
+    train_dictionary,
+)
+from app.db.supabase import SupabaseClient
+from benchmarks.analysis_corpus import synthetic_analysis
+
+
+class Insert:
+    """One PostgREST insert that answers with the row it was given"""
+
+    def __init__(self, row: dict):
+        self.row = row
+
+    def execute(self):
+        return type("Result", (), {"data": [dict(self.row)]})()
+
+
+class AnalysesTable:
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name: str) -> "AnalysesTable":
+        assert name == "analyses"
+        return self
+
+    def insert(self, row: dict) -> Insert:
+        self.rows.append(row)
+        return Insert(row)
+
+
+@pytest.fixture
+def samples() -> list[str]:
+    rng = random.Random(0)
+    return [synthetic_analysis(rng) for _ in range(300)]
+
+
+def test_plain_round_trip(tmp_path, samples):
+    codec = AnalysisCodec(directory=tmp_path)
+
+    for text in samples[:20] + ["", "Ψ ρ q f — ünïcode ✓"]:
+        assert codec.decompress(codec.compress(text)) == text
+
+
+def test_dictionary_round_trip_and_smaller(tmp_path, samples):
+    (tmp_path / "v1.zdict").write_bytes(train_dictionary(samples[:250], size=8 * 1024))
+    plain = AnalysisCodec(directory=tmp_path)
+    trained = AnalysisCodec("v1", directory=tmp_path)
+
+    for text in samples[250:]:
+        packed = trained.compress(text)
+        assert trained.decompress(packed) == text
+        assert len(packed) < len(plain.compress(text))
+    assert trained.dict_id != 0
+
+
+def test_rows_stay_readable_after_dictionary_change(tmp_path, samples):
+    (tmp_path / "v1.zdict").write_bytes(train_dictionary(samples[:150], size=8 * 1024))
+    (tmp_path / "v2.zdict").write_bytes(train_dictionary(samples[150:250], size=8 * 1024))
+    old = AnalysisCodec("v1", directory=tmp_path).compress(samples[260])
+
+    assert AnalysisCodec("v2", directory=tmp_path).decompress(old) == samples[260]
+    # Compression turned off: the reader still knows every dictionary
+    assert AnalysisCodec(directory=tmp_path).decompress(old) == samples[260]
+
+
+def test_unknown_dictionary(tmp_path, samples):
+    (tmp_path / "v1.zdict").write_bytes(train_dictionary(samples[:250], size=8 * 1024))
+    packed = AnalysisCodec("v1", directory=tmp_path).compress(samples[260])
+    (tmp_path / "v1.zdict").unlink()
+
+    with pytest.raises(AnalysisCodecError):
+        AnalysisCodec(directory=tmp_path).decompress(packed)
+    with pytest.raises(FileNotFoundError):
+        AnalysisCodec("v1", directory=tmp_path).compress("text")
+
+
+def test_corrupt_data(tmp_path):
+    with pytest.raises(AnalysisCodecError):
+        AnalysisCodec(directory=tmp_path).decompress(b"not zstd")
+
+
+def test_shipped_dictionary_round_trip(samples):
+    codec = AnalysisCodec("rose-glass-v1")
+
+    assert codec.decompress(codec.compress(samples[0])) == samples[0]
+
+
+def test_bytea_round_trip():
+    assert to_bytea(b"\x00\xffab") == "\\x00ff6162"
+    assert from_bytea(to_bytea(b"\x00\xffab")) == b"\x00\xffab"
+    with pytest.raises(AnalysisCodecError):
+        from_bytea("00ff")
+
+
+async def test_save_returns_the_text_without_decompressing(tmp_path, samples):
+    codec = AnalysisCodec(directory=tmp_path)
+    db = SupabaseClient(url=None, service_key=None, codec=codec)
+    db._client = AnalysesTable()
+
+    def no_decompress(packed):
+        raise AssertionError("decompressed a row it had just compressed")
+
+    codec.decompress = no_decompress
+    saved = await db.save_analysis(
+        user_id="u-1", analysis_text=samples[0], input_tokens=10, output_tokens=20,
+        cost_micros=1_000, charge_micros=2_000, model_used="sonnet", analysis_id="a-1"
+    )
+
+    (row,) = db._client.rows
+    assert row["analysis_text"] is None and from_bytea(row["analysis_zstd"])
+    assert saved["analysis_text"] == samples[0]
+    assert "analysis_zstd" not in saved
+    assert saved["id"] == "a-1"
@@ -0,0 +1,243 @@
+"""
+Analysis endpoints: triage and deep passes, and comparisons with one charge per stream
+"""
+
+import io
+import json
+
+from fastapi import HTTPException, UploadFile
+import pytest
+
+from app.config import get_settings
+from app.core.lifecycle import InFlightTracker
+from app.core.metrics import metrics
+from app.routers.analyze import _comparison_profiles, _run_comparison
+from app.services.auth import User
+from app.services.image_store import ImageStore, LocalImageBackend
+from app.services.rate_limiter import AdmissionController, AdmissionLimits, InMemoryBackend
+from app.services.token_budget import TokenBudgetExceeded
+from benchmarks.common import make_screenshot
+from tests.conftest import auth
+
+
+def profile_files(count: int = 2) -> list:
+    return [("profile_images", (f"{i}.jpg", make_screenshot(i, (585, 1266)), "image/jpeg")) for i in range(count)]
+
+
+def uploads(n: int) -> list[UploadFile]:
+    return [UploadFile(io.BytesIO(b""), filename=f"{i}.png") for i in range(n)]
+
+
+def screenshots(n: int) -> list[UploadFile]:
+    return [UploadFile(io.BytesIO(make_screenshot(i, (585, 1266))), filename=f"{i}.jpg") for i in range(n)]
+
+
+async def compare(api, profiles: int) -> list[dict]:
+    files = [("profile_images", (f"{i}.jpg", make_screenshot(i, (585, 1266)), "image/jpeg")) for i in range(profiles)]
+    response = await api.post("/api/analyze/compare", files=files, data={"images_per_profile": [1] * profiles},
+                              headers=auth("harness"))
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def failing(claude, indexes: set[int]):
+    """`claude.compare_profiles` with the profiles at `indexes` shed instead of answered"""
+    compare_profiles = claude.compare_profiles
+
+    async def wrapped(*args, **kwargs):
+        async for index, outcome in compare_profiles(*args, **kwargs):
+            yield index, TokenBudgetExceeded("model", "budget", 3.0) if index in indexes else outcome
+
+    return wrapped
+
+
+async def triage(api, user: str = "harness") -> dict:
+    response = await api.post("/api/analyze/", files=profile_files(), data={"mode": "triage"}, headers=auth(user))
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_deep_pass_reuses_the_cached_prefix(api, fake_api):
+    first = await triage(api)
+
+    response = await api.post(f"/api/analyze/{first['analysis_id']}/deep", headers=auth("harness"))
+
+    assert response.status_code == 200
+    deep = response.json()
+    assert (deep["stage"], deep["parent_id"]) == ("deep", first["analysis_id"])
+    # Stored screenshots were reused
+    assert deep["image_ids"] == first["image_ids"]
+
+    triage_call, deep_call = fake_api.requests
+    assert deep_call["model"] == triage_call["model"]
+    assert deep_call["system"] == triage_call["system"]
+    # System + images (cache-marked) + triage request, then the triage's answer
+    assert deep_call["messages"][0] == triage_call["messages"][0]
+    assert deep_call["messages"][0]["content"][-2]["cache_control"] == {"type": "ephemeral"}
+    assert deep_call["messages"][1] == {"role": "assistant", "content": first["analysis"]}
+    assert deep_call["messages"][2]["role"] == "user"
+    assert triage_call["max_tokens"] < deep_call["max_tokens"]
+
+    assert first["usage"]["cache_write_tokens"] > 0
+    assert deep["usage"]["cache_read_tokens"] == first["usage"]["cache_write_tokens"]
+
+
+async def test_deep_pass_is_charged_on_its_own(api, database):
+    first = await triage(api)
+
+    deep = (await api.post(f"/api/analyze/{first['analysis_id']}/deep", headers=auth("harness"))).json()
+
+    charges = [(e["reference_id"], -e["amount_usd"]) for e in database.ledger]
+    assert charges == [
+        (first["analysis_id"], pytest.approx(first["usage"]["charge_usd"])),
+        (deep["analysis_id"], pytest.approx(deep["usage"]["charge_usd"])),
+    ]
+    assert database.analyses[deep["analysis_id"]]["stage"] == "deep"
+    assert database.analyses[deep["analysis_id"]]["parent_id"] == first["analysis_id"]
+    assert deep["remaining_credits"] == pytest.approx(10.0 - sum(amount for _, amount in charges))
+
+
+async def test_repeated_deep_pass_is_charged_again(api, database):
+    first = await triage(api)
+
+    for _ in range(2):
+        assert (await api.post(f"/api/analyze/{first['analysis_id']}/deep", headers=auth("harness"))).status_code == 200
+
+    assert [e["reference_id"] == first["analysis_id"] for e in database.ledger] == [True, False, False]
+    assert len({e["reference_id"] for e in database.ledger}) == 3
+
+
+async def test_deep_pass_needs_a_triage_of_ones_own(api, database, fake_api):
+    first = await triage(api)
+    full = (await api.post("/api/analyze/", files=profile_files(), headers=auth("harness"))).json()
+    calls = len(fake_api.requests)
+
+    assert (await api.post(f"/api/analyze/{first['analysis_id']}/deep", headers=auth("someone-else"))).status_code == 404
+    assert (await api.post("/api/analyze/no-such-analysis/deep", headers=auth("harness"))).status_code == 404
+    assert (await api.post(f"/api/analyze/{full['analysis_id']}/deep", headers=auth("harness"))).status_code == 409
+
+    deep = (await api.post(f"/api/analyze/{first['analysis_id']}/deep", headers=auth("harness"))).json()
+    # A deep pass does not continue another deep pass
+    assert (await api.post(f"/api/analyze/{deep['analysis_id']}/deep", headers=auth("harness"))).status_code == 409
+
+    assert len(fake_api.requests) == calls + 1
+    assert len(database.ledger) == 3
+
+
+def test_uploads_split_by_count():
+    files = uploads(5)
+
+    profiles = _comparison_profiles(files, [2, 3], None)
+
+    assert profiles == [files[:2], files[2:]]
+
+
+def test_image_ids_one_list_per_profile():
+    profiles = _comparison_profiles(None, None, ["a, b", " c ,,d", "e"])
+
+    assert profiles == [["a", "b"], ["c", "d"], ["e"]]
+
+
+@pytest.mark.parametrize("counts", [None, [2, 2], [3, 3], [5, 0], [6, -1]])
+def test_counts_must_match_uploads(counts):
+    with pytest.raises(HTTPException) as e:
+        _comparison_profiles(uploads(5), counts, None)
+
+    assert e.value.status_code == 400
+    assert "images_per_profile" in e.value.detail
+
+
+def test_uploads_and_ids_are_exclusive():
+    with pytest.raises(HTTPException) as e:
+        _comparison_profiles(uploads(2), [1, 1], ["a", "b"])
+
+    assert e.value.status_code == 400
+
+
+def test_profile_count_limits():
+    most = get_settings().compare_max_profiles
+
+    for ids in (None, ["a,b"], [str(i) for i in range(most + 1)]):
+        with pytest.raises(HTTPException) as e:
+            _comparison_profiles(None, None, ids)
+        assert e.value.detail == f"A comparison needs 2-{most} profiles"
+    assert len(_comparison_profiles(None, None, [str(i) for i in range(most)])) == most
+
+
+def test_each_profile_needs_one_to_ten_images():
+    with pytest.raises(HTTPException) as empty:
+        _comparison_profiles(None, None, ["a", " , "])
+    with pytest.raises(HTTPException) as too_many:
+        _comparison_profiles(None, None, ["a", ",".join(str(i) for i in range(11))])
+
+    assert empty.value.detail == "At least 1 profile image required"
+    assert too_many.value.detail == "Maximum 10 profile images allowed"
+
+
+async def test_comparison_is_charged_once(api, database):
+    lines = await compare(api, 3)
+
+    header, *results, summary = lines
+    assert [line["type"] for line in results] == ["result"] * 3
+    charge = sum(line["usage"]["charge_micros"] for line in results)
+    (entry,) = database.ledger
+    assert (entry["kind"], entry["reference_id"]) == ("comparison", header["comparison_id"])
+    assert entry["amount_usd"] == pytest.approx(-charge / 1e6)
+    assert {database.analyses[line["analysis_id"]]["comparison_id"] for line in results} == {header["comparison_id"]}
+    assert summary == {
+        "type": "summary", "comparison_id": header["comparison_id"], "analyses": 3, "failed": 0,
+        "charge_usd": pytest.approx(charge / 1e6), "remaining_credits": pytest.approx(10.0 - charge / 1e6),
+    }
+
+
+async def test_failed_profiles_are_not_charged(api, claude, database, monkeypatch):
+    monkeypatch.setattr(claude, "compare_profiles", failing(claude, {1}))
+
+    _, *lines, summary = await compare(api, 3)
+
+    errors = [line for line in lines if line["type"] == "error"]
+    assert [(line["index"], line["status"]) for line in errors] == [(1, 429)]
+    charge = sum(line["usage"]["charge_micros"] for line in lines if line["type"] == "result")
+    assert (summary["analyses"], summary["failed"]) == (2, 1)
+    assert summary["charge_usd"] == pytest.approx(charge / 1e6)
+    assert summary["remaining_credits"] == pytest.approx(10.0 - charge / 1e6)
+    assert len(database.ledger) == 1 and len(database.analyses) == 2
+
+
+async def test_nothing_completed_leaves_the_balance(api, claude, database, monkeypatch):
+    monkeypatch.setattr(claude, "compare_profiles", failing(claude, {0, 1}))
+
+    *_, summary = await compare(api, 2)
+
+    assert (summary["analyses"], summary["failed"], summary["charge_usd"]) == (0, 2, 0.0)
+    assert summary["remaining_credits"] == pytest.approx(10.0)
+    assert database.ledger == []
+
+
+async def test_disconnect_mid_stream_settles_what_completed(claude, database, tmp_path):
+    user = User(id="u-1", clerk_id="clerk-1", email="a@b.c", credits=10_000_000)
+    database._user(user.id)
+    admission = AdmissionController(InMemoryBackend(), AdmissionLimits(
+        user_per_minute=600, user_burst=100, global_per_minute=6000, global_burst=1000,
+        per_user=10, per_model={}, default_per_model=10, global_concurrency=10,
+        max_queue=10, max_wait=1.0, lease_ttl=60
+    ))
+    inflight = InFlightTracker()
+    cancelled = metrics.snapshot()["counters"].get("analysis_cancelled{stage=compare}", 0)
+    stream = _run_comparison(
+        [[upload] for upload in screenshots(3)], None, False, user, claude, database,
+        ImageStore(LocalImageBackend(str(tmp_path))), inflight, admission, claude.route(profile_images=1)
+    )
+
+    header = json.loads(await anext(stream))
+    first = json.loads(await anext(stream))
+    # The client goes away: Starlette closes the body iterator
+    await stream.aclose()
+
+    assert first["type"] == "result"
+    (entry,) = database.ledger
+    assert entry["reference_id"] == header["comparison_id"]
+    assert entry["amount_usd"] == pytest.approx(-first["usage"]["charge_micros"] / 1e6)
+    assert list(database.analyses) == [first["analysis_id"]]
+    assert metrics.snapshot()["counters"]["analysis_cancelled{stage=compare}"] == cancelled + 1
+    assert await inflight.drain(timeout=1)
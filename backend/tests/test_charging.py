@@ -0,0 +1,133 @@
+"""
+Charging: a stale balance snapshot or an unresolved user must not let an analysis through unbilled
+"""
+
+from fastapi import HTTPException
+import pytest
+
+from app.db.journal import WriteJournal
+from app.db.supabase import DatabaseUnavailable, InsufficientCredits, SupabaseClient
+from app.routers.analyze import _deduct, _save_analysis
+from app.services.auth import User, get_user_cache, resolve_user
+from benchmarks.fakes import InMemoryDatabase
+
+
+class FailingDatabase(InMemoryDatabase):
+    def __init__(self, error: Exception):
+        super().__init__()
+        self.error = error
+        self.deferred = []
+
+    async def upsert_user(self, *args, **kwargs) -> dict:
+        raise self.error
+
+    async def deduct_credits(self, *args, **kwargs) -> int:
+        raise self.error
+
+    async def defer(self, op: str, **kwargs) -> bool:
+        self.deferred.append((op, kwargs))
+        return True
+
+
+def cached_user(db: InMemoryDatabase, credits: int) -> User:
+    user = User(id="u-1", clerk_id="clerk-1", email="a@b.c", credits=credits)
+    db._user(user.id)
+    get_user_cache().put(user.clerk_id, user.id, credits)
+    return user
+
+
+async def test_charge_within_balance():
+    db = InMemoryDatabase(starting_credits=1.0)
+    user = cached_user(db, 1_000_000)
+
+    assert await _deduct(db, user, 1_000_000, 250_000, "analysis", "a-1") == 750_000
+    assert get_user_cache().get(user.clerk_id).credits == 750_000
+
+
+async def test_stale_snapshot_is_refused_with_402():
+    db = InMemoryDatabase(starting_credits=0.01)
+    # The cache still believes in $5 (another worker spent it)
+    user = cached_user(db, 5_000_000)
+
+    with pytest.raises(HTTPException) as refused:
+        await _deduct(db, user, 5_000_000, 250_000, "analysis", "a-1")
+
+    assert refused.value.status_code == 402
+    assert "you have $0.01" in refused.value.detail
+    assert get_user_cache().get(user.clerk_id) is None
+    assert db.ledger == []
+
+
+async def test_outage_is_journaled():
+    db = FailingDatabase(DatabaseUnavailable("circuit open"))
+    user = cached_user(db, 1_000_000)
+
+    assert await _deduct(db, user, 1_000_000, 250_000, "analysis", "a-1") == 750_000
+    assert db.deferred == [("deduct_credits", {
+        "user_id": user.id, "amount_micros": 250_000, "kind": "analysis", "reference_id": "a-1"
+    })]
+
+
+async def test_other_failures_are_not_swallowed():
+    db = FailingDatabase(ValueError("bad request"))
+    user = cached_user(db, 1_000_000)
+
+    with pytest.raises(HTTPException) as failed:
+        await _deduct(db, user, 1_000_000, 250_000, "analysis", "a-1")
+    assert failed.value.status_code == 500
+    assert db.deferred == []
+
+
+async def test_fake_mirrors_the_balance_check():
+    db = InMemoryDatabase(starting_credits=0.1)
+    with pytest.raises(InsufficientCredits):
+        await db.deduct_credits("u-2", 200_000)
+
+
+async def test_user_unresolved_during_an_outage():
+    user = await resolve_user(FailingDatabase(DatabaseUnavailable("down")), "clerk-1", None, fallback_id="clerk-1")
+
+    assert (user.id, user.resolved, user.credits) == ("clerk-1", False, None)
+    assert (await resolve_user(InMemoryDatabase(), "clerk-1", None, fallback_id="clerk-1")).resolved
+
+
+async def test_unresolved_user_is_journaled_by_clerk_id():
+    # The database may be back by now, but "clerk-1" is no users.id
+    db = FailingDatabase(ValueError("invalid input syntax for type uuid"))
+    user = User(id="clerk-1", clerk_id="clerk-1", email="a@b.c", resolved=False)
+
+    assert await _deduct(db, user, 1_000_000, 250_000, "analysis", "a-1") == 750_000
+    assert await _save_analysis(db, user, {"user_id": user.id, "analysis_id": "a-1", "analysis_text": "..."}) == "a-1"
+
+    assert db.deferred == [
+        ("deduct_credits", {"clerk_id": "clerk-1", "amount_micros": 250_000, "kind": "analysis", "reference_id": "a-1"}),
+        ("save_analysis", {"clerk_id": "clerk-1", "analysis_id": "a-1", "analysis_text": "..."}),
+    ]
+
+
+async def test_replay_charges_the_resolved_user(tmp_path):
+    db = SupabaseClient(url=None, service_key=None, journal=WriteJournal(str(tmp_path / "journal.db")))
+    applied = []
+
+    async def upsert_user(clerk_id, email=None):
+        return {"id": f"uuid-of-{clerk_id}", "credits": 1_000_000}
+
+    async def deduct_credits(**kwargs):
+        applied.append(("deduct_credits", kwargs))
+
+    async def save_analysis(**kwargs):
+        applied.append(("save_analysis", kwargs))
+
+    db.upsert_user, db.deduct_credits, db.save_analysis = upsert_user, deduct_credits, save_analysis
+    await db.defer("deduct_credits", clerk_id="clerk-1", amount_micros=250_000, kind="analysis", reference_id="a-1")
+    await db.defer("save_analysis", clerk_id="clerk-1", analysis_id="a-1")
+    await db.defer("deduct_credits", user_id="u-2", amount_micros=5, kind="analysis", reference_id="a-2")
+
+    assert await db.replay_journal() == 3
+
+    assert applied == [
+        ("deduct_credits", {"amount_micros": 250_000, "kind": "analysis", "reference_id": "a-1", "user_id": "uuid-of-clerk-1"}),
+        ("save_analysis", {"analysis_id": "a-1", "user_id": "uuid-of-clerk-1"}),
+        ("deduct_credits", {"user_id": "u-2", "amount_micros": 5, "kind": "analysis", "reference_id": "a-2"}),
+    ]
+    db.close()
@@ -0,0 +1,146 @@
+"""
+Circuit breaker: closed -> open after consecutive failures -> half-open probe -> closed or open again
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr("app.core.circuit_breaker.time.monotonic", lambda: self.now)
+
+
+async def ok():
+    return "ok"
+
+
+async def down():
+    raise ConnectionError("refused")
+
+
+async def fail(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        with pytest.raises(ConnectionError):
+            await breaker.call(down)
+
+
+async def test_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker("db", failure_threshold=3)
+
+    await fail(breaker, 2)
+    assert breaker.state == CLOSED
+    # A success resets the count
+    assert await breaker.call(ok) == "ok"
+    await fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    await fail(breaker, 1)
+    assert breaker.state == OPEN
+
+
+async def test_open_fails_fast_without_calling(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=10)
+    await fail(breaker, 1)
+    calls = 0
+
+    async def counted():
+        nonlocal calls
+        calls += 1
+
+    clock.now += 4
+    with pytest.raises(CircuitOpen) as e:
+        await breaker.call(counted)
+
+    assert calls == 0
+    assert e.value.retry_after == pytest.approx(6)
+
+
+async def test_successful_probe_closes(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=10)
+    await fail(breaker, 1)
+
+    clock.now += 10
+    assert await breaker.call(ok) == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.closed
+
+
+async def test_failed_probe_reopens(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker("db", failure_threshold=3, reset_timeout=10)
+    await fail(breaker, 3)
+
+    clock.now += 10
+    await fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen) as e:
+        await breaker.call(ok)
+    assert e.value.retry_after == pytest.approx(10)
+
+
+async def test_one_probe_at_a_time(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=10)
+    await fail(breaker, 1)
+    clock.now += 10
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "ok"
+
+    probe = asyncio.ensure_future(breaker.call(slow))
+    await asyncio.sleep(0)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        await breaker.call(ok)
+
+    release.set()
+    assert await probe == "ok"
+    assert breaker.state == CLOSED
+
+
+async def test_cancelled_probe_lets_the_next_call_probe(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=10)
+    await fail(breaker, 1)
+    clock.now += 10
+
+    probe = asyncio.ensure_future(breaker.call(lambda: asyncio.Event().wait()))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == HALF_OPEN
+    assert await breaker.call(ok) == "ok"
+    assert breaker.state == CLOSED
+
+
+async def test_timeout_counts_as_failure():
+    breaker = CircuitBreaker("db", failure_threshold=1, timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(lambda: asyncio.sleep(1))
+
+    assert breaker.state == OPEN
+
+
+async def test_answered_errors_do_not_trip():
+    breaker = CircuitBreaker("db", failure_threshold=1, is_failure=lambda e: not isinstance(e, ValueError))
+
+    async def rejected():
+        raise ValueError("duplicate key")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await breaker.call(rejected)
+
+    assert breaker.state == CLOSED
@@ -0,0 +1,84 @@
+"""
+Fake Anthropic API: sampled latency and usage, billed like the real API, including the prompt cache
+"""
+
+import random
+
+import httpx
+import pytest
+
+from benchmarks import fake_anthropic
+
+
+def image_block() -> dict:
+    return {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": "AAAA"}}
+
+
+async def post(app, body: dict) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake") as client:
+        return await client.post("/v1/messages", json=body)
+
+
+def test_distributions():
+    rng = random.Random(0)
+
+    assert fake_anthropic.parse_distribution("fixed:0.5", rng)() == 0.5
+    uniform = fake_anthropic.parse_distribution("uniform:0.2,1.5", rng)
+    assert all(0.2 <= uniform() <= 1.5 for _ in range(100))
+    assert all(fake_anthropic.parse_distribution("normal:0,5", rng)() >= 0 for _ in range(100))
+    assert fake_anthropic.parse_distribution("lognormal:0.8,0", rng)() == pytest.approx(0.8)
+    with pytest.raises(ValueError):
+        fake_anthropic.parse_distribution("poisson:3", rng)
+
+
+def test_input_tokens_count_images_and_text():
+    body = {
+        "system": "x" * 400,
+        "messages": [{"role": "user", "content": [image_block(), image_block(), {"type": "text", "text": "y" * 40}]}],
+    }
+
+    assert fake_anthropic.count_input_tokens(body, per_image_tokens=1000) == 2000 + 110
+
+
+def test_cached_prefix_ends_at_last_breakpoint():
+    body = {
+        "system": [{"type": "text", "text": "system", "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": [
+            image_block(), {"type": "text", "text": "marked", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "after"},
+        ]}],
+    }
+
+    assert [b.get("text") for b in fake_anthropic.cached_prefix(body)] == ["system", None, "marked"]
+    assert fake_anthropic.cached_prefix({"system": "plain", "messages": []}) == []
+
+
+async def test_first_request_writes_cache_repeat_reads_it():
+    app = fake_anthropic.create_app(ttft="fixed:0", output_tokens="fixed:5000", per_image_tokens=1000)
+    body = {
+        "model": "claude-sonnet-4-20250514",
+        "max_tokens": 700,
+        "system": [{"type": "text", "text": "s" * 400, "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": [image_block(), {"type": "text", "text": "q" * 40}]}],
+    }
+
+    first = (await post(app, body)).json()["usage"]
+    second = (await post(app, body)).json()["usage"]
+
+    assert first == {"input_tokens": 1010, "output_tokens": 700,
+                     "cache_creation_input_tokens": 100, "cache_read_input_tokens": 0}
+    assert second["cache_read_input_tokens"] == 100
+    assert second["cache_creation_input_tokens"] == 0
+    # Another model has its own cache
+    other = (await post(app, {**body, "model": "claude-3-5-haiku-20241022"})).json()["usage"]
+    assert other["cache_creation_input_tokens"] == 100
+
+
+async def test_error_rate():
+    app = fake_anthropic.create_app(ttft="fixed:0", error_rate=1.0)
+
+    response = await post(app, {"messages": []})
+
+    assert response.status_code == 529
+    assert response.json()["error"]["type"] == "overloaded_error"
@@ -0,0 +1,111 @@
+"""
+Image packing: screenshots tiled into fewer images within Claude's limits, order and legibility preserved
+"""
+
+import io
+
+from PIL import Image
+import pytest
+
+from app.services.image_packing import (
+    MAX_EDGE,
+    MAX_PIXELS,
+    fit_scale,
+    image_tokens,
+    pack_images,
+)
+from app.services.image_store import normalize_image
+from benchmarks.image_packing import synthetic_screenshot
+
+
+def size(data: bytes) -> tuple[int, int]:
+    return Image.open(io.BytesIO(data)).size
+
+
+@pytest.fixture(scope="module")
+def screenshots() -> list[bytes]:
+    return [normalize_image(synthetic_screenshot(seed)) for seed in range(5)]
+
+
+def test_token_estimate():
+    assert fit_scale(800, 600) == 1.0
+    assert image_tokens(750, 1000) == 1000
+    # Downscaled to the area limit first, so no image costs much more than ~1,500
+    assert image_tokens(4000, 4000) == pytest.approx(MAX_PIXELS / 750, rel=0.01)
+    assert fit_scale(3136, 100) == pytest.approx(MAX_EDGE / 3136)
+
+
+def test_packs_into_fewer_cheaper_images(screenshots):
+    result = pack_images(screenshots)
+
+    assert sum(result.tiles) == len(screenshots)
+    assert len(result.images) < len(screenshots)
+    assert result.tokens_after < result.tokens_before
+    assert result.min_scale >= 0.7
+    for data in result.images:
+        width, height = size(data)
+        assert max(width, height) <= MAX_EDGE
+        assert width * height <= MAX_PIXELS
+
+
+def test_min_scale_bounds_shrinking(screenshots):
+    strict = pack_images(screenshots, min_scale=0.95)
+    loose = pack_images(screenshots, min_scale=0.5)
+
+    assert strict.min_scale >= 0.95
+    assert len(loose.images) <= len(strict.images)
+
+
+def test_max_tiles(screenshots):
+    assert max(pack_images(screenshots, min_scale=0.1, max_tiles=2).tiles) <= 2
+    assert pack_images(screenshots, max_tiles=1).tiles == [1] * len(screenshots)
+
+
+def test_deterministic(screenshots):
+    assert pack_images(screenshots).images == pack_images(screenshots).images
+
+
+def test_order_is_preserved():
+    # Solid blocks of distinct colours, one per screenshot, read left to right
+    colours = [(220, 30, 30), (30, 200, 30), (30, 30, 220)]
+    shots = []
+    for colour in colours:
+        image = Image.new("RGB", (600, 1300), (250, 250, 250))
+        image.paste(colour, (100, 200, 500, 1100))
+        out = io.BytesIO()
+        image.save(out, format="PNG")
+        shots.append(out.getvalue())
+
+    result = pack_images(shots, min_scale=0.5)
+    assert result.tiles == [3]
+
+    packed = Image.open(io.BytesIO(result.images[0])).convert("RGB")
+    width, height = packed.size
+    found = []
+    for x in range(0, width, 4):
+        pixel = packed.getpixel((x, height // 2))
+        for colour in colours:
+            if all(abs(a - b) < 40 for a, b in zip(pixel, colour)) and (not found or found[-1] != colour):
+                found.append(colour)
+    assert found == colours
+
+
+def test_single_untrimmed_image_sent_as_is():
+    image = Image.effect_noise((500, 900), 50).convert("RGB")
+    out = io.BytesIO()
+    image.save(out, format="JPEG")
+    data = out.getvalue()
+
+    result = pack_images([data])
+
+    assert result.images == [data]
+    assert result.tokens_after == result.tokens_before
+
+
+def test_blank_screenshot_is_kept():
+    out = io.BytesIO()
+    Image.new("RGB", (400, 800), (255, 255, 255)).save(out, format="PNG")
+
+    result = pack_images([out.getvalue()])
+
+    assert result.tiles == [1]
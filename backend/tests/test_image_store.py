@@ -0,0 +1,64 @@
+"""
+Image store: normalization and the local backend's writes
+"""
+
+import asyncio
+import hashlib
+import io
+import threading
+
+from PIL import Image
+
+from app.services.image_store import ImageStore, LocalImageBackend, normalize_image
+
+
+def screenshot(size=(600, 1300), color=(200, 120, 40)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_normalize_keeps_in_bounds_images():
+    data = screenshot()
+    assert normalize_image(data) == data
+
+
+def test_normalize_downscales_and_is_idempotent():
+    normalized = normalize_image(screenshot((1170, 2532)))
+    assert max(Image.open(io.BytesIO(normalized)).size) == 1568
+    assert normalize_image(normalized) == normalized
+
+
+async def test_concurrent_puts_of_one_image(tmp_path):
+    store = ImageStore(LocalImageBackend(str(tmp_path)))
+    data = screenshot()
+
+    stored = await asyncio.gather(*(store.put(data) for _ in range(40)))
+
+    image_id = hashlib.sha256(data).hexdigest()
+    assert {image.id for image in stored} == {image_id}
+    assert (await store.get(image_id)).data == data
+    # No temporary files left behind
+    assert [p.name for p in (tmp_path / image_id[:2]).iterdir()] == [image_id]
+
+
+def test_concurrent_writes_from_threads(tmp_path):
+    backend = LocalImageBackend(str(tmp_path))
+    data = screenshot()
+    path = backend._path("ab" * 32)
+    errors = []
+
+    def write():
+        try:
+            backend._write(path, data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert path.read_bytes() == data
@@ -0,0 +1,81 @@
+"""
+Hash-first uploads: only a user's own images count as stored or can be referenced by id
+"""
+
+from fastapi import HTTPException
+import pytest
+
+from app.routers.images import load_images
+from app.services.auth import User
+from app.services.image_store import ImageStore, LocalImageBackend
+from benchmarks.common import make_screenshot
+from benchmarks.fakes import InMemoryDatabase
+from tests.conftest import auth
+
+
+def upload(seed: int) -> tuple:
+    return ("images", (f"{seed}.jpg", make_screenshot(seed, (585, 1266)), "image/jpeg"))
+
+
+async def stored_ids(api, user: str, seeds: range) -> list[str]:
+    response = await api.post("/api/images/", files=[upload(seed) for seed in seeds], headers=auth(user))
+    assert response.status_code == 200
+    return [image["id"] for image in response.json()["images"]]
+
+
+async def check(api, user: str, hashes: list[str]) -> dict:
+    response = await api.post("/api/images/check", json={"hashes": hashes}, headers=auth(user))
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_check_reports_only_own_images_as_stored(api):
+    mine = await stored_ids(api, "alice", range(2))
+    theirs = await stored_ids(api, "bob", range(2, 3))
+    unknown = "0" * 64
+
+    answer = await check(api, "alice", [mine[0].upper(), *theirs, mine[1], unknown, "not-a-hash", mine[0]])
+
+    assert answer["stored"] == mine
+    assert answer["missing"] == [*theirs, unknown, "not-a-hash"]
+    # Bob's image is stored, just not for Alice
+    assert (await check(api, "bob", theirs))["stored"] == theirs
+
+
+async def test_check_reports_owned_images_gone_from_the_store(api, tmp_path):
+    (image_id,) = await stored_ids(api, "alice", range(1))
+    (path,) = (tmp_path / "images").rglob(f"{image_id}*")
+    path.unlink()
+
+    assert await check(api, "alice", [image_id]) == {"stored": [], "missing": [image_id]}
+
+
+async def test_analysis_cannot_reference_someone_elses_image(api, database, fake_api):
+    (theirs,) = await stored_ids(api, "bob", range(1))
+
+    response = await api.post("/api/analyze/", data={"profile_image_ids": [theirs]}, headers=auth("alice"))
+
+    assert response.status_code == 404
+    assert fake_api.requests == []
+    assert database.ledger == []
+
+    response = await api.post("/api/analyze/", data={"profile_image_ids": [theirs]}, headers=auth("bob"))
+    assert response.status_code == 200
+    assert response.json()["image_ids"] == [theirs]
+
+
+async def test_load_images_checks_ownership_except_known_ids(tmp_path):
+    db = InMemoryDatabase()
+    store = ImageStore(LocalImageBackend(str(tmp_path)))
+    image = await store.put(make_screenshot(0, (585, 1266)))
+    owner, other = User(id="u-1", clerk_id="c-1", email=""), User(id="u-2", clerk_id="c-2", email="")
+    await db.add_user_images(owner.id, [image.id])
+
+    assert await load_images([image.id], store, db, owner) == [image]
+
+    with pytest.raises(HTTPException) as refused:
+        await load_images([image.id], store, db, other)
+    assert refused.value.status_code == 404
+
+    # e.g. the triage's own images, for its deep pass
+    assert await load_images([image.id], store, db, other, known=frozenset([image.id])) == [image]
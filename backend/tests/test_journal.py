@@ -0,0 +1,114 @@
+"""
+Write journal: writes deferred during an outage are replayed in order once the database answers
+"""
+
+import pytest
+
+from app.db.journal import WriteJournal
+from app.db.supabase import DatabaseUnavailable, SupabaseClient
+
+
+class DuplicateKey(Exception):
+    code = "23505"
+
+
+def client_with_journal(tmp_path) -> tuple[SupabaseClient, list]:
+    """A client whose journaled writes record their calls instead of querying"""
+    db = SupabaseClient(url=None, service_key=None, journal=WriteJournal(str(tmp_path / "journal.db")))
+    applied = []
+
+    async def deduct_credits(**kwargs):
+        applied.append(("deduct_credits", kwargs))
+
+    async def save_analysis(**kwargs):
+        applied.append(("save_analysis", kwargs))
+
+    db.deduct_credits = deduct_credits
+    db.save_analysis = save_analysis
+    return db, applied
+
+
+async def test_journal_survives_reopen(tmp_path):
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    await journal.append("deduct_credits", {"user_id": "u-1", "amount_micros": 5})
+    journal.close()
+
+    reopened = WriteJournal(str(tmp_path / "journal.db"))
+    assert await reopened.count() == 1
+    assert await reopened.next_batch() == [(1, "deduct_credits", {"user_id": "u-1", "amount_micros": 5})]
+    reopened.close()
+
+
+async def test_replay_applies_in_order_and_empties(tmp_path):
+    db, applied = client_with_journal(tmp_path)
+    assert await db.defer("deduct_credits", user_id="u-1", amount_micros=5)
+    assert await db.defer("save_analysis", analysis_id="a-1")
+    assert await db.defer("deduct_credits", user_id="u-2", amount_micros=7)
+
+    assert await db.replay_journal() == 3
+
+    assert applied == [
+        ("deduct_credits", {"user_id": "u-1", "amount_micros": 5}),
+        ("save_analysis", {"analysis_id": "a-1"}),
+        ("deduct_credits", {"user_id": "u-2", "amount_micros": 7}),
+    ]
+    assert await db.journal.count() == 0
+    db.close()
+
+
+async def test_replay_pauses_when_database_fails_again(tmp_path):
+    db, applied = client_with_journal(tmp_path)
+    await db.defer("deduct_credits", user_id="u-1", amount_micros=5)
+    await db.defer("deduct_credits", user_id="u-2", amount_micros=7)
+
+    async def outage(**kwargs):
+        if kwargs["user_id"] == "u-2":
+            raise DatabaseUnavailable("down")
+        applied.append(kwargs)
+
+    db.deduct_credits = outage
+    assert await db.replay_journal() == 1
+    # The second write stays queued for the next replay
+    assert await db.journal.next_batch() == [(2, "deduct_credits", {"user_id": "u-2", "amount_micros": 7})]
+    db.close()
+
+
+async def test_rejected_entry_is_kept_as_failed(tmp_path):
+    db, applied = client_with_journal(tmp_path)
+    await db.defer("deduct_credits", user_id="u-1", amount_micros=5)
+    await db.defer("save_analysis", analysis_id="a-1")
+
+    async def rejected(**kwargs):
+        raise ValueError("violates foreign key")
+
+    db.deduct_credits = rejected
+    assert await db.replay_journal() == 1
+
+    assert applied == [("save_analysis", {"analysis_id": "a-1"})]
+    assert await db.journal.count() == 0
+    failed = db.journal._run("SELECT op, failed, last_error FROM writes")
+    assert failed == [("deduct_credits", 1, "violates foreign key")]
+    db.close()
+
+
+async def test_save_that_already_landed_counts_as_applied(tmp_path):
+    db, _ = client_with_journal(tmp_path)
+    await db.defer("save_analysis", analysis_id="a-1")
+
+    async def exists(**kwargs):
+        raise DuplicateKey("duplicate key value")
+
+    db.save_analysis = exists
+    assert await db.replay_journal() == 1
+    assert await db.journal.count() == 0
+    assert db.journal._run("SELECT count(*) FROM writes") == [(0,)]
+    db.close()
+
+
+async def test_only_journaled_writes_can_be_deferred(tmp_path):
+    db, _ = client_with_journal(tmp_path)
+
+    with pytest.raises(ValueError):
+        await db.defer("delete_user", user_id="u-1")
+    assert await db.journal.count() == 0
+    db.close()
@@ -0,0 +1,153 @@
+"""
+Credit ledger: idempotent postings, refused charges, and the spend dashboards built from it
+"""
+
+from datetime import date
+
+from postgrest.exceptions import APIError
+import pytest
+
+from app.config import get_settings
+from app.db.supabase import InsufficientCredits, SupabaseClient
+from app.routers.admin import _dashboard
+from app.services.auth import get_user_cache
+from benchmarks.common import make_screenshot
+from benchmarks.fakes import InMemoryDatabase
+from tests.conftest import auth
+
+
+class RpcCall:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def execute(self):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class RpcClient:
+    """Stands in for the supabase client: records rpc calls, answers with `outcome`"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = []
+
+    def rpc(self, name: str, params: dict) -> RpcCall:
+        self.calls.append((name, params))
+        return RpcCall(self.outcome)
+
+
+def client_answering(outcome) -> tuple[SupabaseClient, RpcClient]:
+    db = SupabaseClient(url=None, service_key=None)
+    db._client = RpcClient(outcome)
+    return db, db._client
+
+
+def profile_files(count: int = 1) -> list:
+    return [("profile_images", (f"{i}.jpg", make_screenshot(i, (585, 1266)), "image/jpeg")) for i in range(count)]
+
+
+async def test_repeated_reference_posts_once():
+    db = InMemoryDatabase(starting_credits=1.0)
+
+    assert await db.deduct_credits("u-1", 250_000, "analysis", "a-1") == 750_000
+    # A retried charge for the same analysis is a no-op
+    assert await db.deduct_credits("u-1", 250_000, "analysis", "a-1") == 750_000
+    # The same reference under another kind is a separate posting
+    assert await db.add_credits("u-1", 250_000, "refund", "a-1") == 1_000_000
+
+    assert [(e["kind"], e["amount_usd"]) for e in db.ledger] == [("analysis", -0.25), ("refund", 0.25)]
+
+
+async def test_posting_carries_its_idempotency_key():
+    db, client = client_answering(Result("0.750000"))
+
+    assert await db.deduct_credits("u-1", 250_000, "analysis", "a-1") == 750_000
+
+    assert client.calls == [("post_ledger_entry", {
+        "p_user_id": "u-1",
+        "p_amount": "-0.250000",
+        "p_kind": "analysis",
+        "p_reference_id": "a-1",
+    })]
+
+
+async def test_check_violation_on_a_debit_is_insufficient_credits():
+    violation = APIError({"code": "23514", "message": "new row violates check constraint"})
+
+    db, _ = client_answering(violation)
+    with pytest.raises(InsufficientCredits):
+        await db.deduct_credits("u-1", 250_000, "analysis", "a-1")
+
+    # A credit cannot overdraw; the constraint error is not about the balance
+    db, _ = client_answering(violation)
+    with pytest.raises(APIError):
+        await db.add_credits("u-1", 250_000, "purchase", "cs_1")
+
+
+async def test_stale_balance_is_refused_with_402(api, database, fake_api):
+    user_id = (await database.upsert_user("harness"))["id"]
+    # The cache still believes in $5 while another worker spent it all
+    get_user_cache().put("harness", user_id, 5_000_000)
+    database.users[user_id]["credits"] = 0
+
+    response = await api.post("/api/analyze/", files=profile_files(), headers=auth("harness"))
+
+    assert response.status_code == 402
+    assert response.headers["X-Required-Credits"]
+    assert database.ledger == []
+    assert database.analyses == {}
+    assert get_user_cache().get("harness") is None
+
+
+def test_dashboard_folds_rows_per_model():
+    rows = [
+        {"day": "2026-10-01", "model": "sonnet", "analyses": 2, "users": 2,
+         "input_tokens": 100, "output_tokens": 40, "cost_usd": 0.02, "charge_usd": 0.05},
+        {"day": "2026-10-01", "model": "haiku", "analyses": 1, "users": 1,
+         "input_tokens": 10, "output_tokens": 5, "cost_usd": 0.001, "charge_usd": 0.01},
+        {"day": "2026-10-02", "model": "sonnet", "analyses": 3, "users": 1,
+         "input_tokens": 300, "output_tokens": 60, "cost_usd": 0.03, "charge_usd": 0.07},
+    ]
+
+    dashboard = _dashboard(date(2026, 10, 1), rows)
+
+    assert dashboard.totals.analyses == 6
+    assert dashboard.totals.input_tokens == 410
+    assert dashboard.totals.charge_usd == pytest.approx(0.13)
+    assert dashboard.by_model["sonnet"].analyses == 5
+    assert dashboard.by_model["sonnet"].output_tokens == 100
+    assert dashboard.by_model["haiku"].cost_usd == pytest.approx(0.001)
+    assert [(row.day, row.model) for row in dashboard.by_day] == [
+        (date(2026, 10, 1), "sonnet"), (date(2026, 10, 1), "haiku"), (date(2026, 10, 2), "sonnet"),
+    ]
+
+
+async def test_usage_dashboards_match_the_ledger(api, database, monkeypatch):
+    monkeypatch.setattr(get_settings(), "admin_api_key", "s3cret")
+    admin = {"X-Admin-Key": "s3cret"}
+    for _ in range(2):
+        assert (await api.post("/api/analyze/", files=profile_files(), headers=auth("harness"))).status_code == 200
+    user_id = database.clerk_ids["harness"]
+
+    assert (await api.get("/api/admin/usage")).status_code == 403
+
+    usage = (await api.get("/api/admin/usage", headers=admin)).json()
+    charged = -sum(e["amount_usd"] for e in database.ledger)
+    assert usage["totals"]["analyses"] == 2
+    assert usage["totals"]["charge_usd"] == pytest.approx(charged)
+    assert sum(m["analyses"] for m in usage["by_model"].values()) == 2
+
+    mine = (await api.get(f"/api/admin/usage/users/{user_id}", headers=admin)).json()
+    assert mine["totals"] == usage["totals"]
+    other = (await api.get("/api/admin/usage/users/someone-else", headers=admin)).json()
+    assert other["totals"]["analyses"] == 0
+
+    ledger = (await api.get(f"/api/admin/ledger/{user_id}", headers=admin)).json()
+    assert [e["kind"] for e in ledger["entries"]] == ["analysis", "analysis"]
@@ -0,0 +1,162 @@
+"""
+Worker lifecycle: disconnected clients cancel their work, settlement survives it, drain waits for both
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.lifecycle import ClientDisconnected, InFlightTracker, ShuttingDown, cancel_on_disconnect
+
+
+class FakeRequest:
+    """Starlette request whose client leaves after `connected_polls` checks"""
+
+    def __init__(self, connected_polls: int = 1_000_000):
+        self.connected_polls = connected_polls
+        self.polls = 0
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.polls > self.connected_polls
+
+
+async def test_drain_when_idle():
+    tracker = InFlightTracker()
+
+    assert await tracker.drain(timeout=0.01) is True
+    assert tracker.draining
+
+
+async def test_drain_refuses_new_work_and_times_out():
+    tracker = InFlightTracker()
+    release = asyncio.Event()
+
+    async def analysis():
+        async with tracker.track():
+            await release.wait()
+
+    running = asyncio.ensure_future(analysis())
+    await asyncio.sleep(0)
+    assert tracker.active == 1
+
+    assert await tracker.drain(timeout=0.02) is False
+    with pytest.raises(ShuttingDown):
+        async with tracker.track():
+            pass
+
+    release.set()
+    await running
+    assert await tracker.drain(timeout=1) is True
+
+
+async def test_settlement_survives_cancelled_request():
+    tracker = InFlightTracker()
+    settled = asyncio.Event()
+    started = asyncio.Event()
+
+    async def settle():
+        started.set()
+        await asyncio.sleep(0.05)
+        settled.set()
+        return "charged"
+
+    async def request():
+        async with tracker.track():
+            return await tracker.run_to_completion(settle())
+
+    task = asyncio.ensure_future(request())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # The request is gone but drain still waits for its charge
+    assert tracker.active == 0
+    assert not settled.is_set()
+    assert await tracker.drain(timeout=1) is True
+    assert settled.is_set()
+
+
+async def test_run_to_completion_returns_result():
+    tracker = InFlightTracker()
+
+    async def settle():
+        return 42
+
+    assert await tracker.run_to_completion(settle()) == 42
+    assert await tracker.drain(timeout=0.01) is True
+
+
+async def test_returns_result_while_connected():
+    async def work():
+        await asyncio.sleep(0.03)
+        return "result"
+
+    assert await cancel_on_disconnect(FakeRequest(), work(), poll_interval=0.01) == "result"
+
+
+async def test_exception_from_work_propagates():
+    async def work():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        await cancel_on_disconnect(FakeRequest(), work(), poll_interval=0.01)
+
+
+async def test_disconnect_cancels_work():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    request = FakeRequest(connected_polls=2)
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(request, work(), poll_interval=0.01)
+
+    assert cancelled.is_set()
+    assert request.polls == 3
+
+
+async def test_disconnect_does_not_cancel_settlement():
+    tracker = InFlightTracker()
+    settled = asyncio.Event()
+
+    async def settle():
+        await asyncio.sleep(0.05)
+        settled.set()
+
+    async def work():
+        async with tracker.track():
+            await tracker.run_to_completion(settle())
+
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(FakeRequest(connected_polls=0), work(), poll_interval=0.01)
+
+    assert not settled.is_set()
+    assert await tracker.drain(timeout=1) is True
+    assert settled.is_set()
+
+
+async def test_cancelling_caller_cancels_work():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(cancel_on_disconnect(FakeRequest(), work(), poll_interval=0.01))
+    await asyncio.sleep(0.02)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
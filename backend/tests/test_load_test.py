@@ -0,0 +1,66 @@
+"""
+Load test harness: request shapes, statistics, regression checks, and the bench stack end to end
+"""
+
+import random
+
+import pytest
+
+from benchmarks import load_test
+from benchmarks.common import LoadResult, make_screenshot, percentile
+from tests.conftest import auth
+
+
+def test_percentile_nearest_rank():
+    ordered = [float(i) for i in range(1, 101)]
+
+    assert percentile(ordered, 0.50) == 50.0
+    assert percentile(ordered, 0.99) == 99.0
+    assert percentile([3.0], 0.95) == 3.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_summary():
+    result = LoadResult(latencies=[0.3, 0.1, 0.2], statuses={200: 3, 429: 1}, errors=1, elapsed=2.0)
+
+    summary = result.summary()
+
+    assert summary["requests"] == 3
+    assert summary["throughput_rps"] == 1.5
+    assert summary["p50_ms"] == pytest.approx(200)
+    assert summary["statuses"] == {"200": 3, "429": 1}
+
+
+def test_requests_carry_distinct_screenshots_and_user(monkeypatch):
+    monkeypatch.setattr(load_test, "make_screenshot", lambda seed, size, fmt: make_screenshot(seed, (60, 130), fmt))
+    build = load_test.build_requester(load_test.SCENARIOS["conversation"], pool_size=8)
+
+    request = build(3, random.Random(0))
+
+    names = [name for name, _ in request["files"]]
+    assert names.count("profile_images") == 3 and names.count("conversation_images") == 4
+    assert len({content for _, (_, content, _) in request["files"]}) == 7
+    assert request["headers"] == build(3, random.Random(1))["headers"]
+    assert request["headers"] != build(4, random.Random(0))["headers"]
+
+
+def test_regressions_beyond_tolerance(capsys):
+    run = {"scenario": "standard", "concurrency": 8, "throughput_rps": 80.0, "p50_ms": 100.0,
+           "p95_ms": 150.0, "p99_ms": 300.0, "peak_rss_mb": 200.0, "requests": 800, "errors": 0}
+    baseline = {**run, "throughput_rps": 100.0, "p99_ms": 290.0, "_tolerance": 0.10}
+
+    assert load_test.print_row(run, baseline) == ["throughput_rps"]
+    assert "REGRESSION" in capsys.readouterr().out
+    assert load_test.print_row(run) == []
+
+
+async def test_analysis_through_bench_stack(api, database, fake_api):
+    files = [("profile_images", (f"{i}.jpg", make_screenshot(i, (585, 1266)), "image/jpeg")) for i in range(2)]
+
+    response = await api.post("/api/analyze/", files=files, headers=auth("harness"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["analysis"].startswith("**Rose Glass Analysis:**")
+    assert len(fake_api.requests) == 1
+    assert database.analyses[body["analysis_id"]]["user_id"] == database.clerk_ids["harness"]
@@ -0,0 +1,137 @@
+"""
+Logging: per-logger sampling, JSON records with their fields, and the queue's writer thread
+"""
+
+import io
+import json
+import logging
+from logging.handlers import QueueHandler
+import sys
+import threading
+
+import pytest
+
+from app.config import get_settings
+from app.core import logs
+from app.core.logs import JsonFormatter, SamplingFilter, configure_logging, stop_logging
+from app.core.metrics import metrics
+
+
+@pytest.fixture(autouse=True)
+def app_logging():
+    """Put the app's logging configuration back after each test"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    settings = get_settings()
+    configure_logging(settings.log_level, settings.log_format, settings.log_sample_rates, settings.log_queue_size)
+    for handler in handlers:
+        if not isinstance(handler, QueueHandler):
+            root.addHandler(handler)
+    root.setLevel(level)
+
+
+def record(name: str = "app.test", level: int = logging.INFO, msg: str = "message", args=(), exc_info=None):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+
+
+def sampled_out(logger: str) -> float:
+    return metrics.snapshot()["counters"].get(f"log_records_sampled_out{{logger={logger}}}", 0)
+
+
+class BlockingStream(io.StringIO):
+    """Output whose writes wait until `release` is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.writing.set()
+        self.release.wait(5)
+        return super().write(text)
+
+
+def test_sampling_rate_comes_from_the_closest_configured_logger():
+    sampler = SamplingFilter({"app.routers": 0.0, "app.routers.images": 1.0})
+
+    assert sampler.rate("app.routers.analyze") == 0.0
+    assert sampler.rate("app.routers.images") == 1.0
+    assert sampler.rate("app.routers.images.upload") == 1.0
+    assert sampler.rate("app.db.supabase") == 1.0
+
+
+def test_sampling_keeps_warnings_and_counts_what_it_drops():
+    sampler = SamplingFilter({"app.routers": 0.0})
+    before = sampled_out("app.routers.analyze")
+
+    assert sampler.filter(record("app.routers.analyze")) is False
+    assert sampler.filter(record("app.routers.analyze", logging.WARNING)) is True
+    assert sampler.filter(record("app.db.supabase")) is True
+    assert sampled_out("app.routers.analyze") == before + 1
+
+
+def test_sampling_keeps_the_configured_fraction(monkeypatch):
+    sampler = SamplingFilter({"app": 0.25})
+
+    monkeypatch.setattr(logs.random, "random", lambda: 0.2)
+    assert sampler.filter(record()) is True
+    monkeypatch.setattr(logs.random, "random", lambda: 0.3)
+    assert sampler.filter(record()) is False
+
+
+def test_json_record_carries_its_fields():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        exc_info = sys.exc_info()
+    entry = record("app.routers.analyze", logging.ERROR, "Charged $%(charge)s to %(user)s",
+                   ({"charge": "0.05", "user": "clerk-1"},), exc_info)
+    entry.request_id = "r-1"
+
+    line = json.loads(JsonFormatter().format(entry))
+
+    assert line["level"] == "ERROR"
+    assert line["logger"] == "app.routers.analyze"
+    assert line["msg"] == "Charged $0.05 to clerk-1"
+    assert (line["charge"], line["user"], line["request_id"]) == ("0.05", "clerk-1", "r-1")
+    assert "ValueError: boom" in line["exc"]
+    assert line["ts"].endswith("+00:00")
+
+
+def test_records_are_written_by_the_listener_and_flushed_on_stop():
+    out = io.StringIO()
+    configure_logging("INFO", "json", stream=out)
+
+    logging.getLogger("app.test").info("Analysis for %(user)s", {"user": "clerk-1"})
+    logging.getLogger("app.test").debug("below the level")
+    stop_logging()
+
+    (line,) = out.getvalue().splitlines()
+    assert json.loads(line)["msg"] == "Analysis for clerk-1"
+    # Stopping again is harmless
+    stop_logging()
+
+
+def test_full_queue_drops_records_and_still_stops():
+    out = BlockingStream()
+    configure_logging("INFO", "text", queue_size=2, stream=out)
+    logger = logging.getLogger("app.test")
+    dropped = metrics.snapshot()["counters"].get("log_records_dropped", 0)
+
+    logger.info("first")
+    assert out.writing.wait(5)
+    for i in range(5):
+        logger.info("queued %(i)d", {"i": i})
+
+    assert metrics.snapshot()["counters"]["log_records_dropped"] == dropped + 3
+    out.release.set()
+    stop_logging()
+
+    assert [line.rpartition(" - ")[2] for line in out.getvalue().splitlines()] == ["first", "queued 0", "queued 1"]
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(ValueError, match="yaml"):
+        configure_logging(fmt="yaml")
@@ -0,0 +1,78 @@
+"""
+Model router: the cheapest adequate tier per request, and escalation to fast under load
+"""
+
+import pytest
+
+from app.services.model_router import ModelRouter, RequestFeatures, RoutingPolicy
+
+
+def routed(features: RequestFeatures, queue_depths: dict = None, router: ModelRouter = None) -> tuple[str, str]:
+    route = (router or ModelRouter()).route(features, queue_depths)
+    return route.tier, route.reason
+
+
+def test_small_requests_go_fast():
+    assert routed(RequestFeatures(profile_images=1)) == ("fast", "small")
+    assert routed(RequestFeatures(profile_images=2)) == ("fast", "small")
+
+
+def test_image_count_moves_to_standard():
+    assert routed(RequestFeatures(profile_images=3)) == ("standard", "default")
+    # Conversation screenshots count towards the total as well
+    router = ModelRouter(RoutingPolicy(fast_with_conversation=True))
+    assert routed(RequestFeatures(profile_images=1, conversation_images=2), router=router) == ("standard", "default")
+
+
+def test_conversation_is_standard_unless_allowed_fast():
+    assert routed(RequestFeatures(profile_images=1, conversation_images=1)) == ("standard", "conversation")
+
+    router = ModelRouter(RoutingPolicy(fast_with_conversation=True))
+    assert routed(RequestFeatures(profile_images=1, conversation_images=1), router=router) == ("fast", "small")
+
+
+def test_context_length_moves_to_standard():
+    assert routed(RequestFeatures(profile_images=1, context_chars=200)) == ("fast", "small")
+    assert routed(RequestFeatures(profile_images=1, context_chars=201)) == ("standard", "default")
+
+
+def test_premium_only_when_asked_and_never_downgraded():
+    assert routed(RequestFeatures(profile_images=1, use_premium=True)) == ("premium", "requested")
+    assert routed(RequestFeatures(profile_images=4, use_premium=True), {"standard:small": 50}) == ("premium", "requested")
+
+
+def test_standard_queue_escalates_mid_sized_requests_to_fast():
+    features = RequestFeatures(profile_images=4)
+
+    assert routed(features, {"standard:small": 3}) == ("standard", "default")
+    assert routed(features, {"standard:small": 2, "standard:large": 2}) == ("fast", "load")
+    # Queues on other tiers are not standard pressure
+    assert routed(features, {"fast:small": 10, "premium:large": 10}) == ("standard", "default")
+    # Too large to move even under load
+    assert routed(RequestFeatures(profile_images=6), {"standard:small": 10}) == ("standard", "default")
+
+
+def test_standard_latency_escalates_when_configured():
+    router = ModelRouter(RoutingPolicy(pressure_queue_depth=0, pressure_latency_ms=5_000))
+    features = RequestFeatures(profile_images=4)
+    standard = router.route(features)
+    assert standard.tier == "standard"
+
+    router.record(standard, latency_ms=4_000, cost_micros=10_000)
+    assert routed(features, router=router) == ("standard", "default")
+
+    router.record(standard, latency_ms=40_000, cost_micros=10_000)
+    assert router.latency_ms("standard") == pytest.approx(4_000 + 0.2 * 36_000)
+    assert routed(features, router=router) == ("fast", "load")
+
+
+def test_pinned_model_keeps_its_tier():
+    router = ModelRouter()
+
+    assert router.route_model(router.model_for("premium"), "deep").tier == "premium"
+    assert router.route_model("some-other-model", "deep").tier == "standard"
+
+
+def test_policy_needs_every_tier():
+    with pytest.raises(ValueError, match="premium"):
+        ModelRouter(RoutingPolicy(models={"fast": "a", "standard": "b"}))
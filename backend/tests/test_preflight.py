@@ -0,0 +1,128 @@
+"""
+Pre-flight screening: what is left out before a vision call, and what is kept
+"""
+
+import hashlib
+import io
+
+from PIL import Image, ImageDraw
+
+from app.services.image_store import StoredImage, media_type_of, normalize_image
+from app.services.preflight import CHECKS, DEFAULT_CHECKS, screen_images
+from benchmarks.image_packing import synthetic_screenshot
+
+
+def encoded(image: Image.Image, fmt: str = "PNG", **options) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format=fmt, **options)
+    return out.getvalue()
+
+
+def stored(data: bytes) -> StoredImage:
+    data = normalize_image(data)
+    return StoredImage(id=hashlib.sha256(data).hexdigest(), data=data, media_type=media_type_of(data))
+
+
+def screenshot(seed: int) -> StoredImage:
+    return stored(synthetic_screenshot(seed))
+
+
+def reasons(screening) -> list[tuple[str, int]]:
+    return [(s.reason, s.index) for s in screening.skipped]
+
+
+def photo_grid(size: tuple[int, int]) -> Image.Image:
+    """Edge-to-edge photos with thin gutters: no flat UI background to speak of"""
+    image = Image.effect_noise(size, 64).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for x in range(0, size[0], size[0] // 3):
+        draw.rectangle((x, 0, x + 4, size[1]), fill=(255, 255, 255))
+    return image
+
+
+def test_tablet_screenshot_kept_by_default():
+    # Tablet screen (4:3) showing a photo-heavy profile
+    ipad = stored(encoded(photo_grid((1024, 768))))
+
+    screening = screen_images([ipad])
+
+    assert screening.kept == [ipad]
+    assert screening.skipped == []
+
+
+def test_photo_check_is_opt_in():
+    camera = stored(encoded(photo_grid((1024, 768))))
+
+    screening = screen_images([camera], checks=("photo",))
+
+    assert screening.kept == []
+    assert reasons(screening) == [("photo", 0)]
+
+
+def test_reencoded_copy_is_a_duplicate():
+    original = screenshot(1)
+    picture = Image.open(io.BytesIO(original.data))
+    as_png = stored(encoded(picture))
+    recompressed = stored(encoded(picture, "JPEG", quality=60))
+
+    screening = screen_images([original, as_png, recompressed])
+
+    assert as_png.media_type == "image/png"
+    assert screening.kept == [original]
+    assert reasons(screening) == [("duplicate", 1), ("duplicate", 2)]
+
+
+def test_blank_and_dark_are_skipped():
+    blank = stored(encoded(Image.new("RGB", (600, 1300), (255, 255, 255))))
+    locked = stored(encoded(Image.new("RGB", (600, 1300), (4, 4, 6))))
+    pocket = stored(encoded(Image.effect_noise((600, 1300), 6).point(lambda v: max(0, v - 120))))
+    shot = screenshot(1)
+
+    screening = screen_images([blank, shot, locked, pocket])
+
+    assert screening.kept == [shot]
+    assert reasons(screening) == [("blank", 0), ("dark", 2), ("dark", 3)]
+
+
+def test_dark_mode_screenshot_is_kept():
+    light = Image.open(io.BytesIO(synthetic_screenshot(2))).convert("L")
+    dark_mode = stored(encoded(light.point(lambda v: 255 - v), "JPEG", quality=90))
+
+    assert screen_images([dark_mode]).kept == [dark_mode]
+
+
+def test_same_upload_twice_is_a_duplicate():
+    first, second = screenshot(1), screenshot(2)
+
+    screening = screen_images([first, second, first])
+
+    assert screening.kept == [first, second]
+    assert reasons(screening) == [("duplicate", 2)]
+
+
+def test_same_layout_with_different_text_is_kept():
+    # Same blocks and photos, a different digit on every line of text
+    first, similar = screenshot(1), screenshot(3)
+
+    assert screen_images([first, similar]).kept == [first, similar]
+
+
+def test_duplicates_across_lists():
+    profile = [screenshot(1), screenshot(2)]
+    repeated = stored(encoded(Image.open(io.BytesIO(profile[1].data))))
+
+    profile_screening = screen_images(profile)
+    conversation = screen_images([screenshot(4), repeated], seen=profile_screening.fingerprints)
+
+    assert len(profile_screening.fingerprints) == 2
+    assert reasons(conversation) == [("duplicate", 1)]
+    # Only the images it kept are fingerprinted for later lists
+    assert len(conversation.fingerprints) == 1
+
+
+def test_checks_select_what_is_screened():
+    blank = stored(encoded(Image.new("RGB", (600, 800), (255, 255, 255))))
+
+    assert screen_images([blank, blank], checks=()).kept == [blank, blank]
+    assert reasons(screen_images([blank, blank], checks=("duplicate",))) == [("duplicate", 1)]
+    assert set(DEFAULT_CHECKS) == set(CHECKS) - {"photo"}
@@ -0,0 +1,91 @@
+"""
+Price table: exact integer micro-dollar math, rounded up once per request
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from app.services.pricing import DEFAULT_PRICE_TABLE, PriceTable, PricingError, from_micros, to_micros
+
+SONNET = "claude-sonnet-4-20250514"
+HAIKU = "claude-3-5-haiku-20241022"
+
+
+def table(**markup) -> PriceTable:
+    return PriceTable.from_dict({**DEFAULT_PRICE_TABLE, "markup": markup or DEFAULT_PRICE_TABLE["markup"]})
+
+
+def test_micros_round_trip():
+    assert to_micros("0.000001") == 1
+    assert to_micros("12.345678") == 12_345_678
+    assert to_micros(Decimal("3.00")) == 3_000_000
+    assert to_micros("0.0000005") == 1  # Half up
+    assert from_micros(12_345_678) == Decimal("12.345678")
+    assert str(from_micros(5)) == "0.000005"
+
+
+def test_not_a_usd_amount():
+    with pytest.raises(PricingError):
+        to_micros("three dollars")
+
+
+def test_price_is_exact():
+    charge = table().price(SONNET, input_tokens=1234, output_tokens=567)
+
+    # 1234 x $3/M + 567 x $15/M = $0.012207, marked up 2x
+    assert charge.cost_micros == 12_207
+    assert charge.charge_micros == 24_414
+    assert charge.price_version == DEFAULT_PRICE_TABLE["version"]
+
+
+def test_cache_tokens_priced_at_their_own_rates():
+    charge = table().price(SONNET, 0, 0, cache_write_tokens=1_000_000, cache_read_tokens=1_000_000)
+
+    assert charge.cost_micros == 3_750_000 + 300_000
+
+
+def test_fractions_round_up_once_per_request():
+    prices = table()
+
+    # One Haiku token is $0.0000008: billed as one micro-dollar, not zero
+    assert prices.price(HAIKU, 1, 0).cost_micros == 1
+    # Ten tokens are $0.000008 exactly, not ten rounded-up tokens
+    assert prices.price(HAIKU, 10, 0).cost_micros == 8
+    assert prices.price(HAIKU, 1, 0).charge_micros == 2
+
+
+def test_many_small_requests_match_float_free_total():
+    prices = table()
+    total = sum(prices.price(SONNET, 3, 7).cost_micros for _ in range(1000))
+
+    # 3 x 3 + 7 x 15 = 114 micro-dollars per request, no drift
+    assert total == 114_000
+
+
+def test_batch_rates_default_to_half():
+    prices = table()
+
+    assert prices.price(SONNET, 1_000_000, 0, batch=True).cost_micros == 1_500_000
+    assert prices.rates(SONNET, batch=True).output == prices.rates(SONNET).output // 2
+
+
+def test_minimum_charge():
+    prices = table(multiplier="1.5", minimum_charge_usd="0.01")
+
+    assert prices.price(SONNET, 1, 0).charge_micros == 10_000
+    assert prices.price(SONNET, 1_000_000, 0).charge_micros == 4_500_000
+
+
+def test_unknown_model_is_not_priced():
+    with pytest.raises(PricingError):
+        table().price("claude-unknown", 1, 1)
+
+
+def test_invalid_tables_are_refused():
+    with pytest.raises(PricingError):
+        PriceTable.from_dict({"version": "x"})
+    with pytest.raises(PricingError):
+        PriceTable.from_dict({"version": "x", "models": {SONNET: {"input": "3.00"}}})
+    with pytest.raises(PricingError):
+        table(multiplier="0.9")
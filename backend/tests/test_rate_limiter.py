@@ -0,0 +1,174 @@
+"""
+Admission control: in-memory token buckets, concurrency leases, and the wait queue
+"""
+
+import asyncio
+
+import pytest
+
+from app.config import get_settings
+from app.services.rate_limiter import AdmissionController, AdmissionLimits, InMemoryBackend, RateLimitExceeded
+
+
+def limits(**overrides) -> AdmissionLimits:
+    values = dict(
+        user_per_minute=600, user_burst=100,
+        global_per_minute=6000, global_burst=1000,
+        per_user=10, per_model={}, default_per_model=10, global_concurrency=10,
+        max_queue=10, max_wait=1.0, lease_ttl=60
+    )
+    values.update(overrides)
+    return AdmissionLimits(**values)
+
+
+async def test_bucket_grants_burst_then_reports_wait():
+    backend = InMemoryBackend()
+
+    for _ in range(3):
+        assert await backend.take_tokens("k", capacity=3, refill_per_sec=1.0) == 0.0
+
+    retry_after = await backend.take_tokens("k", capacity=3, refill_per_sec=1.0)
+    assert 0.9 < retry_after <= 1.0
+
+
+async def test_bucket_refills_over_time(monkeypatch):
+    backend = InMemoryBackend()
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.rate_limiter.time.monotonic", lambda: clock[0])
+
+    await backend.take_tokens("k", capacity=2, refill_per_sec=0.5, cost=2)
+    assert await backend.take_tokens("k", capacity=2, refill_per_sec=0.5) == pytest.approx(2.0)
+
+    clock[0] += 2.0
+    assert await backend.take_tokens("k", capacity=2, refill_per_sec=0.5) == 0.0
+
+    # Idle time never fills the bucket past its capacity
+    clock[0] += 3600
+    await backend.take_tokens("k", capacity=2, refill_per_sec=0.5, cost=2)
+    assert await backend.take_tokens("k", capacity=2, refill_per_sec=0.5) > 0
+
+
+async def test_leases_up_to_limit_and_release():
+    backend = InMemoryBackend()
+
+    first = await backend.try_acquire("k", limit=2, ttl=60)
+    second = await backend.try_acquire("k", limit=2, ttl=60)
+    assert first and second and first != second
+    assert await backend.try_acquire("k", limit=2, ttl=60) is None
+
+    await backend.release("k", first)
+    assert await backend.try_acquire("k", limit=2, ttl=60) is not None
+    # Releasing an unknown lease is harmless
+    await backend.release("other", "nope")
+
+
+async def test_rate_limit_rejects_with_retry_after():
+    admission = AdmissionController(InMemoryBackend(), limits(user_burst=1, user_per_minute=60))
+
+    async with admission.admit("u-1", "sonnet"):
+        pass
+    with pytest.raises(RateLimitExceeded) as e:
+        async with admission.admit("u-1", "sonnet"):
+            pass
+
+    assert (e.value.scope, e.value.reason) == ("user", "rate")
+    assert 0 < e.value.retry_after <= 1.0
+    # Other users have their own bucket
+    async with admission.admit("u-2", "sonnet"):
+        pass
+
+
+async def test_per_user_concurrency_rejects_immediately():
+    admission = AdmissionController(InMemoryBackend(), limits(per_user=1))
+
+    async with admission.admit("u-1", "sonnet"):
+        with pytest.raises(RateLimitExceeded) as e:
+            async with admission.admit("u-1", "sonnet"):
+                pass
+
+    assert (e.value.scope, e.value.reason) == ("user", "concurrency")
+    async with admission.admit("u-1", "sonnet"):
+        pass
+
+
+async def test_model_slot_waits_for_release():
+    admission = AdmissionController(InMemoryBackend(), limits(per_model={"opus": 1}))
+    release = asyncio.Event()
+    order = []
+
+    async def first():
+        async with admission.admit("u-1", "opus"):
+            order.append("first")
+            await release.wait()
+
+    async def second():
+        async with admission.admit("u-2", "opus"):
+            order.append("second")
+
+    running = asyncio.ensure_future(first())
+    await asyncio.sleep(0)
+    waiting = asyncio.ensure_future(second())
+    await asyncio.sleep(0.01)
+    assert admission.queue_depths() == {"model:opus": 1}
+
+    release.set()
+    await asyncio.wait_for(asyncio.gather(running, waiting), 1)
+    assert order == ["first", "second"]
+    assert admission.queue_depths() == {}
+
+
+async def test_queue_full_and_wait_timeout():
+    admission = AdmissionController(InMemoryBackend(), limits(global_concurrency=1, max_queue=1, max_wait=0.05))
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.admit("u-1", "sonnet"):
+            await release.wait()
+
+    async def queued():
+        async with admission.admit("u-2", "sonnet"):
+            pass
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(queued())
+    await asyncio.sleep(0)
+
+    with pytest.raises(RateLimitExceeded) as full:
+        async with admission.admit("u-3", "sonnet"):
+            pass
+    assert (full.value.scope, full.value.reason) == ("global", "queue")
+
+    with pytest.raises(RateLimitExceeded) as timed_out:
+        await waiter
+    assert (timed_out.value.scope, timed_out.value.reason) == ("global", "concurrency")
+
+    release.set()
+    await holder
+
+
+async def test_leases_released_when_a_later_slot_is_refused():
+    backend = InMemoryBackend()
+    admission = AdmissionController(backend, limits(global_concurrency=0, max_queue=0))
+
+    with pytest.raises(RateLimitExceeded):
+        async with admission.admit("u-1", "sonnet"):
+            pass
+
+    # The user and model leases taken before the global refusal were returned
+    assert all(not leases for leases in backend._leases.values())
+
+
+async def test_admission_counters_are_admin_only(api, monkeypatch):
+    settings = get_settings()
+
+    monkeypatch.setattr(settings, "admin_api_key", None)
+    assert (await api.get("/metrics")).status_code == 404
+
+    monkeypatch.setattr(settings, "admin_api_key", "s3cret")
+    assert (await api.get("/metrics")).status_code == 403
+    assert (await api.get("/metrics", headers={"X-Admin-Key": "wrong"})).status_code == 403
+
+    response = await api.get("/metrics", headers={"X-Admin-Key": "s3cret"})
+    assert response.status_code == 200
+    assert "inflight_analyses" in response.json()["gauges"]
@@ -0,0 +1,105 @@
+"""
+Record/replay transport: fingerprints, recording, replay and the store
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+
+import httpx
+import pytest
+
+from app.services.replay import ReplayStore, ReplayTransport, fingerprint_request
+
+MESSAGE = {
+    "id": "msg_1",
+    "type": "message",
+    "role": "assistant",
+    "content": [{"type": "text", "text": "| **Ψ** | 0.72 | Consistent |"}],
+    "usage": {"input_tokens": 1200, "output_tokens": 300},
+}
+
+
+def body(image: str = "aW1hZ2U=", model: str = "claude-sonnet-4-20250514") -> dict:
+    return {
+        "model": model,
+        "max_tokens": 100,
+        "messages": [{"role": "user", "content": [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": image}},
+            {"type": "text", "text": "Analyze"},
+        ]}],
+    }
+
+
+def upstream(calls: list, encoding: str = None) -> httpx.MockTransport:
+    def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        content = json.dumps(MESSAGE).encode()
+        headers = {"content-type": "application/json"}
+        if encoding == "gzip":
+            content = gzip.compress(content)
+            headers["content-encoding"] = "gzip"
+        return httpx.Response(200, headers=headers, content=content)
+
+    return httpx.MockTransport(handle)
+
+
+async def post(transport: httpx.AsyncBaseTransport, payload: dict) -> httpx.Response:
+    async with httpx.AsyncClient(transport=transport, base_url="https://api.anthropic.com") as client:
+        return await client.post("/v1/messages", json=payload)
+
+
+def test_fingerprint_hashes_images_and_keeps_the_rest():
+    fp, summary = fingerprint_request("/v1/messages", body())
+    assert fingerprint_request("/v1/messages", body())[0] == fp
+    assert fingerprint_request("/v1/messages", body(image="b3RoZXI="))[0] != fp
+    assert fingerprint_request("/v1/messages", body(model="claude-opus-4-20250514"))[0] != fp
+    assert len(summary["image_hashes"]) == 1
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ReplayTransport("sometimes", str(tmp_path))
+
+
+async def test_record_then_replay(tmp_path):
+    calls = []
+    recorded = await post(ReplayTransport("record", str(tmp_path), upstream=upstream(calls)), body())
+    assert recorded.json() == MESSAGE
+
+    replayed = await post(ReplayTransport("replay", str(tmp_path), latency="0", upstream=upstream(calls)), body())
+    assert replayed.json() == MESSAGE
+    assert len(calls) == 1
+
+
+async def test_replay_miss_is_an_api_404(tmp_path):
+    response = await post(ReplayTransport("replay", str(tmp_path), latency="0", upstream=upstream([])), body())
+    assert response.status_code == 404
+    assert response.json()["error"]["type"] == "not_found_error"
+
+
+async def test_auto_records_compressed_responses(tmp_path):
+    calls = []
+    transport = ReplayTransport("auto", str(tmp_path), latency="0", upstream=upstream(calls, encoding="gzip"))
+
+    first = await post(transport, body())
+    assert first.json() == MESSAGE
+    assert "content-encoding" not in first.headers
+
+    fp, _ = fingerprint_request("/v1/messages", body())
+    entry = ReplayStore(str(tmp_path)).load(fp)
+    assert entry["response"]["body"] == MESSAGE
+
+    assert (await post(transport, body())).json() == MESSAGE
+    assert len(calls) == 1
+
+
+def test_concurrent_saves_of_one_fingerprint(tmp_path):
+    store = ReplayStore(str(tmp_path))
+    entry = {"fingerprint": "ab" * 32, "response": {"body": MESSAGE}}
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda _: store.save("ab" * 32, entry), range(64)))
+
+    assert store.load("ab" * 32) == entry
+    assert [p.name for p in store.path("ab" * 32).parent.iterdir()] == [f"{'ab' * 32}.json"]
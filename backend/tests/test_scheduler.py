@@ -0,0 +1,117 @@
+"""
+Fair scheduler: dispatch order under contention, and slots handed on when waiters leave
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.scheduler import FairScheduler
+
+
+async def dispatch_order(scheduler: FairScheduler, lanes: list[str]) -> list[str]:
+    """Queue one call per lane behind a held slot and record the order they get slots"""
+    order = []
+    release = asyncio.Event()
+
+    async def call(lane: str):
+        async with scheduler.slot(lane):
+            order.append(lane)
+
+    async def hold():
+        async with scheduler.slot(lanes[0]):
+            await release.wait()
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    calls = []
+    for lane in lanes:
+        calls.append(asyncio.ensure_future(call(lane)))
+        await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(holder, *calls)
+    return order
+
+
+async def test_idle_slot_is_granted_without_waiting():
+    scheduler = FairScheduler(slots=2)
+
+    async with scheduler.slot("standard:small") as ticket:
+        assert scheduler.busy == 1
+        assert ticket.lane == "standard:small"
+    assert scheduler.busy == 0
+
+
+async def test_equal_lanes_take_turns():
+    scheduler = FairScheduler(slots=1)
+    lanes = ["premium:large"] * 3 + ["standard:small"] * 3
+
+    order = await dispatch_order(scheduler, lanes)
+
+    # The backlogged lane does not hold off the one that arrived after it,
+    # and the premium lane already had the held slot
+    assert order == ["standard:small", "premium:large"] * 3
+
+
+async def test_weights_share_slots_in_proportion():
+    scheduler = FairScheduler(slots=1, weights={"standard:small": 2.0})
+    lanes = ["premium:large"] * 4 + ["standard:small"] * 4
+
+    order = await dispatch_order(scheduler, lanes)
+
+    assert order[:6].count("standard:small") == 4
+    assert order[-2:] == ["premium:large"] * 2
+
+
+async def test_fifo_within_a_lane():
+    scheduler = FairScheduler(slots=1)
+    order = []
+    release = asyncio.Event()
+
+    async def call(n: int):
+        async with scheduler.slot("standard:small"):
+            order.append(n)
+
+    async def hold():
+        async with scheduler.slot("standard:small"):
+            await release.wait()
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    calls = [asyncio.ensure_future(call(n)) for n in range(4)]
+    await asyncio.sleep(0)
+    assert scheduler.queue_depths() == {"standard:small": 4}
+
+    release.set()
+    await asyncio.gather(holder, *calls)
+    assert order == [0, 1, 2, 3]
+
+
+async def test_cancelled_waiter_does_not_hold_a_slot():
+    scheduler = FairScheduler(slots=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot("a"):
+            await release.wait()
+
+    async def call():
+        async with scheduler.slot("a"):
+            return "ran"
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    abandoned = asyncio.ensure_future(call())
+    waiting = asyncio.ensure_future(call())
+    await asyncio.sleep(0)
+
+    abandoned.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await abandoned
+    release.set()
+
+    assert await asyncio.wait_for(waiting, 1) == "ran"
+    await holder
+    assert scheduler.busy == 0
+    assert scheduler.queue_depths() == {}
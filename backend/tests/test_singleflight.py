@@ -0,0 +1,159 @@
+"""
+Single-flight: concurrent identical work runs once, and only the last caller leaving cancels it
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+from app.dependencies import get_admission
+from app.main import app
+from app.services.model_router import Route
+from app.services.rate_limiter import AdmissionController, AdmissionLimits, InMemoryBackend
+from benchmarks import fake_anthropic
+from benchmarks.common import make_screenshot
+from tests.conftest import RecordingTransport, auth
+
+
+@pytest.fixture
+def fake_api() -> RecordingTransport:
+    # Slow enough for a retry to arrive while the first call is upstream
+    return RecordingTransport(fake_anthropic.create_app(ttft="fixed:0.3", output_tokens="fixed:300"))
+
+
+async def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    callers = [asyncio.ensure_future(flights.do("key", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert flights.active == 1
+
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    assert calls == 1
+    assert sorted(results, key=lambda r: r[1]) == [("result", False), ("result", True), ("result", True)]
+    assert flights.active == 0
+
+
+async def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def work(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(flights.do("a", lambda: work(1)), flights.do("b", lambda: work(2)))
+
+    assert results == [(1, False), (2, False)]
+
+
+async def test_exception_reaches_every_caller():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0)
+        raise ValueError("upstream failed")
+
+    results = await asyncio.gather(flights.do("key", work), flights.do("key", work), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.active == 0
+
+
+async def test_flight_survives_one_caller_leaving():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "result"
+
+    first = asyncio.ensure_future(flights.do("key", work))
+    second = asyncio.ensure_future(flights.do("key", work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    release.set()
+    assert await second == ("result", True)
+
+
+async def test_last_caller_leaving_cancels_work():
+    flights = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    callers = [asyncio.ensure_future(flights.do("key", work)) for _ in range(2)]
+    await started.wait()
+
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert flights.active == 0
+
+
+async def test_finished_flight_runs_again():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await flights.do("key", work) == (1, False)
+    assert await flights.do("key", work) == (2, False)
+
+
+async def test_retry_joins_the_running_analysis_before_admission(api, claude, database, fake_api, monkeypatch):
+    # One analysis per user at a time, no queue: a retry admitted on its own would be 429
+    admission = AdmissionController(InMemoryBackend(), AdmissionLimits(
+        user_per_minute=600, user_burst=100, global_per_minute=6000, global_burst=1000,
+        per_user=1, per_model={}, default_per_model=10, global_concurrency=10,
+        max_queue=0, max_wait=1.0, lease_ttl=60
+    ))
+    app.dependency_overrides[get_admission] = lambda: admission
+    # The retry sees a busier queue and is routed elsewhere
+    routes = iter([
+        Route("standard", claude.router.model_for("standard"), "default"),
+        Route("fast", claude.router.model_for("fast"), "load"),
+    ])
+    monkeypatch.setattr(claude, "route", lambda *args, **kwargs: next(routes))
+    files = [("profile_images", (f"{i}.jpg", make_screenshot(i, (585, 1266)), "image/jpeg")) for i in range(3)]
+
+    async def post():
+        return await api.post("/api/analyze/", files=files, headers=auth("harness"))
+
+    first = asyncio.create_task(post())
+    while not fake_api.requests:
+        await asyncio.sleep(0.01)
+    retry = await post()
+
+    assert retry.status_code == 200
+    assert (await first).json() == retry.json()
+    assert len(fake_api.requests) == 1
+    assert fake_api.requests[0]["model"] == claude.router.model_for("standard")
+    assert len(database.ledger) == 1
@@ -0,0 +1,74 @@
+"""
+Stripe inbox: events already waiting are fulfilled when a worker starts
+"""
+
+import asyncio
+
+from app import dependencies, main
+from app.services.stripe_webhooks import StripeEventProcessor
+from benchmarks.fakes import InMemoryDatabase
+
+
+def checkout_event(event_id: str, user_id: str) -> dict:
+    return {
+        "id": event_id,
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "id": f"cs_{event_id}",
+            "payment_status": "paid",
+            "client_reference_id": user_id,
+            "currency": "usd",
+            "amount_total": 500,
+        }},
+    }
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+async def pending_inbox() -> InMemoryDatabase:
+    db = InMemoryDatabase(starting_credits=0.0)
+    db._user("u-1")
+    await db.record_stripe_event(checkout_event("evt_1", "u-1"))
+    return db
+
+
+async def test_lifespan_starts_processor_when_stripe_configured(monkeypatch):
+    db = await pending_inbox()
+    monkeypatch.setattr(dependencies, "db_for", lambda state: db)
+    monkeypatch.setattr(main.settings, "stripe_webhook_secret", "whsec_test")
+
+    async with main.lifespan(main.app):
+        processor = main.app.state.stripe_processor
+        assert processor is not None
+        await wait_for(lambda: db.stripe_events["evt_1"]["status"] == "processed")
+        assert await db.get_user_credits("u-1") == 5_000_000
+
+    # Stopped on shutdown
+    assert processor._task is None
+
+
+async def test_lifespan_leaves_processor_off_without_stripe(monkeypatch):
+    monkeypatch.setattr(main.settings, "stripe_webhook_secret", None)
+
+    async with main.lifespan(main.app):
+        assert main.app.state.stripe_processor is None
+
+
+async def test_wake_starts_once():
+    db = await pending_inbox()
+    processor = StripeEventProcessor(db, poll_interval=60)
+
+    processor.wake()
+    task = processor._task
+    processor.start()
+    processor.wake()
+    assert processor._task is task
+
+    await wait_for(lambda: db.stripe_events["evt_1"]["status"] == "processed")
+    await processor.close()
+    assert task.cancelled()
@@ -0,0 +1,106 @@
+"""
+Prompt templates: compiled structure, rendering, cache blocks and versions
+"""
+
+import pytest
+
+from app.prompts.templates import (
+    ANALYSIS_REQUEST,
+    CACHE_CONTROL,
+    CO_CREATION_PROMPT,
+    DEEP_REQUEST,
+    PromptTemplate,
+    Slot,
+    When,
+    perception_text,
+)
+
+
+def test_adjacent_static_text_is_merged():
+    template = PromptTemplate("t", "a", "b", "", Slot("x"), "c", "d")
+
+    assert template.parts == ("ab", Slot("x"), "cd")
+
+
+def test_slots_and_conditions():
+    template = PromptTemplate(
+        "t",
+        "Hello ",
+        Slot("name"),
+        Slot("note", " ({})", optional=True),
+        When("formal", ", welcome.", otherwise="!"),
+    )
+
+    assert template.render(name="Sam", note="", formal=False) == "Hello Sam!"
+    assert template.render(name="Sam", note="VIP", formal=True) == "Hello Sam (VIP), welcome."
+    # A required slot is formatted even when empty
+    assert template.render(name="", note=None, formal=False) == "Hello !"
+
+
+def test_missing_value_is_an_error():
+    with pytest.raises(KeyError):
+        PromptTemplate("t", "Hi ", Slot("name")).render()
+
+
+def test_blocks_split_static_prefix():
+    template = PromptTemplate("t", "Fixed preamble. ", Slot("name"))
+
+    assert template.blocks(name="Sam") == [
+        {"type": "text", "text": "Fixed preamble. "},
+        {"type": "text", "text": "Sam"},
+    ]
+    cached = template.blocks(cache_prefix=True, name="Sam")
+    assert cached[0]["cache_control"] == CACHE_CONTROL
+    assert "".join(block["text"] for block in cached) == template.render(name="Sam")
+
+
+def test_blocks_without_static_prefix_or_rest():
+    assert PromptTemplate("t", Slot("name")).blocks(cache_prefix=True, name="Sam") == [
+        {"type": "text", "text": "Sam"}
+    ]
+    assert PromptTemplate("t", "Only text").blocks() == [{"type": "text", "text": "Only text"}]
+
+
+def test_analysis_request_sections():
+    without = ANALYSIS_REQUEST.render(user_context=None, has_conversation=False)
+    with_conversation = ANALYSIS_REQUEST.render(user_context="Into climbing", has_conversation=True)
+
+    assert "User Context" not in without
+    assert "5. **Conversation Analysis**" not in without
+    assert "**User Context:** Into climbing\n\n" in with_conversation
+    assert "6. **Next Move**" in with_conversation
+
+
+def test_deep_request_otherwise_branch():
+    assert "2. **Next Move** — How to follow up" in DEEP_REQUEST.render(has_conversation=False)
+    assert "2. **Conversation Analysis**" in DEEP_REQUEST.render(has_conversation=True)
+
+
+def test_co_creation_prefix_is_static():
+    blocks = CO_CREATION_PROMPT.blocks(
+        cache_prefix=True, analysis="A", observation="O", resonance="R", intention="I", conversation_context=None
+    )
+
+    assert blocks[0]["cache_control"] == CACHE_CONTROL
+    assert blocks[0]["text"].endswith("## Original Analysis (Phase 1)\n\n")
+    assert blocks[1]["text"].startswith("A\n\n## User Input (Phase 2)")
+    assert "Conversation context" not in blocks[1]["text"]
+
+
+def test_version_tracks_static_structure():
+    a = PromptTemplate("t", "Hello ", Slot("name"))
+
+    assert PromptTemplate("t", "Hello ", Slot("name")).version == a.version
+    assert PromptTemplate("t", "Hi ", Slot("name")).version != a.version
+    assert PromptTemplate("t", "Hello ", Slot("name", "<{}>")).version != a.version
+
+
+def test_perception_text():
+    class Result:
+        analysis = "from attribute"
+
+    assert perception_text("plain") == "plain"
+    assert perception_text({"analysis_text": "stored"}) == "stored"
+    assert perception_text({"analysis": "response"}) == "response"
+    assert perception_text(Result()) == "from attribute"
+    assert perception_text(42) == "42"
@@ -0,0 +1,151 @@
+"""
+Token budget: reservations against the per-minute budget, refunds of unused estimates, upstream 429s
+"""
+
+import httpx
+import pytest
+
+from app.services.claude_service import ClaudeService
+from app.services.rate_limiter import InMemoryBackend
+from app.services.token_budget import (
+    PER_IMAGE_TOKENS,
+    TokenBudgetExceeded,
+    TokenBudgetLimits,
+    TokenGovernor,
+    estimate_input_tokens,
+)
+
+MODEL = "claude-sonnet-4-20250514"
+
+
+class RecordingBackend(InMemoryBackend):
+    """In-memory buckets that keep every take_tokens call"""
+
+    def __init__(self):
+        super().__init__()
+        self.takes = []
+
+    async def take_tokens(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1.0) -> float:
+        self.takes.append((key, cost))
+        return await super().take_tokens(key, capacity, refill_per_sec, cost)
+
+
+def governor(backend=None, **limits) -> TokenGovernor:
+    return TokenGovernor(backend or InMemoryBackend(), TokenBudgetLimits(**limits))
+
+
+def test_estimate_counts_images_and_text():
+    image = {"type": "image", "source": {"type": "base64", "data": "..."}}
+    messages = [{"role": "user", "content": [image, image, {"type": "text", "text": "x" * 350}]}]
+
+    assert estimate_input_tokens(messages) == 2 * PER_IMAGE_TOKENS + 100 + 1
+
+
+def test_estimate_skips_a_cached_prefix():
+    image = {"type": "image", "source": {"type": "base64", "data": "..."}}
+    messages = [
+        {"role": "user", "content": [image, {**image, "cache_control": {"type": "ephemeral"}}, {"type": "text", "text": "x" * 35}]},
+        {"role": "assistant", "content": "y" * 70},
+    ]
+
+    assert estimate_input_tokens(messages) == 2 * PER_IMAGE_TOKENS + 10 + 20 + 1
+    # Only what follows the breakpoint is billed as uncached input
+    assert estimate_input_tokens(messages, cached_prefix=True) == 10 + 20 + 1
+
+
+async def test_reservation_over_the_budget_is_refused():
+    budget = governor(input_tpm=6_000, output_tpm=600, max_wait=0.5)
+
+    async with budget.reserve(MODEL, 5_000, 300):
+        pass
+
+    with pytest.raises(TokenBudgetExceeded) as refused:
+        async with budget.reserve(MODEL, 5_000, 300):
+            pass
+    assert refused.value.reason == "budget"
+    # 4,000 input tokens short at 100 a second
+    assert refused.value.retry_after == pytest.approx(40, rel=0.01)
+
+
+async def test_refused_reservation_takes_nothing():
+    backend = RecordingBackend()
+    budget = governor(backend, input_tpm=6_000, output_tpm=600, max_wait=0.5)
+    async with budget.reserve(MODEL, 1_000, 500):
+        pass
+    backend.takes.clear()
+
+    with pytest.raises(TokenBudgetExceeded):
+        async with budget.reserve(MODEL, 1_000, 500):
+            pass
+
+    # Input was granted, output was not: the input went back
+    assert backend.takes == [(f"tpm:input:{MODEL}", 1_000), (f"tpm:output:{MODEL}", 500), (f"tpm:input:{MODEL}", -1_000)]
+
+
+async def test_unused_estimate_is_refunded():
+    backend = RecordingBackend()
+    budget = governor(backend, input_tpm=6_000, output_tpm=3_000)
+
+    async with budget.reserve(MODEL, 5_000, 2_000) as reservation:
+        reservation.used(1_200, 450)
+
+    assert backend.takes == [
+        (f"tpm:input:{MODEL}", 5_000), (f"tpm:output:{MODEL}", 2_000),
+        (f"tpm:input:{MODEL}", -3_800), (f"tpm:output:{MODEL}", -1_550),
+    ]
+    # What is left is the budget less actual usage
+    assert await backend.take_tokens(f"tpm:input:{MODEL}", 6_000, 100, 6_000 - 1_200) == 0.0
+    assert await backend.take_tokens(f"tpm:output:{MODEL}", 3_000, 50, 3_000 - 450) == 0.0
+
+
+async def test_failed_call_keeps_its_reservation():
+    backend = RecordingBackend()
+    budget = governor(backend, input_tpm=6_000)
+
+    with pytest.raises(RuntimeError):
+        async with budget.reserve(MODEL, 5_000, 700):
+            raise RuntimeError("upstream failed")
+
+    assert backend.takes == [(f"tpm:input:{MODEL}", 5_000)]
+
+
+async def test_upstream_429_is_shed_and_pauses_the_model():
+    def rate_limited(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, headers={"retry-after": "7"}, json={
+            "type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"},
+        })
+
+    budget = governor(input_tpm=1_000_000, max_wait=1.0)
+    claude = ClaudeService(api_key="test", transport=httpx.MockTransport(rate_limited), governor=budget)
+    claude.client = claude.client.with_options(max_retries=0)
+
+    with pytest.raises(TokenBudgetExceeded) as shed:
+        await claude.analyze_profile(images=["aGVsbG8="], route=claude.route_for_model(MODEL, "test"))
+
+    assert (shed.value.reason, shed.value.retry_after) == ("upstream", 7.0)
+    # Later calls to that model are refused locally until the pause is over
+    with pytest.raises(TokenBudgetExceeded):
+        async with budget.reserve(MODEL, 100, 100):
+            pass
+    async with budget.reserve("claude-3-5-haiku-20241022", 100, 100):
+        pass
+
+
+async def test_analysis_reconciles_to_reported_usage(fake_api):
+    backend = RecordingBackend()
+    claude = ClaudeService(api_key="test", transport=fake_api, governor=governor(backend, input_tpm=1_000_000, output_tpm=100_000))
+
+    route = claude.route_for_model(MODEL, "test")
+    # The first call writes the system prompt to the cache; from then on it is read
+    await claude.analyze_profile(images=["aGVsbG8="], route=route)
+    backend.takes.clear()
+
+    result = await claude.analyze_profile(images=["aGVsbG8="], route=route)
+
+    assert result["usage"]["cache_read_tokens"] > 0
+    net = {}
+    for key, cost in backend.takes:
+        net[key] = net.get(key, 0) + cost
+    usage = result["usage"]
+    assert net[f"tpm:input:{MODEL}"] == usage["input_tokens"] + usage["cache_write_tokens"]
+    assert net[f"tpm:output:{MODEL}"] == usage["output_tokens"]
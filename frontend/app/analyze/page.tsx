@@ -5,18 +5,43 @@ import Link from 'next/link';
 import { ArrowLeft, Loader2 } from 'lucide-react';
 import { UploadZone } from '@/components/upload-zone';
 import { AnalysisDisplay } from '@/components/analysis-display';
-import { analyzeProfile } from '@/lib/api';
+import { analyzeProfile, deepAnalysis, storeImages } from '@/lib/api';
+import type { PreparedImage } from '@/lib/images';
 
 export default function AnalyzePage() {
-  const [profileImages, setProfileImages] = useState<File[]>([]);
-  const [conversationImages, setConversationImages] = useState<File[]>([]);
+  const [profileImages, setProfileImages] = useState<PreparedImage[]>([]);
+  const [conversationImages, setConversationImages] = useState<PreparedImage[]>([]);
+  const [profilePreparing, setProfilePreparing] = useState(false);
+  const [conversationPreparing, setConversationPreparing] = useState(false);
   const [userContext, setUserContext] = useState('');
   const [usePremium, setUsePremium] = useState(false);
+  const [profileProgress, setProfileProgress] = useState<number[] | undefined>();
+  const [conversationProgress, setConversationProgress] = useState<number[] | undefined>();
 
   const [loading, setLoading] = useState(false);
   const [analysis, setAnalysis] = useState<any>(null);
+  const [deep, setDeep] = useState<any>(null);
+  const [deepLoading, setDeepLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
+  const preparing = profilePreparing || conversationPreparing;
+
+  // Upload only the images the backend does not already hold, then
+  // reference all of them by id
+  const uploadImages = async (token: string) => {
+    const all = [...profileImages, ...conversationImages];
+    const fractions = all.map(() => 0);
+    const ids = await storeImages(all, token, (index, fraction) => {
+      fractions[index] = fraction;
+      setProfileProgress(fractions.slice(0, profileImages.length));
+      setConversationProgress(fractions.slice(profileImages.length));
+    });
+    return {
+      profileImageIds: ids.slice(0, profileImages.length),
+      conversationImageIds: ids.slice(profileImages.length)
+    };
+  };
+
   const handleAnalyze = async () => {
     if (profileImages.length === 0) {
       setError('Please upload at least one profile screenshot');
@@ -30,15 +55,16 @@ export default function AnalyzePage() {
       // For MVP, use dev token
       const token = 'dev_test_user';
 
-      const result = await analyzeProfile(
-        {
-          profileImages,
-          conversationImages: conversationImages.length > 0 ? conversationImages : undefined,
-          userContext: userContext || undefined,
-          usePremium
-        },
-        token
-      );
+      const imageIds = await uploadImages(token);
+
+      // Quick triage first; the full translation is one click away
+      const result = await analyzeProfile({
+        profileImages: [],
+        ...imageIds,
+        userContext: userContext || undefined,
+        usePremium,
+        mode: 'triage'
+      }, token);
 
       setAnalysis(result);
     } catch (err: any) {
@@ -46,11 +72,33 @@ export default function AnalyzePage() {
       setError(err.message || 'Analysis failed. Please try again.');
     } finally {
       setLoading(false);
+      setProfileProgress(undefined);
+      setConversationProgress(undefined);
+    }
+  };
+
+  const handleDeep = async () => {
+    setDeepLoading(true);
+    setError(null);
+
+    try {
+      const token = 'dev_test_user';
+      setDeep(await deepAnalysis(
+        analysis.analysis_id,
+        { profileImages: [], userContext: userContext || undefined },
+        token
+      ));
+    } catch (err: any) {
+      console.error('Deep analysis error:', err);
+      setError(err.message || 'Deep analysis failed. Please try again.');
+    } finally {
+      setDeepLoading(false);
     }
   };
 
   const resetAnalysis = () => {
     setAnalysis(null);
+    setDeep(null);
     setProfileImages([]);
     setConversationImages([]);
     setUserContext('');
@@ -83,6 +131,35 @@ export default function AnalyzePage() {
               usage={analysis.usage}
               remainingCredits={analysis.remaining_credits}
             />
+            {deep ? (
+              <AnalysisDisplay
+                analysis={deep.analysis}
+                usage={deep.usage}
+                remainingCredits={deep.remaining_credits}
+              />
+            ) : analysis.stage === 'triage' && analysis.analysis_id && (
+              <button
+                onClick={handleDeep}
+                disabled={deepLoading}
+                className="w-full py-3 border-2 border-rose-300 text-rose-600 hover:bg-rose-50 disabled:opacity-50 rounded-lg font-medium transition-colors flex items-center justify-center gap-2"
+              >
+                {deepLoading ? (
+                  <>
+                    <Loader2 className="h-5 w-5 animate-spin" />
+                    Going deeper...
+                  </>
+                ) : (
+                  conversationImages.length > 0
+                    ? 'Full Translation, Conversation Analysis & Next Move'
+                    : 'Full Translation & Next Move'
+                )}
+              </button>
+            )}
+            {error && (
+              <div className="bg-red-50 border border-red-200 text-red-700 px-4 py-3 rounded-lg">
+                {error}
+              </div>
+            )}
             <button
               onClick={resetAnalysis}
               className="w-full py-3 bg-rose-500 hover:bg-rose-600 text-white rounded-lg font-medium transition-colors"
@@ -97,6 +174,8 @@ export default function AnalyzePage() {
             <div className="bg-white rounded-lg p-6 border shadow-sm">
               <UploadZone
                 onImagesSelected={setProfileImages}
+                onPreparingChange={setProfilePreparing}
+                progress={profileProgress}
                 maxImages={10}
                 label="Profile Screenshots (Required)"
               />
@@ -106,6 +185,8 @@ export default function AnalyzePage() {
             <div className="bg-white rounded-lg p-6 border shadow-sm">
               <UploadZone
                 onImagesSelected={setConversationImages}
+                onPreparingChange={setConversationPreparing}
+                progress={conversationProgress}
                 maxImages={10}
                 label="Conversation Screenshots (Optional)"
               />
@@ -159,7 +240,7 @@ export default function AnalyzePage() {
             {/* Analyze Button */}
             <button
               onClick={handleAnalyze}
-              disabled={loading || profileImages.length === 0}
+              disabled={loading || preparing || profileImages.length === 0}
               className="w-full py-4 bg-rose-500 hover:bg-rose-600 disabled:bg-gray-300 disabled:cursor-not-allowed text-white rounded-lg font-medium transition-colors flex items-center justify-center gap-2"
             >
               {loading ? (
@@ -167,6 +248,11 @@ export default function AnalyzePage() {
                   <Loader2 className="h-5 w-5 animate-spin" />
                   Analyzing...
                 </>
+              ) : preparing ? (
+                <>
+                  <Loader2 className="h-5 w-5 animate-spin" />
+                  Optimizing images...
+                </>
               ) : (
                 `Analyze Profile (${profileImages.length} ${profileImages.length === 1 ? 'image' : 'images'})`
               )}
@@ -1,45 +1,76 @@
 'use client';
 
-import { useCallback, useState } from 'react';
+import { useCallback, useEffect, useRef, useState } from 'react';
 import { useDropzone } from 'react-dropzone';
-import { Upload, X } from 'lucide-react';
+import { Loader2, Upload, X } from 'lucide-react';
 import { cn } from '@/lib/utils';
+import { formatBytes, prepareImage, type PreparedImage } from '@/lib/images';
 
 interface UploadZoneProps {
-  onImagesSelected: (files: File[]) => void;
+  /** Called with the prepared (downscaled, hashed) images once none are pending */
+  onImagesSelected: (images: PreparedImage[]) => void;
+  /** Called with true while selected images are still being prepared */
+  onPreparingChange?: (preparing: boolean) => void;
+  /** Upload progress (0-1) per image, in order, while a request is in flight */
+  progress?: number[];
   maxImages?: number;
   label?: string;
 }
 
+interface Item {
+  key: number;
+  source: File;
+  preview: string;
+  prepared?: PreparedImage;
+}
+
+let nextKey = 0;
+
 export function UploadZone({
   onImagesSelected,
+  onPreparingChange,
+  progress,
   maxImages = 10,
   label = "Profile Screenshots"
 }: UploadZoneProps) {
-  const [images, setImages] = useState<File[]>([]);
-  const [previews, setPreviews] = useState<string[]>([]);
-
-  const onDrop = useCallback((acceptedFiles: File[]) => {
-    const newImages = [...images, ...acceptedFiles].slice(0, maxImages);
-    setImages(newImages);
+  const [items, setItems] = useState<Item[]>([]);
 
-    const newPreviews = newImages.map(file => URL.createObjectURL(file));
-    setPreviews(prev => {
-      prev.forEach(url => URL.revokeObjectURL(url));
-      return newPreviews;
-    });
+  // Latest callbacks, so inline handlers from the parent do not re-run the effect
+  const callbacks = useRef({ onImagesSelected, onPreparingChange });
+  callbacks.current = { onImagesSelected, onPreparingChange };
 
-    onImagesSelected(newImages);
-  }, [images, maxImages, onImagesSelected]);
+  // Report prepared images to the parent whenever the selection settles
+  useEffect(() => {
+    const preparing = items.some(item => !item.prepared);
+    callbacks.current.onPreparingChange?.(preparing);
+    if (!preparing) {
+      callbacks.current.onImagesSelected(items.map(item => item.prepared!));
+    }
+  }, [items]);
 
-  const removeImage = (index: number) => {
-    const newImages = images.filter((_, i) => i !== index);
-    setImages(newImages);
+  const onDrop = useCallback((acceptedFiles: File[]) => {
+    const added = acceptedFiles.slice(0, maxImages - items.length).map(file => ({
+      key: nextKey++,
+      source: file,
+      preview: URL.createObjectURL(file)
+    }));
+    setItems(prev => [...prev, ...added]);
 
-    URL.revokeObjectURL(previews[index]);
-    setPreviews(prev => prev.filter((_, i) => i !== index));
+    // Downscale and hash in the background while the rest of the form is filled in
+    added.forEach(item => {
+      prepareImage(item.source).then(prepared => {
+        setItems(prev => prev.map(i => (i.key === item.key ? { ...i, prepared } : i)));
+      });
+    });
+  }, [items.length, maxImages]);
 
-    onImagesSelected(newImages);
+  const removeImage = (key: number) => {
+    setItems(prev => prev.filter(item => {
+      if (item.key === key) {
+        URL.revokeObjectURL(item.preview);
+      }
+      return item.key !== key;
+    }));
   };
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
@@ -47,8 +78,8 @@ export function UploadZone({
     accept: {
       'image/*': ['.png', '.jpg', '.jpeg', '.webp']
     },
-    maxFiles: maxImages - images.length,
-    disabled: images.length >= maxImages
+    maxFiles: maxImages - items.length,
+    disabled: items.length >= maxImages
   });
 
   return (
@@ -60,7 +91,7 @@ export function UploadZone({
         className={cn(
           "border-2 border-dashed rounded-lg p-8 text-center cursor-pointer transition-colors",
           isDragActive ? "border-rose-500 bg-rose-50" : "border-gray-300 hover:border-rose-400",
-          images.length >= maxImages && "opacity-50 cursor-not-allowed"
+          items.length >= maxImages && "opacity-50 cursor-not-allowed"
         )}
       >
         <input {...getInputProps()} />
@@ -68,25 +99,45 @@ export function UploadZone({
         <p className="mt-2 text-sm text-gray-600">
           {isDragActive
             ? "Drop images here..."
-            : `Drag & drop screenshots, or click to select (${images.length}/${maxImages})`}
+            : `Drag & drop screenshots, or click to select (${items.length}/${maxImages})`}
         </p>
       </div>
 
-      {previews.length > 0 && (
+      {items.length > 0 && (
         <div className="grid grid-cols-2 sm:grid-cols-4 gap-4">
-          {previews.map((preview, index) => (
-            <div key={index} className="relative group">
+          {items.map((item, index) => (
+            <div key={item.key} className="relative group">
               <img
-                src={preview}
+                src={item.preview}
                 alt={`Screenshot ${index + 1}`}
                 className="w-full h-32 object-cover rounded-lg border"
               />
               <button
-                onClick={() => removeImage(index)}
+                onClick={() => removeImage(item.key)}
                 className="absolute top-1 right-1 p-1 bg-red-500 text-white rounded-full opacity-0 group-hover:opacity-100 transition-opacity"
               >
                 <X className="h-4 w-4" />
               </button>
+              <div className="mt-1 text-xs text-gray-500 flex items-center gap-1">
+                {item.prepared ? (
+                  item.prepared.file.size < item.prepared.originalSize
+                    ? `${formatBytes(item.prepared.originalSize)} → ${formatBytes(item.prepared.file.size)}`
+                    : formatBytes(item.prepared.file.size)
+                ) : (
+                  <>
+                    <Loader2 className="h-3 w-3 animate-spin" />
+                    Optimizing...
+                  </>
+                )}
+              </div>
+              {progress && progress[index] !== undefined && (
+                <div className="mt-1 h-1 bg-gray-200 rounded">
+                  <div
+                    className="h-1 bg-rose-500 rounded transition-all"
+                    style={{ width: `${Math.round(progress[index] * 100)}%` }}
+                  />
+                </div>
+              )}
             </div>
           ))}
         </div>
@@ -2,13 +2,22 @@
  * API Client for Rose Glass Dating Backend
  */
 
+import type { PreparedImage } from './images';
+
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+// Images uploaded at once by storeImages
+const UPLOAD_CONCURRENCY = 3;
+
 export interface AnalysisRequest {
   profileImages: File[];
   conversationImages?: File[];
+  /** Images already in the backend image store, sent before the uploads */
+  profileImageIds?: string[];
+  conversationImageIds?: string[];
   userContext?: string;
   usePremium?: boolean;
+  mode?: 'full' | 'triage';
 }
 
 export interface AnalysisResponse {
@@ -17,20 +26,33 @@ export interface AnalysisResponse {
   usage: {
     input_tokens: number;
     output_tokens: number;
+    cache_read_tokens?: number;
+    cache_write_tokens?: number;
     cost_usd: number;
     charge_usd: number;
+    cost_micros?: number;
+    charge_micros?: number;
+    price_version?: string;
+    prompt_version?: string;
     model_used: string;
+    model_tier?: string;
+    queue_wait_ms?: number;
   };
   remaining_credits: number;
   analysis_id?: string;
+  stage?: 'full' | 'triage' | 'deep';
+  parent_id?: string;
+  image_ids?: string[];
+  conversation_image_ids?: string[];
 }
 
-export async function analyzeProfile(
-  request: AnalysisRequest,
-  token: string
-): Promise<AnalysisResponse> {
+function imagesFormData(request: AnalysisRequest): FormData {
   const formData = new FormData();
 
+  // Stored images by id, then uploads
+  request.profileImageIds?.forEach(id => formData.append('profile_image_ids', id));
+  request.conversationImageIds?.forEach(id => formData.append('conversation_image_ids', id));
+
   // Add profile images
   request.profileImages.forEach(image => {
     formData.append('profile_images', image);
@@ -48,23 +70,140 @@ export async function analyzeProfile(
     formData.append('user_context', request.userContext);
   }
 
-  // Add premium flag
+  return formData;
+}
+
+/**
+ * Run an analysis. Images can be uploaded with the request or, after
+ * `storeImages`, referenced by id; `onUploadProgress` receives bytes sent
+ * of the whole request body.
+ */
+export async function analyzeProfile(
+  request: AnalysisRequest,
+  token: string,
+  onUploadProgress?: (loaded: number, total: number) => void
+): Promise<AnalysisResponse> {
+  const formData = imagesFormData(request);
+
+  // Add premium flag and mode
   formData.append('use_premium', String(request.usePremium || false));
+  formData.append('mode', request.mode || 'full');
 
-  const response = await fetch(`${API_URL}/api/analyze`, {
-    method: 'POST',
-    headers: {
-      'Authorization': `Bearer ${token}`
-    },
-    body: formData
-  });
+  return postAnalysis(`${API_URL}/api/analyze`, formData, token, onUploadProgress);
+}
 
-  if (!response.ok) {
-    const error = await response.json().catch(() => ({ detail: 'Analysis failed' }));
-    throw new Error(error.detail || `HTTP ${response.status}`);
+/**
+ * Deep pass for a triage analysis. The backend reuses the triage's stored
+ * images (and its cached prompt prefix), so only the context is sent.
+ */
+export async function deepAnalysis(
+  analysisId: string,
+  request: AnalysisRequest,
+  token: string
+): Promise<AnalysisResponse> {
+  const formData = new FormData();
+  if (request.userContext) {
+    formData.append('user_context', request.userContext);
+  }
+  return postAnalysis(`${API_URL}/api/analyze/${analysisId}/deep`, formData, token);
+}
+
+/**
+ * Make sure every image is in the backend image store and return their ids,
+ * in order. Hashes are checked first and only images the server does not
+ * already hold for this user are uploaded, a few at a time, each as its own
+ * request so progress is reported per image.
+ */
+export async function storeImages(
+  images: PreparedImage[],
+  token: string,
+  onProgress?: (index: number, fraction: number) => void
+): Promise<string[]> {
+  const hashes = images.map(image => image.hash).filter((h): h is string => h !== null);
+  const stored = new Set<string>();
+
+  if (hashes.length > 0) {
+    try {
+      const response = await fetch(`${API_URL}/api/images/check`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ hashes })
+      });
+      if (response.ok) {
+        (await response.json()).stored.forEach((h: string) => stored.add(h));
+      }
+    } catch (err) {
+      // Upload everything instead
+      console.warn('Image check failed:', err);
+    }
   }
 
-  return response.json();
+  const ids: string[] = images.map(image => (image.hash && stored.has(image.hash) ? image.hash : ''));
+  const pending = images.map((_, index) => index).filter(index => !ids[index]);
+  ids.forEach((id, index) => id && onProgress?.(index, 1));
+
+  const worker = async () => {
+    for (let index = pending.shift(); index !== undefined; index = pending.shift()) {
+      const formData = new FormData();
+      formData.append('images', images[index].file);
+      const i = index;
+      const result = await postForm<{ images: { id: string }[] }>(
+        `${API_URL}/api/images/`, formData, token,
+        (loaded, total) => onProgress?.(i, loaded / total)
+      );
+      ids[index] = result.images[0].id;
+      onProgress?.(index, 1);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(UPLOAD_CONCURRENCY, pending.length) }, worker));
+
+  return ids;
+}
+
+function postAnalysis(
+  url: string,
+  formData: FormData,
+  token: string,
+  onUploadProgress?: (loaded: number, total: number) => void
+): Promise<AnalysisResponse> {
+  return postForm<AnalysisResponse>(url, formData, token, onUploadProgress);
+}
+
+// XMLHttpRequest rather than fetch: fetch cannot report upload progress
+function postForm<T>(
+  url: string,
+  formData: FormData,
+  token: string,
+  onUploadProgress?: (loaded: number, total: number) => void
+): Promise<T> {
+  return new Promise((resolve, reject) => {
+    const xhr = new XMLHttpRequest();
+    xhr.open('POST', url);
+    xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+    xhr.responseType = 'json';
+
+    if (onUploadProgress) {
+      xhr.upload.onprogress = event => {
+        if (event.lengthComputable) {
+          onUploadProgress(event.loaded, event.total);
+        }
+      };
+    }
+
+    xhr.onload = () => {
+      if (xhr.status >= 200 && xhr.status < 300) {
+        resolve(xhr.response);
+      } else {
+        reject(new Error(xhr.response?.detail || `HTTP ${xhr.status}`));
+      }
+    };
+    xhr.onerror = () => reject(new Error('Network error, please try again'));
+
+    xhr.send(formData);
+  });
 }
 
 export async function getCredits(token: string): Promise<{ credits: number }> {
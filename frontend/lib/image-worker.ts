@@ -0,0 +1,68 @@
+/**
+ * Image preparation worker
+ *
+ * Downscales a screenshot to the backend's normalized size with
+ * OffscreenCanvas and hashes the result, off the main thread. Mirrors
+ * `normalize_image` in backend/app/services/image_store.py: images already
+ * within bounds are passed through byte for byte, so the hash computed here
+ * is the id the backend stores the image under.
+ */
+
+export interface PrepareRequest {
+  id: number;
+  file: Blob;
+  maxEdge: number;
+  maxBytes: number;
+  quality: number;
+}
+
+export type PrepareResult =
+  | { id: number; blob: Blob; resized: boolean; hash: string; width: number; height: number }
+  | { id: number; error: string };
+
+// Formats the backend keeps as uploaded when they are within bounds
+const PASSTHROUGH_TYPES = ['image/jpeg', 'image/png', 'image/webp', 'image/gif'];
+
+const scope = self as unknown as {
+  onmessage: ((event: MessageEvent<PrepareRequest>) => void) | null;
+  postMessage: (message: PrepareResult) => void;
+};
+
+async function sha256Hex(blob: Blob): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function prepare({ file, maxEdge, maxBytes, quality }: PrepareRequest) {
+  const bitmap = await createImageBitmap(file);
+  let { width, height } = bitmap;
+  let blob = file;
+
+  const inBounds = Math.max(width, height) <= maxEdge
+    && file.size <= maxBytes
+    && PASSTHROUGH_TYPES.includes(file.type);
+
+  if (!inBounds) {
+    const scale = Math.min(1, maxEdge / Math.max(width, height));
+    width = Math.round(width * scale);
+    height = Math.round(height * scale);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const context = canvas.getContext('2d')!;
+    context.imageSmoothingQuality = 'high';
+    context.drawImage(bitmap, 0, 0, width, height);
+    blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+  }
+  bitmap.close();
+
+  return { blob, resized: !inBounds, hash: await sha256Hex(blob), width, height };
+}
+
+scope.onmessage = async (event) => {
+  const { id } = event.data;
+  try {
+    scope.postMessage({ id, ...(await prepare(event.data)) });
+  } catch (err) {
+    scope.postMessage({ id, error: err instanceof Error ? err.message : String(err) });
+  }
+};
@@ -0,0 +1,114 @@
+/**
+ * Client-side image preparation
+ *
+ * Screenshots are downscaled and hashed in a small pool of Web Workers
+ * (lib/image-worker.ts) as soon as they are selected, so uploads carry the
+ * ~1568px images the backend would produce anyway instead of full-resolution
+ * phone captures, and each image's hash matches its backend image id.
+ * Browsers without Worker/OffscreenCanvas upload the original file.
+ */
+
+import type { PrepareRequest, PrepareResult } from './image-worker';
+
+// Keep in step with IMAGE_MAX_EDGE / IMAGE_MAX_BYTES on the backend
+const IMAGE_MAX_EDGE = Number(process.env.NEXT_PUBLIC_IMAGE_MAX_EDGE || 1568);
+const IMAGE_MAX_BYTES = 5 * 1024 * 1024;
+const JPEG_QUALITY = 0.85;
+const MAX_WORKERS = 4;
+
+export interface PreparedImage {
+  /** What gets uploaded: the downscaled image, or the original */
+  file: File;
+  /** SHA-256 of `file`, i.e. its backend image id; null if unavailable */
+  hash: string | null;
+  originalSize: number;
+}
+
+interface PoolWorker {
+  worker: Worker;
+  busy: number;
+}
+
+type Pending = { resolve: (result: PrepareResult) => void };
+
+let pool: PoolWorker[] | null = null;
+const pending = new Map<number, Pending>();
+let nextId = 0;
+
+function workerPool(): PoolWorker[] | null {
+  if (typeof window === 'undefined' || typeof Worker === 'undefined'
+      || typeof OffscreenCanvas === 'undefined') {
+    return null;
+  }
+  if (pool === null) {
+    const size = Math.min(navigator.hardwareConcurrency || 2, MAX_WORKERS);
+    pool = Array.from({ length: size }, () => {
+      const entry: PoolWorker = {
+        worker: new Worker(new URL('./image-worker.ts', import.meta.url)),
+        busy: 0
+      };
+      entry.worker.onmessage = (event: MessageEvent<PrepareResult>) => {
+        entry.busy--;
+        pending.get(event.data.id)?.resolve(event.data);
+        pending.delete(event.data.id);
+      };
+      return entry;
+    });
+  }
+  return pool;
+}
+
+async function sha256Hex(blob: Blob): Promise<string | null> {
+  // crypto.subtle only exists in secure contexts (https, localhost)
+  if (typeof crypto === 'undefined' || !crypto.subtle) {
+    return null;
+  }
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function runInWorker(file: File): Promise<PrepareResult> | null {
+  const workers = workerPool();
+  if (!workers) {
+    return null;
+  }
+  const target = workers.reduce((a, b) => (b.busy < a.busy ? b : a));
+  const request: PrepareRequest = {
+    id: nextId++,
+    file,
+    maxEdge: IMAGE_MAX_EDGE,
+    maxBytes: IMAGE_MAX_BYTES,
+    quality: JPEG_QUALITY
+  };
+
+  return new Promise(resolve => {
+    pending.set(request.id, { resolve });
+    target.busy++;
+    target.worker.postMessage(request);
+  });
+}
+
+/** Downscale and hash one selected file; never rejects */
+export async function prepareImage(file: File): Promise<PreparedImage> {
+  const result = await runInWorker(file);
+
+  if (!result || 'error' in result) {
+    if (result) {
+      console.warn(`Could not prepare ${file.name}, uploading original:`, result.error);
+    }
+    return { file, hash: await sha256Hex(file).catch(() => null), originalSize: file.size };
+  }
+
+  const prepared = !result.resized ? file : new File(
+    [result.blob],
+    file.name.replace(/\.[^.]+$/, '') + '.jpg',
+    { type: result.blob.type }
+  );
+  return { file: prepared, hash: result.hash, originalSize: file.size };
+}
+
+export function formatBytes(bytes: number): string {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${Math.round(bytes / 1024)} KB`;
+  return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
@@ -0,0 +1,106 @@
+-- Rose Glass Dating - Rate Limiting State
+-- Token buckets and concurrency leases shared by all backend workers
+-- (RATE_LIMIT_BACKEND=database). Both tables are UNLOGGED: the state is
+-- short-lived and rebuilding it after a crash is harmless, so skipping WAL
+-- keeps the per-request writes cheap.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS concurrency_leases (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    key TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_concurrency_leases_key ON concurrency_leases(key, expires_at);
+
+-- RLS Policies (service role only)
+ALTER TABLE rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE concurrency_leases ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access rate_limit_buckets"
+    ON rate_limit_buckets FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access concurrency_leases"
+    ON concurrency_leases FOR ALL
+    USING (auth.role() = 'service_role');
+
+-- Take p_cost tokens from bucket p_key, refilling at p_refill_per_sec up to
+-- p_capacity. Returns 0 when granted, otherwise seconds until enough tokens
+-- will have accumulated.
+CREATE OR REPLACE FUNCTION rate_limit_take(
+    p_key TEXT,
+    p_capacity DOUBLE PRECISION,
+    p_refill_per_sec DOUBLE PRECISION,
+    p_cost DOUBLE PRECISION DEFAULT 1
+) RETURNS DOUBLE PRECISION
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_now TIMESTAMPTZ := clock_timestamp();
+    v_tokens DOUBLE PRECISION;
+BEGIN
+    INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+    VALUES (p_key, p_capacity, v_now)
+    ON CONFLICT (key) DO NOTHING;
+
+    SELECT LEAST(p_capacity, tokens + EXTRACT(EPOCH FROM (v_now - updated_at)) * p_refill_per_sec)
+    INTO v_tokens
+    FROM rate_limit_buckets
+    WHERE key = p_key
+    FOR UPDATE;
+
+    IF v_tokens >= p_cost THEN
+        UPDATE rate_limit_buckets SET tokens = v_tokens - p_cost, updated_at = v_now WHERE key = p_key;
+        RETURN 0;
+    END IF;
+
+    UPDATE rate_limit_buckets SET tokens = v_tokens, updated_at = v_now WHERE key = p_key;
+    RETURN (p_cost - v_tokens) / p_refill_per_sec;
+END;
+$$;
+
+-- Take one of p_limit slots for p_key. Returns a lease id, or NULL when all
+-- slots are held. Leases expire after p_ttl_seconds so a crashed worker
+-- cannot leak slots forever.
+CREATE OR REPLACE FUNCTION concurrency_acquire(
+    p_key TEXT,
+    p_limit INTEGER,
+    p_ttl_seconds DOUBLE PRECISION
+) RETURNS UUID
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_held INTEGER;
+    v_lease UUID;
+BEGIN
+    -- Serialize acquirers of the same key without locking the table
+    PERFORM pg_advisory_xact_lock(hashtext(p_key));
+
+    DELETE FROM concurrency_leases WHERE key = p_key AND expires_at < clock_timestamp();
+
+    SELECT COUNT(*) INTO v_held FROM concurrency_leases WHERE key = p_key;
+    IF v_held >= p_limit THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO concurrency_leases (key, expires_at)
+    VALUES (p_key, clock_timestamp() + make_interval(secs => p_ttl_seconds))
+    RETURNING id INTO v_lease;
+
+    RETURN v_lease;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION concurrency_release(p_lease_id UUID) RETURNS VOID
+LANGUAGE sql AS $$
+    DELETE FROM concurrency_leases WHERE id = p_lease_id;
+$$;
+
+-- Comments
+COMMENT ON TABLE rate_limit_buckets IS 'Token buckets for per-user and global request rate limits';
+COMMENT ON TABLE concurrency_leases IS 'Held concurrency slots for per-user, per-model and global admission control';
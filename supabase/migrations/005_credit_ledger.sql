@@ -0,0 +1,195 @@
+-- Rose Glass Dating - Credit Ledger and Usage Rollups
+-- Every credit movement is an append-only ledger row; users.credits becomes
+-- a balance cache maintained only by post_ledger_entry(). Usage rollups are
+-- maintained incrementally on each analysis insert so spend dashboards read
+-- a handful of pre-aggregated rows instead of scanning analyses.
+
+-- ============================================================
+-- Credit ledger
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS credit_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    amount_usd DECIMAL(12,6) NOT NULL CHECK (amount_usd <> 0),
+    balance_after DECIMAL(12,6) NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('analysis', 'co_create', 'purchase', 'refund', 'adjustment')),
+    reference_id TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_credit_ledger_user_created ON credit_ledger(user_id, created_at DESC);
+-- One entry per (kind, reference): retried postings are no-ops
+CREATE UNIQUE INDEX IF NOT EXISTS idx_credit_ledger_reference
+    ON credit_ledger(kind, reference_id) WHERE reference_id IS NOT NULL;
+
+-- Append-only: corrections are new 'adjustment' rows, never edits
+CREATE OR REPLACE FUNCTION credit_ledger_append_only() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    RAISE EXCEPTION 'credit_ledger is append-only';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_credit_ledger_append_only ON credit_ledger;
+CREATE TRIGGER trg_credit_ledger_append_only
+    BEFORE UPDATE OR DELETE ON credit_ledger
+    FOR EACH ROW EXECUTE FUNCTION credit_ledger_append_only();
+
+-- Post a credit (positive) or debit (negative) and return the new balance.
+-- The users row lock serializes concurrent postings for one user, replacing
+-- the racy read-then-write balance update. A repeated (kind, reference_id)
+-- posts nothing and returns the current balance.
+CREATE OR REPLACE FUNCTION post_ledger_entry(
+    p_user_id UUID,
+    p_amount DECIMAL,
+    p_kind TEXT,
+    p_reference_id TEXT DEFAULT NULL
+) RETURNS DECIMAL
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_balance DECIMAL;
+BEGIN
+    SELECT credits INTO v_balance FROM users WHERE id = p_user_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Unknown user %', p_user_id;
+    END IF;
+
+    IF p_reference_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM credit_ledger WHERE kind = p_kind AND reference_id = p_reference_id
+    ) THEN
+        RETURN v_balance;
+    END IF;
+
+    v_balance := v_balance + p_amount;
+
+    UPDATE users SET credits = v_balance, updated_at = NOW() WHERE id = p_user_id;
+
+    INSERT INTO credit_ledger (user_id, amount_usd, balance_after, kind, reference_id)
+    VALUES (p_user_id, p_amount, v_balance, p_kind, p_reference_id);
+
+    RETURN v_balance;
+END;
+$$;
+
+-- ============================================================
+-- Usage rollups
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    day DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    analyses INTEGER NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(14,6) NOT NULL DEFAULT 0,
+    charge_usd DECIMAL(14,6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, model)
+);
+
+CREATE TABLE IF NOT EXISTS usage_daily_model (
+    day DATE NOT NULL,
+    model TEXT NOT NULL,
+    analyses INTEGER NOT NULL DEFAULT 0,
+    users INTEGER NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(14,6) NOT NULL DEFAULT 0,
+    charge_usd DECIMAL(14,6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model)
+);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_usage_daily_user_day ON usage_daily(user_id, day DESC);
+
+-- Fold one new analysis into both rollups
+CREATE OR REPLACE FUNCTION rollup_analysis_usage() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_day DATE := (COALESCE(NEW.created_at, NOW()) AT TIME ZONE 'UTC')::DATE;
+    v_model TEXT := COALESCE(NEW.model_used, 'unknown');
+    v_new_user INTEGER;
+BEGIN
+    INSERT INTO usage_daily AS u (day, user_id, model, analyses, input_tokens, output_tokens, cost_usd, charge_usd)
+    VALUES (v_day, NEW.user_id, v_model, 1, NEW.input_tokens, NEW.output_tokens, NEW.cost_usd, NEW.charge_usd)
+    ON CONFLICT (day, user_id, model) DO UPDATE SET
+        analyses = u.analyses + 1,
+        input_tokens = u.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = u.output_tokens + EXCLUDED.output_tokens,
+        cost_usd = u.cost_usd + EXCLUDED.cost_usd,
+        charge_usd = u.charge_usd + EXCLUDED.charge_usd
+    RETURNING (CASE WHEN u.analyses = 1 THEN 1 ELSE 0 END) INTO v_new_user;
+
+    INSERT INTO usage_daily_model AS m (day, model, analyses, users, input_tokens, output_tokens, cost_usd, charge_usd)
+    VALUES (v_day, v_model, 1, v_new_user, NEW.input_tokens, NEW.output_tokens, NEW.cost_usd, NEW.charge_usd)
+    ON CONFLICT (day, model) DO UPDATE SET
+        analyses = m.analyses + 1,
+        users = m.users + EXCLUDED.users,
+        input_tokens = m.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = m.output_tokens + EXCLUDED.output_tokens,
+        cost_usd = m.cost_usd + EXCLUDED.cost_usd,
+        charge_usd = m.charge_usd + EXCLUDED.charge_usd;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_rollup_analysis_usage ON analyses;
+CREATE TRIGGER trg_rollup_analysis_usage
+    AFTER INSERT ON analyses
+    FOR EACH ROW EXECUTE FUNCTION rollup_analysis_usage();
+
+-- Backfill rollups from analyses written before this migration
+INSERT INTO usage_daily (day, user_id, model, analyses, input_tokens, output_tokens, cost_usd, charge_usd)
+SELECT (created_at AT TIME ZONE 'UTC')::DATE, user_id, COALESCE(model_used, 'unknown'),
+       COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cost_usd), SUM(charge_usd)
+FROM analyses
+GROUP BY 1, 2, 3
+ON CONFLICT (day, user_id, model) DO NOTHING;
+
+INSERT INTO usage_daily_model (day, model, analyses, users, input_tokens, output_tokens, cost_usd, charge_usd)
+SELECT day, model, SUM(analyses), COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cost_usd), SUM(charge_usd)
+FROM usage_daily
+GROUP BY 1, 2
+ON CONFLICT (day, model) DO NOTHING;
+
+-- Opening balances, so ledger sums reconcile with users.credits
+INSERT INTO credit_ledger (user_id, amount_usd, balance_after, kind, reference_id)
+SELECT id, credits, credits, 'adjustment', 'opening-balance'
+FROM users
+WHERE credits <> 0
+  AND NOT EXISTS (SELECT 1 FROM credit_ledger l WHERE l.user_id = users.id);
+
+-- ============================================================
+-- RLS Policies
+-- ============================================================
+
+ALTER TABLE credit_ledger ENABLE ROW LEVEL SECURITY;
+ALTER TABLE usage_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE usage_daily_model ENABLE ROW LEVEL SECURITY;
+
+-- Users can read their own ledger
+CREATE POLICY "Users can read own ledger"
+    ON credit_ledger FOR SELECT
+    USING (user_id IN (SELECT id FROM users WHERE clerk_id = auth.uid()::text));
+
+CREATE POLICY "Service role full access credit_ledger"
+    ON credit_ledger FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access usage_daily"
+    ON usage_daily FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access usage_daily_model"
+    ON usage_daily_model FOR ALL
+    USING (auth.role() = 'service_role');
+
+-- Comments
+COMMENT ON TABLE credit_ledger IS 'Append-only record of every credit and debit; users.credits is its running balance';
+COMMENT ON COLUMN credit_ledger.amount_usd IS 'Positive for credits added, negative for charges';
+COMMENT ON COLUMN credit_ledger.reference_id IS 'Analysis id or Stripe session; unique per kind for idempotent retries';
+COMMENT ON TABLE usage_daily IS 'Per user, per day, per model usage totals maintained on analysis insert';
+COMMENT ON TABLE usage_daily_model IS 'Per day, per model usage totals maintained on analysis insert';
@@ -0,0 +1,12 @@
+-- Rose Glass Dating - Price Table Versioning
+-- Records which price table each analysis was charged with. Amounts are
+-- computed in integer micro-dollars by the backend; DECIMAL(10,6) stores
+-- them exactly.
+
+ALTER TABLE analyses ADD COLUMN IF NOT EXISTS price_version TEXT;
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_analyses_price_version ON analyses(price_version);
+
+-- Comments
+COMMENT ON COLUMN analyses.price_version IS 'Version of the price table used for cost_usd/charge_usd (NULL before versioning)';
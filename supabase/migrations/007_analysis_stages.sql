@@ -0,0 +1,24 @@
+-- Rose Glass Dating - Two-Stage Analyses
+-- A triage analysis (readings, tell, opener) can be followed by a deep pass
+-- stored as its own row pointing back at it. Both are charged and rolled up
+-- like any other analysis. Prompt-cache token counts are kept for cost audits.
+
+ALTER TABLE analyses
+    ADD COLUMN IF NOT EXISTS stage TEXT NOT NULL DEFAULT 'full'
+        CHECK (stage IN ('full', 'triage', 'deep')),
+    ADD COLUMN IF NOT EXISTS parent_id UUID REFERENCES analyses(id) ON DELETE CASCADE,
+    ADD COLUMN IF NOT EXISTS cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS cache_write_tokens INTEGER NOT NULL DEFAULT 0;
+
+-- A cached prefix can leave very few uncached input tokens
+ALTER TABLE analyses DROP CONSTRAINT IF EXISTS analyses_input_tokens_check;
+ALTER TABLE analyses ADD CONSTRAINT analyses_input_tokens_check CHECK (input_tokens >= 0);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_analyses_parent_id ON analyses(parent_id) WHERE parent_id IS NOT NULL;
+
+-- Comments
+COMMENT ON COLUMN analyses.stage IS 'full, triage (quick pass) or deep (follow-up to a triage analysis)';
+COMMENT ON COLUMN analyses.parent_id IS 'Triage analysis a deep pass continues';
+COMMENT ON COLUMN analyses.cache_read_tokens IS 'Input tokens billed at the prompt-cache read rate';
+COMMENT ON COLUMN analyses.cache_write_tokens IS 'Input tokens billed at the prompt-cache write rate';
@@ -0,0 +1,36 @@
+-- Rose Glass Dating - Stored Images
+-- Screenshots are normalized and written once to a content-addressed image
+-- store (local filesystem or S3), keyed by the SHA-256 of the normalized
+-- bytes. Analyses reference the images they were run on, and user_images
+-- records who uploaded what, so an image can only be reused by id by a user
+-- who has uploaded it.
+
+ALTER TABLE analyses
+    ADD COLUMN IF NOT EXISTS image_hashes TEXT[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS conversation_image_hashes TEXT[] NOT NULL DEFAULT '{}';
+
+CREATE TABLE IF NOT EXISTS user_images (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    image_hash TEXT NOT NULL CHECK (image_hash ~ '^[0-9a-f]{64}$'),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, image_hash)
+);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_user_images_image_hash ON user_images(image_hash);
+
+-- Row Level Security
+ALTER TABLE user_images ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own images"
+    ON user_images FOR SELECT
+    USING (user_id IN (SELECT id FROM users WHERE clerk_id = auth.uid()::text));
+
+CREATE POLICY "Service role full access user_images"
+    ON user_images FOR ALL
+    USING (auth.role() = 'service_role');
+
+-- Comments
+COMMENT ON TABLE user_images IS 'Images each user has uploaded to the image store (by content hash)';
+COMMENT ON COLUMN analyses.image_hashes IS 'Profile screenshots analyzed, as image store hashes, in order';
+COMMENT ON COLUMN analyses.conversation_image_hashes IS 'Conversation screenshots analyzed, as image store hashes, in order';
@@ -0,0 +1,21 @@
+-- Rose Glass Dating - Compressed Analysis Text
+-- Analysis bodies are stored zstd-compressed with a trained dictionary
+-- (backend/app/services/analysis_codec.py); the frame header names the
+-- dictionary. Rows written before this migration, or with compression
+-- turned off, keep their text in analysis_text. History listings select
+-- neither column; the text is only read for a single analysis.
+
+ALTER TABLE analyses
+    ADD COLUMN IF NOT EXISTS analysis_zstd BYTEA,
+    ALTER COLUMN analysis_text DROP NOT NULL;
+
+ALTER TABLE analyses DROP CONSTRAINT IF EXISTS analyses_body_check;
+ALTER TABLE analyses ADD CONSTRAINT analyses_body_check
+    CHECK (analysis_text IS NOT NULL OR analysis_zstd IS NOT NULL);
+
+-- Already compressed; keep Postgres from trying again
+ALTER TABLE analyses ALTER COLUMN analysis_zstd SET STORAGE EXTERNAL;
+
+-- Comments
+COMMENT ON COLUMN analyses.analysis_text IS 'Full analysis text from Claude, when stored uncompressed';
+COMMENT ON COLUMN analyses.analysis_zstd IS 'Full analysis text, zstd-compressed with a dictionary from backend/app/dictionaries';
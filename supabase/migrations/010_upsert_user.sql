@@ -0,0 +1,33 @@
+-- Rose Glass Dating - Single Round-Trip User Resolution
+-- Every authenticated request maps its Clerk user to a users row (cached per
+-- worker, see backend/app/services/auth.py). upsert_user creates the row on
+-- first sight and returns its id and balance in one statement instead of a
+-- select followed by an insert. The email is only rewritten when it changed,
+-- so repeat calls do not churn the row.
+
+CREATE OR REPLACE FUNCTION upsert_user(
+    p_clerk_id TEXT,
+    p_email TEXT DEFAULT NULL,
+    OUT user_id UUID,
+    OUT balance DECIMAL
+)
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO users AS u (clerk_id, email)
+    VALUES (p_clerk_id, COALESCE(p_email, ''))
+    ON CONFLICT (clerk_id) DO UPDATE
+        SET email = EXCLUDED.email, updated_at = NOW()
+        WHERE p_email IS NOT NULL AND u.email IS DISTINCT FROM EXCLUDED.email
+    RETURNING u.id, u.credits INTO user_id, balance;
+
+    -- Existing row with nothing to update: ON CONFLICT returned no row
+    IF NOT FOUND THEN
+        SELECT u.id, u.credits INTO user_id, balance
+        FROM users u
+        WHERE u.clerk_id = p_clerk_id;
+    END IF;
+END;
+$$;
+
+-- Comments
+COMMENT ON FUNCTION upsert_user(TEXT, TEXT) IS 'Get or create the user for a Clerk id; returns (user_id, balance) in one round trip';
@@ -0,0 +1,91 @@
+-- Rose Glass Dating - Stripe Webhook Inbox
+-- Verified webhook events are stored raw, keyed by Stripe's event id, and
+-- acknowledged at once; redeliveries hit the primary key and are dropped.
+-- Worker processes claim pending events in batches and fulfil checkouts
+-- (backend/app/services/stripe_webhooks.py). Fulfilment posts the ledger
+-- entry, records the transaction and closes the event in one transaction,
+-- and the ledger entry is keyed by the checkout session, so each session
+-- is credited exactly once.
+
+CREATE TABLE IF NOT EXISTS stripe_events (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processed', 'ignored', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_until TIMESTAMPTZ,
+    last_error TEXT,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_stripe_events_pending
+    ON stripe_events(received_at) WHERE status = 'pending';
+
+-- Lease up to p_limit pending events to the caller, oldest first. Rows
+-- locked by another worker's claim are skipped, and a lease that expires
+-- (worker died mid-batch) makes its events claimable again.
+CREATE OR REPLACE FUNCTION claim_stripe_events(
+    p_limit INTEGER,
+    p_lease_seconds INTEGER
+) RETURNS SETOF stripe_events
+LANGUAGE sql AS $$
+    UPDATE stripe_events e
+    SET claimed_until = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = e.attempts + 1
+    WHERE e.id IN (
+        SELECT id FROM stripe_events
+        WHERE status = 'pending'
+          AND (claimed_until IS NULL OR claimed_until < NOW())
+        ORDER BY received_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING e.*;
+$$;
+
+-- Credit a paid checkout session and close its event. Safe to repeat: the
+-- ledger entry is keyed by ('purchase', session id).
+CREATE OR REPLACE FUNCTION fulfill_stripe_checkout(
+    p_event_id TEXT,
+    p_user_id UUID,
+    p_session_id TEXT,
+    p_payment_intent TEXT,
+    p_amount DECIMAL,
+    p_credits DECIMAL
+) RETURNS DECIMAL
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_balance DECIMAL;
+BEGIN
+    v_balance := post_ledger_entry(p_user_id, p_credits, 'purchase', p_session_id);
+
+    INSERT INTO transactions AS t (
+        user_id, stripe_session_id, stripe_payment_intent, amount_usd, credits_added, status, completed_at
+    )
+    VALUES (p_user_id, p_session_id, p_payment_intent, p_amount, p_credits, 'completed', NOW())
+    ON CONFLICT (stripe_session_id) DO UPDATE SET
+        status = 'completed',
+        stripe_payment_intent = EXCLUDED.stripe_payment_intent,
+        completed_at = COALESCE(t.completed_at, NOW());
+
+    UPDATE stripe_events
+    SET status = 'processed', processed_at = NOW(), claimed_until = NULL, last_error = NULL
+    WHERE id = p_event_id;
+
+    RETURN v_balance;
+END;
+$$;
+
+-- RLS Policies
+ALTER TABLE stripe_events ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access stripe_events"
+    ON stripe_events FOR ALL
+    USING (auth.role() = 'service_role');
+
+-- Comments
+COMMENT ON TABLE stripe_events IS 'Inbox of verified Stripe webhook events, keyed by event id for idempotent ingestion';
+COMMENT ON COLUMN stripe_events.status IS 'pending until fulfilled (processed), not applicable (ignored) or given up on (failed)';
+COMMENT ON COLUMN stripe_events.claimed_until IS 'Lease of the worker processing the event; expired leases are reclaimed';
@@ -0,0 +1,19 @@
+-- Rose Glass Dating - Profile Comparisons
+-- POST /api/analyze/compare analyzes several profiles in parallel. Each
+-- profile is stored as its own analysis tagged with the comparison, and
+-- the whole comparison is charged as one 'comparison' ledger entry keyed
+-- by its id, in place of one debit per analysis.
+
+ALTER TABLE credit_ledger DROP CONSTRAINT IF EXISTS credit_ledger_kind_check;
+ALTER TABLE credit_ledger ADD CONSTRAINT credit_ledger_kind_check
+    CHECK (kind IN ('analysis', 'co_create', 'comparison', 'purchase', 'refund', 'adjustment'));
+
+ALTER TABLE analyses
+    ADD COLUMN IF NOT EXISTS comparison_id UUID;
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_analyses_comparison_id ON analyses(comparison_id) WHERE comparison_id IS NOT NULL;
+
+-- Comments
+COMMENT ON COLUMN analyses.comparison_id IS 'Comparison the analysis was part of; its charge is on the comparison ledger entry';
+COMMENT ON COLUMN credit_ledger.reference_id IS 'Analysis id, comparison id or Stripe session; unique per kind for idempotent retries';
@@ -0,0 +1,21 @@
+-- Rose Glass Dating - Credit Precision
+-- Charges are micro-dollars: credit_ledger keeps 6 decimal places and
+-- post_ledger_entry() returns 6-place balances, but users.credits and
+-- transactions.credits_added were DECIMAL(10,4) and silently rounded every
+-- write. users.credits then drifted from the ledger after the first
+-- sub-0.0001 charge. Both now hold 6 places, like the ledger.
+
+ALTER TABLE users ALTER COLUMN credits TYPE DECIMAL(12,6);
+ALTER TABLE transactions ALTER COLUMN credits_added TYPE DECIMAL(12,6);
+
+-- Drift so far, booked as one adjustment per user so ledger sums reconcile
+-- with users.credits again (balances themselves are left as they are;
+-- the ledger is append-only, so balance_after history is not rewritten)
+INSERT INTO credit_ledger (user_id, amount_usd, balance_after, kind, reference_id)
+SELECT u.id, u.credits - l.total, u.credits, 'adjustment', 'precision-013:' || u.id
+FROM users u
+JOIN (SELECT user_id, SUM(amount_usd) AS total FROM credit_ledger GROUP BY user_id) l ON l.user_id = u.id
+WHERE u.credits <> l.total;
+
+-- Comments
+COMMENT ON COLUMN users.credits IS 'Balance in USD to 6 places; maintained only by post_ledger_entry()';